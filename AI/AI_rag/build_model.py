@@ -111,12 +111,17 @@ def load_json_to_splittext(file_path: str):
         raise ValueError("不支持的文档格式，仅支持.txt和.json")
 
 
+def create_embedding():
+    """创建嵌入模型"""
+    return DashScopeEmbeddings(
+        model="text-embedding-v1", dashscope_api_key=DASHSCOPE_API_KEY
+    )
+
+
 def create_vector_db(documents, persist_dir: str):
     """创建并持久化向量数据库"""
     # 创建嵌入模型
-    embedding = DashScopeEmbeddings(
-        model="text-embedding-v1", dashscope_api_key=DASHSCOPE_API_KEY
-    )
+    embedding = create_embedding()
 
     try:
         # 创建并持久化向量数据库
@@ -148,25 +153,8 @@ def create_vector_db(documents, persist_dir: str):
         return db
 
 
-def build_and_save_model(
-    data_path: str, model_name: str = "zhihu_model", model_type: str = "zhihu_model"
-):
-    """构建并保存问答模型"""
-    # 创建模型目录
-    model_dir = f"model_{model_name}"
-    os.makedirs(model_dir, exist_ok=True)
-
-    print(f"🛠️ 开始构建模型: {model_name}")
-
-    # 1. 加载文档
-    print("🔍 加载文档...")
-    documents = load_json_to_splittext(data_path)
-
-    # 2. 创建向量数据库
-    print("🧠 创建向量数据库...")
-    db = create_vector_db(documents, persist_dir=model_dir)
-
-    # 3. 保存提示模板
+def get_prompt_template(model_type: str) -> str:
+    """根据模型类型获取提示模板"""
     if model_type == "zhihu_model":
         prompt_template = """
 【角色定位】
@@ -317,12 +305,79 @@ def build_and_save_model(
 {context}
 """
 
+    return prompt_template
+
+
+def save_prompt_template(model_dir: str, model_type: str):
+    """保存提示模板到模型目录"""
     with open(f"{model_dir}/prompt_template.txt", "w", encoding="utf-8") as f:
-        f.write(prompt_template)
+        f.write(get_prompt_template(model_type))
+
+
+def build_and_save_model(
+    data_path: str, model_name: str = "zhihu_model", model_type: str = "zhihu_model"
+):
+    """构建并保存问答模型"""
+    # 创建模型目录
+    model_dir = f"model_{model_name}"
+    os.makedirs(model_dir, exist_ok=True)
+
+    print(f"🛠️ 开始构建模型: {model_name}")
+
+    # 1. 加载文档
+    print("🔍 加载文档...")
+    documents = load_json_to_splittext(data_path)
+
+    # 2. 创建向量数据库
+    print("🧠 创建向量数据库...")
+    db = create_vector_db(documents, persist_dir=model_dir)
+
+    # 3. 保存提示模板
+    save_prompt_template(model_dir, model_type)
 
     print(f"✅ 模型构建完成并保存到 {model_dir}")
 
 
+class IncrementalModelBuilder:
+    """
+    增量构建问答模型：文本到达后立即切分并写入向量数据库，
+    用于爬取、转写和向量化同时进行的流水线，而不是等全部数据爬完再统一构建
+    """
+
+    def __init__(self, model_name: str, model_type: str):
+        self.model_name = model_name
+        self.model_type = model_type
+        self.model_dir = f"model_{model_name}"
+        os.makedirs(self.model_dir, exist_ok=True)
+        self.db = Chroma(
+            persist_directory=self.model_dir, embedding_function=create_embedding()
+        )
+        self.chunk_count = 0
+
+    def add_texts(self, texts, metadata=None) -> int:
+        """切分文本并写入向量数据库，返回写入的分块数量"""
+        documents = [
+            Document(page_content=text, metadata=metadata or {})
+            for text in texts
+            if text and text.strip()
+        ]
+        splits = safe_split_documents(documents)
+        if not splits:
+            return 0
+        self.db.add_documents(splits)
+        self.chunk_count += len(splits)
+        return len(splits)
+
+    def finalize(self) -> bool:
+        """持久化向量数据库并保存提示模板，没有任何内容时返回 False"""
+        if self.chunk_count == 0:
+            return False
+        self.db.persist()
+        save_prompt_template(self.model_dir, self.model_type)
+        print(f"✅ 模型构建完成并保存到 {self.model_dir}，共 {self.chunk_count} 个分块")
+        return True
+
+
 if __name__ == "__main__":
     # 示例用法
     data_path = "data/video_fan_transcription.txt"
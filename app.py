@@ -1,16 +1,17 @@
 # app.py
 import asyncio
+import dataclasses
 import json
 import logging
 import os
 import shutil
 import subprocess
 import sys
-from threading import Lock, Thread
 
 from flask import Flask, jsonify, request, send_from_directory
 from flask_cors import CORS
 
+from job_runner import JobRunner
 from main import CrawlerConfig
 from main import main as run_crawler_main
 
@@ -22,17 +23,14 @@ logger = logging.getLogger(__name__)
 HOST = os.environ.get("HOST", "0.0.0.0")
 PORT = int(os.environ.get("PORT", 5000))
 DEBUG = os.environ.get("DEBUG", "False").lower() == "true"
+# 同时运行的爬虫任务数量，任务之间共享 data 目录和模型目录，默认串行执行
+JOB_MAX_WORKERS = int(os.environ.get("JOB_MAX_WORKERS", 1))
+# 任务状态持久化的 SQLite 文件，不能放在每次运行都会清空的 data 目录下
+JOB_DB_PATH = os.environ.get("JOB_DB_PATH", "jobs.db")
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
 
-# 存储任务状态
-task_status = {}
-# 任务锁，防止并发问题
-task_lock = Lock()
-# 正在运行的任务
-running_tasks = set()
-
 
 # 提供前端页面
 @app.route("/")
@@ -59,18 +57,12 @@ def run_crawler():
         task_id = data.get("task_id", "default")
         task_type = data.get("task-type")  # 获取任务类型
 
-        # 检查任务是否已经在运行
-        with task_lock:
-            if task_id in running_tasks:
-                return jsonify({"success": False, "message": "任务已在运行中，请勿重复点击"}), 400
-
-            # 标记任务为正在运行
-            running_tasks.add(task_id)
-
         # 获取参数
         logintype = data.get("logintype")
         platform = data.get("platform")
         crawlertype = data.get("crawlertype")
+        # 优先级，数字越小越先执行
+        priority = int(data.get("priority", 10))
 
         # 根据任务类型获取相应URL
         url = None
@@ -81,73 +73,74 @@ def run_crawler():
         elif task_type == "xhs-detail":
             url = data.get("post-url")
 
-        # 记录任务状态
-        task_status[task_id] = {"status": "running", "message": "正在运行爬虫和生成模型..."}
-
-        # 在新线程中运行爬虫
-        thread = Thread(
-            target=execute_crawler,
-            args=(logintype, platform, crawlertype, task_id, url, task_type),
-        )
-        thread.daemon = True  # 设置为守护线程
-        thread.start()
-
-        return jsonify({"success": True, "task_id": task_id, "message": "任务已启动"})
+        # 提交到任务队列，由固定数量的 worker 执行
+        params = {
+            "logintype": logintype,
+            "platform": platform,
+            "crawlertype": crawlertype,
+            "url": url,
+            "task_type": task_type,
+            # 是否从上次中断的位置继续爬取
+            "resume": bool(data.get("resume", False)),
+            # 断点记录按 task_id 隔离，续爬时只复用同一个任务的断点
+            "run_id": task_id,
+        }
+        if not job_runner.submit(task_id, params, priority=priority):
+            return jsonify({"success": False, "message": "任务已在运行中，请勿重复点击"}), 400
+
+        return jsonify({"success": True, "task_id": task_id, "message": "任务已加入队列"})
     except Exception as e:
         logger.error(f"运行爬虫时出错: {str(e)}")
         return jsonify({"success": False, "message": str(e)}), 500
 
 
-def execute_crawler(logintype, platform, crawlertype, task_id, url, task_type):
-    try:
-        # 如果提供了URL，则更新配置文件中的URL
-        if url:
-            update_config_url(platform, crawlertype, url, task_type)
-
-        # 在运行爬虫之前删除对应的模型目录
-        model_name = f"{platform}_model"
-        model_dir = f"model_{model_name}"
+async def execute_crawler(
+    logintype, platform, crawlertype, url, task_type, resume=False, run_id=""
+):
+    # 在运行爬虫之前删除对应的模型目录
+    model_name = f"{platform}_model"
+    model_dir = f"model_{model_name}"
+
+    # 断点续爬时保留已有模型，新爬取的数据继续增量写入
+    if os.path.exists(model_dir) and not resume:
+        shutil.rmtree(model_dir)
+        logger.info(f"已删除已存在的模型目录: {model_dir}")
+
+    # 创建爬虫配置
+    config = CrawlerConfig(
+        logintype=logintype,
+        platform=platform,
+        crawlertype=crawlertype,
+        overrides=build_config_overrides(url, task_type),
+        resume=resume,
+        run_id=run_id,
+    )
 
-        if os.path.exists(model_dir):
-            import shutil
+    # 运行爬虫主程序，所有任务共享 job_runner 的事件循环
+    # 增加重试机制和错误处理
+    try:
+        await run_crawler_main(config)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        # 记录详细错误信息
+        logger.error(f"爬虫执行过程中发生错误: {str(e)}")
+        # 尝试再次运行
+        try:
+            logger.info("尝试重新运行爬虫...")
+            # 重试时从断点继续，不再清空已经爬取的数据
+            await run_crawler_main(dataclasses.replace(config, resume=True))
+        except Exception as retry_error:
+            logger.error(f"重试后仍然失败: {str(retry_error)}")
+            raise retry_error
 
-            shutil.rmtree(model_dir)
-            logger.info(f"已删除已存在的模型目录: {model_dir}")
+    return "爬虫运行完成，模型已生成"
 
-        # 创建爬虫配置
-        config = CrawlerConfig(
-            logintype=logintype, platform=platform, crawlertype=crawlertype
-        )
 
-        # 运行爬虫主程序
-        # 注意: asyncio.run() 不能在已有事件循环的线程中运行
-        # 所以我们需要创建一个新的事件循环
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        # 增加重试机制和错误处理
-        try:
-            loop.run_until_complete(run_crawler_main(config))
-        except Exception as e:
-            # 记录详细错误信息
-            logger.error(f"爬虫执行过程中发生错误: {str(e)}")
-            # 尝试再次运行
-            try:
-                logger.info("尝试重新运行爬虫...")
-                loop.run_until_complete(run_crawler_main(config))
-            except Exception as retry_error:
-                logger.error(f"重试后仍然失败: {str(retry_error)}")
-                raise retry_error
-
-        # 更新任务状态
-        task_status[task_id] = {"status": "completed", "message": "爬虫运行完成，模型已生成"}
-        logger.info(f"任务 {task_id} 完成")
-    except Exception as e:
-        task_status[task_id] = {"status": "error", "message": str(e)}
-        logger.error(f"任务 {task_id} 出错: {str(e)}")
-    finally:
-        # 无论成功还是失败，都要从运行中任务集合中移除
-        with task_lock:
-            running_tasks.discard(task_id)
+# 爬虫任务执行器
+job_runner = JobRunner(
+    execute_crawler, max_workers=JOB_MAX_WORKERS, db_path=JOB_DB_PATH
+)
 
 
 def extract_bv_id_from_url(url):
@@ -163,86 +156,57 @@ def extract_bv_id_from_url(url):
     return None
 
 
-def update_config_url(platform, crawlertype, url, task_type):
+def build_config_overrides(url, task_type):
     """
-    根据平台和爬虫类型更新配置文件中的URL
+    根据任务类型生成只对本次任务生效的爬虫配置，不再改写 base_config.py
     """
-    config_path = os.path.join(
-        os.path.dirname(__file__), "crawler", "config", "base_config.py"
-    )
-
-    try:
-        # 读取配置文件
-        with open(config_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        # 根据任务类型确定要替换的配置项
-        if task_type == "zhihu-question":
-            # 更新知乎问题URL
-            for i, line in enumerate(lines):
-                if line.startswith("ZHIHU_QUESTION_URL ="):
-                    lines[i] = f'ZHIHU_QUESTION_URL = "{url}"  # 替换为实际的问题URL\n'
-                    break
-        elif task_type == "bili-video":
-            # 更新B站指定视频ID列表
-            # 查找BILI_SPECIFIED_ID_LIST开始位置
-            start_index = -1
-            end_index = -1
-            for i, line in enumerate(lines):
-                if "BILI_SPECIFIED_ID_LIST = [" in line:
-                    start_index = i
-                elif start_index != -1 and line.strip() == "]" and end_index == -1:
-                    end_index = i
-                    break
-
-            # 如果找到了列表定义，则替换它
-            if start_index != -1 and end_index != -1:
-                # 提取BV号（从URL中）
-                bv_id = extract_bv_id_from_url(url)
-                if bv_id:
-                    lines[start_index] = "BILI_SPECIFIED_ID_LIST = [\n"
-                    lines[start_index + 1] = f'    "{bv_id}"\n'
-                    lines[start_index + 2] = "]\n"
-                    # 删除多余的行
-                    for _ in range(end_index - start_index - 2):
-                        lines.pop(start_index + 3)
-        elif task_type == "xhs-detail":
-            # 更新小红书指定笔记URL列表
-            # 查找XHS_SPECIFIED_NOTE_URL_LIST开始位置
-            start_index = -1
-            end_index = -1
-            for i, line in enumerate(lines):
-                if "XHS_SPECIFIED_NOTE_URL_LIST = [" in line:
-                    start_index = i
-                elif start_index != -1 and line.strip() == "]" and end_index == -1:
-                    end_index = i
-                    break
-
-            # 如果找到了列表定义，则替换它
-            if start_index != -1 and end_index != -1:
-                lines[start_index] = "XHS_SPECIFIED_NOTE_URL_LIST = [\n"
-                lines[start_index + 1] = f'    "{url}"\n'
-                lines[start_index + 2] = "]\n"
-                # 删除多余的行
-                for _ in range(end_index - start_index - 2):
-                    lines.pop(start_index + 3)
-
-        # 写回配置文件
-        with open(config_path, "w", encoding="utf-8") as f:
-            f.writelines(lines)
-
-        logger.info(f"已更新配置文件中的URL，任务类型: {task_type}")
-    except Exception as e:
-        logger.error(f"更新配置文件失败: {str(e)}")
-        raise
+    if not url:
+        return {}
+    if task_type == "zhihu-question":
+        return {"ZHIHU_QUESTION_URL": url}
+    if task_type == "bili-video":
+        # 提取BV号（从URL中）
+        bv_id = extract_bv_id_from_url(url)
+        return {"BILI_SPECIFIED_ID_LIST": [bv_id]} if bv_id else {}
+    if task_type == "xhs-detail":
+        return {"XHS_SPECIFIED_NOTE_URL_LIST": [url]}
+    return {}
 
 
 @app.route("/api/task-status/<task_id>", methods=["GET"])
 def get_task_status(task_id):
-    status = task_status.get(task_id, {"status": "unknown", "message": "任务不存在"})
+    status = job_runner.get_status(task_id) or {"status": "unknown", "message": "任务不存在"}
     return jsonify(status)
 
 
+@app.route("/api/cancel-task/<task_id>", methods=["POST"])
+def cancel_task(task_id):
+    if not job_runner.cancel(task_id):
+        return jsonify({"success": False, "message": "任务不存在或已结束"}), 400
+    return jsonify({"success": True, "task_id": task_id, "message": "任务已取消"})
+
+
+@app.route("/api/job-stats", methods=["GET"])
+def get_job_stats():
+    return jsonify(job_runner.get_stats())
+
+
+@app.route("/api/crawler-stats", methods=["GET"])
+def get_crawler_stats():
+    # crawler 目录由 main 模块加入 sys.path
+    from tools.circuit_breaker import get_circuit_breaker_stats
+    from tools.rate_limiter import get_rate_limiter_stats
+    from tools.retry_policy import get_retry_stats
+
+    return jsonify(
+        {
+            "rate_limiters": get_rate_limiter_stats(),
+            "circuit_breakers": get_circuit_breaker_stats(),
+            "retries": get_retry_stats(),
+        }
+    )
+
+
 @app.route("/api/summarize", methods=["POST"])
 def summarize():
     try:
@@ -318,6 +282,9 @@ def test_api():
 if __name__ == "__main__":
     # 使用环境变量配置应用
     try:
+        # debug 模式下 reloader 的父进程只负责监控文件变化，只在实际处理请求的子进程里启动任务执行器
+        if not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+            job_runner.start()
         app.run(debug=DEBUG, port=PORT, host=HOST, threaded=True)
     except SystemExit:
         logger.info("应用正常退出")
@@ -1,10 +1,15 @@
 import argparse
+from typing import Any, Dict
 
 import config
 from tools.utils import str2bool
 
 
-async def parse_cmd():
+async def parse_cmd() -> Dict[str, Any]:
+    """
+    解析命令行参数，返回需要覆盖的配置项，不再直接修改全局配置
+    :return: 配置项名称 -> 命令行参数值
+    """
     # 读取command arg
     parser = argparse.ArgumentParser(description="Media crawler program.")
     parser.add_argument(
@@ -14,6 +19,14 @@ async def parse_cmd():
         choices=["xhs", "dy", "ks", "bili", "wb", "tieba", "zhihu"],
         default=config.PLATFORM,
     )
+    parser.add_argument(
+        "--platforms",
+        type=str,  # 同时爬取的多个平台
+        nargs="+",
+        help="crawl several media platforms concurrently with the same options",
+        choices=["xhs", "dy", "ks", "bili", "wb", "tieba", "zhihu"],
+        default=config.CRAWLER_PLATFORMS,
+    )
     parser.add_argument(
         "--lt",
         type=str,
@@ -67,15 +80,38 @@ async def parse_cmd():
         default=config.COOKIES,
     )
 
+    parser.add_argument(
+        "--resume",
+        type=str2bool,  # 是否从断点继续爬取
+        help="""whether to resume from the checkpoint of the same run id, supported values case insensitive ('yes', 'true', 't', 'y', '1', 'no', 'false', 'f', 'n', '0')""",
+        default=config.CHECKPOINT_RESUME,
+    )
+    parser.add_argument(
+        "--run_id",
+        type=str,  # 断点记录所属的运行ID
+        help="run id that checkpoints are kept under",
+        default=config.CHECKPOINT_RUN_ID,
+    )
+
     args = parser.parse_args()
 
+    keywords = args.keywords
+    if isinstance(keywords, list):
+        # nargs="+" 时得到的是列表，统一为以英文逗号分隔的字符串
+        keywords = ",".join(keywords)
+
     # override config
-    config.PLATFORM = args.platform
-    config.LOGIN_TYPE = args.lt
-    config.CRAWLER_TYPE = args.type
-    config.START_PAGE = args.start
-    config.KEYWORDS = args.keywords
-    config.ENABLE_GET_COMMENTS = args.get_comment
-    config.ENABLE_GET_SUB_COMMENTS = args.get_sub_comment
-    config.SAVE_DATA_OPTION = args.save_data_option
-    config.COOKIES = args.cookies
+    return {
+        "PLATFORM": args.platform,
+        "CRAWLER_PLATFORMS": list(args.platforms),
+        "LOGIN_TYPE": args.lt,
+        "CRAWLER_TYPE": args.type,
+        "START_PAGE": args.start,
+        "KEYWORDS": keywords,
+        "ENABLE_GET_COMMENTS": args.get_comment,
+        "ENABLE_GET_SUB_COMMENTS": args.get_sub_comment,
+        "SAVE_DATA_OPTION": args.save_data_option,
+        "COOKIES": args.cookies,
+        "CHECKPOINT_RESUME": args.resume,
+        "CHECKPOINT_RUN_ID": args.run_id,
+    }
@@ -1,2 +1,28 @@
+import sys
+import types
+
 from .base_config import *
 from .db_config import *
+from .job_config import (
+    CrawlerJobConfig,
+    build_job_config,
+    get_job_config,
+    job_config_var,
+)
+
+
+class _JobScopedConfigModule(types.ModuleType):
+    """
+    读取 config.XXX 时优先返回当前任务配置中覆盖的值，没有任务配置时返回模块中的默认值，
+    这样同一进程内可以同时运行多个配置不同的爬虫任务
+    """
+
+    def __getattribute__(self, name: str):
+        if name.isupper():
+            job_config = job_config_var.get()
+            if job_config is not None and name in job_config.overrides:
+                return job_config.overrides[name]
+        return super().__getattribute__(name)
+
+
+sys.modules[__name__].__class__ = _JobScopedConfigModule
@@ -1,4 +1,6 @@
 PLATFORM = "zhihu"
+# 同时爬取的多个平台，例如 ["bili", "zhihu"]，配置两个及以上时各平台使用相同的配置并发爬取，PLATFORM 不再生效
+CRAWLER_PLATFORMS = []
 KEYWORDS = "特斯拉"  # 关键词搜索配置，以英文逗号分隔
 ZHIHU_QUESTION_URL = "https://www.zhihu.com/question/614075115"  # 替换为实际的问题URL
 LOGIN_TYPE = "qrcode"  # qrcode or phone or cookie
@@ -21,10 +23,35 @@ CRAWLER_MAX_SLEEP_SEC = 4
 # 代理IP池数量
 IP_PROXY_POOL_COUNT = 2
 
-# 代理IP提供商名称
+# 代理IP提供商名称，localmock 为本机模拟的代理，用于离线调试和压测代理池
 # IP_PROXY_PROVIDER_NAME = "kuaidaili"
 IP_PROXY_PROVIDER_NAME = None
 
+# 代理池可用 IP 数量低于 IP_PROXY_POOL_COUNT * 该比例时，在后台提前补充新 IP
+IP_PROXY_REFILL_RATIO = 0.5
+
+# 距离过期不足该秒数的代理 IP 提前剔除，避免请求发到一半 IP 过期
+IP_PROXY_EXPIRE_MARGIN_SEC = 30
+
+# 同一个代理 IP 连续失败多少次后从代理池剔除
+IP_PROXY_MAX_CONSECUTIVE_FAILURES = 3
+
+# 并发验证代理 IP 的数量，以及单次验证的超时时间（秒）
+IP_PROXY_VALIDATE_CONCURRENCY = 5
+IP_PROXY_VALIDATE_TIMEOUT_SEC = 10
+
+# 验证代理 IP 是否有效的地址，返回 200 即认为有效
+IP_PROXY_VALIDATE_URL = "https://httpbin.org/ip"
+
+# 本地模拟代理（localmock）：单个代理平均延迟的范围（秒）、单个代理的最大失败率、代理的有效时长（秒）
+MOCK_PROXY_LATENCY_RANGE = (0.05, 0.5)
+MOCK_PROXY_MAX_FAILURE_RATE = 0.3
+MOCK_PROXY_EXPIRE_SEC = 600
+
+# 平台客户端使用代理池的方式：request 每次请求租用一个代理，把请求分散到所有 IP 上；
+# session 固定使用一个代理直到它被剔除，适合登录态和 IP 绑定比较敏感的平台
+IP_PROXY_ROTATION_MODE = "request"
+
 # 设置为True不会打开浏览器（无头浏览器）
 # 设置False会打开一个浏览器
 # 小红书如果一直扫码登录不通过，打开浏览器手动过一下滑动验证码
@@ -63,6 +90,9 @@ CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES = 999
 # 老版本项目使用了 db, 则需参考 schema/tables.sql line 287 增加表字段
 ENABLE_GET_SUB_COMMENTS = False
 
+# 单个视频/帖子同时展开的二级评论线程数量，展开的同时一级评论继续翻页
+SUB_COMMENT_CONCURRENCY = 4
+
 # 已废弃⚠️⚠️⚠️指定小红书需要爬虫的笔记ID列表
 # 已废弃⚠️⚠️⚠️ 指定笔记ID笔记列表会因为缺少xsec_token和xsec_source参数导致爬取失败
 # XHS_SPECIFIED_ID_LIST = [
@@ -148,6 +178,13 @@ ZHIHU_SPECIFIED_ID_LIST = [
     # "https://www.zhihu.com/zvideo/1539542068422144000" # 视频
 ]
 
+# 知乎问题回答爬取：是否按分页游标爬取问题下的全部回答，关闭时只爬取第一页
+ZHIHU_QUESTION_ALL_ANSWERS = True
+# 单个问题最多爬取的回答数量，0 表示不限制
+ZHIHU_QUESTION_MAX_ANSWERS_COUNT = 0
+# 回答列表接口每页数量
+ZHIHU_QUESTION_ANSWERS_PAGE_SIZE = 20
+
 # 词云相关
 # 是否开启生成评论词云图
 ENABLE_GET_WORDCLOUD = False
@@ -175,6 +212,15 @@ END_DAY = "2024-01-01"
 # 若为 True，则按照 START_DAY 至 END_DAY 按照每一天进行筛选，这样能够突破 1000 条视频的限制，最大程度爬取该关键词下的所有视频
 ALL_DAY = False
 
+# ALL_DAY 模式下同时搜索的日期分片数量
+BILI_SEARCH_SHARD_CONCURRENCY = 4
+# ALL_DAY 模式下所有分片共享的同时进行中的搜索请求数量
+BILI_SEARCH_MAX_INFLIGHT_REQUESTS = 2
+# ALL_DAY 模式下单个关键词最多发起的搜索请求数量，0 表示不限制，用完后未完成的分片下次运行时继续
+BILI_SEARCH_REQUEST_BUDGET = 0
+# 时间窗口的搜索结果达到 1000 条上限时会二分拆分，拆分后窗口的最短时长（秒）
+BILI_SEARCH_MIN_WINDOW_SEC = 3600
+
 # 音频下载配置
 AUDIO_CUTOFF_DATE = None  # 截止日期，例如 datetime(2023, 1, 1)
 MIN_VIEW_COUNT = 1  # 最小观看量
@@ -182,3 +228,202 @@ MIN_LIKE_COUNT = 1  # 最小点赞量
 
 # 音频存储路径
 AUDIO_STORE_DIR = "data/audios"
+
+# 媒体文件流式下载时每次读取写入的字节数，峰值内存与视频大小无关
+MEDIA_DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# 媒体下载阶段的并发数量，与元数据爬取的 MAX_CONCURRENCY_NUM 相互独立
+MEDIA_DOWNLOAD_CONCURRENCY = 4
+
+# 媒体下载阶段对同一个域名每秒最多发起的请求数
+MEDIA_DOWNLOAD_HOST_QPS = 5
+
+# 媒体下载队列的最大长度，队列满时元数据爬取会等待，避免任务无限堆积
+MEDIA_DOWNLOAD_QUEUE_SIZE = 200
+
+# 是否开启媒体文件内容寻址存储，开启后相同 url / 相同内容的图片视频只下载和保存一份
+ENABLE_MEDIA_DEDUP = True
+
+# 内容寻址存储的根目录，包含按 sha256 分片的 blob 文件和 url 索引，
+# 放在 data 目录之外，每次运行清空 data 时不会被删除，跨任务去重仍然有效
+MEDIA_BLOB_STORE_DIR = "media_blobs"
+
+# 是否开启断点续爬，开启后会记录关键词/日期/页码、创作者分页、评论游标以及已完成的内容ID，
+# 任务中断后重新运行会从中断的位置继续，并跳过已经保存的内容
+ENABLE_CHECKPOINT = True
+
+# 断点续爬记录保存的 sqlite 文件，与爬取数据放在一起，清空 data 目录时一并清空
+CHECKPOINT_DB_PATH = "data/checkpoint.db"
+
+# 断点记录所属的运行ID（例如 API 请求中的 task_id），断点按 平台:爬取类型:运行ID 隔离，
+# 同一个运行ID重新运行时才会复用之前的断点
+CHECKPOINT_RUN_ID = ""
+
+# 是否从断点继续爬取，关闭时视为新的运行，清空同一个运行ID之前的断点记录和已完成标记
+CHECKPOINT_RESUME = False
+
+# 是否开启跨任务去重：记录每条内容最后一次爬取的时间和指纹（例如评论数），
+# 之后的任务只重新爬取过期或者有变化的内容。
+# 开启后清空 data 目录的全量流程将拿不到旧内容，适合保留数据（断点续爬 / 数据库存储）的周期性爬取
+ENABLE_CRAWL_FRONTIER = False
+
+# 去重索引保存的 sqlite 文件，放在 data 目录之外，清空 data 时不会被删除
+FRONTIER_DB_PATH = "frontier/frontier.db"
+
+# 内容在多久之后视为过期需要重新爬取，单位秒
+FRONTIER_REFRESH_INTERVAL_SEC = 7 * 24 * 3600
+
+# 内存布隆过滤器的容量和误判率，用于在查询 sqlite 之前快速判断内容是否一定没有爬取过
+FRONTIER_BLOOM_CAPACITY = 1000000
+FRONTIER_BLOOM_ERROR_RATE = 0.001
+
+# 分布式爬取：工作队列名称，协调者和所有 worker 需要一致
+DISTRIBUTED_QUEUE_NAME = "crawler_work"
+
+# 分布式爬取：worker 领取任务后多久没有确认完成，任务重新回到队列，单位秒
+DISTRIBUTED_VISIBILITY_TIMEOUT_SEC = 300
+
+# 分布式爬取：单个任务最多尝试次数，超过后放入失败队列
+DISTRIBUTED_MAX_ATTEMPTS = 3
+
+# 分布式爬取：worker 连续多久领取不到任务后退出，单位秒
+DISTRIBUTED_WORKER_IDLE_EXIT_SEC = 60
+
+# 搜索流水线（搜索翻页 -> 详情 -> 评论）各阶段之间的队列长度，队列满时翻页会等待
+SEARCH_PIPELINE_QUEUE_SIZE = 100
+
+# 创作者主页列表：已知总页数时（bilibili）同时请求的页数；游标翻页的平台为同时处理详情的页数
+CREATOR_PAGE_CONCURRENCY = 3
+
+# 自适应限速：每个 (平台, 接口类型, 账号/代理) 一个令牌桶，所有平台客户端请求前都要先拿到令牌，
+# 被限流（403/418/429/461/471、blocked、IP 异常等）时乘性降速，持续成功时加性提速。
+# 开启后客户端翻页之间的固定随机等待不再生效
+ENABLE_RATE_LIMITER = True
+
+# 令牌桶初始速率（请求/秒），RATE_LIMIT_PLATFORM_RPS 中指定的平台以平台为准
+RATE_LIMIT_INITIAL_RPS = 1.0
+RATE_LIMIT_PLATFORM_RPS = {
+    "xhs": 0.5,
+    "dy": 0.5,
+}
+
+# 速率的上下限（请求/秒）
+RATE_LIMIT_MIN_RPS = 0.05
+RATE_LIMIT_MAX_RPS = 5.0
+
+# 令牌桶容量，允许的瞬时突发请求数
+RATE_LIMIT_BURST = 2
+
+# 连续成功多少次后提速一次，以及每次提速的步长（请求/秒）
+RATE_LIMIT_SUCCESS_THRESHOLD = 10
+RATE_LIMIT_INCREASE_STEP = 0.1
+
+# 被限流时速率乘以该系数，并暂停该令牌桶的所有请求一段时间（秒）
+RATE_LIMIT_DECREASE_FACTOR = 0.5
+RATE_LIMIT_COOLDOWN_SEC = 10
+
+# 平台熔断：同一平台连续被限流多少次后暂停该平台的所有请求（其他平台不受影响），
+# 冷却结束后先刷新登录态（重新打开首页、更新 cookie）再继续
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 3
+
+# 平台熔断的冷却时间，单位秒
+CIRCUIT_BREAKER_COOLDOWN_SEC = 30
+
+# 平台熔断（错误率）：滑动窗口内请求数不少于 CIRCUIT_BREAKER_MIN_REQUESTS 并且失败比例达到
+# CIRCUIT_BREAKER_ERROR_RATE 时，冷却时间内该平台的请求直接失败，不再发出和重试
+CIRCUIT_BREAKER_ERROR_RATE = 0.5
+CIRCUIT_BREAKER_MIN_REQUESTS = 20
+
+# 统计错误率的滑动窗口，单位秒
+CIRCUIT_BREAKER_WINDOW_SEC = 60
+
+# 平台客户端请求失败后的重试策略：最多尝试次数（包括第一次），指数退避的初始等待和最大等待（秒），
+# 每次等待在 [0, min(最大等待, 初始等待 * 2^(失败次数 - 1))] 之间随机
+RETRY_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY_SEC = 1.0
+RETRY_MAX_DELAY_SEC = 30.0
+
+# 各平台单独的重试策略，没有配置的字段使用上面的默认值，例如 {"xhs": {"max_attempts": 2, "base_delay_sec": 2}}
+RETRY_PLATFORM_POLICIES = {}
+
+# 全局重试预算：滑动窗口内重试请求最多占全部请求的比例，超过后失败的请求不再重试直接报错
+RETRY_BUDGET_RATIO = 0.2
+
+# 每个窗口内不受比例限制的最少重试次数，请求量很小时也能正常重试
+RETRY_BUDGET_MIN_RETRIES = 10
+
+# 统计重试预算的滑动窗口，单位秒
+RETRY_BUDGET_WINDOW_SEC = 60
+
+# 浏览器上下文池：任务结束后不关闭浏览器，已经打开首页、保留登录态的上下文归还到池中，
+# 同一平台（相同用户数据目录、无头模式）的下一个任务直接复用，不再重新启动浏览器和登录
+ENABLE_BROWSER_POOL = True
+
+# 不保存登录态（SAVE_LOGIN_STATE = False）时，同一平台最多同时打开的浏览器上下文数
+BROWSER_POOL_MAX_CONTEXTS_PER_KEY = 2
+
+# 浏览器上下文被租用多少次、存活多久（秒）、页面 JS 堆内存超过多少 MB 后关闭重建，避免内存持续增长
+BROWSER_POOL_MAX_USES = 50
+BROWSER_POOL_MAX_AGE_SEC = 6 * 3600
+BROWSER_POOL_MAX_HEAP_MB = 512
+
+# 空闲超过多久（秒）的浏览器上下文被关闭
+BROWSER_POOL_IDLE_TIMEOUT_SEC = 1800
+
+# 复用前健康检查（在页面中执行脚本）的超时时间，单位秒
+BROWSER_POOL_HEALTH_CHECK_TIMEOUT_SEC = 5
+
+# 浏览器省资源模式：爬虫的页面只用来执行签名 JS、读取 localStorage 和 cookie，
+# 开启后拦截图片、视频、字体和统计/埋点请求，降低每个浏览器上下文的 CPU 和内存占用（扫码登录时不拦截图片）
+ENABLE_BROWSER_RESOURCE_BLOCKING = False
+
+# 拦截的资源类型（playwright 的 request.resource_type）
+BROWSER_BLOCK_RESOURCE_TYPES = ["image", "media", "font"]
+
+# 地址中包含这些关键字的请求会被拦截（统计、埋点、监控）
+BROWSER_BLOCK_URL_KEYWORDS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "hm.baidu.com",
+    "cnzz.com",
+    "umeng.com",
+    "apm-fe.xiaohongshu.com",
+    "mcs.zijieapi.com",
+    "data.bilibili.com",
+    "datahub.zhihu.com",
+]
+
+# 精简加载：打开首页时只等待 DOMContentLoaded，再等待签名函数就绪，不等待整个页面加载完成
+ENABLE_BROWSER_MINIMAL_PAGE = False
+
+# 精简加载时各平台判断签名函数就绪的脚本，返回 true 表示可以签名，没有配置的平台不等待
+BROWSER_SIGNER_READY_SCRIPTS = {
+    "xhs": "() => typeof window._webmsxyw === 'function' && !!window.localStorage.getItem('b1')",
+    "bili": "() => !!window.localStorage.getItem('wbi_img_urls')",
+    "dy": "() => !!window.localStorage.getItem('xmst')",
+}
+
+# 等待签名函数就绪的超时时间，单位秒
+BROWSER_SIGNER_READY_TIMEOUT_SEC = 10
+
+# 免浏览器模式（目前支持 bili、zhihu）：使用保存的登录态（cookie、localStorage）直接请求接口并在进程内签名，
+# 不启动浏览器，同一台机器可以运行更多 worker；没有保存的登录态或者登录态失效时才启动浏览器登录。
+# SAVE_LOGIN_STATE 开启时，浏览器登录成功后会把登录态导出到 browser_data/SESSION_STATE_FILE；
+# 没有登录态文件时使用 cookie 登录方式配置的 COOKIES
+ENABLE_BROWSER_FREE_MODE = False
+
+# 导出的登录态文件名，%s 会被替换为平台名称，格式与 playwright 的 storage_state 一致
+SESSION_STATE_FILE = "%s_session_state.json"
+
+# 同一平台的额外账号 cookie，和浏览器登录的账号一起轮流使用，限速按账号划分，吞吐量随账号数量增加
+# 例如 {"bili": ["SESSDATA=xxx; bili_jct=xxx", "SESSDATA=yyy; bili_jct=yyy"]}，目前支持 xhs、ks、wb、bili、zhihu
+PLATFORM_ACCOUNT_COOKIES = {}
+
+# 多账号时选择账号的策略：least_loaded 选进行中请求最少的账号，round_robin 依次轮流
+ACCOUNT_LEASE_STRATEGY = "least_loaded"
+
+# 账号连续被限流 / 风控多少次后暂停使用
+ACCOUNT_MAX_CONSECUTIVE_FAILURES = 3
+
+# 账号暂停的时长，单位秒，暂停结束后验证登录态，登录态失效的账号不再使用
+ACCOUNT_SUSPEND_SEC = 300
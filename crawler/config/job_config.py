@@ -0,0 +1,81 @@
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional
+
+from . import base_config, db_config
+
+
+@dataclass(frozen=True)
+class CrawlerJobConfig:
+    """
+    单个爬虫任务的配置，创建后不可修改
+    只保存相对 base_config / db_config 默认值有变化的配置项（命令行参数、API 请求参数等），
+    没有覆盖的配置项读取默认值
+    """
+
+    overrides: Mapping[str, Any] = field(default_factory=dict)
+
+    def __post_init__(self):
+        unknown_names = [name for name in self.overrides if not self._has_default(name)]
+        if unknown_names:
+            raise ValueError(f"Unknown config names: {unknown_names}")
+        object.__setattr__(self, "overrides", MappingProxyType(dict(self.overrides)))
+
+    @staticmethod
+    def _has_default(name: str) -> bool:
+        return hasattr(base_config, name) or hasattr(db_config, name)
+
+    def get(self, name: str) -> Any:
+        """
+        读取配置项，优先使用任务覆盖的值
+        :param name: 配置项名称，例如 PLATFORM
+        :return:
+        """
+        if name in self.overrides:
+            return self.overrides[name]
+        if hasattr(base_config, name):
+            return getattr(base_config, name)
+        return getattr(db_config, name)
+
+    def with_overrides(self, **overrides) -> "CrawlerJobConfig":
+        """
+        基于当前配置生成一个新的任务配置
+        :param overrides: 需要覆盖的配置项
+        :return:
+        """
+        return CrawlerJobConfig({**self.overrides, **overrides})
+
+    @property
+    def platform(self) -> str:
+        return self.get("PLATFORM")
+
+    @property
+    def login_type(self) -> str:
+        return self.get("LOGIN_TYPE")
+
+    @property
+    def crawler_type(self) -> str:
+        return self.get("CRAWLER_TYPE")
+
+
+# 当前任务的配置，每个任务运行在自己的 asyncio 上下文中，互不影响
+job_config_var: ContextVar[Optional[CrawlerJobConfig]] = ContextVar(
+    "job_config", default=None
+)
+
+
+def get_job_config() -> Optional[CrawlerJobConfig]:
+    return job_config_var.get()
+
+
+def build_job_config(*override_dicts: Optional[Dict[str, Any]]) -> CrawlerJobConfig:
+    """
+    按顺序合并多层覆盖配置（默认值 < 命令行参数 < API 请求参数），后面的优先
+    :param override_dicts:
+    :return:
+    """
+    merged: Dict[str, Any] = {}
+    for overrides in override_dicts:
+        merged.update(overrides or {})
+    return CrawlerJobConfig(merged)
@@ -2,6 +2,7 @@ import asyncio
 import itertools
 import os
 import sys
+from typing import Any, Dict, Optional
 
 # 设置项目根目录和crawler目录
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -29,6 +30,8 @@ from media_platform.tieba import TieBaCrawler
 from media_platform.weibo import WeiboCrawler
 from media_platform.xhs import XiaoHongShuCrawler
 from media_platform.zhihu import ZhihuCrawler
+from orchestrator import CrawlOrchestrator, CrawlTarget, run_multi_platform
+from tools.browser_pool import close_browser_pool
 
 
 class CrawlerFactory:
@@ -43,12 +46,22 @@ class CrawlerFactory:
     }
 
     @staticmethod
-    def create_crawler(platform: str) -> AbstractCrawler:
+    def create_crawler(
+        platform: str, job_config: Optional[config.CrawlerJobConfig] = None
+    ) -> AbstractCrawler:
+        """
+        创建爬虫实例
+        :param platform: 平台名称
+        :param job_config: 任务配置，爬虫、客户端以及存储层读取 config.XXX 时都会使用该配置
+        :return:
+        """
         crawler_class = CrawlerFactory.CRAWLERS.get(platform)
         if not crawler_class:
             raise ValueError(
                 "Invalid Media Platform Currently only supported xhs or dy or ks or bili ..."
             )
+        if job_config is not None:
+            config.job_config_var.set(job_config)
         return crawler_class()
 
 
@@ -59,16 +72,21 @@ async def run_single_test(login_type: str, platform: str, crawler_type: str):
     )
 
     try:
-        # 设置配置
-        config.LOGIN_TYPE = login_type
-        config.PLATFORM = platform
-        config.CRAWLER_TYPE = crawler_type
+        # 设置当前任务的配置
+        job_config = config.build_job_config(
+            {
+                "LOGIN_TYPE": login_type,
+                "PLATFORM": platform,
+                "CRAWLER_TYPE": crawler_type,
+            }
+        )
+        config.job_config_var.set(job_config)
 
         # init db
         if config.SAVE_DATA_OPTION == "db":
             await db.init_db()
 
-        crawler = CrawlerFactory.create_crawler(platform=config.PLATFORM)
+        crawler = CrawlerFactory.create_crawler(platform, job_config)
         await crawler.start()
 
         if config.SAVE_DATA_OPTION == "db":
@@ -100,40 +118,86 @@ async def test_all_combinations():
 
     print(f"总共需要测试 {len(combinations)} 个组合")
 
-    # 逐一测试
-    for i, (login_type, platform, crawler_type) in enumerate(combinations, 1):
-        print(f"\n[{i}/{len(combinations)}] 开始测试...")
-        await run_single_test(login_type, platform, crawler_type)
-        # 可选：添加延迟避免请求过于频繁
-        # await asyncio.sleep(2)
+    # 不同平台并发测试，同一平台的组合共用登录态，按顺序测试
+    targets = [
+        CrawlTarget(platform=platform, crawler_type=crawler_type, login_type=login_type)
+        for login_type, platform, crawler_type in combinations
+    ]
+    progress = await CrawlOrchestrator(targets).run()
+    for name, target_progress in progress.items():
+        mark = "✓" if target_progress["status"] == "completed" else "✗"
+        print(f"{mark} {name}: {target_progress}")
 
     print(f"\n=== 所有测试完成 ===")
 
 
 async def main(
-    logintype: str = "cookie", platform: str = "zhihu", crawlertype: str = "question"
+    logintype: str = "cookie",
+    platform: str = "zhihu",
+    crawlertype: str = "question",
+    overrides: Optional[Dict[str, Any]] = None,
 ):
+    """
+    :param logintype: 登录方式
+    :param platform: 平台
+    :param crawlertype: 爬取类型
+    :param overrides: 本次任务额外覆盖的配置项，例如 API 请求中指定的 ZHIHU_QUESTION_URL
+    :return:
+    """
     # parse cmd
-    await cmd_arg.parse_cmd()
-    # 如果你只想运行原来的单个测试，可以注释掉上面一行，取消注释下面几行
-    config.LOGIN_TYPE = logintype
-    config.PLATFORM = platform
-    config.CRAWLER_TYPE = crawlertype
+    cmd_overrides = await cmd_arg.parse_cmd()
+    # 默认值 < 命令行参数 < 调用方参数，只对当前任务生效，不修改全局配置
+    job_config = config.build_job_config(
+        cmd_overrides,
+        {"LOGIN_TYPE": logintype, "PLATFORM": platform, "CRAWLER_TYPE": crawlertype},
+        overrides,
+    )
+    config.job_config_var.set(job_config)
+
+    # 配置了多个平台时交给 CrawlOrchestrator 并发爬取，数据库连接由 CrawlOrchestrator 管理
+    if len(config.CRAWLER_PLATFORMS) > 1:
+        # 平台、登录方式和爬取类型由每个平台的 CrawlTarget 指定
+        target_names = {"PLATFORM", "LOGIN_TYPE", "CRAWLER_TYPE", "CRAWLER_PLATFORMS"}
+        shared_overrides = {
+            name: value
+            for name, value in job_config.overrides.items()
+            if name not in target_names
+        }
+        progress = await run_multi_platform(
+            config.CRAWLER_PLATFORMS,
+            config.CRAWLER_TYPE,
+            login_type=config.LOGIN_TYPE,
+            overrides=shared_overrides,
+        )
+        for name, target_progress in progress.items():
+            print(f"{name}: {target_progress}")
+        return
 
     # init db
     if config.SAVE_DATA_OPTION == "db":
         await db.init_db()
 
-    crawler = CrawlerFactory.create_crawler(platform=config.PLATFORM)
+    crawler = CrawlerFactory.create_crawler(platform, job_config)
     await crawler.start()
 
     if config.SAVE_DATA_OPTION == "db":
         await db.close()
 
 
+async def run_cli():
+    """
+    命令行入口：进程只运行一个任务，结束后关闭浏览器上下文池
+    :return:
+    """
+    try:
+        await main()
+    finally:
+        await close_browser_pool()
+
+
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        asyncio.run(run_cli())
         # asyncio.get_event_loop().run_until_complete(main())
     except KeyboardInterrupt:
         sys.exit()
@@ -0,0 +1,4 @@
+from .coordinator import Coordinator
+from .fake_redis import FakeRedis, connect_fake_redis, start_fake_redis_server
+from .work_queue import RedisWorkQueue, WorkUnit
+from .worker import CrawlWorker
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import config
+from media_platform.bilibili import BilibiliCrawler
+from media_platform.bilibili.field import SearchOrderType
+from store import bilibili as bilibili_store
+from var import source_keyword_var
+
+from .work_queue import (
+    UNIT_KIND_COMMENTS,
+    UNIT_KIND_DETAIL,
+    UNIT_KIND_SEARCH_PAGE,
+    WorkUnit,
+)
+from .worker import UnitHandler
+
+BILI_SEARCH_PAGE_SIZE = 20
+
+
+def create_bilibili_handlers(crawler: BilibiliCrawler) -> Dict[str, UnitHandler]:
+    """
+    B站的任务处理函数，crawler 需要已经通过 open_session 完成登录
+    :param crawler:
+    :return:
+    """
+    semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+
+    async def handle_search_page(unit: WorkUnit) -> List[WorkUnit]:
+        keyword = unit.payload["keyword"]
+        source_keyword_var.set(keyword)
+        videos_res = await crawler.bili_client.search_video_by_keyword(
+            keyword=keyword,
+            page=unit.payload["page"],
+            page_size=BILI_SEARCH_PAGE_SIZE,
+            order=SearchOrderType.DEFAULT,
+            pubtime_begin_s=0,
+            pubtime_end_s=0,
+        )
+        return [
+            WorkUnit(
+                platform="bili",
+                kind=UNIT_KIND_DETAIL,
+                payload={"aid": video_item.get("aid"), "keyword": keyword},
+            )
+            for video_item in videos_res.get("result") or []
+        ]
+
+    async def handle_detail(unit: WorkUnit) -> Optional[List[WorkUnit]]:
+        source_keyword_var.set(unit.payload.get("keyword", ""))
+        video_detail = await crawler.get_video_info_task(
+            aid=unit.payload.get("aid", 0),
+            bvid=unit.payload.get("bvid", ""),
+            semaphore=semaphore,
+        )
+        if video_detail is None:
+            raise ValueError(f"get video detail failed: {unit.payload}")
+        await bilibili_store.update_bilibili_video(video_detail)
+        await bilibili_store.update_up_info(video_detail)
+        await crawler.get_bilibili_video(video_detail, semaphore)
+        if not config.ENABLE_GET_COMMENTS:
+            return None
+        return [
+            WorkUnit(
+                platform="bili",
+                kind=UNIT_KIND_COMMENTS,
+                payload={"aid": video_detail.get("View").get("aid")},
+            )
+        ]
+
+    async def handle_comments(unit: WorkUnit):
+        # 出错时抛出异常，由 worker nack 后重试
+        await crawler.fetch_comments(unit.payload["aid"], semaphore)
+
+    return {
+        UNIT_KIND_SEARCH_PAGE: handle_search_page,
+        UNIT_KIND_DETAIL: handle_detail,
+        UNIT_KIND_COMMENTS: handle_comments,
+    }
@@ -0,0 +1,180 @@
+import argparse
+import asyncio
+import multiprocessing
+from typing import Any, Dict, List, Optional, Tuple
+
+import config
+from config import db_config
+from tools import utils
+
+from .coordinator import Coordinator
+from .fake_redis import connect_fake_redis, start_fake_redis_server
+from .work_queue import RedisWorkQueue
+from .worker import CrawlWorker, UnitHandler
+
+
+def create_redis_client():
+    """
+    连接 db_config 中配置的 redis
+    :return:
+    """
+    from redis import Redis
+
+    return Redis(
+        host=db_config.REDIS_DB_HOST,
+        port=db_config.REDIS_DB_PORT,
+        db=db_config.REDIS_DB_NUM,
+        password=db_config.REDIS_DB_PWD,
+    )
+
+
+def create_unit_handlers(platform: str, crawler) -> Dict[str, UnitHandler]:
+    if platform == "bili":
+        from .bilibili_handlers import create_bilibili_handlers
+
+        return create_bilibili_handlers(crawler)
+    raise ValueError(f"Distributed crawl is not supported for platform: {platform}")
+
+
+async def run_worker(
+    queue: RedisWorkQueue,
+    platform: str,
+    worker_id: str,
+    overrides: Optional[Dict[str, Any]] = None,
+) -> Dict[str, int]:
+    """
+    启动一个已登录的浏览器上下文，然后从队列领取任务直到空闲退出
+    :param queue: 工作队列
+    :param platform: 平台
+    :param worker_id: worker ID
+    :param overrides: 覆盖配置
+    :return:
+    """
+    from crawler_main import CrawlerFactory
+    from tools.browser_pool import close_browser_pool
+
+    job_config = config.build_job_config(
+        {
+            "PLATFORM": platform,
+            "CRAWLER_TYPE": "search",
+            # 同一台机器上的多个 worker 不能共用浏览器用户数据目录
+            "USER_DATA_DIR": f"%s_user_data_dir_{worker_id}",
+        },
+        overrides,
+    )
+    crawler = CrawlerFactory.create_crawler(platform, job_config)
+    await crawler.open_session()
+    try:
+        from var import crawler_type_var
+
+        crawler_type_var.set(config.CRAWLER_TYPE)
+        worker = CrawlWorker(queue, create_unit_handlers(platform, crawler), worker_id)
+        stats = await worker.run()
+        await crawler.media_stage.close()
+        return stats
+    finally:
+        await crawler.close_session()
+        # worker 进程只运行这一个爬虫，退出前关闭浏览器
+        await close_browser_pool()
+
+
+def worker_process_main(
+    redis_address: Optional[Tuple[str, int]],
+    authkey: bytes,
+    queue_name: str,
+    platform: str,
+    worker_id: str,
+    overrides: Optional[Dict[str, Any]] = None,
+):
+    """
+    worker 进程入口，redis_address 为空时连接真实 redis，否则连接本地 FakeRedis
+    """
+    redis_client = (
+        connect_fake_redis(redis_address, authkey)
+        if redis_address
+        else create_redis_client()
+    )
+    queue = RedisWorkQueue(redis_client, name=queue_name)
+    asyncio.run(run_worker(queue, platform, worker_id, overrides))
+
+
+def run_cluster(
+    platform: str,
+    keywords: List[str],
+    pages: int,
+    worker_count: int,
+    overrides: Optional[Dict[str, Any]] = None,
+    use_fake_redis: bool = True,
+) -> Dict[str, int]:
+    """
+    在本机启动协调者和多个 worker 进程
+    :param platform: 平台
+    :param keywords: 关键词列表
+    :param pages: 每个关键词爬取的页数
+    :param worker_count: worker 进程数量
+    :param overrides: 覆盖配置
+    :param use_fake_redis: 使用进程间共享的 FakeRedis，不需要安装 redis
+    :return: 队列统计
+    """
+    manager = None
+    authkey = b"crawler"
+    if use_fake_redis:
+        manager = start_fake_redis_server(authkey=authkey)
+        redis_client = manager.get_redis()
+    else:
+        redis_client = create_redis_client()
+    queue = RedisWorkQueue(redis_client)
+    queue.clear()
+
+    planned = Coordinator(queue).plan_search(platform, keywords, pages)
+    utils.logger.info(f"[cluster.run_cluster] planned {planned} search units")
+
+    # json 存储是读-改-写整个文件，多个进程同时写同一个文件会互相覆盖，默认改为 csv 追加写
+    worker_overrides = {"SAVE_DATA_OPTION": "csv", **(overrides or {})}
+    processes = [
+        multiprocessing.Process(
+            target=worker_process_main,
+            args=(
+                manager.address if manager else None,
+                authkey,
+                queue.name,
+                platform,
+                f"worker{i}",
+                worker_overrides,
+            ),
+            name=f"crawl_worker_{i}",
+        )
+        for i in range(worker_count)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    stats = queue.get_stats()
+    utils.logger.info(f"[cluster.run_cluster] all workers exit, queue stats: {stats}")
+    if manager:
+        manager.shutdown()
+    return stats
+
+
+if __name__ == "__main__":
+    # 在 crawler 目录下运行：python -m distributed.cluster --platform bili --keywords 特斯拉 --workers 2
+    parser = argparse.ArgumentParser(description="Distributed crawler cluster.")
+    parser.add_argument("--platform", type=str, default="bili", choices=["bili"])
+    parser.add_argument("--keywords", type=str, default=config.KEYWORDS)
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--redis",
+        action="store_true",
+        help="use redis in db_config instead of fake redis",
+    )
+    args = parser.parse_args()
+    run_cluster(
+        platform=args.platform,
+        keywords=args.keywords.split(","),
+        pages=args.pages,
+        worker_count=args.workers,
+        use_fake_redis=not args.redis,
+    )
@@ -0,0 +1,87 @@
+import asyncio
+from typing import Dict, List
+
+from tools import utils
+
+from .work_queue import (
+    UNIT_KIND_COMMENTS,
+    UNIT_KIND_DETAIL,
+    UNIT_KIND_SEARCH_PAGE,
+    RedisWorkQueue,
+    WorkUnit,
+)
+
+
+class Coordinator:
+    """分布式爬取协调者：把爬取计划拆分成任务单元放入工作队列，并等待 worker 全部处理完"""
+
+    def __init__(self, queue: RedisWorkQueue):
+        self.queue = queue
+
+    def plan_search(self, platform: str, keywords: List[str], pages: int) -> int:
+        """
+        每个关键词的每一页搜索结果作为一个任务
+        :param platform: 平台
+        :param keywords: 关键词列表
+        :param pages: 每个关键词爬取的页数
+        :return: 入队数量
+        """
+        return self.queue.enqueue_many(
+            [
+                WorkUnit(
+                    platform=platform,
+                    kind=UNIT_KIND_SEARCH_PAGE,
+                    payload={"keyword": keyword, "page": page},
+                )
+                for keyword in keywords
+                for page in range(1, pages + 1)
+            ]
+        )
+
+    def plan_details(self, platform: str, id_key: str, content_ids: List) -> int:
+        """
+        指定内容的详情任务
+        :param platform: 平台
+        :param id_key: 内容ID字段名，例如 B站的 aid / bvid
+        :param content_ids: 内容ID列表
+        :return: 入队数量
+        """
+        return self.queue.enqueue_many(
+            [
+                WorkUnit(
+                    platform=platform, kind=UNIT_KIND_DETAIL, payload={id_key: cid}
+                )
+                for cid in content_ids
+            ]
+        )
+
+    def plan_comments(self, platform: str, id_key: str, content_ids: List) -> int:
+        """
+        指定内容的评论任务
+        :param platform: 平台
+        :param id_key: 内容ID字段名
+        :param content_ids: 内容ID列表
+        :return: 入队数量
+        """
+        return self.queue.enqueue_many(
+            [
+                WorkUnit(
+                    platform=platform, kind=UNIT_KIND_COMMENTS, payload={id_key: cid}
+                )
+                for cid in content_ids
+            ]
+        )
+
+    async def wait_until_drained(self, poll_interval_sec: float = 5) -> Dict[str, int]:
+        """
+        等待队列中的任务全部完成（包括 worker 处理过程中新产生的任务）
+        :param poll_interval_sec: 检查间隔
+        :return: 队列统计
+        """
+        while not self.queue.is_drained():
+            self.queue.requeue_expired()
+            utils.logger.info(
+                f"[Coordinator.wait_until_drained] queue stats: {self.queue.get_stats()}"
+            )
+            await asyncio.sleep(poll_interval_sec)
+        return self.queue.get_stats()
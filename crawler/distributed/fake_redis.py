@@ -0,0 +1,148 @@
+import threading
+from multiprocessing.managers import BaseManager
+from typing import Dict, List, Optional, Set, Tuple
+
+
+class FakeRedis:
+    """
+    进程内的 Redis 替代品，只实现工作队列用到的命令，用于本地测试分布式爬取
+    通过 FakeRedisManager 可以在多个进程之间共享同一个实例
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._strings: Dict[str, str] = {}
+        self._lists: Dict[str, List[str]] = {}
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._sets: Dict[str, Set[str]] = {}
+        self._zsets: Dict[str, Dict[str, float]] = {}
+
+    def lpush(self, name: str, *values: str) -> int:
+        with self._lock:
+            items = self._lists.setdefault(name, [])
+            for value in values:
+                items.insert(0, value)
+            return len(items)
+
+    def rpop(self, name: str) -> Optional[str]:
+        with self._lock:
+            items = self._lists.get(name)
+            return items.pop() if items else None
+
+    def llen(self, name: str) -> int:
+        with self._lock:
+            return len(self._lists.get(name, []))
+
+    def hset(self, name: str, key: str, value: str) -> int:
+        with self._lock:
+            values = self._hashes.setdefault(name, {})
+            is_new = key not in values
+            values[key] = value
+            return int(is_new)
+
+    def hget(self, name: str, key: str) -> Optional[str]:
+        with self._lock:
+            return self._hashes.get(name, {}).get(key)
+
+    def hdel(self, name: str, *keys: str) -> int:
+        with self._lock:
+            values = self._hashes.get(name, {})
+            return sum(1 for key in keys if values.pop(key, None) is not None)
+
+    def sadd(self, name: str, *values: str) -> int:
+        with self._lock:
+            members = self._sets.setdefault(name, set())
+            added = [value for value in values if value not in members]
+            members.update(added)
+            return len(added)
+
+    def zadd(self, name: str, mapping: Dict[str, float]) -> int:
+        with self._lock:
+            members = self._zsets.setdefault(name, {})
+            added = sum(1 for member in mapping if member not in members)
+            members.update(mapping)
+            return added
+
+    def zrem(self, name: str, *values: str) -> int:
+        with self._lock:
+            members = self._zsets.get(name, {})
+            return sum(1 for value in values if members.pop(value, None) is not None)
+
+    def zrangebyscore(self, name: str, min_score: float, max_score: float) -> List[str]:
+        with self._lock:
+            members: List[Tuple[str, float]] = sorted(
+                self._zsets.get(name, {}).items(), key=lambda item: item[1]
+            )
+            return [m for m, score in members if min_score <= score <= max_score]
+
+    def zcard(self, name: str) -> int:
+        with self._lock:
+            return len(self._zsets.get(name, {}))
+
+    def incr(self, name: str, amount: int = 1) -> int:
+        with self._lock:
+            value = int(self._strings.get(name, 0)) + amount
+            self._strings[name] = str(value)
+            return value
+
+    def get(self, name: str) -> Optional[str]:
+        with self._lock:
+            return self._strings.get(name)
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            deleted = 0
+            for name in names:
+                for container in (
+                    self._strings,
+                    self._lists,
+                    self._hashes,
+                    self._sets,
+                    self._zsets,
+                ):
+                    if container.pop(name, None) is not None:
+                        deleted += 1
+            return deleted
+
+
+class FakeRedisManager(BaseManager):
+    pass
+
+
+_shared_fake_redis: Optional[FakeRedis] = None
+
+
+def _get_shared_fake_redis() -> FakeRedis:
+    global _shared_fake_redis
+    if _shared_fake_redis is None:
+        _shared_fake_redis = FakeRedis()
+    return _shared_fake_redis
+
+
+FakeRedisManager.register("get_redis", callable=_get_shared_fake_redis)
+
+
+def start_fake_redis_server(
+    address: Tuple[str, int] = ("127.0.0.1", 0), authkey: bytes = b"crawler"
+) -> FakeRedisManager:
+    """
+    在子进程中启动共享的 FakeRedis，返回的 manager.address 交给 worker 进程连接
+    :param address: 监听地址，端口为 0 时自动分配
+    :param authkey: 连接密钥
+    :return:
+    """
+    manager = FakeRedisManager(address=address, authkey=authkey)
+    manager.start()
+    return manager
+
+
+def connect_fake_redis(address: Tuple[str, int], authkey: bytes = b"crawler"):
+    """
+    连接 start_fake_redis_server 启动的 FakeRedis，返回的代理对象和 redis 客户端用法一致
+    :param address:
+    :param authkey:
+    :return:
+    """
+    manager = FakeRedisManager(address=address, authkey=authkey)
+    manager.connect()
+    return manager.get_redis()
@@ -0,0 +1,217 @@
+import json
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+import config
+from tools import utils
+
+# 任务类型
+UNIT_KIND_SEARCH_PAGE = "search_page"
+UNIT_KIND_DETAIL = "detail"
+UNIT_KIND_COMMENTS = "comments"
+
+
+@dataclass
+class WorkUnit:
+    """分布式爬取的最小任务单元：一页搜索结果、一个内容详情或一个内容的评论"""
+
+    platform: str
+    kind: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    attempts: int = 0
+
+    @property
+    def unit_id(self) -> str:
+        # 相同的任务生成相同的ID，重复入队时会被去重
+        payload_key = ":".join(f"{k}={self.payload[k]}" for k in sorted(self.payload))
+        return f"{self.platform}:{self.kind}:{payload_key}"
+
+    def dumps(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def loads(cls, value) -> "WorkUnit":
+        return cls(**json.loads(_decode(value)))
+
+
+def _decode(value) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.decode()
+    return value
+
+
+class RedisWorkQueue:
+    """
+    基于 Redis 的工作队列，带可见性超时：
+    - {name}:pending   list，等待领取的任务ID
+    - {name}:inflight  zset，已领取的任务ID -> 超时时间戳，超时未确认的任务重新回到 pending
+    - {name}:units     hash，任务ID -> 任务内容
+    - {name}:seen      set，入过队的任务ID，用于去重
+    - {name}:dead      list，超过最大尝试次数的任务
+    只使用基础命令，redis-py 客户端和 distributed.fake_redis.FakeRedis 都可以使用
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        name: str = "",
+        visibility_timeout_sec: int = 0,
+        max_attempts: int = 0,
+    ):
+        self.redis = redis_client
+        self.name = name or config.DISTRIBUTED_QUEUE_NAME
+        self.visibility_timeout_sec = (
+            visibility_timeout_sec or config.DISTRIBUTED_VISIBILITY_TIMEOUT_SEC
+        )
+        self.max_attempts = max_attempts or config.DISTRIBUTED_MAX_ATTEMPTS
+        self._pending_key = f"{self.name}:pending"
+        self._inflight_key = f"{self.name}:inflight"
+        self._units_key = f"{self.name}:units"
+        self._seen_key = f"{self.name}:seen"
+        self._dead_key = f"{self.name}:dead"
+        self._done_key = f"{self.name}:done"
+
+    def enqueue(self, unit: WorkUnit, dedup: bool = True) -> bool:
+        """
+        任务入队
+        :param unit: 任务
+        :param dedup: 是否去重，相同ID的任务只入队一次
+        :return: 是否入队
+        """
+        unit_id = unit.unit_id
+        if dedup and not self.redis.sadd(self._seen_key, unit_id):
+            return False
+        self.redis.hset(self._units_key, unit_id, unit.dumps())
+        self.redis.lpush(self._pending_key, unit_id)
+        return True
+
+    def enqueue_many(self, units: List[WorkUnit]) -> int:
+        return sum(1 for unit in units if self.enqueue(unit))
+
+    def claim(self) -> Optional[WorkUnit]:
+        """
+        领取一个任务，领取后在可见性超时时间内需要调用 ack 或 nack
+        :return: 没有任务时返回 None
+        """
+        self.requeue_expired()
+        while True:
+            unit_id = _decode(self.redis.rpop(self._pending_key))
+            if unit_id is None:
+                return None
+            self.redis.zadd(
+                self._inflight_key, {unit_id: time.time() + self.visibility_timeout_sec}
+            )
+            value = self.redis.hget(self._units_key, unit_id)
+            if value is None:
+                # 任务已经被其他 worker 完成（超时重投后原 worker 又确认了）
+                self.redis.zrem(self._inflight_key, unit_id)
+                continue
+            return WorkUnit.loads(value)
+
+    def extend(self, unit: WorkUnit):
+        """
+        延长任务的可见性超时，长任务执行期间定期调用
+        :param unit:
+        :return:
+        """
+        self.redis.zadd(
+            self._inflight_key,
+            {unit.unit_id: time.time() + self.visibility_timeout_sec},
+        )
+
+    def ack(self, unit: WorkUnit):
+        """
+        确认任务完成
+        :param unit:
+        :return:
+        """
+        unit_id = unit.unit_id
+        self.redis.zrem(self._inflight_key, unit_id)
+        self.redis.hdel(self._units_key, unit_id)
+        self.redis.incr(self._done_key)
+
+    def nack(self, unit: WorkUnit, error: str = ""):
+        """
+        任务失败，未超过最大尝试次数时重新入队，否则放入失败队列
+        :param unit:
+        :param error: 错误信息
+        :return:
+        """
+        unit_id = unit.unit_id
+        # 已经超时被重新入队（或者已经被确认）的任务不再重复入队
+        if not self.redis.zrem(self._inflight_key, unit_id):
+            utils.logger.warning(
+                f"[RedisWorkQueue.nack] unit {unit_id} is no longer inflight, skip, err: {error}"
+            )
+            return
+        self._retry(unit, error)
+
+    def _retry(self, unit: WorkUnit, error: str):
+        """
+        记录一次失败的尝试，未超过最大尝试次数时重新入队，否则放入失败队列
+        :param unit: 已经从 inflight 中移除的任务
+        :param error: 错误信息
+        :return:
+        """
+        unit_id = unit.unit_id
+        unit.attempts += 1
+        if unit.attempts >= self.max_attempts:
+            self.redis.hdel(self._units_key, unit_id)
+            self.redis.lpush(
+                self._dead_key, json.dumps({"unit": unit.dumps(), "error": error})
+            )
+            utils.logger.error(
+                f"[RedisWorkQueue._retry] unit {unit_id} failed {unit.attempts} times, moved to dead queue, err: {error}"
+            )
+            return
+        self.redis.hset(self._units_key, unit_id, unit.dumps())
+        self.redis.lpush(self._pending_key, unit_id)
+
+    def requeue_expired(self) -> int:
+        """
+        把超过可见性超时仍未确认的任务重新放回队列（领取它的 worker 可能已经崩溃），
+        超时计为一次失败的尝试，超过最大尝试次数的任务放入失败队列
+        :return: 重新入队的数量
+        """
+        requeued = 0
+        for unit_id in self.redis.zrangebyscore(self._inflight_key, 0, time.time()):
+            unit_id = _decode(unit_id)
+            # 多个 worker 同时检查时，只有成功移除的那个负责重新入队
+            if not self.redis.zrem(self._inflight_key, unit_id):
+                continue
+            value = self.redis.hget(self._units_key, unit_id)
+            if value is None:
+                # 超时后原 worker 又确认了
+                continue
+            unit = WorkUnit.loads(value)
+            self._retry(unit, "visibility timeout expired")
+            if unit.attempts < self.max_attempts:
+                requeued += 1
+        if requeued:
+            utils.logger.info(
+                f"[RedisWorkQueue.requeue_expired] requeue {requeued} expired units"
+            )
+        return requeued
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "pending": self.redis.llen(self._pending_key),
+            "inflight": self.redis.zcard(self._inflight_key),
+            "done": int(_decode(self.redis.get(self._done_key)) or 0),
+            "dead": self.redis.llen(self._dead_key),
+        }
+
+    def is_drained(self) -> bool:
+        stats = self.get_stats()
+        return stats["pending"] == 0 and stats["inflight"] == 0
+
+    def clear(self):
+        self.redis.delete(
+            self._pending_key,
+            self._inflight_key,
+            self._units_key,
+            self._seen_key,
+            self._dead_key,
+            self._done_key,
+        )
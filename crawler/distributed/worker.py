@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import config
+from tools import utils
+
+from .work_queue import RedisWorkQueue, WorkUnit
+
+# 处理一个任务，返回需要继续入队的后续任务（例如搜索页产生的详情任务）
+UnitHandler = Callable[[WorkUnit], Awaitable[Optional[List[WorkUnit]]]]
+
+
+class CrawlWorker:
+    """
+    分布式爬取 worker：循环从工作队列领取任务，按任务类型交给对应的 handler 处理
+    处理期间定期延长可见性超时，处理成功后确认，失败时重新入队
+    """
+
+    def __init__(
+        self,
+        queue: RedisWorkQueue,
+        handlers: Dict[str, UnitHandler],
+        worker_id: str,
+        idle_exit_sec: int = 0,
+        poll_interval_sec: float = 1.0,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.worker_id = worker_id
+        self.idle_exit_sec = idle_exit_sec or config.DISTRIBUTED_WORKER_IDLE_EXIT_SEC
+        self.poll_interval_sec = poll_interval_sec
+        self.processed_count = 0
+        self.failed_count = 0
+
+    async def run(self) -> Dict[str, int]:
+        """
+        运行直到连续 idle_exit_sec 秒领取不到任务
+        :return: 处理统计
+        """
+        utils.logger.info(f"[CrawlWorker.run] worker {self.worker_id} started")
+        idle_since: Optional[float] = None
+        while True:
+            unit = self.queue.claim()
+            if unit is None:
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since >= self.idle_exit_sec:
+                    break
+                await asyncio.sleep(self.poll_interval_sec)
+                continue
+            idle_since = None
+            await self._process(unit)
+
+        stats = {"processed": self.processed_count, "failed": self.failed_count}
+        utils.logger.info(
+            f"[CrawlWorker.run] worker {self.worker_id} exit, stats: {stats}"
+        )
+        return stats
+
+    async def _heartbeat(self, unit: WorkUnit):
+        # 在可见性超时的一半时间续期，避免长任务被其他 worker 重复领取
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout_sec / 2)
+            self.queue.extend(unit)
+
+    async def _process(self, unit: WorkUnit):
+        handler = self.handlers.get(unit.kind)
+        if handler is None:
+            self.failed_count += 1
+            self.queue.nack(
+                unit, f"worker {self.worker_id} has no handler for {unit.kind}"
+            )
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(unit))
+        try:
+            next_units = await handler(unit)
+            if next_units:
+                self.queue.enqueue_many(next_units)
+            self.queue.ack(unit)
+            self.processed_count += 1
+        except Exception as e:
+            self.failed_count += 1
+            utils.logger.error(
+                f"[CrawlWorker._process] worker {self.worker_id} handle {unit.unit_id} error: {e}"
+            )
+            self.queue.nack(unit, str(e))
+        finally:
+            heartbeat.cancel()
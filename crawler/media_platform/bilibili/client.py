@@ -1,12 +1,21 @@
 import asyncio
 import json
+import time
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from urllib.parse import urlencode
 
+import config
 import httpx
 from base.base_crawler import AbstractApiClient
 from playwright.async_api import BrowserContext, Page
+from proxy.proxy_ip_pool import ProxyIpPool
+from proxy.proxy_transport import ProxyTransport
 from tools import utils
+from tools.account_pool import AccountPool
+from tools.async_pipeline import BoundedTaskGroup
+from tools.media_download import MediaDownloadResult, download_media_to_file
+from tools.rate_limiter import THROTTLE_STATUS_CODES, crawl_sleep
+from tools.retry_policy import retry_request
 
 from .exception import DataFetchError
 from .field import CommentOrderType, SearchOrderType
@@ -14,21 +23,40 @@ from .help import BilibiliSign
 
 
 class BilibiliClient(AbstractApiClient):
+    # -412 请求被拦截，-352 风控校验失败，-509 请求过于频繁
+    THROTTLE_CODES = (-412, -352, -509)
+    # 免浏览器模式下 WBI key 的缓存时间，B站每天更换一次 key
+    WBI_KEYS_TTL_SEC = 3600
+
     def __init__(
         self,
         timeout=10,
         proxies=None,
+        ip_pool: Optional[ProxyIpPool] = None,
         *,
         headers: Dict[str, str],
-        playwright_page: Page,
+        playwright_page: Optional[Page],
         cookie_dict: Dict[str, str],
     ):
-        self.proxies = None
+        self.proxies = proxies
+        # 浏览器登录的账号和 PLATFORM_ACCOUNT_COOKIES 中配置的账号轮流使用
+        self.account_pool = AccountPool("bili", headers.get("Cookie", ""), cookie_dict)
+        self.account_pool.set_pong_callback(self.pong)
+        # 每次请求从代理池租用代理，没有代理池时使用固定代理
+        self.transport = ProxyTransport(
+            "bili",
+            ip_pool=ip_pool,
+            default_proxies=proxies,
+            account_pool=self.account_pool,
+        )
         self.timeout = timeout
         self.headers = headers
         self._host = "https://api.bilibili.com"
+        # 用来读取签名参数的页面，免浏览器模式下为 None
         self.playwright_page = playwright_page
         self.cookie_dict = cookie_dict
+        self._wbi_keys: Optional[Tuple[str, str]] = None
+        self._wbi_keys_ts = 0.0
 
     # async def request(self, method, url, **kwargs) -> Any:
     #     async with httpx.AsyncClient(proxies=self.proxies) as client:
@@ -42,29 +70,32 @@ class BilibiliClient(AbstractApiClient):
     #     else:
     #         return data.get("data", {})
 
+    @retry_request("bili")
     async def request(self, method, url, **kwargs) -> Any:
         # 创建请求参数字典
         request_kwargs = {
-            "method": method,
-            "url": url,
             "timeout": self.timeout,
             "headers": self.headers,
         }
         request_kwargs.update(kwargs)  # 合并额外参数
 
+        lease = await self.transport.lease(url)
         try:
-            # 使用无参初始化AsyncClient
-            async with httpx.AsyncClient() as client:
-                response = await client.request(**request_kwargs)
-                response.raise_for_status()  # 检查HTTP状态码
+            response = await lease.request(method, url, **request_kwargs)
+            response.raise_for_status()  # 检查HTTP状态码
 
-                data: Dict = response.json()
-                if data.get("code") != 0:
-                    raise DataFetchError(data.get("message", "unkonw error"))
-                return data.get("data", {})
+            data: Dict = response.json()
+            if data.get("code") in self.THROTTLE_CODES:
+                lease.report_throttled(f"code {data.get('code')}")
+            if data.get("code") != 0:
+                raise DataFetchError(data.get("message", "unkonw error"))
+            lease.report_success()
+            return data.get("data", {})
 
         except httpx.HTTPStatusError as e:
             utils.logger.error(f"HTTP error {e.response.status_code}: {e}")
+            if e.response.status_code in THROTTLE_STATUS_CODES:
+                lease.report_throttled(f"status {e.response.status_code}")
             raise DataFetchError(f"HTTP error: {e.response.status_code}")
         except json.JSONDecodeError:
             utils.logger.error(f"JSON decode error, response text: {response.text}")
@@ -86,40 +117,71 @@ class BilibiliClient(AbstractApiClient):
     async def get_wbi_keys(self) -> Tuple[str, str]:
         """
         获取最新的 img_key 和 sub_key
+        免浏览器模式下没有 playwright_page，从 nav 接口获取并缓存 WBI_KEYS_TTL_SEC 秒
         :return:
         """
+        if self.playwright_page is None:
+            if (
+                self._wbi_keys is None
+                or time.monotonic() - self._wbi_keys_ts > self.WBI_KEYS_TTL_SEC
+            ):
+                self._wbi_keys = await self.get_wbi_keys_from_nav()
+                self._wbi_keys_ts = time.monotonic()
+            return self._wbi_keys
+
         local_storage = await self.playwright_page.evaluate("() => window.localStorage")
         wbi_img_urls = local_storage.get("wbi_img_urls", "") or local_storage.get(
             "wbi_img_url"
         ) + "-" + local_storage.get("wbi_sub_url")
         if wbi_img_urls and "-" in wbi_img_urls:
             img_url, sub_url = wbi_img_urls.split("-")
-        else:
-            resp = await self.request(
-                method="GET", url=self._host + "/x/web-interface/nav"
-            )
-            img_url: str = resp["wbi_img"]["img_url"]
-            sub_url: str = resp["wbi_img"]["sub_url"]
-        img_key = img_url.rsplit("/", 1)[1].split(".")[0]
-        sub_key = sub_url.rsplit("/", 1)[1].split(".")[0]
-        return img_key, sub_key
+            return self.extract_wbi_key(img_url), self.extract_wbi_key(sub_url)
+        return await self.get_wbi_keys_from_nav()
+
+    async def get_wbi_keys_from_nav(self) -> Tuple[str, str]:
+        """
+        从 nav 接口获取 img_key 和 sub_key，该接口本身不需要签名
+        :return:
+        """
+        resp = await self.request(method="GET", url=self._host + "/x/web-interface/nav")
+        img_url: str = resp["wbi_img"]["img_url"]
+        sub_url: str = resp["wbi_img"]["sub_url"]
+        return self.extract_wbi_key(img_url), self.extract_wbi_key(sub_url)
+
+    @staticmethod
+    def extract_wbi_key(wbi_url: str) -> str:
+        return wbi_url.rsplit("/", 1)[1].split(".")[0]
 
     async def get(self, uri: str, params=None, enable_params_sign: bool = True) -> Dict:
-        final_uri = uri
-        if enable_params_sign:
-            params = await self.pre_request_data(params)
-        if isinstance(params, dict):
-            final_uri = f"{uri}?" f"{urlencode(params)}"
-        return await self.request(
-            method="GET", url=f"{self._host}{final_uri}", headers=self.headers
-        )
+        # 每个请求租用一个账号，签名和发送使用同一个账号
+        async with self.account_pool.lease():
+            final_uri = uri
+            if enable_params_sign:
+                params = await self.pre_request_data(params)
+            if isinstance(params, dict):
+                final_uri = f"{uri}?" f"{urlencode(params)}"
+            return await self.request(
+                method="GET", url=f"{self._host}{final_uri}", headers=self.headers
+            )
 
     async def post(self, uri: str, data: dict) -> Dict:
-        data = await self.pre_request_data(data)
-        json_str = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
-        return await self.request(
-            method="POST", url=f"{self._host}{uri}", data=json_str, headers=self.headers
-        )
+        # 每个请求租用一个账号，签名和发送使用同一个账号
+        async with self.account_pool.lease():
+            data = await self.pre_request_data(data)
+            json_str = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+            return await self.request(
+                method="POST",
+                url=f"{self._host}{uri}",
+                data=json_str,
+                headers=self.headers,
+            )
+
+    async def close(self):
+        """
+        关闭各代理的 httpx 连接池，爬虫结束时调用
+        :return:
+        """
+        await self.transport.aclose()
 
     async def pong(self) -> bool:
         """get a note to check if login state is ok"""
@@ -144,6 +206,7 @@ class BilibiliClient(AbstractApiClient):
         cookie_str, cookie_dict = utils.convert_cookies(await browser_context.cookies())
         self.headers["Cookie"] = cookie_str
         self.cookie_dict = cookie_dict
+        self.account_pool.update_primary(cookie_str, cookie_dict)
 
     async def search_video_by_keyword(
         self,
@@ -262,6 +325,19 @@ class BilibiliClient(AbstractApiClient):
                 return None
             return response.content
 
+    async def download_video_media(
+        self, video_url: str, save_file_name: str
+    ) -> Optional[MediaDownloadResult]:
+        """
+        流式下载视频到本地文件，不在内存中缓存整个视频
+        :param video_url: 视频地址
+        :param save_file_name: 保存的文件路径
+        :return:
+        """
+        return await download_media_to_file(
+            video_url, save_file_name, headers=self.headers, timeout=60
+        )
+
     async def get_video_comments(
         self,
         video_id: str,
@@ -291,6 +367,8 @@ class BilibiliClient(AbstractApiClient):
         is_fetch_sub_comments=False,
         callback: Optional[Callable] = None,
         max_count: int = 10,
+        start_cursor: int = 0,
+        cursor_callback: Optional[Callable[[int], Any]] = None,
     ):
         """
         get video all comments include sub comments
@@ -299,13 +377,36 @@ class BilibiliClient(AbstractApiClient):
         :param is_fetch_sub_comments:
         :param callback:
         max_count: 一次笔记爬取的最大评论数量
+        :param start_cursor: 从哪个 next 游标开始爬取，用于断点续爬
+        :param cursor_callback: 每一页处理完之后回调下一页的游标，用于保存断点
 
-        :return:
+        :return: 有二级评论展开失败时抛出 DataFetchError，断点停在失败的那一页
         """
 
         result = []
         is_end = False
-        next_page = 0
+        next_page = start_cursor
+        sub_comment_group = BoundedTaskGroup(
+            config.SUB_COMMENT_CONCURRENCY, name=f"bili_sub_comments_{video_id}"
+        )
+        # (该页展开二级评论的任务, 下一页游标)，页内的二级评论都展开完才保存游标，
+        # 避免断点续爬时漏掉还在展开中的二级评论
+        pending_cursors: List[Tuple[List[asyncio.Task], int]] = []
+
+        def flush_cursors():
+            while pending_cursors and all(
+                task.done() for task in pending_cursors[0][0]
+            ):
+                # 有二级评论展开失败的页不保存游标，断点续爬时从这一页重新开始
+                if any(
+                    task.cancelled() or task.exception() is not None
+                    for task in pending_cursors[0][0]
+                ):
+                    return
+                _, cursor = pending_cursors.pop(0)
+                if cursor_callback:
+                    cursor_callback(cursor)
+
         while not is_end and len(result) < max_count:
             comments_res = await self.get_video_comments(
                 video_id, CommentOrderType.DEFAULT, next_page
@@ -314,28 +415,38 @@ class BilibiliClient(AbstractApiClient):
             comment_list: List[Dict] = comments_res.get("replies", [])
             is_end = cursor_info.get("is_end")
             next_page = cursor_info.get("next")
-            if is_fetch_sub_comments:
-                for comment in comment_list:
-                    comment_id = comment["rpid"]
-                    if comment.get("rcount", 0) > 0:
-                        {
-                            await self.get_video_all_level_two_comments(
-                                video_id,
-                                comment_id,
-                                CommentOrderType.DEFAULT,
-                                10,
-                                crawl_interval,
-                                callback,
-                            )
-                        }
             if len(result) + len(comment_list) > max_count:
                 comment_list = comment_list[: max_count - len(result)]
+            result.extend(comment_list)
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(video_id, comment_list)
-            await asyncio.sleep(crawl_interval)
-            if not is_fetch_sub_comments:
-                result.extend(comment_list)
-                continue
+            page_tasks = []
+            if is_fetch_sub_comments:
+                for comment in comment_list:
+                    if comment.get("rcount", 0) > 0:
+                        page_tasks.append(
+                            sub_comment_group.spawn(
+                                self.get_video_all_level_two_comments(
+                                    video_id,
+                                    comment["rpid"],
+                                    CommentOrderType.DEFAULT,
+                                    10,
+                                    crawl_interval,
+                                    callback,
+                                )
+                            )
+                        )
+            pending_cursors.append((page_tasks, next_page))
+            flush_cursors()
+            await crawl_sleep(crawl_interval)
+        await sub_comment_group.wait()
+        flush_cursors()
+        if pending_cursors:
+            utils.logger.error(
+                f"[BilibiliClient.get_video_all_comments] video_id: {video_id} fetch sub comments failed, "
+                f"{len(pending_cursors)} comment pages are not completed"
+            )
+            raise DataFetchError(f"fetch sub comments of video {video_id} failed")
         return result
 
     async def get_video_all_level_two_comments(
@@ -366,7 +477,7 @@ class BilibiliClient(AbstractApiClient):
             comment_list: List[Dict] = result.get("replies", [])
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(video_id, comment_list)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             if int(result["page"]["count"]) <= pn * ps:
                 break
 
@@ -14,19 +14,29 @@ if project_root not in sys.path:
     print(f"[DEBUG] Added project root to sys.path: {project_root}")
 
 import asyncio
+import functools
+import math
 import os
 import random
 from asyncio import Task
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
 
 import config
 import pandas as pd
 from base.base_crawler import AbstractCrawler
-from playwright.async_api import BrowserContext, BrowserType, Page, async_playwright
-from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
+from playwright.async_api import BrowserContext, BrowserType, Page
+from proxy.proxy_ip_pool import IpInfoModel, ProxyIpPool, create_ip_pool
 from store import bilibili as bilibili_store
 from tools import utils
+from tools.async_pipeline import AsyncPipeline, BoundedTaskGroup
+from tools.browser_pool import PooledBrowser, browser_pool_key, get_browser_pool
+from tools.checkpoint import PageCheckpointTracker, create_crawl_checkpoint
+from tools.circuit_breaker import CircuitOpenError
+from tools.frontier import CrawlFrontier
+from tools.media_queue import MediaDownloadStage
+from tools.rate_limiter import crawl_sleep
+from tools.session_state import SessionState, load_session_state, save_session_state
 from var import crawler_type_var, source_keyword_var
 
 from .client import BilibiliClient
@@ -34,18 +44,55 @@ from .exception import DataFetchError
 from .field import SearchOrderType
 from .login import BilibiliLogin
 
+# 单次搜索（同一关键词和时间范围）最多返回的视频数量
+BILI_SEARCH_RESULT_LIMIT = 1000
+
 
 class BilibiliCrawler(AbstractCrawler):
     context_page: Page
     bili_client: BilibiliClient
     browser_context: BrowserContext
+    pooled_browser: Optional[PooledBrowser] = None
 
     def __init__(self):
         self.index_url = "https://www.bilibili.com"
         self.user_agent = utils.get_user_agent()
+        self.media_stage = MediaDownloadStage(name="bilibili")
+        self.checkpoint = create_crawl_checkpoint()
+        # 跨任务去重，之前爬取过且评论数没有变化的视频不再重复爬取
+        self.frontier = CrawlFrontier("bili")
 
     async def start(self):
+        await self.open_session()
+        try:
+            crawler_type_var.set(config.CRAWLER_TYPE)
+            if config.CRAWLER_TYPE == "search":
+                # Search for video and retrieve their comment information.
+                await self.search()
+            elif config.CRAWLER_TYPE == "detail":
+                # Get the information and comments of the specified post
+                await self.get_specified_videos(config.BILI_SPECIFIED_ID_LIST)
+            elif config.CRAWLER_TYPE == "creator":
+                for creator_id in config.BILI_CREATOR_ID_LIST:
+                    await self.get_creator_videos(int(creator_id))
+            elif config.CRAWLER_TYPE == "creator_audio":
+                for creator_id in config.BILI_CREATOR_ID_LIST:
+                    await self.get_creator_audio(int(creator_id))
+            else:
+                pass
+            # 等待媒体下载阶段把队列中剩余的视频下载完成
+            await self.media_stage.close()
+            utils.logger.info("[BilibiliCrawler.start] Bilibili Crawler finished ...")
+        finally:
+            await self.close_session()
+
+    async def open_session(self):
+        """
+        启动浏览器并完成登录，创建 bili_client，之后可以直接调用各个爬取方法
+        :return:
+        """
         playwright_proxy_format, httpx_proxy_format = None, None
+        ip_proxy_pool: Optional[ProxyIpPool] = None
         current_file = os.path.abspath(__file__)
         crawler_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_file)))
         stealth_path = os.path.join(crawler_dir, "libs", "stealth.min.js")
@@ -65,49 +112,78 @@ class BilibiliCrawler(AbstractCrawler):
                 ip_proxy_info
             )
 
-        async with async_playwright() as playwright:
-            # Launch a browser context.
-            chromium = playwright.chromium
-            self.browser_context = await self.launch_browser(
-                chromium, None, self.user_agent, headless=config.HEADLESS
+        if config.ENABLE_BROWSER_FREE_MODE and await self.open_browser_free_session(
+            httpx_proxy_format, ip_proxy_pool
+        ):
+            return
+
+        # 从浏览器上下文池租用已经打开首页的浏览器，池中没有时才启动新的浏览器
+        self.pooled_browser = await get_browser_pool().acquire(
+            browser_pool_key(config.PLATFORM),
+            lambda chromium: self.create_browser_context(chromium, stealth_path),
+            self.index_url,
+            exclusive=config.SAVE_LOGIN_STATE,
+        )
+        self.browser_context = self.pooled_browser.browser_context
+        self.context_page = self.pooled_browser.page
+
+        # Create a client to interact with the xiaohongshu website.
+        self.bili_client = await self.create_bilibili_client(
+            httpx_proxy_format, ip_proxy_pool
+        )
+        if not await self.bili_client.pong():
+            login_obj = BilibiliLogin(
+                login_type=config.LOGIN_TYPE,
+                login_phone="",  # your phone number
+                browser_context=self.browser_context,
+                context_page=self.context_page,
+                cookie_str=config.COOKIES,
             )
-            # stealth.min.js is a js script to prevent the website from detecting the crawler.
-            # await self.browser_context.add_init_script(path="libs/stealth.min.js")
-            await self.browser_context.add_init_script(path=stealth_path)
-            self.context_page = await self.browser_context.new_page()
-            await self.context_page.goto(self.index_url)
-
-            # Create a client to interact with the xiaohongshu website.
-            self.bili_client = await self.create_bilibili_client(httpx_proxy_format)
-            if not await self.bili_client.pong():
-                login_obj = BilibiliLogin(
-                    login_type=config.LOGIN_TYPE,
-                    login_phone="",  # your phone number
-                    browser_context=self.browser_context,
-                    context_page=self.context_page,
-                    cookie_str=config.COOKIES,
-                )
-                await login_obj.begin()
-                await self.bili_client.update_cookies(
-                    browser_context=self.browser_context
-                )
+            await login_obj.begin()
+            await self.bili_client.update_cookies(browser_context=self.browser_context)
+        if config.SAVE_LOGIN_STATE:
+            # 导出登录态，之后的免浏览器模式任务直接使用
+            await save_session_state(self.browser_context, config.PLATFORM)
 
-            crawler_type_var.set(config.CRAWLER_TYPE)
-            if config.CRAWLER_TYPE == "search":
-                # Search for video and retrieve their comment information.
-                await self.search()
-            elif config.CRAWLER_TYPE == "detail":
-                # Get the information and comments of the specified post
-                await self.get_specified_videos(config.BILI_SPECIFIED_ID_LIST)
-            elif config.CRAWLER_TYPE == "creator":
-                for creator_id in config.BILI_CREATOR_ID_LIST:
-                    await self.get_creator_videos(int(creator_id))
-            elif config.CRAWLER_TYPE == "creator_audio":
-                for creator_id in config.BILI_CREATOR_ID_LIST:
-                    await self.get_creator_audio(int(creator_id))
-            else:
-                pass
-            utils.logger.info("[BilibiliCrawler.start] Bilibili Crawler finished ...")
+    async def open_browser_free_session(
+        self, httpx_proxy: Optional[str], ip_pool: Optional[ProxyIpPool] = None
+    ) -> bool:
+        """
+        免浏览器模式：使用保存的登录态创建 bili_client，签名需要的 WBI key 从 nav 接口获取，不启动浏览器
+        :param httpx_proxy: httpx proxy
+        :param ip_pool: 代理池，开启后每次请求从代理池租用代理
+        :return: 没有保存的登录态或者登录态已经失效时返回 False，需要启动浏览器重新登录
+        """
+        session_state = load_session_state(config.PLATFORM)
+        if session_state is None:
+            utils.logger.info(
+                "[BilibiliCrawler.open_browser_free_session] no saved session state, fallback to browser"
+            )
+            return False
+        self.bili_client = await self.create_bilibili_client(
+            httpx_proxy, ip_pool, session_state=session_state
+        )
+        if not await self.bili_client.pong():
+            utils.logger.info(
+                "[BilibiliCrawler.open_browser_free_session] saved session expired, fallback to browser"
+            )
+            return False
+        utils.logger.info(
+            "[BilibiliCrawler.open_browser_free_session] use saved session without browser"
+        )
+        return True
+
+    async def close_session(self):
+        """
+        关闭 httpx 连接池，并把浏览器上下文归还到上下文池，由上下文池决定保留给下一个任务还是关闭
+        :return:
+        """
+        bili_client = getattr(self, "bili_client", None)
+        if bili_client is not None:
+            await bili_client.close()
+        if self.pooled_browser is not None:
+            await get_browser_pool().release(self.pooled_browser)
+            self.pooled_browser = None
 
     @staticmethod
     async def get_pubtime_datetime(
@@ -150,130 +226,351 @@ class BilibiliCrawler(AbstractCrawler):
     async def search(self):
         """
         search bilibili video with keywords
+        搜索翻页、视频详情、评论分为三个阶段，通过有界队列连接，各阶段独立并发，
+        上一页的评论还在爬取时下一页的详情已经开始请求，不再在每一页之间等待
         :return:
         """
         utils.logger.info("[BilibiliCrawler.search] Begin search bilibli keywords")
         bili_limit_count = 20  # bilibili limit page fixed value
-        if config.CRAWLER_MAX_NOTES_COUNT < bili_limit_count:
-            config.CRAWLER_MAX_NOTES_COUNT = bili_limit_count
+        # 不修改全局配置，避免影响同一进程内的其他任务
+        max_notes_count = max(config.CRAWLER_MAX_NOTES_COUNT, bili_limit_count)
         start_page = config.START_PAGE  # start page number
-        for keyword in config.KEYWORDS.split(","):
-            source_keyword_var.set(keyword)
-            utils.logger.info(
-                f"[BilibiliCrawler.search] Current search keyword: {keyword}"
-            )
-            # 每个关键词最多返回 1000 条数据
-            if not config.ALL_DAY:
-                page = 1
-                while (
-                    page - start_page + 1
-                ) * bili_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
-                    if page < start_page:
-                        utils.logger.info(f"[BilibiliCrawler.search] Skip page: {page}")
-                        page += 1
+        page_tracker = PageCheckpointTracker(self.checkpoint)
+        pipeline = self.create_video_pipeline(page_tracker)
+        try:
+            for keyword in config.KEYWORDS.split(","):
+                source_keyword_var.set(keyword)
+                utils.logger.info(
+                    f"[BilibiliCrawler.search] Current search keyword: {keyword}"
+                )
+                # 每个关键词最多返回 1000 条数据
+                if not config.ALL_DAY:
+                    keyword_scope = f"search:{keyword}"
+                    if self.checkpoint.is_completed(keyword_scope):
+                        utils.logger.info(
+                            f"[BilibiliCrawler.search] keyword {keyword} already finished, skip"
+                        )
                         continue
+                    page = self.checkpoint.get_cursor(keyword_scope, 1)
+                    while (page - start_page + 1) * bili_limit_count <= max_notes_count:
+                        if page < start_page:
+                            utils.logger.info(
+                                f"[BilibiliCrawler.search] Skip page: {page}"
+                            )
+                            page += 1
+                            continue
 
-                    utils.logger.info(
-                        f"[BilibiliCrawler.search] search bilibili keyword: {keyword}, page: {page}"
+                        utils.logger.info(
+                            f"[BilibiliCrawler.search] search bilibili keyword: {keyword}, page: {page}"
+                        )
+                        videos_res = await self.bili_client.search_video_by_keyword(
+                            keyword=keyword,
+                            page=page,
+                            page_size=bili_limit_count,
+                            order=SearchOrderType.DEFAULT,
+                            pubtime_begin_s=0,  # 作品发布日期起始时间戳
+                            pubtime_end_s=0,  # 作品发布日期结束日期时间戳
+                        )
+                        video_list: List[Dict] = videos_res.get("result") or []
+                        await self.put_search_videos(
+                            pipeline,
+                            page_tracker,
+                            video_list,
+                            keyword,
+                            keyword_scope,
+                            page,
+                        )
+                        page += 1
+                    page_tracker.close_scope(keyword_scope)
+                # 按照 START_DAY 至 END_DAY 按照每一天进行筛选，这样能够突破 1000 条视频的限制，最大程度爬取该关键词下的所有视频
+                else:
+                    await self.search_by_time_shards(
+                        keyword, pipeline, page_tracker, max_notes_count, start_page
                     )
-                    video_id_list: List[str] = []
-                    videos_res = await self.bili_client.search_video_by_keyword(
-                        keyword=keyword,
-                        page=page,
-                        page_size=bili_limit_count,
-                        order=SearchOrderType.DEFAULT,
-                        pubtime_begin_s=0,  # 作品发布日期起始时间戳
-                        pubtime_end_s=0,  # 作品发布日期结束日期时间戳
+        finally:
+            # 等待详情和评论阶段把队列中剩余的视频处理完
+            await pipeline.close()
+
+    async def search_by_time_shards(
+        self,
+        keyword: str,
+        pipeline: AsyncPipeline,
+        page_tracker: PageCheckpointTracker,
+        max_notes_count: int,
+        start_page: int,
+    ):
+        """
+        按照 START_DAY 至 END_DAY 的每一天分片并发搜索：
+        - 多个日期分片同时翻页，所有分片共享同一个搜索请求并发上限和请求预算
+        - 某个时间窗口的搜索结果达到 1000 条上限时，二分为更小的时间窗口分别搜索
+        - 不同分片返回的同一个视频按 aid 去重，只进入流水线一次
+        :param keyword: 关键词
+        :param pipeline: 搜索结果处理流水线
+        :param page_tracker:
+        :param max_notes_count: 每个时间窗口最多爬取的视频数量
+        :param start_page:
+        :return:
+        """
+        bili_limit_count = 20  # bilibili limit page fixed value
+        request_semaphore = asyncio.Semaphore(config.BILI_SEARCH_MAX_INFLIGHT_REQUESTS)
+        requests_left = config.BILI_SEARCH_REQUEST_BUDGET
+        seen_aids = set()
+
+        async def search_page(page: int, begin_s: int, end_s: int) -> Optional[Dict]:
+            nonlocal requests_left
+            if config.BILI_SEARCH_REQUEST_BUDGET:
+                if requests_left <= 0:
+                    return None
+                requests_left -= 1
+            async with request_semaphore:
+                return await self.bili_client.search_video_by_keyword(
+                    keyword=keyword,
+                    page=page,
+                    page_size=bili_limit_count,
+                    order=SearchOrderType.DEFAULT,
+                    pubtime_begin_s=begin_s,  # 作品发布日期起始时间戳
+                    pubtime_end_s=end_s,  # 作品发布日期结束日期时间戳
+                )
+
+        async def search_window(scope: str, begin_s: int, end_s: int):
+            if self.checkpoint.is_completed(scope):
+                utils.logger.info(
+                    f"[BilibiliCrawler.search_by_time_shards] {scope} already finished, skip"
+                )
+                return
+            page = self.checkpoint.get_cursor(scope, 1)
+            window_finished = True
+            while (page - start_page + 1) * bili_limit_count <= max_notes_count:
+                # ! Catch any error if response return nothing, go to next window
+                try:
+                    utils.logger.info(
+                        f"[BilibiliCrawler.search_by_time_shards] search bilibili keyword: {keyword}, "
+                        f"window: {datetime.fromtimestamp(begin_s)} - {datetime.fromtimestamp(end_s)}, page: {page}"
                     )
+                    videos_res = await search_page(page, begin_s, end_s)
+                    if videos_res is None:
+                        # 请求预算用完，未完成的窗口下次运行时从保存的页码继续
+                        utils.logger.info(
+                            f"[BilibiliCrawler.search_by_time_shards] request budget exhausted, stop {scope}"
+                        )
+                        window_finished = False
+                        break
+                    if (
+                        page == 1
+                        and int(videos_res.get("numResults") or 0)
+                        >= BILI_SEARCH_RESULT_LIMIT
+                        and max_notes_count > BILI_SEARCH_RESULT_LIMIT
+                        and end_s - begin_s + 1 >= 2 * config.BILI_SEARCH_MIN_WINDOW_SEC
+                    ):
+                        # 结果被截断，拆分为两个更小的窗口，拆分后的窗口各自记录断点
+                        mid_s = begin_s + (end_s - begin_s) // 2
+                        utils.logger.info(
+                            f"[BilibiliCrawler.search_by_time_shards] {scope} hit result limit, split window"
+                        )
+                        await asyncio.gather(
+                            search_window(
+                                f"window:{keyword}:{begin_s}-{mid_s}", begin_s, mid_s
+                            ),
+                            search_window(
+                                f"window:{keyword}:{mid_s + 1}-{end_s}",
+                                mid_s + 1,
+                                end_s,
+                            ),
+                        )
+                        return
                     video_list: List[Dict] = videos_res.get("result")
+                    if not video_list:
+                        # 当前窗口的视频已经全部爬取完
+                        break
+                    await self.put_search_videos(
+                        pipeline,
+                        page_tracker,
+                        video_list,
+                        keyword,
+                        scope,
+                        page,
+                        seen_aids,
+                    )
+                    page += 1
+                except Exception as e:
+                    # 异常中断的窗口不标记完成，下次运行时从保存的页码继续
+                    utils.logger.error(
+                        f"[BilibiliCrawler.search_by_time_shards] search {scope} page {page} error: {e}"
+                    )
+                    window_finished = False
+                    break
+            if window_finished:
+                page_tracker.close_scope(scope)
 
-                    semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
-                    task_list = []
-                    try:
-                        task_list = [
-                            self.get_video_info_task(
-                                aid=video_item.get("aid"), bvid="", semaphore=semaphore
-                            )
-                            for video_item in video_list
-                        ]
-                    except Exception as e:
-                        utils.logger.warning(
-                            f"[BilibiliCrawler.search] error in the task list. The video for this page will not be included. {e}"
+        shard_group = BoundedTaskGroup(
+            config.BILI_SEARCH_SHARD_CONCURRENCY, name=f"bili_search_shards_{keyword}"
+        )
+        for day in pd.date_range(start=config.START_DAY, end=config.END_DAY, freq="D"):
+            # 按照每一天进行爬取的时间戳参数
+            pubtime_begin_s, pubtime_end_s = await self.get_pubtime_datetime(
+                start=day.strftime("%Y-%m-%d"), end=day.strftime("%Y-%m-%d")
+            )
+            shard_group.spawn(
+                search_window(
+                    f"day:{keyword}:{day.strftime('%Y-%m-%d')}",
+                    int(pubtime_begin_s),
+                    int(pubtime_end_s),
+                )
+            )
+        await shard_group.wait()
+        utils.logger.info(
+            f"[BilibiliCrawler.search_by_time_shards] keyword {keyword} finished, unique videos: {len(seen_aids)}"
+        )
+
+    def create_video_pipeline(
+        self, page_tracker: PageCheckpointTracker, name: str = "bilibili_search"
+    ) -> AsyncPipeline:
+        """
+        搜索结果、创作者视频列表的处理流水线：视频详情 -> 评论
+        流水线中的数据为 dict: aid, bvid（创作者视频列表按 bvid 请求详情）, keyword, scope, page,
+        stored（断点记录中已经保存过详情）
+        :param page_tracker: 内容处理完后推进断点页码
+        :param name: 流水线名称
+        :return:
+        """
+        detail_semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        comment_semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+
+        async def fetch_video_detail(item: Dict) -> Optional[Dict]:
+            source_keyword_var.set(item["keyword"])
+            try:
+                if not item["stored"]:
+                    video_detail = await self.get_video_info_task(
+                        aid=item["aid"] or 0,
+                        bvid=item.get("bvid", ""),
+                        semaphore=detail_semaphore,
+                    )
+                    if not video_detail:
+                        page_tracker.item_failed(item["scope"], item["page"])
+                        return None
+                    if item.get("bvid"):
+                        item["aid"] = await self.save_specified_video(
+                            video_detail, detail_semaphore
                         )
-                    video_items = await asyncio.gather(*task_list)
-                    for video_item in video_items:
-                        if video_item:
-                            video_id_list.append(video_item.get("View").get("aid"))
-                            await bilibili_store.update_bilibili_video(video_item)
-                            await bilibili_store.update_up_info(video_item)
-                            await self.get_bilibili_video(video_item, semaphore)
-                    page += 1
-                    await self.batch_get_video_comments(video_id_list)
-            # 按照 START_DAY 至 END_DAY 按照每一天进行筛选，这样能够突破 1000 条视频的限制，最大程度爬取该关键词下的所有视频
+                    else:
+                        await self.save_search_video(video_detail, detail_semaphore)
+            except Exception:
+                page_tracker.item_failed(item["scope"], item["page"])
+                raise
+            if not config.ENABLE_GET_COMMENTS:
+                page_tracker.item_done(item["scope"], item["page"])
+                return None
+            return item
+
+        async def fetch_video_comments(item: Dict):
+            if await self.get_comments(item["aid"], comment_semaphore):
+                page_tracker.item_done(item["scope"], item["page"])
             else:
-                for day in pd.date_range(
-                    start=config.START_DAY, end=config.END_DAY, freq="D"
-                ):
-                    # 按照每一天进行爬取的时间戳参数
-                    pubtime_begin_s, pubtime_end_s = await self.get_pubtime_datetime(
-                        start=day.strftime("%Y-%m-%d"), end=day.strftime("%Y-%m-%d")
-                    )
-                    page = 1
-                    while (
-                        page - start_page + 1
-                    ) * bili_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
-                        # ! Catch any error if response return nothing, go to next day
-                        try:
-                            # ! Don't skip any page, to make sure gather all video in one day
-                            # if page < start_page:
-                            #     utils.logger.info(f"[BilibiliCrawler.search] Skip page: {page}")
-                            #     page += 1
-                            #     continue
+                page_tracker.item_failed(item["scope"], item["page"])
+
+        return (
+            AsyncPipeline(name=name)
+            .add_stage(
+                "detail",
+                fetch_video_detail,
+                concurrency=config.MAX_CONCURRENCY_NUM,
+                queue_size=config.SEARCH_PIPELINE_QUEUE_SIZE,
+            )
+            .add_stage(
+                "comments",
+                fetch_video_comments,
+                concurrency=config.MAX_CONCURRENCY_NUM,
+                queue_size=config.SEARCH_PIPELINE_QUEUE_SIZE,
+            )
+        )
 
-                            utils.logger.info(
-                                f"[BilibiliCrawler.search] search bilibili keyword: {keyword}, date: {day.ctime()}, page: {page}"
-                            )
-                            video_id_list: List[str] = []
-                            videos_res = await self.bili_client.search_video_by_keyword(
-                                keyword=keyword,
-                                page=page,
-                                page_size=bili_limit_count,
-                                order=SearchOrderType.DEFAULT,
-                                pubtime_begin_s=pubtime_begin_s,  # 作品发布日期起始时间戳
-                                pubtime_end_s=pubtime_end_s,  # 作品发布日期结束日期时间戳
-                            )
-                            video_list: List[Dict] = videos_res.get("result")
-
-                            semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
-                            task_list = []
-                            try:
-                                task_list = [
-                                    self.get_video_info_task(
-                                        aid=video_item.get("aid"),
-                                        bvid="",
-                                        semaphore=semaphore,
-                                    )
-                                    for video_item in video_list
-                                ]
-                            finally:
-                                pass
-                            video_items = await asyncio.gather(*task_list)
-                            for video_item in video_items:
-                                if video_item:
-                                    video_id_list.append(
-                                        video_item.get("View").get("aid")
-                                    )
-                                    await bilibili_store.update_bilibili_video(
-                                        video_item
-                                    )
-                                    await bilibili_store.update_up_info(video_item)
-                                    await self.get_bilibili_video(video_item, semaphore)
-                            page += 1
-                            await self.batch_get_video_comments(video_id_list)
-                        # go to next day
-                        except Exception as e:
-                            print(e)
-                            break
+    async def put_search_videos(
+        self,
+        pipeline: AsyncPipeline,
+        page_tracker: PageCheckpointTracker,
+        video_list: List[Dict],
+        keyword: str,
+        scope: str,
+        page: int,
+        seen_aids: Optional[Set] = None,
+    ):
+        """
+        把一页搜索结果放入流水线，不等待处理完成
+        断点记录中已经保存过的视频跳过详情请求，只检查评论是否完成，在去重索引中过期或者有变化时重新爬取；
+        没有保存过、也没有变化的视频直接跳过
+        :param pipeline:
+        :param page_tracker:
+        :param video_list: 搜索结果
+        :param keyword: 关键词
+        :param scope: 断点分页范围
+        :param page: 页码
+        :param seen_aids: 多个分片共享的已入队 aid，用于合并去重
+        :return:
+        """
+        items = []
+        for video_item in video_list:
+            aid = video_item.get("aid")
+            if seen_aids is not None:
+                if aid in seen_aids:
+                    continue
+                seen_aids.add(aid)
+            stored = self.checkpoint.is_completed(f"aid:{aid}")
+            # 搜索结果中的 review 为评论数
+            if stored and self.reopen_stale_video(
+                f"aid:{aid}", aid, video_item.get("review")
+            ):
+                stored = False
+            elif not stored and not self.frontier.should_crawl(
+                f"aid:{aid}", video_item.get("review")
+            ):
+                continue
+            items.append(
+                {
+                    "aid": aid,
+                    "keyword": keyword,
+                    "scope": scope,
+                    "page": page,
+                    "stored": stored,
+                }
+            )
+        page_tracker.add_page(scope, page, len(items))
+        for item in items:
+            await pipeline.put(item)
+
+    def reopen_stale_video(
+        self, item_id: str, aid: Any, fingerprint: Optional[str] = None
+    ) -> bool:
+        """
+        断点记录中已经保存过的视频在去重索引中过期或者评论数发生变化时，
+        清除视频和评论的完成标记，重新爬取详情和评论
+        :param item_id: 断点记录中的视频ID，例如 aid:123、bvid:BV1xx
+        :param aid: 视频的 aid，用于清除评论的完成标记
+        :param fingerprint: 视频指纹，例如列表页返回的评论数
+        :return: 需要重新爬取时返回 True
+        """
+        if not self.frontier.enabled or not self.frontier.should_crawl(
+            item_id, fingerprint
+        ):
+            return False
+        self.checkpoint.reopen(item_id)
+        if aid:
+            self.checkpoint.reopen(f"comments:{aid}")
+        return True
+
+    async def save_search_video(self, video_item: Dict, semaphore: asyncio.Semaphore):
+        """
+        保存搜索结果中的视频详情，并记录到断点和去重索引
+        :param video_item: 视频详情
+        :param semaphore:
+        :return:
+        """
+        video_item_view: Dict = video_item.get("View")
+        aid = video_item_view.get("aid")
+        await bilibili_store.update_bilibili_video(video_item)
+        await bilibili_store.update_up_info(video_item)
+        await self.get_bilibili_video(video_item, semaphore)
+        self.checkpoint.mark_completed(f"aid:{aid}")
+        self.frontier.record(f"aid:{aid}", video_item_view.get("stat", {}).get("reply"))
 
     async def batch_get_video_comments(self, video_id_list: List[str]):
         """
@@ -299,34 +596,52 @@ class BilibiliCrawler(AbstractCrawler):
             task_list.append(task)
         await asyncio.gather(*task_list)
 
-    async def get_comments(self, video_id: str, semaphore: asyncio.Semaphore):
+    async def get_comments(self, video_id: str, semaphore: asyncio.Semaphore) -> bool:
+        """
+        get comment for video id，出错时只记录日志
+        :param video_id:
+        :param semaphore:
+        :return: 评论全部爬取完成时返回 True
+        """
+        try:
+            await self.fetch_comments(video_id, semaphore)
+            return True
+        except DataFetchError as ex:
+            utils.logger.error(
+                f"[BilibiliCrawler.get_comments] get video_id: {video_id} comment error: {ex}"
+            )
+        except Exception as e:
+            utils.logger.error(
+                f"[BilibiliCrawler.get_comments] may be been blocked, err:{e}"
+            )
+        return False
+
+    async def fetch_comments(self, video_id: str, semaphore: asyncio.Semaphore):
         """
-        get comment for video id
+        爬取视频的全部评论并记录断点，出错时抛出异常，分布式任务据此重试
         :param video_id:
         :param semaphore:
         :return:
         """
+        comments_scope = f"comments:{video_id}"
+        if self.checkpoint.is_completed(comments_scope):
+            return
         async with semaphore:
-            try:
-                utils.logger.info(
-                    f"[BilibiliCrawler.get_comments] begin get video_id: {video_id} comments ..."
-                )
-                await self.bili_client.get_video_all_comments(
-                    video_id=video_id,
-                    crawl_interval=random.random(),
-                    is_fetch_sub_comments=config.ENABLE_GET_SUB_COMMENTS,
-                    callback=bilibili_store.batch_update_bilibili_video_comments,
-                    max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
-                )
-
-            except DataFetchError as ex:
-                utils.logger.error(
-                    f"[BilibiliCrawler.get_comments] get video_id: {video_id} comment error: {ex}"
-                )
-            except Exception as e:
-                utils.logger.error(
-                    f"[BilibiliCrawler.get_comments] may be been blocked, err:{e}"
-                )
+            utils.logger.info(
+                f"[BilibiliCrawler.fetch_comments] begin get video_id: {video_id} comments ..."
+            )
+            await self.bili_client.get_video_all_comments(
+                video_id=video_id,
+                crawl_interval=random.random(),
+                is_fetch_sub_comments=config.ENABLE_GET_SUB_COMMENTS,
+                callback=bilibili_store.batch_update_bilibili_video_comments,
+                max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+                start_cursor=self.checkpoint.get_cursor(comments_scope, 0),
+                cursor_callback=functools.partial(
+                    self.checkpoint.set_cursor, comments_scope
+                ),
+            )
+            self.checkpoint.mark_completed(comments_scope)
 
     # async def get_creator_videos(self, creator_id: int):
     #     """
@@ -347,42 +662,106 @@ class BilibiliCrawler(AbstractCrawler):
     #     await self.get_specified_videos(video_bvids_list)
 
     async def get_creator_videos(self, creator_id: int):
-        ps = 30  # 每页数量
-        pn = 1  # 起始页码
-        video_bvids_list = []
-        total_videos = 0  # 总视频数
+        """
+        获取创作者的全部视频：第一页拿到视频总数后其余页并发请求，
+        每一页的视频立即交给详情、评论流水线，不等待整个视频列表拿到
+        :param creator_id: 创作者ID
+        :return:
+        """
+        creator_scope = f"creator:{creator_id}"
+        if self.checkpoint.is_completed(creator_scope):
+            utils.logger.info(f"创作者 {creator_id} 已经爬取完成，跳过")
+            return
+        # 断点续爬：从第一个还没处理完的页码继续，已经保存过详情的视频只检查评论
+        start_pn = self.checkpoint.get_cursor(creator_scope, 1)
+        if not isinstance(start_pn, int):
+            # 旧版本的断点保存的是整个视频列表，重新翻页即可，已保存的视频不会重复请求
+            start_pn = 1
+        page_tracker = PageCheckpointTracker(self.checkpoint)
+        page_tracker.open_scope(creator_scope, start_pn)
+        pipeline = self.create_video_pipeline(
+            page_tracker, name=f"bilibili_creator_{creator_id}"
+        )
 
-        while True:
+        async def put_creator_videos(pn: int, video_list: List[Dict]):
+            items = []
+            for video in video_list:
+                bvid = video["bvid"]
+                stored_aid = self.checkpoint.get_completed(f"bvid:{bvid}")
+                if stored_aid and self.reopen_stale_video(f"bvid:{bvid}", stored_aid):
+                    stored_aid = None
+                elif not stored_aid and not self.frontier.should_crawl(f"bvid:{bvid}"):
+                    continue
+                items.append(
+                    {
+                        "aid": stored_aid,
+                        "bvid": bvid,
+                        "keyword": "",
+                        "scope": creator_scope,
+                        "page": pn,
+                        "stored": bool(stored_aid),
+                    }
+                )
+            page_tracker.add_page(creator_scope, pn, len(items))
+            for item in items:
+                await pipeline.put(item)
+
+        try:
+            if await self.list_creator_video_pages(
+                creator_id, start_pn, put_creator_videos
+            ):
+                page_tracker.close_scope(creator_scope)
+        finally:
+            # 等待详情和评论阶段把队列中剩余的视频处理完
+            await pipeline.close()
+
+    async def list_creator_video_pages(
+        self,
+        creator_id: int,
+        start_pn: int,
+        on_page: Callable[[int, List[Dict]], Awaitable[None]],
+    ) -> bool:
+        """
+        翻页获取创作者的视频列表，第一页返回视频总数后按总页数并发请求其余页，
+        每拿到一页就回调 on_page（页码可能乱序）
+        :param creator_id: 创作者ID
+        :param start_pn: 起始页码
+        :param on_page: async def on_page(pn, video_list)
+        :return: 所有页都获取成功时返回 True
+        """
+        ps = 30  # 每页数量
+        try:
+            result = await self.bili_client.get_creator_videos(creator_id, start_pn, ps)
+            total_videos = int(result["page"]["count"])
+            utils.logger.info(f"创作者 {creator_id} 总视频数: {total_videos}")
+            await on_page(start_pn, result["list"]["vlist"] or [])
+        except DataFetchError as e:
+            utils.logger.error(f"获取创作者视频失败: {e}")
+            return False
+        except KeyError as e:
+            utils.logger.error(f"API响应结构异常: {e}")
+            return False
+
+        failed_pages = []
+
+        async def fetch_page(pn: int):
+            await crawl_sleep(random.random())
             try:
-                result = await self.bili_client.get_creator_videos(creator_id, pn, ps)
-
-                # 首次循环获取总视频数
-                if pn == 1:
-                    total_videos = int(result["page"]["count"])
-                    utils.logger.info(f"创作者 {creator_id} 总视频数: {total_videos}")
-
-                # 处理当前页视频
-                current_videos = result["list"]["vlist"]
-                for video in current_videos:
-                    video_bvids_list.append(video["bvid"])
-
-                # 终止条件：没有更多视频或已获取所有视频
-                if not current_videos or len(video_bvids_list) >= total_videos:
-                    break
-
-                # 下一页
-                pn += 1
-                await asyncio.sleep(random.random())
-
-            except DataFetchError as e:
-                utils.logger.error(f"获取创作者视频失败: {e}")
-                break
-            except KeyError as e:
-                utils.logger.error(f"API响应结构异常: {e}")
-                break
+                page_result = await self.bili_client.get_creator_videos(
+                    creator_id, pn, ps
+                )
+                await on_page(pn, page_result["list"]["vlist"] or [])
+            except (DataFetchError, KeyError) as e:
+                failed_pages.append(pn)
+                utils.logger.error(f"获取创作者视频第 {pn} 页失败: {e}")
 
-        utils.logger.info(f"已获取 {len(video_bvids_list)}/{total_videos} 个视频")
-        await self.get_specified_videos(video_bvids_list)
+        page_group = BoundedTaskGroup(
+            config.CREATOR_PAGE_CONCURRENCY, name=f"bili_creator_pages_{creator_id}"
+        )
+        for pn in range(start_pn + 1, math.ceil(total_videos / ps) + 1):
+            page_group.spawn(fetch_page(pn))
+        await page_group.wait()
+        return not failed_pages
 
     async def get_specified_videos(self, bvids_list: List[str]):
         """
@@ -390,23 +769,50 @@ class BilibiliCrawler(AbstractCrawler):
         :return:
         """
         semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
-        task_list = [
-            self.get_video_info_task(aid=0, bvid=video_id, semaphore=semaphore)
-            for video_id in bvids_list
-        ]
-        video_details = await asyncio.gather(*task_list)
         video_aids_list = []
+        task_list = []
+        for video_id in bvids_list:
+            # 断点记录中已经保存过的视频只需要继续爬取评论
+            stored_aid = self.checkpoint.get_completed(f"bvid:{video_id}")
+            if stored_aid and self.reopen_stale_video(f"bvid:{video_id}", stored_aid):
+                stored_aid = None
+            elif not stored_aid and not self.frontier.should_crawl(f"bvid:{video_id}"):
+                continue
+            if stored_aid:
+                video_aids_list.append(stored_aid)
+                continue
+            task_list.append(
+                self.get_video_info_task(aid=0, bvid=video_id, semaphore=semaphore)
+            )
+        video_details = await asyncio.gather(*task_list)
         for video_detail in video_details:
             if video_detail is not None:
-                video_item_view: Dict = video_detail.get("View")
-                video_aid: str = video_item_view.get("aid")
+                video_aid = await self.save_specified_video(video_detail, semaphore)
                 if video_aid:
                     video_aids_list.append(video_aid)
-                await bilibili_store.update_bilibili_video(video_detail)
-                await bilibili_store.update_up_info(video_detail)
-                await self.get_bilibili_video(video_detail, semaphore)
         await self.batch_get_video_comments(video_aids_list)
 
+    async def save_specified_video(
+        self, video_detail: Dict, semaphore: asyncio.Semaphore
+    ) -> Optional[int]:
+        """
+        保存按 bvid 获取的视频详情，并记录到断点和去重索引
+        :param video_detail: 视频详情
+        :param semaphore:
+        :return: 视频的 aid
+        """
+        video_item_view: Dict = video_detail.get("View")
+        video_aid = video_item_view.get("aid")
+        await bilibili_store.update_bilibili_video(video_detail)
+        await bilibili_store.update_up_info(video_detail)
+        await self.get_bilibili_video(video_detail, semaphore)
+        self.checkpoint.mark_completed(f"bvid:{video_item_view.get('bvid')}", video_aid)
+        self.frontier.record(
+            f"bvid:{video_item_view.get('bvid')}",
+            video_item_view.get("stat", {}).get("reply"),
+        )
+        return video_aid
+
     async def get_creator_audio(self, creator_id: int):
         """
         获取创作者的所有视频的音频
@@ -420,39 +826,23 @@ class BilibiliCrawler(AbstractCrawler):
         await self.download_creator_audios(video_bvids)
 
     async def fetch_creator_videos(self, creator_id: int) -> List[str]:
-        """复用现有视频获取逻辑（与get_creator_videos相同）"""
-        ps = 30
-        pn = 1
-        video_bvids_list = []
-        total_videos = 0
-
-        while True:
-            try:
-                result = await self.bili_client.get_creator_videos(creator_id, pn, ps)
-
-                if pn == 1:
-                    total_videos = int(result["page"]["count"])
-                    utils.logger.info(f"创作者 {creator_id} 总视频数: {total_videos}")
-
-                current_videos = result["list"]["vlist"]
-                # print("-=-=-=----4444444-------", current_videos)
-                for video in current_videos:
-                    # 添加过滤条件（可选）
-                    if self.should_download_video(video):
-                        video_bvids_list.append(video["bvid"])
-                # print(video_bvids_list, "-=-=-=-----------")
-                if not current_videos or len(video_bvids_list) >= total_videos:
-                    break
-
-                pn += 1
-                await asyncio.sleep(random.random())
-
-            except (DataFetchError, KeyError) as e:
-                utils.logger.error(f"获取创作者视频失败: {e}")
-                break
-
-        utils.logger.info(f"符合条件的视频数: {len(video_bvids_list)}/{total_videos}")
-        print("video_bvids_list:", video_bvids_list)
+        """复用 get_creator_videos 的并发翻页逻辑，只返回符合下载条件的视频"""
+        page_bvids: Dict[int, List[str]] = {}
+
+        async def collect_page(pn: int, video_list: List[Dict]):
+            # 添加过滤条件（可选）
+            page_bvids[pn] = [
+                video["bvid"]
+                for video in video_list
+                if self.should_download_video(video)
+            ]
+
+        await self.list_creator_video_pages(creator_id, 1, collect_page)
+        # 页码可能乱序返回，按页码还原视频顺序
+        video_bvids_list = [
+            bvid for pn in sorted(page_bvids) for bvid in page_bvids[pn]
+        ]
+        utils.logger.info(f"符合条件的视频数: {len(video_bvids_list)}")
         return video_bvids_list
 
     def should_download_video(self, video_info: Dict) -> bool:
@@ -557,6 +947,11 @@ class BilibiliCrawler(AbstractCrawler):
             try:
                 result = await self.bili_client.get_video_info(aid=aid, bvid=bvid)
                 return result
+            except CircuitOpenError as ex:
+                utils.logger.error(
+                    f"[BilibiliCrawler.get_video_info_task] circuit is open, skip: {ex}"
+                )
+                return None
             except DataFetchError as ex:
                 utils.logger.error(
                     f"[BilibiliCrawler.get_video_info_task] Get video detail error: {ex}"
@@ -582,6 +977,11 @@ class BilibiliCrawler(AbstractCrawler):
             try:
                 result = await self.bili_client.get_video_play_url(aid=aid, cid=cid)
                 return result
+            except CircuitOpenError as ex:
+                utils.logger.error(
+                    f"[BilibiliCrawler.get_video_play_url_task] circuit is open, skip: {ex}"
+                )
+                return None
             except DataFetchError as ex:
                 utils.logger.error(
                     f"[BilibiliCrawler.get_video_play_url_task] Get video play url error: {ex}"
@@ -594,21 +994,35 @@ class BilibiliCrawler(AbstractCrawler):
                 return None
 
     async def create_bilibili_client(
-        self, httpx_proxy: Optional[str]
+        self,
+        httpx_proxy: Optional[str],
+        ip_pool: Optional[ProxyIpPool] = None,
+        session_state: Optional[SessionState] = None,
     ) -> BilibiliClient:
         """
         create bilibili client
         :param httpx_proxy: httpx proxy
+        :param ip_pool: 代理池，开启后每次请求从代理池租用代理
+        :param session_state: 免浏览器模式下保存的登录态，为空时使用浏览器的 cookie 和页面
         :return: bilibili client
         """
         utils.logger.info(
             "[BilibiliCrawler.create_bilibili_client] Begin create bilibili API client ..."
         )
-        cookie_str, cookie_dict = utils.convert_cookies(
-            await self.browser_context.cookies()
-        )
+        if session_state is not None:
+            cookie_str, cookie_dict = (
+                session_state.cookie_str,
+                session_state.cookie_dict,
+            )
+            playwright_page = None
+        else:
+            cookie_str, cookie_dict = utils.convert_cookies(
+                await self.browser_context.cookies()
+            )
+            playwright_page = self.context_page
         bilibili_client_obj = BilibiliClient(
             proxies=httpx_proxy,
+            ip_pool=ip_pool,
             headers={
                 "User-Agent": self.user_agent,
                 "Cookie": cookie_str,
@@ -616,7 +1030,7 @@ class BilibiliCrawler(AbstractCrawler):
                 "Referer": "https://www.bilibili.com",
                 "Content-Type": "application/json;charset=UTF-8",
             },
-            playwright_page=self.context_page,
+            playwright_page=playwright_page,
             cookie_dict=cookie_dict,
         )
         return bilibili_client_obj
@@ -640,6 +1054,22 @@ class BilibiliCrawler(AbstractCrawler):
         }
         return playwright_proxy, httpx_proxy
 
+    async def create_browser_context(
+        self, chromium: BrowserType, stealth_path: str
+    ) -> BrowserContext:
+        """
+        启动浏览器并注入反检测脚本，浏览器上下文池中没有可复用的上下文时调用
+        :param chromium: chromium browser
+        :param stealth_path: stealth.min.js 的路径
+        :return: browser context
+        """
+        browser_context = await self.launch_browser(
+            chromium, None, self.user_agent, headless=config.HEADLESS
+        )
+        # stealth.min.js is a js script to prevent the website from detecting the crawler.
+        await browser_context.add_init_script(path=stealth_path)
+        return browser_context
+
     async def launch_browser(
         self,
         chromium: BrowserType,
@@ -716,8 +1146,14 @@ class BilibiliCrawler(AbstractCrawler):
             )
             return
 
-        content = await self.bili_client.get_video_media(video_url)
-        if content is None:
-            return
         extension_file_name = f"video.mp4"
-        await bilibili_store.store_video(aid, content, extension_file_name)
+        await self.media_stage.submit(
+            video_url,
+            functools.partial(
+                bilibili_store.store_video_stream,
+                aid,
+                video_url,
+                functools.partial(self.bili_client.download_video_media, video_url),
+                extension_file_name,
+            ),
+        )
@@ -4,10 +4,20 @@ import json
 import urllib.parse
 from typing import Any, Callable, Dict, Optional
 
+import config
 import requests
 from base.base_crawler import AbstractApiClient
 from playwright.async_api import BrowserContext
 from tools import utils
+from tools.async_pipeline import BoundedTaskGroup
+from tools.pagination import iter_cursor_pages
+from tools.rate_limiter import (
+    THROTTLE_STATUS_CODES,
+    crawl_sleep,
+    get_rate_limiter,
+    mark_transient_failure,
+)
+from tools.retry_policy import retry_request
 from var import request_keyword_var
 
 from .exception import *
@@ -83,19 +93,30 @@ class DOUYINClient(AbstractApiClient):
         )
         params["a_bogus"] = a_bogus
 
+    @retry_request("dy")
     async def request(self, method, url, **kwargs):
         response = None
+        rate_limiter = get_rate_limiter("dy", url, self.proxies)
+        await rate_limiter.acquire()
+        # requests 是同步库，放到线程中执行，避免阻塞事件循环
         if method == "GET":
-            response = requests.request(method, url, **kwargs)
+            response = await asyncio.to_thread(requests.request, method, url, **kwargs)
         elif method == "POST":
-            response = requests.request(method, url, **kwargs)
+            response = await asyncio.to_thread(requests.request, method, url, **kwargs)
         try:
+            if response.status_code in THROTTLE_STATUS_CODES:
+                rate_limiter.report_throttled(f"status {response.status_code}")
+            elif response.status_code >= 500:
+                mark_transient_failure(f"status {response.status_code}")
             if response.text == "" or response.text == "blocked":
                 utils.logger.error(
                     f"request params incrr, response.text: {response.text}"
                 )
+                rate_limiter.report_throttled("blocked")
                 raise Exception("account blocked")
-            return response.json()
+            data = response.json()
+            rate_limiter.report_success()
+            return data
         except Exception as e:
             raise DataFetchError(f"{e}, {response.text}")
 
@@ -250,6 +271,18 @@ class DOUYINClient(AbstractApiClient):
         result = []
         comments_has_more = 1
         comments_cursor = 0
+        # 二级评论在后台并发展开，一级评论继续翻页，展开完成的二级评论同样计入 max_count
+        sub_comment_group = BoundedTaskGroup(
+            config.SUB_COMMENT_CONCURRENCY, name=f"douyin_sub_comments_{aweme_id}"
+        )
+
+        async def expand_sub_comments(comment_id: str):
+            result.extend(
+                await self.get_comment_all_sub_comments(
+                    aweme_id, comment_id, crawl_interval, callback
+                )
+            )
+
         while comments_has_more and len(result) < max_count:
             comments_res = await self.get_aweme_comments(aweme_id, comments_cursor)
             comments_has_more = comments_res.get("has_more", 0)
@@ -263,32 +296,46 @@ class DOUYINClient(AbstractApiClient):
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(aweme_id, comments)
 
-            await asyncio.sleep(crawl_interval)
-            if not is_fetch_sub_comments:
-                continue
-            # 获取二级评论
-            for comment in comments:
-                reply_comment_total = comment.get("reply_comment_total")
-
-                if reply_comment_total > 0:
-                    comment_id = comment.get("cid")
-                    sub_comments_has_more = 1
-                    sub_comments_cursor = 0
+            if is_fetch_sub_comments:
+                for comment in comments:
+                    if (comment.get("reply_comment_total") or 0) > 0:
+                        sub_comment_group.spawn(expand_sub_comments(comment.get("cid")))
+            await crawl_sleep(crawl_interval)
+        await sub_comment_group.wait()
+        return result
 
-                    while sub_comments_has_more:
-                        sub_comments_res = await self.get_sub_comments(
-                            comment_id, sub_comments_cursor
-                        )
-                        sub_comments_has_more = sub_comments_res.get("has_more", 0)
-                        sub_comments_cursor = sub_comments_res.get("cursor", 0)
-                        sub_comments = sub_comments_res.get("comments", [])
+    async def get_comment_all_sub_comments(
+        self,
+        aweme_id: str,
+        comment_id: str,
+        crawl_interval: float = 1.0,
+        callback: Optional[Callable] = None,
+    ):
+        """
+        获取一条一级评论下的所有二级评论
+        :param aweme_id: 帖子ID
+        :param comment_id: 一级评论ID
+        :param crawl_interval: 抓取间隔
+        :param callback: 回调函数，用于处理抓取到的评论
+        :return: 二级评论列表
+        """
+        result = []
+        sub_comments_has_more = 1
+        sub_comments_cursor = 0
+        while sub_comments_has_more:
+            sub_comments_res = await self.get_sub_comments(
+                comment_id, sub_comments_cursor
+            )
+            sub_comments_has_more = sub_comments_res.get("has_more", 0)
+            sub_comments_cursor = sub_comments_res.get("cursor", 0)
+            sub_comments = sub_comments_res.get("comments", [])
 
-                        if not sub_comments:
-                            continue
-                        result.extend(sub_comments)
-                        if callback:  # 如果有回调函数，就执行回调函数
-                            await callback(aweme_id, sub_comments)
-                        await asyncio.sleep(crawl_interval)
+            if not sub_comments:
+                continue
+            result.extend(sub_comments)
+            if callback:  # 如果有回调函数，就执行回调函数
+                await callback(aweme_id, sub_comments)
+            await crawl_sleep(crawl_interval)
         return result
 
     async def get_user_info(self, sec_user_id: str):
@@ -318,16 +365,16 @@ class DOUYINClient(AbstractApiClient):
     async def get_all_user_aweme_posts(
         self, sec_user_id: str, callback: Optional[Callable] = None
     ):
-        posts_has_more = 1
-        max_cursor = ""
         result = []
-        while posts_has_more == 1:
-            aweme_post_res = await self.get_user_aweme_posts(sec_user_id, max_cursor)
-            posts_has_more = aweme_post_res.get("has_more", 0)
-            max_cursor = aweme_post_res.get("max_cursor")
+        # 处理当前页的同时预取下一页
+        pages = iter_cursor_pages(
+            lambda max_cursor: self.get_user_aweme_posts(sec_user_id, max_cursor),
+            lambda res: res.get("max_cursor") if res.get("has_more", 0) == 1 else None,
+        )
+        async for aweme_post_res in pages:
             aweme_list = (
                 aweme_post_res.get("aweme_list")
-                if aweme_post_res.get("aweme_list")
+                if aweme_post_res and aweme_post_res.get("aweme_list")
                 else []
             )
             utils.logger.info(
@@ -6,10 +6,13 @@ from typing import Any, Dict, List, Optional, Tuple
 
 import config
 from base.base_crawler import AbstractCrawler
-from playwright.async_api import BrowserContext, BrowserType, Page, async_playwright
+from playwright.async_api import BrowserContext, BrowserType, Page
 from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
 from store import douyin as douyin_store
 from tools import utils
+from tools.async_pipeline import BoundedTaskGroup
+from tools.browser_pool import browser_pool_key, get_browser_pool
+from tools.circuit_breaker import CircuitOpenError
 from var import crawler_type_var, source_keyword_var
 
 from .client import DOUYINClient
@@ -37,16 +40,15 @@ class DouYinCrawler(AbstractCrawler):
                 ip_proxy_info
             )
 
-        async with async_playwright() as playwright:
-            # Launch a browser context.
-            chromium = playwright.chromium
-            self.browser_context = await self.launch_browser(
-                chromium, None, user_agent=None, headless=config.HEADLESS
-            )
-            # stealth.min.js is a js script to prevent the website from detecting the crawler.
-            await self.browser_context.add_init_script(path="libs/stealth.min.js")
-            self.context_page = await self.browser_context.new_page()
-            await self.context_page.goto(self.index_url)
+        # 从浏览器上下文池租用已经打开首页的浏览器，池中没有时才启动新的浏览器
+        async with get_browser_pool().lease(
+            browser_pool_key(config.PLATFORM),
+            self.create_browser_context,
+            self.index_url,
+            exclusive=config.SAVE_LOGIN_STATE,
+        ) as pooled_browser:
+            self.browser_context = pooled_browser.browser_context
+            self.context_page = pooled_browser.page
 
             self.dy_client = await self.create_douyin_client(httpx_proxy_format)
             if not await self.dy_client.pong(browser_context=self.browser_context):
@@ -77,8 +79,8 @@ class DouYinCrawler(AbstractCrawler):
     async def search(self) -> None:
         utils.logger.info("[DouYinCrawler.search] Begin search douyin keywords")
         dy_limit_count = 10  # douyin limit page fixed value
-        if config.CRAWLER_MAX_NOTES_COUNT < dy_limit_count:
-            config.CRAWLER_MAX_NOTES_COUNT = dy_limit_count
+        # 不修改全局配置，避免影响同一进程内的其他任务
+        max_notes_count = max(config.CRAWLER_MAX_NOTES_COUNT, dy_limit_count)
         start_page = config.START_PAGE  # start page number
         for keyword in config.KEYWORDS.split(","):
             source_keyword_var.set(keyword)
@@ -86,9 +88,7 @@ class DouYinCrawler(AbstractCrawler):
             aweme_list: List[str] = []
             page = 0
             dy_search_id = ""
-            while (
-                page - start_page + 1
-            ) * dy_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
+            while (page - start_page + 1) * dy_limit_count <= max_notes_count:
                 if page < start_page:
                     utils.logger.info(f"[DouYinCrawler.search] Skip {page}")
                     page += 1
@@ -156,6 +156,11 @@ class DouYinCrawler(AbstractCrawler):
         async with semaphore:
             try:
                 return await self.dy_client.get_video_by_id(aweme_id)
+            except CircuitOpenError as ex:
+                utils.logger.error(
+                    f"[DouYinCrawler.get_aweme_detail] circuit is open, skip: {ex}"
+                )
+                return None
             except DataFetchError as ex:
                 utils.logger.error(
                     f"[DouYinCrawler.get_aweme_detail] Get aweme detail error: {ex}"
@@ -218,19 +223,33 @@ class DouYinCrawler(AbstractCrawler):
             if creator_info:
                 await douyin_store.save_creator(user_id, creator=creator_info)
 
+            # 每一页的视频立即交给详情 worker，翻页不等待详情爬取完成
+            detail_semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+            detail_group = BoundedTaskGroup(
+                config.CREATOR_PAGE_CONCURRENCY, name=f"douyin_creator_{user_id}"
+            )
+
+            async def hand_off_videos(video_list: List[Dict]):
+                detail_group.spawn(
+                    self.fetch_creator_video_detail(video_list, detail_semaphore)
+                )
+
             # Get all video information of the creator
             all_video_list = await self.dy_client.get_all_user_aweme_posts(
-                sec_user_id=user_id, callback=self.fetch_creator_video_detail
+                sec_user_id=user_id, callback=hand_off_videos
             )
+            await detail_group.wait()
 
             video_ids = [video_item.get("aweme_id") for video_item in all_video_list]
             await self.batch_get_note_comments(video_ids)
 
-    async def fetch_creator_video_detail(self, video_list: List[Dict]):
+    async def fetch_creator_video_detail(
+        self, video_list: List[Dict], semaphore: Optional[asyncio.Semaphore] = None
+    ):
         """
         Concurrently obtain the specified post list and save the data
         """
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = semaphore or asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
         task_list = [
             self.get_aweme_detail(post_item.get("aweme_id"), semaphore)
             for post_item in video_list
@@ -276,6 +295,19 @@ class DouYinCrawler(AbstractCrawler):
         )
         return douyin_client
 
+    async def create_browser_context(self, chromium: BrowserType) -> BrowserContext:
+        """
+        启动浏览器并注入反检测脚本，浏览器上下文池中没有可复用的上下文时调用
+        :param chromium:
+        :return:
+        """
+        browser_context = await self.launch_browser(
+            chromium, None, user_agent=None, headless=config.HEADLESS
+        )
+        # stealth.min.js is a js script to prevent the website from detecting the crawler.
+        await browser_context.add_init_script(path="libs/stealth.min.js")
+        return browser_context
+
     async def launch_browser(
         self,
         chromium: BrowserType,
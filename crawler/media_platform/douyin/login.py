@@ -21,7 +21,7 @@ class DouYinLogin(AbstractLogin):
         login_phone: Optional[str] = "",
         cookie_str: Optional[str] = "",
     ):
-        config.LOGIN_TYPE = login_type
+        self.login_type = login_type
         self.browser_context = browser_context
         self.context_page = context_page
         self.login_phone = login_phone
@@ -38,11 +38,11 @@ class DouYinLogin(AbstractLogin):
         await self.popup_login_dialog()
 
         # select login type
-        if config.LOGIN_TYPE == "qrcode":
+        if self.login_type == "qrcode":
             await self.login_by_qrcode()
-        elif config.LOGIN_TYPE == "phone":
+        elif self.login_type == "phone":
             await self.login_by_mobile()
-        elif config.LOGIN_TYPE == "cookie":
+        elif self.login_type == "cookie":
             await self.login_by_cookies()
         else:
             raise ValueError(
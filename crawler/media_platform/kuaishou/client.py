@@ -1,13 +1,17 @@
-import asyncio
 import json
 from typing import Any, Callable, Dict, List, Optional
 from urllib.parse import urlencode
 
 import config
-import httpx
 from base.base_crawler import AbstractApiClient
 from playwright.async_api import BrowserContext, Page
+from proxy.proxy_ip_pool import ProxyIpPool
+from proxy.proxy_transport import ProxyTransport
 from tools import utils
+from tools.account_pool import AccountPool
+from tools.pagination import iter_cursor_pages
+from tools.rate_limiter import THROTTLE_STATUS_CODES, crawl_sleep
+from tools.retry_policy import retry_request
 
 from .exception import DataFetchError
 from .graphql import KuaiShouGraphQL
@@ -18,12 +22,23 @@ class KuaiShouClient(AbstractApiClient):
         self,
         timeout=10,
         proxies=None,
+        ip_pool: Optional[ProxyIpPool] = None,
         *,
         headers: Dict[str, str],
         playwright_page: Page,
         cookie_dict: Dict[str, str],
     ):
         self.proxies = proxies
+        # 浏览器登录的账号和 PLATFORM_ACCOUNT_COOKIES 中配置的账号轮流使用
+        self.account_pool = AccountPool("ks", headers.get("Cookie", ""), cookie_dict)
+        self.account_pool.set_pong_callback(self.pong)
+        # 每次请求从代理池租用代理，没有代理池时使用固定代理
+        self.transport = ProxyTransport(
+            "ks",
+            ip_pool=ip_pool,
+            default_proxies=proxies,
+            account_pool=self.account_pool,
+        )
         self.timeout = timeout
         self.headers = headers
         self._host = "https://www.kuaishou.com/graphql"
@@ -31,28 +46,56 @@ class KuaiShouClient(AbstractApiClient):
         self.cookie_dict = cookie_dict
         self.graphql = KuaiShouGraphQL()
 
+    @retry_request("ks")
     async def request(self, method, url, **kwargs) -> Any:
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
-            response = await client.request(method, url, timeout=self.timeout, **kwargs)
+        # 快手所有接口都走同一个 graphql 地址，按 operationName 区分接口类型
+        lease = await self.transport.lease(f"{url}/{self._get_operation_name(kwargs)}")
+        response = await lease.request(method, url, timeout=self.timeout, **kwargs)
+        if response.status_code in THROTTLE_STATUS_CODES:
+            lease.report_throttled(f"status {response.status_code}")
         data: Dict = response.json()
         if data.get("errors"):
             raise DataFetchError(data.get("errors", "unkonw error"))
         else:
+            lease.report_success()
             return data.get("data", {})
 
+    @staticmethod
+    def _get_operation_name(request_kwargs: Dict) -> str:
+        try:
+            return json.loads(request_kwargs.get("data") or "{}").get(
+                "operationName", ""
+            )
+        except (TypeError, ValueError):
+            return ""
+
     async def get(self, uri: str, params=None) -> Dict:
-        final_uri = uri
-        if isinstance(params, dict):
-            final_uri = f"{uri}?" f"{urlencode(params)}"
-        return await self.request(
-            method="GET", url=f"{self._host}{final_uri}", headers=self.headers
-        )
+        # 每个请求租用一个账号，签名和发送使用同一个账号
+        async with self.account_pool.lease():
+            final_uri = uri
+            if isinstance(params, dict):
+                final_uri = f"{uri}?" f"{urlencode(params)}"
+            return await self.request(
+                method="GET", url=f"{self._host}{final_uri}", headers=self.headers
+            )
 
     async def post(self, uri: str, data: dict) -> Dict:
-        json_str = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
-        return await self.request(
-            method="POST", url=f"{self._host}{uri}", data=json_str, headers=self.headers
-        )
+        # 每个请求租用一个账号，签名和发送使用同一个账号
+        async with self.account_pool.lease():
+            json_str = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+            return await self.request(
+                method="POST",
+                url=f"{self._host}{uri}",
+                data=json_str,
+                headers=self.headers,
+            )
+
+    async def close(self):
+        """
+        关闭各代理的 httpx 连接池，爬虫结束时调用
+        :return:
+        """
+        await self.transport.aclose()
 
     async def pong(self) -> bool:
         """get a note to check if login state is ok"""
@@ -80,6 +123,7 @@ class KuaiShouClient(AbstractApiClient):
         cookie_str, cookie_dict = utils.convert_cookies(await browser_context.cookies())
         self.headers["Cookie"] = cookie_str
         self.cookie_dict = cookie_dict
+        self.account_pool.update_primary(cookie_str, cookie_dict)
 
     async def search_info_by_keyword(
         self, keyword: str, pcursor: str, search_session_id: str = ""
@@ -193,7 +237,7 @@ class KuaiShouClient(AbstractApiClient):
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(photo_id, comments)
             result.extend(comments)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             sub_comments = await self.get_comments_all_sub_comments(
                 comments, photo_id, crawl_interval, callback
             )
@@ -246,7 +290,7 @@ class KuaiShouClient(AbstractApiClient):
                 comments = vision_sub_comment_list.get("subComments", {})
                 if callback:
                     await callback(photo_id, comments)
-                await asyncio.sleep(crawl_interval)
+                await crawl_sleep(crawl_interval)
                 result.extend(comments)
         return result
 
@@ -275,10 +319,18 @@ class KuaiShouClient(AbstractApiClient):
 
         """
         result = []
-        pcursor = ""
 
-        while pcursor != "no_more":
-            videos_res = await self.get_video_by_creater(user_id, pcursor)
+        def next_pcursor(videos_res: Dict) -> Optional[str]:
+            pcursor = videos_res.get("visionProfilePhotoList", {}).get("pcursor", "")
+            return None if pcursor == "no_more" else pcursor
+
+        # 处理当前页的同时预取下一页
+        pages = iter_cursor_pages(
+            lambda pcursor: self.get_video_by_creater(user_id, pcursor),
+            next_pcursor,
+            crawl_interval=crawl_interval,
+        )
+        async for videos_res in pages:
             if not videos_res:
                 utils.logger.error(
                     f"[KuaiShouClient.get_all_videos_by_creator] The current creator may have been banned by ks, so they cannot access the data."
@@ -286,8 +338,6 @@ class KuaiShouClient(AbstractApiClient):
                 break
 
             vision_profile_photo_list = videos_res.get("visionProfilePhotoList", {})
-            pcursor = vision_profile_photo_list.get("pcursor", "")
-
             videos = vision_profile_photo_list.get("feeds", [])
             utils.logger.info(
                 f"[KuaiShouClient.get_all_videos_by_creator] got user_id:{user_id} videos len : {len(videos)}"
@@ -295,6 +345,5 @@ class KuaiShouClient(AbstractApiClient):
 
             if callback:
                 await callback(videos)
-            await asyncio.sleep(crawl_interval)
             result.extend(videos)
         return result
@@ -1,17 +1,19 @@
 import asyncio
 import os
 import random
-import time
 from asyncio import Task
 from typing import Dict, List, Optional, Tuple
 
 import config
 from base.base_crawler import AbstractCrawler
-from playwright.async_api import BrowserContext, BrowserType, Page, async_playwright
-from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
+from playwright.async_api import BrowserContext, BrowserType, Page
+from proxy.proxy_ip_pool import IpInfoModel, ProxyIpPool, create_ip_pool
 from store import kuaishou as kuaishou_store
 from tools import utils
-from var import comment_tasks_var, crawler_type_var, source_keyword_var
+from tools.async_pipeline import BoundedTaskGroup
+from tools.browser_pool import browser_pool_key, get_browser_pool
+from tools.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from var import crawler_type_var, source_keyword_var
 
 from .client import KuaiShouClient
 from .exception import DataFetchError
@@ -29,6 +31,7 @@ class KuaishouCrawler(AbstractCrawler):
 
     async def start(self):
         playwright_proxy_format, httpx_proxy_format = None, None
+        ip_proxy_pool: Optional[ProxyIpPool] = None
         if config.ENABLE_IP_PROXY:
             ip_proxy_pool = await create_ip_pool(
                 config.IP_PROXY_POOL_COUNT, enable_validate_ip=True
@@ -38,52 +41,60 @@ class KuaishouCrawler(AbstractCrawler):
                 ip_proxy_info
             )
 
-        async with async_playwright() as playwright:
-            # Launch a browser context.
-            chromium = playwright.chromium
-            self.browser_context = await self.launch_browser(
-                chromium, None, self.user_agent, headless=config.HEADLESS
-            )
-            # stealth.min.js is a js script to prevent the website from detecting the crawler.
-            await self.browser_context.add_init_script(path="libs/stealth.min.js")
-            self.context_page = await self.browser_context.new_page()
-            await self.context_page.goto(f"{self.index_url}?isHome=1")
+        # 从浏览器上下文池租用已经打开首页的浏览器，池中没有时才启动新的浏览器
+        async with get_browser_pool().lease(
+            browser_pool_key(config.PLATFORM),
+            self.create_browser_context,
+            f"{self.index_url}?isHome=1",
+            exclusive=config.SAVE_LOGIN_STATE,
+        ) as pooled_browser:
+            self.browser_context = pooled_browser.browser_context
+            self.context_page = pooled_browser.page
 
             # Create a client to interact with the kuaishou website.
-            self.ks_client = await self.create_ks_client(httpx_proxy_format)
-            if not await self.ks_client.pong():
-                login_obj = KuaishouLogin(
-                    login_type=config.LOGIN_TYPE,
-                    login_phone=httpx_proxy_format,
-                    browser_context=self.browser_context,
-                    context_page=self.context_page,
-                    cookie_str=config.COOKIES,
-                )
-                await login_obj.begin()
-                await self.ks_client.update_cookies(
-                    browser_context=self.browser_context
-                )
+            self.ks_client = await self.create_ks_client(
+                httpx_proxy_format, ip_proxy_pool
+            )
+            try:
+                if not await self.ks_client.pong():
+                    login_obj = KuaishouLogin(
+                        login_type=config.LOGIN_TYPE,
+                        login_phone=httpx_proxy_format,
+                        browser_context=self.browser_context,
+                        context_page=self.context_page,
+                        cookie_str=config.COOKIES,
+                    )
+                    await login_obj.begin()
+                    await self.ks_client.update_cookies(
+                        browser_context=self.browser_context
+                    )
+                get_circuit_breaker("ks").set_refresh_callback(self.refresh_session)
 
-            crawler_type_var.set(config.CRAWLER_TYPE)
-            if config.CRAWLER_TYPE == "search":
-                # Search for videos and retrieve their comment information.
-                await self.search()
-            elif config.CRAWLER_TYPE == "detail":
-                # Get the information and comments of the specified post
-                await self.get_specified_videos()
-            elif config.CRAWLER_TYPE == "creator":
-                # Get creator's information and their videos and comments
-                await self.get_creators_and_videos()
-            else:
-                pass
-
-            utils.logger.info("[KuaishouCrawler.start] Kuaishou Crawler finished ...")
+                crawler_type_var.set(config.CRAWLER_TYPE)
+                if config.CRAWLER_TYPE == "search":
+                    # Search for videos and retrieve their comment information.
+                    await self.search()
+                elif config.CRAWLER_TYPE == "detail":
+                    # Get the information and comments of the specified post
+                    await self.get_specified_videos()
+                elif config.CRAWLER_TYPE == "creator":
+                    # Get creator's information and their videos and comments
+                    await self.get_creators_and_videos()
+                else:
+                    pass
+
+                utils.logger.info(
+                    "[KuaishouCrawler.start] Kuaishou Crawler finished ..."
+                )
+            finally:
+                # 关闭各代理的 httpx 连接池
+                await self.ks_client.close()
 
     async def search(self):
         utils.logger.info("[KuaishouCrawler.search] Begin search kuaishou keywords")
         ks_limit_count = 20  # kuaishou limit page fixed value
-        if config.CRAWLER_MAX_NOTES_COUNT < ks_limit_count:
-            config.CRAWLER_MAX_NOTES_COUNT = ks_limit_count
+        # 不修改全局配置，避免影响同一进程内的其他任务
+        max_notes_count = max(config.CRAWLER_MAX_NOTES_COUNT, ks_limit_count)
         start_page = config.START_PAGE
         for keyword in config.KEYWORDS.split(","):
             search_session_id = ""
@@ -92,9 +103,7 @@ class KuaishouCrawler(AbstractCrawler):
                 f"[KuaishouCrawler.search] Current search keyword: {keyword}"
             )
             page = 1
-            while (
-                page - start_page + 1
-            ) * ks_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
+            while (page - start_page + 1) * ks_limit_count <= max_notes_count:
                 if page < start_page:
                     utils.logger.info(f"[KuaishouCrawler.search] Skip page: {page}")
                     page += 1
@@ -153,6 +162,11 @@ class KuaishouCrawler(AbstractCrawler):
                     f"[KuaishouCrawler.get_video_info_task] Get video_id:{video_id} info result: {result} ..."
                 )
                 return result.get("visionVideoDetail")
+            except CircuitOpenError as ex:
+                utils.logger.error(
+                    f"[KuaishouCrawler.get_video_info_task] circuit is open, skip: {ex}"
+                )
+                return None
             except DataFetchError as ex:
                 utils.logger.error(
                     f"[KuaishouCrawler.get_video_info_task] Get video detail error: {ex}"
@@ -187,7 +201,6 @@ class KuaishouCrawler(AbstractCrawler):
             )
             task_list.append(task)
 
-        comment_tasks_var.set(task_list)
         await asyncio.gather(*task_list)
 
     async def get_comments(self, video_id: str, semaphore: asyncio.Semaphore):
@@ -208,6 +221,11 @@ class KuaishouCrawler(AbstractCrawler):
                     callback=kuaishou_store.batch_update_ks_video_comments,
                     max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
                 )
+            except CircuitOpenError as ex:
+                # 熔断已经打开，不再重复 trip
+                utils.logger.error(
+                    f"[KuaishouCrawler.get_comments] circuit is open, skip video_id: {video_id}, err: {ex}"
+                )
             except DataFetchError as ex:
                 utils.logger.error(
                     f"[KuaishouCrawler.get_comments] get video_id: {video_id} comment error: {ex}"
@@ -216,16 +234,17 @@ class KuaishouCrawler(AbstractCrawler):
                 utils.logger.error(
                     f"[KuaishouCrawler.get_comments] may be been blocked, err:{e}"
                 )
-                # use time.sleeep block main coroutine instead of asyncio.sleep and cacel running comment task
-                # maybe kuaishou block our request, we will take a nap and update the cookie again
-                current_running_tasks = comment_tasks_var.get()
-                for task in current_running_tasks:
-                    task.cancel()
-                time.sleep(20)
-                await self.context_page.goto(f"{self.index_url}?isHome=1")
-                await self.ks_client.update_cookies(
-                    browser_context=self.browser_context
-                )
+                # maybe kuaishou block our request, pause only kuaishou requests for a while,
+                # the other comment tasks wait on the breaker and the cookie is refreshed before resuming
+                get_circuit_breaker("ks").trip(f"get comments error: {e}")
+
+    async def refresh_session(self):
+        """
+        熔断冷却结束后重新打开首页并刷新 cookie
+        :return:
+        """
+        await self.context_page.goto(f"{self.index_url}?isHome=1")
+        await self.ks_client.update_cookies(browser_context=self.browser_context)
 
     @staticmethod
     def format_proxy_info(
@@ -242,7 +261,9 @@ class KuaishouCrawler(AbstractCrawler):
         }
         return playwright_proxy, httpx_proxy
 
-    async def create_ks_client(self, httpx_proxy: Optional[str]) -> KuaiShouClient:
+    async def create_ks_client(
+        self, httpx_proxy: Optional[str], ip_pool: Optional[ProxyIpPool] = None
+    ) -> KuaiShouClient:
         """Create ks client"""
         utils.logger.info(
             "[KuaishouCrawler.create_ks_client] Begin create kuaishou API client ..."
@@ -252,6 +273,7 @@ class KuaishouCrawler(AbstractCrawler):
         )
         ks_client_obj = KuaiShouClient(
             proxies=httpx_proxy,
+            ip_pool=ip_pool,
             headers={
                 "User-Agent": self.user_agent,
                 "Cookie": cookie_str,
@@ -264,6 +286,19 @@ class KuaishouCrawler(AbstractCrawler):
         )
         return ks_client_obj
 
+    async def create_browser_context(self, chromium: BrowserType) -> BrowserContext:
+        """
+        启动浏览器并注入反检测脚本，浏览器上下文池中没有可复用的上下文时调用
+        :param chromium:
+        :return:
+        """
+        browser_context = await self.launch_browser(
+            chromium, None, self.user_agent, headless=config.HEADLESS
+        )
+        # stealth.min.js is a js script to prevent the website from detecting the crawler.
+        await browser_context.add_init_script(path="libs/stealth.min.js")
+        return browser_context
+
     async def launch_browser(
         self,
         chromium: BrowserType,
@@ -306,23 +341,37 @@ class KuaishouCrawler(AbstractCrawler):
             if createor_info:
                 await kuaishou_store.save_creator(user_id, creator=createor_info)
 
+            # 每一页的视频立即交给详情 worker，翻页不等待详情爬取完成
+            detail_semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+            detail_group = BoundedTaskGroup(
+                config.CREATOR_PAGE_CONCURRENCY, name=f"kuaishou_creator_{user_id}"
+            )
+
+            async def hand_off_videos(video_list: List[Dict]):
+                detail_group.spawn(
+                    self.fetch_creator_video_detail(video_list, detail_semaphore)
+                )
+
             # Get all video information of the creator
             all_video_list = await self.ks_client.get_all_videos_by_creator(
                 user_id=user_id,
                 crawl_interval=random.random(),
-                callback=self.fetch_creator_video_detail,
+                callback=hand_off_videos,
             )
+            await detail_group.wait()
 
             video_ids = [
                 video_item.get("photo", {}).get("id") for video_item in all_video_list
             ]
             await self.batch_get_video_comments(video_ids)
 
-    async def fetch_creator_video_detail(self, video_list: List[Dict]):
+    async def fetch_creator_video_detail(
+        self, video_list: List[Dict], semaphore: Optional[asyncio.Semaphore] = None
+    ):
         """
         Concurrently obtain the specified post list and save the data
         """
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = semaphore or asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
         task_list = [
             self.get_video_info_task(post_item.get("photo", {}).get("id"), semaphore)
             for post_item in video_list
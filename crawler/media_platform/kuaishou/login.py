@@ -3,7 +3,6 @@ import functools
 import sys
 from typing import Optional
 
-import config
 from base.base_crawler import AbstractLogin
 from playwright.async_api import BrowserContext, Page
 from tenacity import RetryError, retry, retry_if_result, stop_after_attempt, wait_fixed
@@ -19,7 +18,7 @@ class KuaishouLogin(AbstractLogin):
         login_phone: Optional[str] = "",
         cookie_str: str = "",
     ):
-        config.LOGIN_TYPE = login_type
+        self.login_type = login_type
         self.browser_context = browser_context
         self.context_page = context_page
         self.login_phone = login_phone
@@ -28,11 +27,11 @@ class KuaishouLogin(AbstractLogin):
     async def begin(self):
         """Start login xiaohongshu"""
         utils.logger.info("[KuaishouLogin.begin] Begin login kuaishou ...")
-        if config.LOGIN_TYPE == "qrcode":
+        if self.login_type == "qrcode":
             await self.login_by_qrcode()
-        elif config.LOGIN_TYPE == "phone":
+        elif self.login_type == "phone":
             await self.login_by_mobile()
-        elif config.LOGIN_TYPE == "cookie":
+        elif self.login_type == "cookie":
             await self.login_by_cookies()
         else:
             raise ValueError(
@@ -4,13 +4,14 @@ from typing import Any, Callable, Dict, List, Optional, Union
 from urllib.parse import urlencode
 
 import config
-import httpx
 from base.base_crawler import AbstractApiClient
 from model.m_baidu_tieba import TiebaComment, TiebaCreator, TiebaNote
 from playwright.async_api import BrowserContext
 from proxy.proxy_ip_pool import ProxyIpPool
-from tenacity import RetryError, retry, stop_after_attempt, wait_fixed
+from proxy.proxy_transport import ProxyTransport
 from tools import utils
+from tools.rate_limiter import THROTTLE_STATUS_CODES, crawl_sleep
+from tools.retry_policy import retry_request
 
 from .field import SearchNoteType, SearchSortType
 from .help import TieBaExtractor
@@ -32,10 +33,14 @@ class BaiduTieBaClient(AbstractApiClient):
         self._host = "https://tieba.baidu.com"
         self._page_extractor = TieBaExtractor()
         self.default_ip_proxy = default_ip_proxy
+        # 每次请求从代理池租用代理，连续失败的代理会被剔除，重试时自动换到其他 IP
+        self.transport = ProxyTransport(
+            "tieba", ip_pool=ip_pool, default_proxies=default_ip_proxy
+        )
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+    @retry_request("tieba")
     async def request(
-        self, method, url, return_ori_content=False, proxies=None, **kwargs
+        self, method, url, return_ori_content=False, **kwargs
     ) -> Union[str, Any]:
         """
         封装httpx的公共请求方法，对请求响应做一些处理
@@ -43,17 +48,20 @@ class BaiduTieBaClient(AbstractApiClient):
             method: 请求方法
             url: 请求的URL
             return_ori_content: 是否返回原始内容
-            proxies: 代理IP
             **kwargs: 其他请求参数，例如请求头、请求体等
 
         Returns:
 
         """
-        actual_proxies = proxies if proxies else self.default_ip_proxy
-        async with httpx.AsyncClient(proxies=actual_proxies) as client:
-            response = await client.request(
-                method, url, timeout=self.timeout, headers=self.headers, **kwargs
-            )
+        lease = await self.transport.lease(url)
+        response = await lease.request(
+            method, url, timeout=self.timeout, headers=self.headers, **kwargs
+        )
+
+        if response.status_code in THROTTLE_STATUS_CODES or response.text == "blocked":
+            lease.report_throttled(f"status {response.status_code}")
+        elif response.status_code == 200:
+            lease.report_success()
 
         if response.status_code != 200:
             utils.logger.error(
@@ -89,34 +97,13 @@ class BaiduTieBaClient(AbstractApiClient):
         final_uri = uri
         if isinstance(params, dict):
             final_uri = f"{uri}?" f"{urlencode(params)}"
-        try:
-            res = await self.request(
-                method="GET",
-                url=f"{self._host}{final_uri}",
-                return_ori_content=return_ori_content,
-                **kwargs,
-            )
-            return res
-        except RetryError as e:
-            if self.ip_pool:
-                proxie_model = await self.ip_pool.get_proxy()
-                _, proxies = utils.format_proxy_info(proxie_model)
-                res = await self.request(
-                    method="GET",
-                    url=f"{self._host}{final_uri}",
-                    return_ori_content=return_ori_content,
-                    proxies=proxies,
-                    **kwargs,
-                )
-                self.default_ip_proxy = proxies
-                return res
-
-            utils.logger.error(
-                f"[BaiduTieBaClient.get] 达到了最大重试次数，IP已经被Block，请尝试更换新的IP代理: {e}"
-            )
-            raise Exception(
-                f"[BaiduTieBaClient.get] 达到了最大重试次数，IP已经被Block，请尝试更换新的IP代理: {e}"
-            )
+        # 开启代理池时每次重试都已经换过代理，达到最大重试次数后由 request 记录日志并抛出原始异常
+        return await self.request(
+            method="GET",
+            url=f"{self._host}{final_uri}",
+            return_ori_content=return_ori_content,
+            **kwargs,
+        )
 
     async def post(self, uri: str, data: dict, **kwargs) -> Dict:
         """
@@ -133,6 +120,13 @@ class BaiduTieBaClient(AbstractApiClient):
             method="POST", url=f"{self._host}{uri}", data=json_str, **kwargs
         )
 
+    async def close(self):
+        """
+        关闭各代理的 httpx 连接池，爬虫结束时调用
+        :return:
+        """
+        await self.transport.aclose()
+
     async def pong(self) -> bool:
         """
         用于检查登录态是否失效了
@@ -250,7 +244,7 @@ class BaiduTieBaClient(AbstractApiClient):
             await self.get_comments_all_sub_comments(
                 comments, crawl_interval=crawl_interval, callback=callback
             )
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             current_page += 1
         return result
 
@@ -304,7 +298,7 @@ class BaiduTieBaClient(AbstractApiClient):
                 if callback:
                     await callback(parment_comment.note_id, sub_comments)
                 all_sub_comments.extend(sub_comments)
-                await asyncio.sleep(crawl_interval)
+                await crawl_sleep(crawl_interval)
                 current_page += 1
         return all_sub_comments
 
@@ -422,7 +416,7 @@ class BaiduTieBaClient(AbstractApiClient):
             notes = await asyncio.gather(*note_detail_task)
             if callback:
                 await callback(notes)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             result.extend(notes)
             page_number += 1
             total_get_count += page_per_count
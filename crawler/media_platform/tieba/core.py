@@ -11,6 +11,7 @@ from playwright.async_api import BrowserContext, BrowserType, Page, async_playwr
 from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
 from store import tieba as tieba_store
 from tools import utils
+from tools.circuit_breaker import CircuitOpenError
 from tools.crawler_util import format_proxy_info
 from var import crawler_type_var, source_keyword_var
 
@@ -55,21 +56,25 @@ class TieBaCrawler(AbstractCrawler):
             ip_pool=ip_proxy_pool,
             default_ip_proxy=httpx_proxy_format,
         )
-        crawler_type_var.set(config.CRAWLER_TYPE)
-        if config.CRAWLER_TYPE == "search":
-            # Search for notes and retrieve their comment information.
-            await self.search()
-            await self.get_specified_tieba_notes()
-        elif config.CRAWLER_TYPE == "detail":
-            # Get the information and comments of the specified post
-            await self.get_specified_notes()
-        elif config.CRAWLER_TYPE == "creator":
-            # Get creator's information and their notes and comments
-            await self.get_creators_and_notes()
-        else:
-            pass
+        try:
+            crawler_type_var.set(config.CRAWLER_TYPE)
+            if config.CRAWLER_TYPE == "search":
+                # Search for notes and retrieve their comment information.
+                await self.search()
+                await self.get_specified_tieba_notes()
+            elif config.CRAWLER_TYPE == "detail":
+                # Get the information and comments of the specified post
+                await self.get_specified_notes()
+            elif config.CRAWLER_TYPE == "creator":
+                # Get creator's information and their notes and comments
+                await self.get_creators_and_notes()
+            else:
+                pass
 
-        utils.logger.info("[BaiduTieBaCrawler.start] Tieba Crawler finished ...")
+            utils.logger.info("[BaiduTieBaCrawler.start] Tieba Crawler finished ...")
+        finally:
+            # 关闭各代理的 httpx 连接池
+            await self.tieba_client.close()
 
     async def search(self) -> None:
         """
@@ -81,8 +86,8 @@ class TieBaCrawler(AbstractCrawler):
             "[BaiduTieBaCrawler.search] Begin search baidu tieba keywords"
         )
         tieba_limit_count = 10  # tieba limit page fixed value
-        if config.CRAWLER_MAX_NOTES_COUNT < tieba_limit_count:
-            config.CRAWLER_MAX_NOTES_COUNT = tieba_limit_count
+        # 不修改全局配置，避免影响同一进程内的其他任务
+        max_notes_count = max(config.CRAWLER_MAX_NOTES_COUNT, tieba_limit_count)
         start_page = config.START_PAGE
         for keyword in config.KEYWORDS.split(","):
             source_keyword_var.set(keyword)
@@ -90,9 +95,7 @@ class TieBaCrawler(AbstractCrawler):
                 f"[BaiduTieBaCrawler.search] Current search keyword: {keyword}"
             )
             page = 1
-            while (
-                page - start_page + 1
-            ) * tieba_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
+            while (page - start_page + 1) * tieba_limit_count <= max_notes_count:
                 if page < start_page:
                     utils.logger.info(f"[BaiduTieBaCrawler.search] Skip page {page}")
                     page += 1
@@ -135,14 +138,14 @@ class TieBaCrawler(AbstractCrawler):
 
         """
         tieba_limit_count = 50
-        if config.CRAWLER_MAX_NOTES_COUNT < tieba_limit_count:
-            config.CRAWLER_MAX_NOTES_COUNT = tieba_limit_count
+        # 不修改全局配置，避免影响同一进程内的其他任务
+        max_notes_count = max(config.CRAWLER_MAX_NOTES_COUNT, tieba_limit_count)
         for tieba_name in config.TIEBA_NAME_LIST:
             utils.logger.info(
                 f"[BaiduTieBaCrawler.get_specified_tieba_notes] Begin get tieba name: {tieba_name}"
             )
             page_number = 0
-            while page_number <= config.CRAWLER_MAX_NOTES_COUNT:
+            while page_number <= max_notes_count:
                 note_list: List[
                     TiebaNote
                 ] = await self.tieba_client.get_notes_by_tieba_name(
@@ -257,12 +260,17 @@ class TieBaCrawler(AbstractCrawler):
             utils.logger.info(
                 f"[BaiduTieBaCrawler.get_comments] Begin get note id comments {note_detail.note_id}"
             )
-            await self.tieba_client.get_note_all_comments(
-                note_detail=note_detail,
-                crawl_interval=random.random(),
-                callback=tieba_store.batch_update_tieba_note_comments,
-                max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
-            )
+            try:
+                await self.tieba_client.get_note_all_comments(
+                    note_detail=note_detail,
+                    crawl_interval=random.random(),
+                    callback=tieba_store.batch_update_tieba_note_comments,
+                    max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+                )
+            except CircuitOpenError as ex:
+                utils.logger.error(
+                    f"[BaiduTieBaCrawler.get_comments] circuit is open, skip note id {note_detail.note_id}: {ex}"
+                )
 
     async def get_creators_and_notes(self) -> None:
         """
@@ -1,4 +1,3 @@
-import asyncio
 import copy
 import json
 import re
@@ -9,7 +8,14 @@ import config
 import httpx
 from httpx import Response
 from playwright.async_api import BrowserContext, Page
+from proxy.proxy_ip_pool import ProxyIpPool
+from proxy.proxy_transport import ProxyTransport
 from tools import utils
+from tools.account_pool import AccountPool
+from tools.media_download import MediaDownloadResult, download_media_to_file
+from tools.pagination import iter_cursor_pages
+from tools.rate_limiter import THROTTLE_STATUS_CODES, crawl_sleep
+from tools.retry_policy import retry_request
 
 from .exception import DataFetchError
 from .field import SearchType
@@ -20,12 +26,23 @@ class WeiboClient:
         self,
         timeout=10,
         proxies=None,
+        ip_pool: Optional[ProxyIpPool] = None,
         *,
         headers: Dict[str, str],
         playwright_page: Page,
         cookie_dict: Dict[str, str],
     ):
         self.proxies = proxies
+        # 浏览器登录的账号和 PLATFORM_ACCOUNT_COOKIES 中配置的账号轮流使用
+        self.account_pool = AccountPool("wb", headers.get("Cookie", ""), cookie_dict)
+        self.account_pool.set_pong_callback(self.pong)
+        # 每次请求从代理池租用代理，没有代理池时使用固定代理
+        self.transport = ProxyTransport(
+            "wb",
+            ip_pool=ip_pool,
+            default_proxies=proxies,
+            account_pool=self.account_pool,
+        )
         self.timeout = timeout
         self.headers = headers
         self._host = "https://m.weibo.cn"
@@ -33,10 +50,16 @@ class WeiboClient:
         self.cookie_dict = cookie_dict
         self._image_agent_host = "https://i1.wp.com/"
 
+    @retry_request("wb")
     async def request(self, method, url, **kwargs) -> Union[Response, Dict]:
         enable_return_response = kwargs.pop("return_response", False)
-        async with httpx.AsyncClient(proxies=self.proxies) as client:
-            response = await client.request(method, url, timeout=self.timeout, **kwargs)
+        lease = await self.transport.lease(url)
+        response = await lease.request(method, url, timeout=self.timeout, **kwargs)
+
+        if response.status_code in THROTTLE_STATUS_CODES:
+            lease.report_throttled(f"status {response.status_code}")
+        elif response.status_code == 200:
+            lease.report_success()
 
         if enable_return_response:
             return response
@@ -59,21 +82,35 @@ class WeiboClient:
     async def get(
         self, uri: str, params=None, headers=None, **kwargs
     ) -> Union[Response, Dict]:
-        final_uri = uri
-        if isinstance(params, dict):
-            final_uri = f"{uri}?" f"{urlencode(params)}"
-
-        if headers is None:
-            headers = self.headers
-        return await self.request(
-            method="GET", url=f"{self._host}{final_uri}", headers=headers, **kwargs
-        )
+        # 每个请求租用一个账号，签名和发送使用同一个账号
+        async with self.account_pool.lease():
+            final_uri = uri
+            if isinstance(params, dict):
+                final_uri = f"{uri}?" f"{urlencode(params)}"
+
+            if headers is None:
+                headers = self.headers
+            return await self.request(
+                method="GET", url=f"{self._host}{final_uri}", headers=headers, **kwargs
+            )
 
     async def post(self, uri: str, data: dict) -> Dict:
-        json_str = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
-        return await self.request(
-            method="POST", url=f"{self._host}{uri}", data=json_str, headers=self.headers
-        )
+        # 每个请求租用一个账号，签名和发送使用同一个账号
+        async with self.account_pool.lease():
+            json_str = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+            return await self.request(
+                method="POST",
+                url=f"{self._host}{uri}",
+                data=json_str,
+                headers=self.headers,
+            )
+
+    async def close(self):
+        """
+        关闭各代理的 httpx 连接池，爬虫结束时调用
+        :return:
+        """
+        await self.transport.aclose()
 
     async def pong(self) -> bool:
         """get a note to check if login state is ok"""
@@ -101,6 +138,7 @@ class WeiboClient:
         cookie_str, cookie_dict = utils.convert_cookies(await browser_context.cookies())
         self.headers["Cookie"] = cookie_str
         self.cookie_dict = cookie_dict
+        self.account_pool.update_primary(cookie_str, cookie_dict)
 
     async def get_note_by_keyword(
         self, keyword: str, page: int = 1, search_type: SearchType = SearchType.DEFAULT
@@ -173,7 +211,7 @@ class WeiboClient:
                 comment_list = comment_list[: max_count - len(result)]
             if callback:  # 如果有回调函数，就执行回调函数
                 await callback(note_id, comment_list)
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
             result.extend(comment_list)
             sub_comment_result = await self.get_comments_all_sub_comments(
                 note_id, comment_list, callback
@@ -237,7 +275,7 @@ class WeiboClient:
                 )
                 return dict()
 
-    async def get_note_image(self, image_url: str) -> bytes:
+    def _build_image_agent_url(self, image_url: str) -> str:
         image_url = image_url[8:]  # 去掉 https://
         sub_url = image_url.split("/")
         image_url = ""
@@ -250,7 +288,10 @@ class WeiboClient:
                 image_url += sub_url[i] + "/"
         # 微博图床对外存在防盗链，所以需要代理访问
         # 由于微博图片是通过 i1.wp.com 来访问的，所以需要拼接一下
-        final_uri = f"{self._image_agent_host}" f"{image_url}"
+        return f"{self._image_agent_host}" f"{image_url}"
+
+    async def get_note_image(self, image_url: str) -> bytes:
+        final_uri = self._build_image_agent_url(image_url)
         async with httpx.AsyncClient(proxies=self.proxies) as client:
             response = await client.request("GET", final_uri, timeout=self.timeout)
             if not response.reason_phrase == "OK":
@@ -261,6 +302,25 @@ class WeiboClient:
             else:
                 return response.content
 
+    async def download_note_image(
+        self, image_url: str, save_file_name: str
+    ) -> Optional[MediaDownloadResult]:
+        """
+        流式下载微博图片到本地文件
+        Args:
+            image_url: 图片地址
+            save_file_name: 保存的文件路径
+
+        Returns:
+
+        """
+        return await download_media_to_file(
+            self._build_image_agent_url(image_url),
+            save_file_name,
+            proxies=self.proxies,
+            timeout=self.timeout,
+        )
+
     async def get_creator_container_info(self, creator_id: str) -> Dict:
         """
         获取用户的容器ID, 容器信息代表着真实请求的API路径
@@ -365,19 +425,30 @@ class WeiboClient:
 
         """
         result = []
-        notes_has_more = True
-        since_id = ""
         crawler_total_count = 0
-        while notes_has_more:
-            notes_res = await self.get_notes_by_creator(
+
+        def next_since_id(notes_res: Dict) -> Optional[str]:
+            # 每页 10 条，已经翻过的条数小于总数时还有下一页
+            nonlocal crawler_total_count
+            crawler_total_count += 10
+            if notes_res.get("cardlistInfo", {}).get("total", 0) <= crawler_total_count:
+                return None
+            return notes_res.get("cardlistInfo", {}).get("since_id", "0")
+
+        # 处理当前页的同时预取下一页
+        pages = iter_cursor_pages(
+            lambda since_id: self.get_notes_by_creator(
                 creator_id, container_id, since_id
-            )
+            ),
+            next_since_id,
+            crawl_interval=crawl_interval,
+        )
+        async for notes_res in pages:
             if not notes_res:
                 utils.logger.error(
                     f"[WeiboClient.get_notes_by_creator] The current creator may have been banned by xhs, so they cannot access the data."
                 )
                 break
-            since_id = notes_res.get("cardlistInfo", {}).get("since_id", "0")
             if "cards" not in notes_res:
                 utils.logger.info(
                     f"[WeiboClient.get_all_notes_by_creator] No 'notes' key found in response: {notes_res}"
@@ -391,10 +462,5 @@ class WeiboClient:
             notes = [note for note in notes if note.get("card_type") == 9]
             if callback:
                 await callback(notes)
-            await asyncio.sleep(crawl_interval)
             result.extend(notes)
-            crawler_total_count += 10
-            notes_has_more = (
-                notes_res.get("cardlistInfo", {}).get("total", 0) > crawler_total_count
-            )
         return result
@@ -1,4 +1,5 @@
 import asyncio
+import functools
 import os
 import random
 from asyncio import Task
@@ -6,10 +7,13 @@ from typing import Dict, List, Optional, Tuple
 
 import config
 from base.base_crawler import AbstractCrawler
-from playwright.async_api import BrowserContext, BrowserType, Page, async_playwright
-from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
+from playwright.async_api import BrowserContext, BrowserType, Page
+from proxy.proxy_ip_pool import IpInfoModel, ProxyIpPool, create_ip_pool
 from store import weibo as weibo_store
 from tools import utils
+from tools.browser_pool import browser_pool_key, get_browser_pool
+from tools.circuit_breaker import CircuitOpenError
+from tools.media_queue import MediaDownloadStage
 from var import crawler_type_var, source_keyword_var
 
 from .client import WeiboClient
@@ -29,9 +33,11 @@ class WeiboCrawler(AbstractCrawler):
         self.mobile_index_url = "https://m.weibo.cn"
         self.user_agent = utils.get_user_agent()
         self.mobile_user_agent = utils.get_mobile_user_agent()
+        self.media_stage = MediaDownloadStage(name="weibo")
 
     async def start(self):
         playwright_proxy_format, httpx_proxy_format = None, None
+        ip_proxy_pool: Optional[ProxyIpPool] = None
         if config.ENABLE_IP_PROXY:
             ip_proxy_pool = await create_ip_pool(
                 config.IP_PROXY_POOL_COUNT, enable_validate_ip=True
@@ -41,52 +47,59 @@ class WeiboCrawler(AbstractCrawler):
                 ip_proxy_info
             )
 
-        async with async_playwright() as playwright:
-            # Launch a browser context.
-            chromium = playwright.chromium
-            self.browser_context = await self.launch_browser(
-                chromium, None, self.mobile_user_agent, headless=config.HEADLESS
-            )
-            # stealth.min.js is a js script to prevent the website from detecting the crawler.
-            await self.browser_context.add_init_script(path="libs/stealth.min.js")
-            self.context_page = await self.browser_context.new_page()
-            await self.context_page.goto(self.mobile_index_url)
+        # 从浏览器上下文池租用已经打开首页的浏览器，池中没有时才启动新的浏览器
+        async with get_browser_pool().lease(
+            browser_pool_key(config.PLATFORM),
+            self.create_browser_context,
+            self.mobile_index_url,
+            exclusive=config.SAVE_LOGIN_STATE,
+        ) as pooled_browser:
+            self.browser_context = pooled_browser.browser_context
+            self.context_page = pooled_browser.page
 
             # Create a client to interact with the xiaohongshu website.
-            self.wb_client = await self.create_weibo_client(httpx_proxy_format)
-            if not await self.wb_client.pong():
-                login_obj = WeiboLogin(
-                    login_type=config.LOGIN_TYPE,
-                    login_phone="",  # your phone number
-                    browser_context=self.browser_context,
-                    context_page=self.context_page,
-                    cookie_str=config.COOKIES,
-                )
-                await login_obj.begin()
+            self.wb_client = await self.create_weibo_client(
+                httpx_proxy_format, ip_proxy_pool
+            )
+            try:
+                if not await self.wb_client.pong():
+                    login_obj = WeiboLogin(
+                        login_type=config.LOGIN_TYPE,
+                        login_phone="",  # your phone number
+                        browser_context=self.browser_context,
+                        context_page=self.context_page,
+                        cookie_str=config.COOKIES,
+                    )
+                    await login_obj.begin()
 
-                # 登录成功后重定向到手机端的网站，再更新手机端登录成功的cookie
-                utils.logger.info(
-                    "[WeiboCrawler.start] redirect weibo mobile homepage and update cookies on mobile platform"
-                )
-                await self.context_page.goto(self.mobile_index_url)
-                await asyncio.sleep(2)
-                await self.wb_client.update_cookies(
-                    browser_context=self.browser_context
-                )
+                    # 登录成功后重定向到手机端的网站，再更新手机端登录成功的cookie
+                    utils.logger.info(
+                        "[WeiboCrawler.start] redirect weibo mobile homepage and update cookies on mobile platform"
+                    )
+                    await self.context_page.goto(self.mobile_index_url)
+                    await asyncio.sleep(2)
+                    await self.wb_client.update_cookies(
+                        browser_context=self.browser_context
+                    )
 
-            crawler_type_var.set(config.CRAWLER_TYPE)
-            if config.CRAWLER_TYPE == "search":
-                # Search for video and retrieve their comment information.
-                await self.search()
-            elif config.CRAWLER_TYPE == "detail":
-                # Get the information and comments of the specified post
-                await self.get_specified_notes()
-            elif config.CRAWLER_TYPE == "creator":
-                # Get creator's information and their notes and comments
-                await self.get_creators_and_notes()
-            else:
-                pass
-            utils.logger.info("[WeiboCrawler.start] Weibo Crawler finished ...")
+                crawler_type_var.set(config.CRAWLER_TYPE)
+                if config.CRAWLER_TYPE == "search":
+                    # Search for video and retrieve their comment information.
+                    await self.search()
+                elif config.CRAWLER_TYPE == "detail":
+                    # Get the information and comments of the specified post
+                    await self.get_specified_notes()
+                elif config.CRAWLER_TYPE == "creator":
+                    # Get creator's information and their notes and comments
+                    await self.get_creators_and_notes()
+                else:
+                    pass
+                # 等待媒体下载阶段把队列中剩余的图片下载完成
+                await self.media_stage.close()
+                utils.logger.info("[WeiboCrawler.start] Weibo Crawler finished ...")
+            finally:
+                # 关闭各代理的 httpx 连接池
+                await self.wb_client.close()
 
     async def search(self):
         """
@@ -95,8 +108,8 @@ class WeiboCrawler(AbstractCrawler):
         """
         utils.logger.info("[WeiboCrawler.search] Begin search weibo keywords")
         weibo_limit_count = 10  # weibo limit page fixed value
-        if config.CRAWLER_MAX_NOTES_COUNT < weibo_limit_count:
-            config.CRAWLER_MAX_NOTES_COUNT = weibo_limit_count
+        # 不修改全局配置，避免影响同一进程内的其他任务
+        max_notes_count = max(config.CRAWLER_MAX_NOTES_COUNT, weibo_limit_count)
         start_page = config.START_PAGE
         for keyword in config.KEYWORDS.split(","):
             source_keyword_var.set(keyword)
@@ -104,9 +117,7 @@ class WeiboCrawler(AbstractCrawler):
                 f"[WeiboCrawler.search] Current search keyword: {keyword}"
             )
             page = 1
-            while (
-                page - start_page + 1
-            ) * weibo_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
+            while (page - start_page + 1) * weibo_limit_count <= max_notes_count:
                 if page < start_page:
                     utils.logger.info(f"[WeiboCrawler.search] Skip page: {page}")
                     page += 1
@@ -159,6 +170,11 @@ class WeiboCrawler(AbstractCrawler):
             try:
                 result = await self.wb_client.get_note_info_by_id(note_id)
                 return result
+            except CircuitOpenError as ex:
+                utils.logger.error(
+                    f"[WeiboCrawler.get_note_info_task] circuit is open, skip: {ex}"
+                )
+                return None
             except DataFetchError as ex:
                 utils.logger.error(
                     f"[WeiboCrawler.get_note_info_task] Get note detail error: {ex}"
@@ -240,12 +256,17 @@ class WeiboCrawler(AbstractCrawler):
             url = pic.get("url")
             if not url:
                 continue
-            content = await self.wb_client.get_note_image(url)
-            if content != None:
-                extension_file_name = url.split(".")[-1]
-                await weibo_store.update_weibo_note_image(
-                    pic["pid"], content, extension_file_name
-                )
+            extension_file_name = url.split(".")[-1]
+            await self.media_stage.submit(
+                url,
+                functools.partial(
+                    weibo_store.update_weibo_note_image_stream,
+                    pic["pid"],
+                    url,
+                    functools.partial(self.wb_client.download_note_image, url),
+                    extension_file_name,
+                ),
+            )
 
     async def get_creators_and_notes(self) -> None:
         """
@@ -289,7 +310,9 @@ class WeiboCrawler(AbstractCrawler):
                     f"[WeiboCrawler.get_creators_and_notes] get creator info error, creator_id:{user_id}"
                 )
 
-    async def create_weibo_client(self, httpx_proxy: Optional[str]) -> WeiboClient:
+    async def create_weibo_client(
+        self, httpx_proxy: Optional[str], ip_pool: Optional[ProxyIpPool] = None
+    ) -> WeiboClient:
         """Create xhs client"""
         utils.logger.info(
             "[WeiboCrawler.create_weibo_client] Begin create weibo API client ..."
@@ -299,6 +322,7 @@ class WeiboCrawler(AbstractCrawler):
         )
         weibo_client_obj = WeiboClient(
             proxies=httpx_proxy,
+            ip_pool=ip_pool,
             headers={
                 "User-Agent": utils.get_mobile_user_agent(),
                 "Cookie": cookie_str,
@@ -326,6 +350,19 @@ class WeiboCrawler(AbstractCrawler):
         }
         return playwright_proxy, httpx_proxy
 
+    async def create_browser_context(self, chromium: BrowserType) -> BrowserContext:
+        """
+        启动浏览器并注入反检测脚本，浏览器上下文池中没有可复用的上下文时调用
+        :param chromium:
+        :return:
+        """
+        browser_context = await self.launch_browser(
+            chromium, None, self.mobile_user_agent, headless=config.HEADLESS
+        )
+        # stealth.min.js is a js script to prevent the website from detecting the crawler.
+        await browser_context.add_init_script(path="libs/stealth.min.js")
+        return browser_context
+
     async def launch_browser(
         self,
         chromium: BrowserType,
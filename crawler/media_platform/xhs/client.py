@@ -1,4 +1,3 @@
-import asyncio
 import json
 import re
 from html import unescape
@@ -9,8 +8,15 @@ import config
 import httpx
 from base.base_crawler import AbstractApiClient
 from playwright.async_api import BrowserContext, Page
-from tenacity import retry, retry_if_result, stop_after_attempt, wait_fixed
+from proxy.proxy_ip_pool import ProxyIpPool
+from proxy.proxy_transport import ProxyTransport
 from tools import utils
+from tools.account_pool import AccountPool, current_account
+from tools.async_pipeline import BoundedTaskGroup
+from tools.media_download import MediaDownloadResult, download_media_to_file
+from tools.pagination import iter_cursor_pages
+from tools.rate_limiter import THROTTLE_STATUS_CODES, crawl_sleep
+from tools.retry_policy import retry_request
 
 from .exception import DataFetchError, IPBlockError
 from .field import SearchNoteType, SearchSortType
@@ -22,12 +28,23 @@ class XiaoHongShuClient(AbstractApiClient):
         self,
         timeout=10,
         proxies=None,
+        ip_pool: Optional[ProxyIpPool] = None,
         *,
         headers: Dict[str, str],
         playwright_page: Page,
         cookie_dict: Dict[str, str],
     ):
         self.proxies = proxies
+        # 浏览器登录的账号和 PLATFORM_ACCOUNT_COOKIES 中配置的账号轮流使用
+        self.account_pool = AccountPool("xhs", headers.get("Cookie", ""), cookie_dict)
+        self.account_pool.set_pong_callback(self.pong)
+        # 每次请求从代理池租用代理，没有代理池时使用固定代理
+        self.transport = ProxyTransport(
+            "xhs",
+            ip_pool=ip_pool,
+            default_proxies=proxies,
+            account_pool=self.account_pool,
+        )
         self.timeout = timeout
         self.headers = headers
         self._host = "https://edith.xiaohongshu.com"
@@ -53,8 +70,9 @@ class XiaoHongShuClient(AbstractApiClient):
             "([url, data]) => window._webmsxyw(url,data)", [url, data]
         )
         local_storage = await self.playwright_page.evaluate("() => window.localStorage")
+        account = current_account() or self.account_pool.primary
         signs = sign(
-            a1=self.cookie_dict.get("a1", ""),
+            a1=account.cookie_dict.get("a1", ""),
             b1=local_storage.get("b1", ""),
             x_s=encrypt_params.get("X-s", ""),
             x_t=str(encrypt_params.get("X-t", "")),
@@ -66,8 +84,8 @@ class XiaoHongShuClient(AbstractApiClient):
             "x-S-Common": signs["x-s-common"],
             "X-B3-Traceid": signs["x-b3-traceid"],
         }
-        self.headers.update(headers)
-        return self.headers
+        # 不修改 self.headers，多个账号并发签名时互不覆盖
+        return {**self.headers, **headers}
 
     # @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
     # async def request(self, method, url, **kwargs) -> Union[str, Any]:
@@ -105,7 +123,7 @@ class XiaoHongShuClient(AbstractApiClient):
     #     else:
     #         raise DataFetchError(data.get("msg", None))
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+    @retry_request("xhs")
     async def request(self, method, url, **kwargs) -> Union[str, Any]:
         """
         封装httpx的公共请求方法，对请求响应做一些处理
@@ -120,23 +138,11 @@ class XiaoHongShuClient(AbstractApiClient):
         # return response.text
         return_response = kwargs.pop("return_response", False)
 
-        # 处理 httpx 版本兼容性问题
-        # 新版本 httpx 使用不同的代理参数格式
-        httpx_kwargs = {}
-        if self.proxies:
-            # 如果 proxies 是字典格式，直接使用
-            if isinstance(self.proxies, dict):
-                httpx_kwargs["proxies"] = self.proxies
-            # 如果 proxies 是字符串格式，需要转换
-            elif isinstance(self.proxies, str):
-                httpx_kwargs["proxy"] = self.proxies
-            # 其他情况保持原样处理
-            else:
-                httpx_kwargs["proxies"] = self.proxies
-
-        async with httpx.AsyncClient(**httpx_kwargs) as client:
-            response = await client.request(method, url, timeout=self.timeout, **kwargs)
+        lease = await self.transport.lease(url)
+        response = await lease.request(method, url, timeout=self.timeout, **kwargs)
 
+        if response.status_code in THROTTLE_STATUS_CODES:
+            lease.report_throttled(f"status {response.status_code}")
         if response.status_code == 471 or response.status_code == 461:
             # someday someone maybe will bypass captcha
             verify_type = response.headers["Verifytype"]
@@ -146,11 +152,14 @@ class XiaoHongShuClient(AbstractApiClient):
             )
 
         if return_response:
+            lease.report_success()
             return response.text
         data: Dict = response.json()
         if data["success"]:
+            lease.report_success()
             return data.get("data", data.get("success", {}))
         elif data["code"] == self.IP_ERROR_CODE:
+            lease.report_throttled(self.IP_ERROR_STR)
             raise IPBlockError(self.IP_ERROR_STR)
         else:
             raise DataFetchError(data.get("msg", None))
@@ -165,13 +174,15 @@ class XiaoHongShuClient(AbstractApiClient):
         Returns:
 
         """
-        final_uri = uri
-        if isinstance(params, dict):
-            final_uri = f"{uri}?" f"{urlencode(params)}"
-        headers = await self._pre_headers(final_uri)
-        return await self.request(
-            method="GET", url=f"{self._host}{final_uri}", headers=headers
-        )
+        # 每个请求租用一个账号，签名和发送使用同一个账号
+        async with self.account_pool.lease():
+            final_uri = uri
+            if isinstance(params, dict):
+                final_uri = f"{uri}?" f"{urlencode(params)}"
+            headers = await self._pre_headers(final_uri)
+            return await self.request(
+                method="GET", url=f"{self._host}{final_uri}", headers=headers
+            )
 
     async def post(self, uri: str, data: dict, **kwargs) -> Dict:
         """
@@ -183,15 +194,17 @@ class XiaoHongShuClient(AbstractApiClient):
         Returns:
 
         """
-        headers = await self._pre_headers(uri, data)
-        json_str = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
-        return await self.request(
-            method="POST",
-            url=f"{self._host}{uri}",
-            data=json_str,
-            headers=headers,
-            **kwargs,
-        )
+        # 每个请求租用一个账号，签名和发送使用同一个账号
+        async with self.account_pool.lease():
+            headers = await self._pre_headers(uri, data)
+            json_str = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+            return await self.request(
+                method="POST",
+                url=f"{self._host}{uri}",
+                data=json_str,
+                headers=headers,
+                **kwargs,
+            )
 
     # async def get_note_media(self, url: str) -> Union[bytes, None]:
     #     async with httpx.AsyncClient(proxies=self.proxies) as client:
@@ -225,6 +238,29 @@ class XiaoHongShuClient(AbstractApiClient):
             else:
                 return response.content
 
+    async def download_note_media(
+        self, url: str, save_file_name: str
+    ) -> Optional[MediaDownloadResult]:
+        """
+        流式下载笔记图片/视频到本地文件，不在内存中缓存整个文件
+        Args:
+            url: 媒体地址
+            save_file_name: 保存的文件路径
+
+        Returns:
+
+        """
+        return await download_media_to_file(
+            url, save_file_name, proxies=self.proxies, timeout=self.timeout
+        )
+
+    async def close(self):
+        """
+        关闭各代理的 httpx 连接池，爬虫结束时调用
+        :return:
+        """
+        await self.transport.aclose()
+
     async def pong(self) -> bool:
         """
         用于检查登录态是否失效了
@@ -257,6 +293,7 @@ class XiaoHongShuClient(AbstractApiClient):
         cookie_str, cookie_dict = utils.convert_cookies(await browser_context.cookies())
         self.headers["Cookie"] = cookie_str
         self.cookie_dict = cookie_dict
+        self.account_pool.update_primary(cookie_str, cookie_dict)
 
     async def get_note_by_keyword(
         self,
@@ -401,6 +438,18 @@ class XiaoHongShuClient(AbstractApiClient):
         result = []
         comments_has_more = True
         comments_cursor = ""
+        # 二级评论在后台并发展开，一级评论继续翻页，展开完成的二级评论同样计入 max_count
+        sub_comment_group = BoundedTaskGroup(
+            config.SUB_COMMENT_CONCURRENCY, name=f"xhs_sub_comments_{note_id}"
+        )
+
+        async def expand_sub_comments(comment: Dict):
+            sub_comments = await self.get_comment_all_sub_comments(
+                comment, xsec_token, crawl_interval, callback
+            )
+            # 多个展开任务同时完成时，每次追加都按剩余名额截断，不超过 max_count
+            result.extend(sub_comments[: max(0, max_count - len(result))])
+
         while comments_has_more and len(result) < max_count:
             comments_res = await self.get_note_comments(
                 note_id=note_id, xsec_token=xsec_token, cursor=comments_cursor
@@ -417,15 +466,12 @@ class XiaoHongShuClient(AbstractApiClient):
                 comments = comments[: max_count - len(result)]
             if callback:
                 await callback(note_id, comments)
-            await asyncio.sleep(crawl_interval)
             result.extend(comments)
-            sub_comments = await self.get_comments_all_sub_comments(
-                comments=comments,
-                xsec_token=xsec_token,
-                crawl_interval=crawl_interval,
-                callback=callback,
-            )
-            result.extend(sub_comments)
+            if config.ENABLE_GET_SUB_COMMENTS:
+                for comment in comments:
+                    sub_comment_group.spawn(expand_sub_comments(comment))
+            await crawl_sleep(crawl_interval)
+        await sub_comment_group.wait()
         return result
 
     async def get_comments_all_sub_comments(
@@ -436,7 +482,7 @@ class XiaoHongShuClient(AbstractApiClient):
         callback: Optional[Callable] = None,
     ) -> List[Dict]:
         """
-        获取指定一级评论下的所有二级评论, 该方法会一直查找一级评论下的所有二级评论信息
+        获取指定一级评论下的所有二级评论, 各个一级评论的二级评论并发展开
         Args:
             comments: 评论列表
             xsec_token: 验证token
@@ -452,46 +498,73 @@ class XiaoHongShuClient(AbstractApiClient):
             )
             return []
 
-        result = []
+        sub_comment_group = BoundedTaskGroup(
+            config.SUB_COMMENT_CONCURRENCY, name="xhs_sub_comments"
+        )
         for comment in comments:
-            note_id = comment.get("note_id")
-            sub_comments = comment.get("sub_comments")
-            if sub_comments and callback:
-                await callback(note_id, sub_comments)
-
-            sub_comment_has_more = comment.get("sub_comment_has_more")
-            if not sub_comment_has_more:
-                continue
-
-            root_comment_id = comment.get("id")
-            sub_comment_cursor = comment.get("sub_comment_cursor")
-
-            while sub_comment_has_more:
-                comments_res = await self.get_note_sub_comments(
-                    note_id=note_id,
-                    root_comment_id=root_comment_id,
-                    xsec_token=xsec_token,
-                    num=10,
-                    cursor=sub_comment_cursor,
+            sub_comment_group.spawn(
+                self.get_comment_all_sub_comments(
+                    comment, xsec_token, crawl_interval, callback
                 )
+            )
+        result = []
+        for sub_comments in await sub_comment_group.wait():
+            result.extend(sub_comments)
+        return result
+
+    async def get_comment_all_sub_comments(
+        self,
+        comment: Dict,
+        xsec_token: str,
+        crawl_interval: float = 1.0,
+        callback: Optional[Callable] = None,
+    ) -> List[Dict]:
+        """
+        获取一条一级评论下的所有二级评论，包括一级评论自带的前几条二级评论
+        Args:
+            comment: 一级评论
+            xsec_token: 验证token
+            crawl_interval: 爬取一次评论的延迟单位（秒）
+            callback: 一次评论爬取结束后
+
+        Returns:
 
-                if comments_res is None:
-                    utils.logger.info(
-                        f"[XiaoHongShuClient.get_comments_all_sub_comments] No response found for note_id: {note_id}"
-                    )
-                    continue
-                sub_comment_has_more = comments_res.get("has_more", False)
-                sub_comment_cursor = comments_res.get("cursor", "")
-                if "comments" not in comments_res:
-                    utils.logger.info(
-                        f"[XiaoHongShuClient.get_comments_all_sub_comments] No 'comments' key found in response: {comments_res}"
-                    )
-                    break
-                comments = comments_res["comments"]
-                if callback:
-                    await callback(note_id, comments)
-                await asyncio.sleep(crawl_interval)
-                result.extend(comments)
+        """
+        result = []
+        note_id = comment.get("note_id")
+        sub_comments = comment.get("sub_comments")
+        if sub_comments and callback:
+            await callback(note_id, sub_comments)
+
+        sub_comment_has_more = comment.get("sub_comment_has_more")
+        root_comment_id = comment.get("id")
+        sub_comment_cursor = comment.get("sub_comment_cursor")
+        while sub_comment_has_more:
+            comments_res = await self.get_note_sub_comments(
+                note_id=note_id,
+                root_comment_id=root_comment_id,
+                xsec_token=xsec_token,
+                num=10,
+                cursor=sub_comment_cursor,
+            )
+
+            if comments_res is None:
+                utils.logger.info(
+                    f"[XiaoHongShuClient.get_comment_all_sub_comments] No response found for note_id: {note_id}"
+                )
+                break
+            sub_comment_has_more = comments_res.get("has_more", False)
+            sub_comment_cursor = comments_res.get("cursor", "")
+            if "comments" not in comments_res:
+                utils.logger.info(
+                    f"[XiaoHongShuClient.get_comment_all_sub_comments] No 'comments' key found in response: {comments_res}"
+                )
+                break
+            comments = comments_res["comments"]
+            if callback:
+                await callback(note_id, comments)
+            await crawl_sleep(crawl_interval)
+            result.extend(comments)
         return result
 
     async def get_creator_info(self, user_id: str) -> Dict:
@@ -555,18 +628,19 @@ class XiaoHongShuClient(AbstractApiClient):
 
         """
         result = []
-        notes_has_more = True
-        notes_cursor = ""
-        while notes_has_more:
-            notes_res = await self.get_notes_by_creator(user_id, notes_cursor)
+        # 处理当前页的同时预取下一页
+        pages = iter_cursor_pages(
+            lambda cursor: self.get_notes_by_creator(user_id, cursor),
+            lambda res: res.get("cursor", "") if res.get("has_more", False) else None,
+            crawl_interval=crawl_interval,
+        )
+        async for notes_res in pages:
             if not notes_res:
                 utils.logger.error(
                     f"[XiaoHongShuClient.get_notes_by_creator] The current creator may have been banned by xhs, so they cannot access the data."
                 )
                 break
 
-            notes_has_more = notes_res.get("has_more", False)
-            notes_cursor = notes_res.get("cursor", "")
             if "notes" not in notes_res:
                 utils.logger.info(
                     f"[XiaoHongShuClient.get_all_notes_by_creator] No 'notes' key found in response: {notes_res}"
@@ -579,7 +653,6 @@ class XiaoHongShuClient(AbstractApiClient):
             )
             if callback:
                 await callback(notes)
-            await asyncio.sleep(crawl_interval)
             result.extend(notes)
         return result
 
@@ -596,7 +669,6 @@ class XiaoHongShuClient(AbstractApiClient):
         data = {"original_url": f"{self._domain}/discovery/item/{note_id}"}
         return await self.post(uri, data=data, return_response=True)
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
     async def get_note_by_id_from_html(
         self,
         note_id: str,
@@ -605,7 +677,7 @@ class XiaoHongShuClient(AbstractApiClient):
         enable_cookie: bool = False,
     ) -> Optional[Dict]:
         """
-        通过解析网页版的笔记详情页HTML，获取笔记详情, 该接口可能会出现失败的情况，这里尝试重试3次
+        通过解析网页版的笔记详情页HTML，获取笔记详情, 该接口可能会出现失败的情况，由 request 按平台重试策略重试
         copy from https://github.com/ReaJason/xhs/blob/eb1c5a0213f6fbb592f0a2897ee552847c69ea2d/xhs/core.py#L217-L259
         thanks for ReaJason
         Args:
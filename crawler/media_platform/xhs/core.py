@@ -1,19 +1,24 @@
 import asyncio
+import functools
 import os
 import random
-import time
 from asyncio import Task
 from typing import Dict, List, Optional, Tuple
 
 import config
 from base.base_crawler import AbstractCrawler
-from config import CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES
 from model.m_xiaohongshu import NoteUrlInfo
-from playwright.async_api import BrowserContext, BrowserType, Page, async_playwright
-from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
+from playwright.async_api import BrowserContext, BrowserType, Page
+from proxy.proxy_ip_pool import IpInfoModel, ProxyIpPool, create_ip_pool
 from store import xhs as xhs_store
 from tenacity import RetryError
 from tools import utils
+from tools.async_pipeline import AsyncPipeline, BoundedTaskGroup
+from tools.browser_pool import browser_pool_key, get_browser_pool
+from tools.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from tools.frontier import CrawlFrontier
+from tools.media_queue import MediaDownloadStage
+from tools.rate_limiter import crawl_sleep
 from var import crawler_type_var, source_keyword_var
 
 from .client import XiaoHongShuClient
@@ -36,9 +41,13 @@ class XiaoHongShuCrawler(AbstractCrawler):
             if config.UA
             else "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36"
         )
+        self.media_stage = MediaDownloadStage(name="xhs")
+        # 跨任务去重，之前爬取过且评论数没有变化的笔记不再重复爬取
+        self.frontier = CrawlFrontier("xhs")
 
     async def start(self) -> None:
         playwright_proxy_format, httpx_proxy_format = None, None
+        ip_proxy_pool: Optional[ProxyIpPool] = None
 
         current_file = os.path.abspath(__file__)
         crawler_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_file)))
@@ -59,57 +68,54 @@ class XiaoHongShuCrawler(AbstractCrawler):
                 ip_proxy_info
             )
 
-        async with async_playwright() as playwright:
-            # Launch a browser context.
-            chromium = playwright.chromium
-            self.browser_context = await self.launch_browser(
-                chromium, None, self.user_agent, headless=config.HEADLESS
-            )
-            # stealth.min.js is a js script to prevent the website from detecting the crawler.
-            await self.browser_context.add_init_script(path=stealth_path)
-            # add a cookie attribute webId to avoid the appearance of a sliding captcha on the webpage
-            await self.browser_context.add_cookies(
-                [
-                    {
-                        "name": "webId",
-                        "value": "xxx123",  # any value
-                        "domain": ".xiaohongshu.com",
-                        "path": "/",
-                    }
-                ]
-            )
-            self.context_page = await self.browser_context.new_page()
-            await self.context_page.goto(self.index_url)
+        # 从浏览器上下文池租用已经打开首页的浏览器，池中没有时才启动新的浏览器
+        async with get_browser_pool().lease(
+            browser_pool_key(config.PLATFORM),
+            lambda chromium: self.create_browser_context(chromium, stealth_path),
+            self.index_url,
+            exclusive=config.SAVE_LOGIN_STATE,
+        ) as pooled_browser:
+            self.browser_context = pooled_browser.browser_context
+            self.context_page = pooled_browser.page
 
             # Create a client to interact with the xiaohongshu website.
-            self.xhs_client = await self.create_xhs_client(httpx_proxy_format)
-            if not await self.xhs_client.pong():
-                login_obj = XiaoHongShuLogin(
-                    login_type=config.LOGIN_TYPE,
-                    login_phone="",  # input your phone number
-                    browser_context=self.browser_context,
-                    context_page=self.context_page,
-                    cookie_str=config.COOKIES,
-                )
-                await login_obj.begin()
-                await self.xhs_client.update_cookies(
-                    browser_context=self.browser_context
-                )
-
-            crawler_type_var.set(config.CRAWLER_TYPE)
-            if config.CRAWLER_TYPE == "search":
-                # Search for notes and retrieve their comment information.
-                await self.search()
-            elif config.CRAWLER_TYPE == "detail":
-                # Get the information and comments of the specified post
-                await self.get_specified_notes()
-            elif config.CRAWLER_TYPE == "creator":
-                # Get creator's information and their notes and comments
-                await self.get_creators_and_notes()
-            else:
-                pass
-
-            utils.logger.info("[XiaoHongShuCrawler.start] Xhs Crawler finished ...")
+            self.xhs_client = await self.create_xhs_client(
+                httpx_proxy_format, ip_proxy_pool
+            )
+            try:
+                if not await self.xhs_client.pong():
+                    login_obj = XiaoHongShuLogin(
+                        login_type=config.LOGIN_TYPE,
+                        login_phone="",  # input your phone number
+                        browser_context=self.browser_context,
+                        context_page=self.context_page,
+                        cookie_str=config.COOKIES,
+                    )
+                    await login_obj.begin()
+                    await self.xhs_client.update_cookies(
+                        browser_context=self.browser_context
+                    )
+                get_circuit_breaker("xhs").set_refresh_callback(self.refresh_session)
+
+                crawler_type_var.set(config.CRAWLER_TYPE)
+                if config.CRAWLER_TYPE == "search":
+                    # Search for notes and retrieve their comment information.
+                    await self.search()
+                elif config.CRAWLER_TYPE == "detail":
+                    # Get the information and comments of the specified post
+                    await self.get_specified_notes()
+                elif config.CRAWLER_TYPE == "creator":
+                    # Get creator's information and their notes and comments
+                    await self.get_creators_and_notes()
+                else:
+                    pass
+
+                # 等待媒体下载阶段把队列中剩余的图片/视频下载完成
+                await self.media_stage.close()
+                utils.logger.info("[XiaoHongShuCrawler.start] Xhs Crawler finished ...")
+            finally:
+                # 关闭各代理的 httpx 连接池
+                await self.xhs_client.close()
 
     async def search(self) -> None:
         """Search for notes and retrieve their comment information."""
@@ -117,74 +123,127 @@ class XiaoHongShuCrawler(AbstractCrawler):
             "[XiaoHongShuCrawler.search] Begin search xiaohongshu keywords"
         )
         xhs_limit_count = 20  # xhs limit page fixed value
-        if config.CRAWLER_MAX_NOTES_COUNT < xhs_limit_count:
-            config.CRAWLER_MAX_NOTES_COUNT = xhs_limit_count
+        # 不修改全局配置，避免影响同一进程内的其他任务
+        max_notes_count = max(config.CRAWLER_MAX_NOTES_COUNT, xhs_limit_count)
         start_page = config.START_PAGE
-        for keyword in config.KEYWORDS.split(","):
-            source_keyword_var.set(keyword)
-            utils.logger.info(
-                f"[XiaoHongShuCrawler.search] Current search keyword: {keyword}"
-            )
-            page = 1
-            search_id = get_search_id()
-            while (
-                page - start_page + 1
-            ) * xhs_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
-                if page < start_page:
-                    utils.logger.info(f"[XiaoHongShuCrawler.search] Skip page {page}")
-                    page += 1
-                    continue
-
-                try:
-                    utils.logger.info(
-                        f"[XiaoHongShuCrawler.search] search xhs keyword: {keyword}, page: {page}"
-                    )
-                    note_ids: List[str] = []
-                    xsec_tokens: List[str] = []
-                    notes_res = await self.xhs_client.get_note_by_keyword(
-                        keyword=keyword,
-                        search_id=search_id,
-                        page=page,
-                        sort=(
-                            SearchSortType(config.SORT_TYPE)
-                            if config.SORT_TYPE != ""
-                            else SearchSortType.GENERAL
-                        ),
-                    )
-                    utils.logger.info(
-                        f"[XiaoHongShuCrawler.search] Search notes res:{notes_res}"
-                    )
-                    if not notes_res or not notes_res.get("has_more", False):
-                        utils.logger.info("No more content!")
-                        break
-                    semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
-                    task_list = [
-                        self.get_note_detail_async_task(
-                            note_id=post_item.get("id"),
-                            xsec_source=post_item.get("xsec_source"),
-                            xsec_token=post_item.get("xsec_token"),
-                            semaphore=semaphore,
+        pipeline = self.create_search_pipeline()
+        try:
+            for keyword in config.KEYWORDS.split(","):
+                source_keyword_var.set(keyword)
+                utils.logger.info(
+                    f"[XiaoHongShuCrawler.search] Current search keyword: {keyword}"
+                )
+                page = 1
+                search_id = get_search_id()
+                while (page - start_page + 1) * xhs_limit_count <= max_notes_count:
+                    if page < start_page:
+                        utils.logger.info(
+                            f"[XiaoHongShuCrawler.search] Skip page {page}"
                         )
-                        for post_item in notes_res.get("items", {})
-                        if post_item.get("model_type") not in ("rec_query", "hot_query")
-                    ]
-                    note_details = await asyncio.gather(*task_list)
-                    for note_detail in note_details:
-                        if note_detail:
-                            await xhs_store.update_xhs_note(note_detail)
-                            await self.get_notice_media(note_detail)
-                            note_ids.append(note_detail.get("note_id"))
-                            xsec_tokens.append(note_detail.get("xsec_token"))
-                    page += 1
-                    utils.logger.info(
-                        f"[XiaoHongShuCrawler.search] Note details: {note_details}"
-                    )
-                    await self.batch_get_note_comments(note_ids, xsec_tokens)
-                except DataFetchError:
-                    utils.logger.error(
-                        "[XiaoHongShuCrawler.search] Get note detail error"
-                    )
-                    break
+                        page += 1
+                        continue
+
+                    try:
+                        utils.logger.info(
+                            f"[XiaoHongShuCrawler.search] search xhs keyword: {keyword}, page: {page}"
+                        )
+                        notes_res = await self.xhs_client.get_note_by_keyword(
+                            keyword=keyword,
+                            search_id=search_id,
+                            page=page,
+                            sort=(
+                                SearchSortType(config.SORT_TYPE)
+                                if config.SORT_TYPE != ""
+                                else SearchSortType.GENERAL
+                            ),
+                        )
+                        utils.logger.info(
+                            f"[XiaoHongShuCrawler.search] Search notes res:{notes_res}"
+                        )
+                        if not notes_res or not notes_res.get("has_more", False):
+                            utils.logger.info("No more content!")
+                            break
+                        # 放入流水线后直接翻页，详情和评论在后续阶段并发处理
+                        for post_item in notes_res.get("items", {}):
+                            if post_item.get("model_type") in (
+                                "rec_query",
+                                "hot_query",
+                            ):
+                                continue
+                            if not self.frontier.should_crawl(
+                                post_item.get("id"),
+                                self.get_note_comment_count(
+                                    post_item.get("note_card", {})
+                                ),
+                            ):
+                                continue
+                            await pipeline.put(
+                                {
+                                    "note_id": post_item.get("id"),
+                                    "xsec_source": post_item.get("xsec_source"),
+                                    "xsec_token": post_item.get("xsec_token"),
+                                    "keyword": keyword,
+                                }
+                            )
+                        page += 1
+                    except DataFetchError:
+                        utils.logger.error(
+                            "[XiaoHongShuCrawler.search] Get note detail error"
+                        )
+                        break
+        finally:
+            # 等待详情和评论阶段把队列中剩余的笔记处理完
+            await pipeline.close()
+
+    def create_search_pipeline(self) -> AsyncPipeline:
+        """
+        搜索结果处理流水线：笔记详情 -> 评论，两个阶段各自并发，不再按页等待
+        :return:
+        """
+        detail_semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        comment_semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+
+        async def fetch_note_detail(item: Dict) -> Optional[Dict]:
+            source_keyword_var.set(item["keyword"])
+            note_detail = await self.get_note_detail_async_task(
+                note_id=item["note_id"],
+                xsec_source=item["xsec_source"],
+                xsec_token=item["xsec_token"],
+                semaphore=detail_semaphore,
+            )
+            if not note_detail:
+                return None
+            await xhs_store.update_xhs_note(note_detail)
+            await self.get_notice_media(note_detail)
+            self.frontier.record(
+                note_detail.get("note_id"), self.get_note_comment_count(note_detail)
+            )
+            if not config.ENABLE_GET_COMMENTS:
+                return None
+            return note_detail
+
+        async def fetch_note_comments(note_detail: Dict):
+            await self.get_comments(
+                note_id=note_detail.get("note_id"),
+                xsec_token=note_detail.get("xsec_token"),
+                semaphore=comment_semaphore,
+            )
+
+        return (
+            AsyncPipeline(name="xhs_search")
+            .add_stage(
+                "detail",
+                fetch_note_detail,
+                concurrency=config.MAX_CONCURRENCY_NUM,
+                queue_size=config.SEARCH_PIPELINE_QUEUE_SIZE,
+            )
+            .add_stage(
+                "comments",
+                fetch_note_comments,
+                concurrency=config.MAX_CONCURRENCY_NUM,
+                queue_size=config.SEARCH_PIPELINE_QUEUE_SIZE,
+            )
+        )
 
     async def get_creators_and_notes(self) -> None:
         """Get creator's notes and retrieve their comment information."""
@@ -204,12 +263,24 @@ class XiaoHongShuCrawler(AbstractCrawler):
                 crawl_interval = random.random()
             else:
                 crawl_interval = random.uniform(1, config.CRAWLER_MAX_SLEEP_SEC)
+            # 每一页的笔记立即交给详情 worker，翻页不等待详情爬取完成
+            detail_semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+            detail_group = BoundedTaskGroup(
+                config.CREATOR_PAGE_CONCURRENCY, name=f"xhs_creator_{user_id}"
+            )
+
+            async def hand_off_notes(notes: List[Dict]):
+                detail_group.spawn(
+                    self.fetch_creator_notes_detail(notes, detail_semaphore)
+                )
+
             # Get all note information of the creator
             all_notes_list = await self.xhs_client.get_all_notes_by_creator(
                 user_id=user_id,
                 crawl_interval=crawl_interval,
-                callback=self.fetch_creator_notes_detail,
+                callback=hand_off_notes,
             )
+            await detail_group.wait()
 
             note_ids = []
             xsec_tokens = []
@@ -218,11 +289,13 @@ class XiaoHongShuCrawler(AbstractCrawler):
                 xsec_tokens.append(note_item.get("xsec_token"))
             await self.batch_get_note_comments(note_ids, xsec_tokens)
 
-    async def fetch_creator_notes_detail(self, note_list: List[Dict]):
+    async def fetch_creator_notes_detail(
+        self, note_list: List[Dict], semaphore: Optional[asyncio.Semaphore] = None
+    ):
         """
         Concurrently obtain the specified post list and save the data
         """
-        semaphore = asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
+        semaphore = semaphore or asyncio.Semaphore(config.MAX_CONCURRENCY_NUM)
         task_list = [
             self.get_note_detail_async_task(
                 note_id=post_item.get("note_id"),
@@ -231,12 +304,25 @@ class XiaoHongShuCrawler(AbstractCrawler):
                 semaphore=semaphore,
             )
             for post_item in note_list
+            if self.frontier.should_crawl(post_item.get("note_id"))
         ]
 
         note_details = await asyncio.gather(*task_list)
         for note_detail in note_details:
             if note_detail:
                 await xhs_store.update_xhs_note(note_detail)
+                self.frontier.record(
+                    note_detail.get("note_id"), self.get_note_comment_count(note_detail)
+                )
+
+    @staticmethod
+    def get_note_comment_count(note_item: Dict) -> Optional[str]:
+        """
+        笔记的评论数，作为跨任务去重的内容指纹
+        :param note_item: 搜索结果中的 note_card 或笔记详情
+        :return:
+        """
+        return note_item.get("interact_info", {}).get("comment_count")
 
     async def get_specified_notes(self):
         """
@@ -301,7 +387,7 @@ class XiaoHongShuCrawler(AbstractCrawler):
                 ] = await self.xhs_client.get_note_by_id_from_html(
                     note_id, xsec_source, xsec_token, enable_cookie=True
                 )
-                time.sleep(crawl_interval)
+                await crawl_sleep(crawl_interval)
                 if not note_detail_from_html:
                     # 如果网页版笔记详情获取失败，则尝试不使用cookie获取
                     note_detail_from_html = (
@@ -325,6 +411,11 @@ class XiaoHongShuCrawler(AbstractCrawler):
                         {"xsec_token": xsec_token, "xsec_source": xsec_source}
                     )
                     return note_detail
+            except CircuitOpenError as ex:
+                utils.logger.error(
+                    f"[XiaoHongShuCrawler.get_note_detail_async_task] circuit is open, skip: {ex}"
+                )
+                return None
             except DataFetchError as ex:
                 utils.logger.error(
                     f"[XiaoHongShuCrawler.get_note_detail_async_task] Get note detail error: {ex}"
@@ -379,7 +470,7 @@ class XiaoHongShuCrawler(AbstractCrawler):
                 xsec_token=xsec_token,
                 crawl_interval=crawl_interval,
                 callback=xhs_store.batch_update_xhs_note_comments,
-                max_count=CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
+                max_count=config.CRAWLER_MAX_COMMENTS_COUNT_SINGLENOTES,
             )
 
     @staticmethod
@@ -397,7 +488,18 @@ class XiaoHongShuCrawler(AbstractCrawler):
         }
         return playwright_proxy, httpx_proxy
 
-    async def create_xhs_client(self, httpx_proxy: Optional[str]) -> XiaoHongShuClient:
+    async def refresh_session(self):
+        """
+        熔断冷却结束后重新打开首页并刷新 cookie
+        Returns:
+
+        """
+        await self.context_page.goto(self.index_url)
+        await self.xhs_client.update_cookies(browser_context=self.browser_context)
+
+    async def create_xhs_client(
+        self, httpx_proxy: Optional[str], ip_pool: Optional[ProxyIpPool] = None
+    ) -> XiaoHongShuClient:
         """Create xhs client"""
         utils.logger.info(
             "[XiaoHongShuCrawler.create_xhs_client] Begin create xiaohongshu API client ..."
@@ -407,6 +509,7 @@ class XiaoHongShuCrawler(AbstractCrawler):
         )
         xhs_client_obj = XiaoHongShuClient(
             proxies=httpx_proxy,
+            ip_pool=ip_pool,
             headers={
                 "User-Agent": self.user_agent,
                 "Cookie": cookie_str,
@@ -419,6 +522,33 @@ class XiaoHongShuCrawler(AbstractCrawler):
         )
         return xhs_client_obj
 
+    async def create_browser_context(
+        self, chromium: BrowserType, stealth_path: str
+    ) -> BrowserContext:
+        """
+        启动浏览器并注入反检测脚本和 cookie，浏览器上下文池中没有可复用的上下文时调用
+        :param chromium:
+        :param stealth_path:
+        :return:
+        """
+        browser_context = await self.launch_browser(
+            chromium, None, self.user_agent, headless=config.HEADLESS
+        )
+        # stealth.min.js is a js script to prevent the website from detecting the crawler.
+        await browser_context.add_init_script(path=stealth_path)
+        # add a cookie attribute webId to avoid the appearance of a sliding captcha on the webpage
+        await browser_context.add_cookies(
+            [
+                {
+                    "name": "webId",
+                    "value": "xxx123",  # any value
+                    "domain": ".xiaohongshu.com",
+                    "path": "/",
+                }
+            ]
+        )
+        return browser_context
+
     async def launch_browser(
         self,
         chromium: BrowserType,
@@ -469,6 +599,7 @@ class XiaoHongShuCrawler(AbstractCrawler):
     async def get_note_images(self, note_item: Dict):
         """
         get note images. please use get_notice_media
+        images are submitted to the media download stage instead of downloaded inline
         :param note_item:
         :return:
         """
@@ -488,12 +619,18 @@ class XiaoHongShuCrawler(AbstractCrawler):
             url = pic.get("url")
             if not url:
                 continue
-            content = await self.xhs_client.get_note_media(url)
-            if content is None:
-                continue
             extension_file_name = f"{picNum}.jpg"
             picNum += 1
-            await xhs_store.update_xhs_note_image(note_id, content, extension_file_name)
+            await self.media_stage.submit(
+                url,
+                functools.partial(
+                    xhs_store.update_xhs_note_media_stream,
+                    note_id,
+                    url,
+                    functools.partial(self.xhs_client.download_note_media, url),
+                    extension_file_name,
+                ),
+            )
 
     async def get_notice_video(self, note_item: Dict):
         """
@@ -511,9 +648,15 @@ class XiaoHongShuCrawler(AbstractCrawler):
             return
         videoNum = 0
         for url in videos:
-            content = await self.xhs_client.get_note_media(url)
-            if content is None:
-                continue
             extension_file_name = f"{videoNum}.mp4"
             videoNum += 1
-            await xhs_store.update_xhs_note_image(note_id, content, extension_file_name)
+            await self.media_stage.submit(
+                url,
+                functools.partial(
+                    xhs_store.update_xhs_note_media_stream,
+                    note_id,
+                    url,
+                    functools.partial(self.xhs_client.download_note_media, url),
+                    extension_file_name,
+                ),
+            )
@@ -10,23 +10,26 @@
 
 
 # -*- coding: utf-8 -*-
-import asyncio
 import json
 import re
 from html import unescape
 from time import sleep
 from typing import Any, Callable, Dict, List, Optional, Union
-from urllib.parse import urlencode
+from urllib.parse import parse_qs, urlencode, urlparse
 
 import config
-import httpx
 from base.base_crawler import AbstractApiClient
 from constant import zhihu as zhihu_constant
 from httpx import Response
 from model.m_zhihu import ZhihuComment, ZhihuContent, ZhihuCreator
 from playwright.async_api import BrowserContext, Page
-from tenacity import retry, stop_after_attempt, wait_fixed
+from proxy.proxy_ip_pool import ProxyIpPool
+from proxy.proxy_transport import ProxyTransport
 from tools import utils
+from tools.account_pool import AccountPool, current_account
+from tools.async_pipeline import BoundedTaskGroup
+from tools.rate_limiter import THROTTLE_STATUS_CODES, crawl_sleep
+from tools.retry_policy import retry_request
 
 from .exception import DataFetchError, ForbiddenError
 from .field import SearchSort, SearchTime, SearchType
@@ -38,12 +41,23 @@ class ZhiHuClient(AbstractApiClient):
         self,
         timeout=10,
         proxies=None,
+        ip_pool: Optional[ProxyIpPool] = None,
         *,
         headers: Dict[str, str],
-        playwright_page: Page,
+        playwright_page: Optional[Page],
         cookie_dict: Dict[str, str],
     ):
         self.proxies = proxies
+        # 浏览器登录的账号和 PLATFORM_ACCOUNT_COOKIES 中配置的账号轮流使用
+        self.account_pool = AccountPool("zhihu", headers.get("cookie", ""), cookie_dict)
+        self.account_pool.set_pong_callback(self.pong)
+        # 每次请求从代理池租用代理，没有代理池时使用固定代理
+        self.transport = ProxyTransport(
+            "zhihu",
+            ip_pool=ip_pool,
+            default_proxies=proxies,
+            account_pool=self.account_pool,
+        )
         self.timeout = timeout
         self.default_headers = headers
         self.cookie_dict = cookie_dict
@@ -59,11 +73,13 @@ class ZhiHuClient(AbstractApiClient):
         Returns:
 
         """
-        d_c0 = self.cookie_dict.get("d_c0")
+        account = current_account() or self.account_pool.primary
+        d_c0 = account.cookie_dict.get("d_c0")
         if not d_c0:
             raise Exception("d_c0 not found in cookies")
-        sign_res = sign(url, self.default_headers["cookie"])
+        sign_res = sign(url, account.cookie_str)
         headers = self.default_headers.copy()
+        headers["cookie"] = account.cookie_str
         headers["x-zst-81"] = sign_res["x-zst-81"]
         headers["x-zse-96"] = sign_res["x-zse-96"]
         return headers
@@ -110,7 +126,7 @@ class ZhiHuClient(AbstractApiClient):
     #         utils.logger.error(f"[ZhiHuClient.request] Request error: {response.text}")
     #         raise DataFetchError(response.text)
 
-    @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
+    @retry_request("zhihu")
     async def request(self, method, url, **kwargs) -> Union[str, Any]:
         """
         封装httpx的公共请求方法，对请求响应做一些处理
@@ -123,33 +139,27 @@ class ZhiHuClient(AbstractApiClient):
 
         """
         return_response = kwargs.pop("return_response", False)
-        # +++ 兼容新旧版本代理设置 +++
-        client_args = {}
-        if self.proxies:
-            # 新版 httpx (>=0.24.0) 使用 transport 参数
-            if hasattr(httpx, "AsyncHTTPTransport"):
-                client_args["transport"] = httpx.AsyncHTTPTransport(proxy=self.proxies)
-            # 旧版 httpx (<0.24.0) 使用 proxies 参数
-            else:
-                client_args["proxies"] = self.proxies
 
+        lease = await self.transport.lease(url)
         # +++ 添加调试信息 +++
-        utils.logger.debug(f"[ZhiHuClient.request] 使用代理设置: {client_args}")
-
-        async with httpx.AsyncClient(**client_args) as client:
-            response = await client.request(method, url, timeout=self.timeout, **kwargs)
+        utils.logger.debug(f"[ZhiHuClient.request] 使用代理: {lease.proxy}")
+        response = await lease.request(method, url, timeout=self.timeout, **kwargs)
 
-            # +++ 新增响应日志 +++
-            status = response.status_code
-            content_type = response.headers.get("content-type", "")
-            content_length = response.headers.get("content-length", "0")
-
-            utils.logger.debug(
-                f"[ZhiHuClient.request] 响应状态: {status}, "
-                f"类型: {content_type}, "
-                f"大小: {content_length}字节"
-            )
+        # +++ 新增响应日志 +++
+        status = response.status_code
+        content_type = response.headers.get("content-type", "")
+        content_length = response.headers.get("content-length", "0")
+
+        utils.logger.debug(
+            f"[ZhiHuClient.request] 响应状态: {status}, "
+            f"类型: {content_type}, "
+            f"大小: {content_length}字节"
+        )
 
+        if response.status_code in THROTTLE_STATUS_CODES:
+            lease.report_throttled(f"status {response.status_code}")
+        elif response.status_code in (200, 404):
+            lease.report_success()
         if response.status_code != 200:
             utils.logger.error(
                 f"[ZhiHuClient.request] 请求URL: {url}, 错误: {response.text}"
@@ -207,7 +217,6 @@ class ZhiHuClient(AbstractApiClient):
         final_uri = uri
         if isinstance(params, dict):
             final_uri += "?" + urlencode(params)
-        headers = await self._pre_headers(final_uri)
         base_url = (
             zhihu_constant.ZHIHU_URL
             if "/p/" not in uri
@@ -215,8 +224,12 @@ class ZhiHuClient(AbstractApiClient):
         )
         url = base_url + final_uri
 
-        # 调用请求方法
-        response = await self.request(method="GET", url=url, headers=headers, **kwargs)
+        # 每个请求租用一个账号，签名和发送使用同一个账号
+        async with self.account_pool.lease():
+            headers = await self._pre_headers(final_uri)
+            response = await self.request(
+                method="GET", url=url, headers=headers, **kwargs
+            )
 
         # +++ 新增响应日志 +++
         if isinstance(response, str):
@@ -237,6 +250,13 @@ class ZhiHuClient(AbstractApiClient):
 
         return response
 
+    async def close(self):
+        """
+        关闭各代理的 httpx 连接池，爬虫结束时调用
+        :return:
+        """
+        await self.transport.aclose()
+
     async def pong(self) -> bool:
         """
         用于检查登录态是否失效了
@@ -273,6 +293,7 @@ class ZhiHuClient(AbstractApiClient):
         cookie_str, cookie_dict = utils.convert_cookies(await browser_context.cookies())
         self.default_headers["cookie"] = cookie_str
         self.cookie_dict = cookie_dict
+        self.account_pool.update_primary(cookie_str, cookie_dict)
 
     async def get_current_user_info(self) -> Dict:
         """
@@ -400,6 +421,11 @@ class ZhiHuClient(AbstractApiClient):
         is_end: bool = False
         offset: str = ""
         limit: int = 10
+        # 子评论在后台并发展开，一级评论继续翻页
+        sub_comment_group = BoundedTaskGroup(
+            config.SUB_COMMENT_CONCURRENCY,
+            name=f"zhihu_sub_comments_{content.content_id}",
+        )
         while not is_end:
             root_comment_res = await self.get_root_comments(
                 content.content_id, content.content_type, offset, limit
@@ -420,10 +446,17 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(comments)
 
             result.extend(comments)
-            await self.get_comments_all_sub_comments(
-                content, comments, crawl_interval=crawl_interval, callback=callback
-            )
-            await asyncio.sleep(crawl_interval)
+            if config.ENABLE_GET_SUB_COMMENTS:
+                for parent_comment in comments:
+                    if parent_comment.sub_comment_count == 0:
+                        continue
+                    sub_comment_group.spawn(
+                        self.get_comment_all_sub_comments(
+                            content, parent_comment, crawl_interval, callback
+                        )
+                    )
+            await crawl_sleep(crawl_interval)
+        await sub_comment_group.wait()
         return result
 
     async def get_comments_all_sub_comments(
@@ -447,36 +480,66 @@ class ZhiHuClient(AbstractApiClient):
         if not config.ENABLE_GET_SUB_COMMENTS:
             return []
 
-        all_sub_comments: List[ZhihuComment] = []
-        for parment_comment in comments:
-            if parment_comment.sub_comment_count == 0:
+        sub_comment_group = BoundedTaskGroup(
+            config.SUB_COMMENT_CONCURRENCY, name="zhihu_sub_comments"
+        )
+        for parent_comment in comments:
+            if parent_comment.sub_comment_count == 0:
                 continue
-
-            is_end: bool = False
-            offset: str = ""
-            limit: int = 10
-            while not is_end:
-                child_comment_res = await self.get_child_comments(
-                    parment_comment.comment_id, offset, limit
-                )
-                if not child_comment_res:
-                    break
-                paging_info = child_comment_res.get("paging", {})
-                is_end = paging_info.get("is_end")
-                offset = self._extractor.extract_offset(paging_info)
-                sub_comments = self._extractor.extract_comments(
-                    content, child_comment_res.get("data")
+            sub_comment_group.spawn(
+                self.get_comment_all_sub_comments(
+                    content, parent_comment, crawl_interval, callback
                 )
+            )
+        all_sub_comments: List[ZhihuComment] = []
+        for sub_comments in await sub_comment_group.wait():
+            all_sub_comments.extend(sub_comments)
+        return all_sub_comments
 
-                if not sub_comments:
-                    break
+    async def get_comment_all_sub_comments(
+        self,
+        content: ZhihuContent,
+        parent_comment: ZhihuComment,
+        crawl_interval: float = 1.0,
+        callback: Optional[Callable] = None,
+    ) -> List[ZhihuComment]:
+        """
+        获取一条评论下的所有子评论
+        Args:
+            content: 内容详情对象(问题｜文章｜视频)
+            parent_comment: 父评论
+            crawl_interval: 爬取一次笔记的延迟单位（秒）
+            callback: 一次笔记爬取结束后
 
-                if callback:
-                    await callback(sub_comments)
+        Returns:
 
-                all_sub_comments.extend(sub_comments)
-                await asyncio.sleep(crawl_interval)
-        return all_sub_comments
+        """
+        result: List[ZhihuComment] = []
+        is_end: bool = False
+        offset: str = ""
+        limit: int = 10
+        while not is_end:
+            child_comment_res = await self.get_child_comments(
+                parent_comment.comment_id, offset, limit
+            )
+            if not child_comment_res:
+                break
+            paging_info = child_comment_res.get("paging", {})
+            is_end = paging_info.get("is_end")
+            offset = self._extractor.extract_offset(paging_info)
+            sub_comments = self._extractor.extract_comments(
+                content, child_comment_res.get("data")
+            )
+
+            if not sub_comments:
+                break
+
+            if callback:
+                await callback(sub_comments)
+
+            result.extend(sub_comments)
+            await crawl_sleep(crawl_interval)
+        return result
 
     async def get_creator_info(self, url_token: str) -> Optional[ZhihuCreator]:
         """
@@ -594,7 +657,7 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(contents)
             all_contents.extend(contents)
             offset += limit
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
         return all_contents
 
     async def get_all_articles_by_creator(
@@ -630,7 +693,7 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(contents)
             all_contents.extend(contents)
             offset += limit
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
         return all_contents
 
     async def get_all_videos_by_creator(
@@ -666,7 +729,7 @@ class ZhiHuClient(AbstractApiClient):
                 await callback(contents)
             all_contents.extend(contents)
             offset += limit
-            await asyncio.sleep(crawl_interval)
+            await crawl_sleep(crawl_interval)
         return all_contents
 
     async def get_answer_info(
@@ -838,14 +901,19 @@ class ZhiHuClient(AbstractApiClient):
         return self._extractor.extract_zvideo_content_from_html(response_html)
 
     async def get_question_answers(
-        self, question_id: str, offset: int = 0, limit: int = 20
+        self,
+        question_id: str,
+        offset: Union[int, str] = 0,
+        limit: int = 20,
+        cursor: str = "",
     ) -> Dict:
         """
-        获取问题的所有回答
+        获取问题的一页回答
         Args:
             question_id: 问题ID
             offset: 偏移量
             limit: 每页数量
+            cursor: 分页游标，取自上一页 paging.next
 
         Returns:
 
@@ -857,4 +925,55 @@ class ZhiHuClient(AbstractApiClient):
             "limit": limit,
             "order_by": "created",
         }
+        if cursor:
+            params["cursor"] = cursor
         return await self.get(uri, params)
+
+    async def get_all_question_answers(
+        self,
+        question_id: str,
+        crawl_interval: float = 1.0,
+        callback: Optional[Callable] = None,
+        max_count: int = 0,
+        page_size: int = 20,
+    ) -> List[Dict]:
+        """
+        按分页游标获取问题下的所有回答，每一页通过 callback 推送给调用方
+        Args:
+            question_id: 问题ID
+            crawl_interval: 爬取一页的延迟单位（秒）
+            callback: 每一页回答爬取结束后
+            max_count: 最多获取的回答数量，0 表示不限制
+            page_size: 每页数量
+
+        Returns:
+
+        """
+        result: List[Dict] = []
+        is_end: bool = False
+        offset: Union[int, str] = 0
+        cursor: str = ""
+        while not is_end and (not max_count or len(result) < max_count):
+            answers_res = await self.get_question_answers(
+                question_id, offset, page_size, cursor
+            )
+            if not answers_res:
+                break
+            answers: List[Dict] = answers_res.get("data", [])
+            if not answers:
+                break
+            paging_info: Dict = answers_res.get("paging", {})
+            is_end = paging_info.get("is_end", True)
+            next_query = parse_qs(urlparse(paging_info.get("next", "")).query)
+            cursor = next_query.get("cursor", [""])[0]
+            offset = self._extractor.extract_offset(paging_info) or (
+                int(offset) + len(answers)
+            )
+
+            if max_count and len(result) + len(answers) > max_count:
+                answers = answers[: max_count - len(result)]
+            if callback:
+                await callback(answers)
+            result.extend(answers)
+            await crawl_sleep(crawl_interval)
+        return result
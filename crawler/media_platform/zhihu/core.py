@@ -22,10 +22,13 @@ import config
 from base.base_crawler import AbstractCrawler
 from constant import zhihu as constant
 from model.m_zhihu import ZhihuContent, ZhihuCreator, ZhihuQuestionAnswer
-from playwright.async_api import BrowserContext, BrowserType, Page, async_playwright
-from proxy.proxy_ip_pool import IpInfoModel, create_ip_pool
+from playwright.async_api import BrowserContext, BrowserType, Page
+from proxy.proxy_ip_pool import IpInfoModel, ProxyIpPool, create_ip_pool
 from store import zhihu as zhihu_store
 from tools import utils
+from tools.async_pipeline import BoundedTaskGroup
+from tools.browser_pool import browser_pool_key, get_browser_pool
+from tools.session_state import SessionState, load_session_state, save_session_state
 from var import crawler_type_var, source_keyword_var
 
 from .client import ZhiHuClient
@@ -52,6 +55,7 @@ class ZhihuCrawler(AbstractCrawler):
 
         """
         playwright_proxy_format, httpx_proxy_format = None, None
+        ip_proxy_pool: Optional[ProxyIpPool] = None
         if config.ENABLE_IP_PROXY:
             ip_proxy_pool = await create_ip_pool(
                 config.IP_PROXY_POOL_COUNT, enable_validate_ip=True
@@ -61,73 +65,127 @@ class ZhihuCrawler(AbstractCrawler):
                 ip_proxy_info
             )
 
-        async with async_playwright() as playwright:  # 使用async_playwright启动浏览器上下文，并加载指定的用户代理和无头模式设置。
-            # Launch a browser context.
-            chromium = playwright.chromium
-            current_file = os.path.abspath(__file__)
-            crawler_dir = os.path.dirname(
-                os.path.dirname(os.path.dirname(current_file))
-            )
-            stealth_path = os.path.join(crawler_dir, "libs", "stealth.min.js")
-            self.browser_context = await self.launch_browser(
-                chromium, None, self.user_agent, headless=config.HEADLESS
-            )
-            # stealth.min.js is a js script to prevent the website from detecting the crawler.添加stealth.min.js脚本防止网站检测爬虫。
-            # await self.browser_context.add_init_script(path="libs/stealth.min.js")
-            await self.browser_context.add_init_script(path=stealth_path)
-
-            self.context_page = await self.browser_context.new_page()
-            await self.context_page.goto(self.index_url, wait_until="domcontentloaded")
-
-            # Create a client to interact with the zhihu website.
-            self.zhihu_client = await self.create_zhihu_client(httpx_proxy_format)
-            if not await self.zhihu_client.pong():  # 检测是否登录成功，如果失败，则进行登录
-                login_obj = ZhiHuLogin(
-                    login_type=config.LOGIN_TYPE,
-                    login_phone="",  # input your phone number
-                    browser_context=self.browser_context,
-                    context_page=self.context_page,
-                    cookie_str=config.COOKIES,
+        try:
+            if (
+                config.ENABLE_BROWSER_FREE_MODE
+                and await self.open_browser_free_session(
+                    httpx_proxy_format, ip_proxy_pool
+                )
+            ):
+                await self.crawl()
+                return
+
+            # 从浏览器上下文池租用已经打开首页的浏览器，池中没有时才启动新的浏览器，并加载指定的用户代理和无头模式设置。
+            async with get_browser_pool().lease(
+                browser_pool_key(config.PLATFORM),
+                self.create_browser_context,
+                self.index_url,
+                exclusive=config.SAVE_LOGIN_STATE,
+                wait_until="domcontentloaded",
+            ) as pooled_browser:
+                self.browser_context = pooled_browser.browser_context
+                self.context_page = pooled_browser.page
+
+                # Create a client to interact with the zhihu website.
+                self.zhihu_client = await self.create_zhihu_client(
+                    httpx_proxy_format, ip_proxy_pool
+                )
+                if not await self.zhihu_client.pong():  # 检测是否登录成功，如果失败，则进行登录
+                    login_obj = ZhiHuLogin(
+                        login_type=config.LOGIN_TYPE,
+                        login_phone="",  # input your phone number
+                        browser_context=self.browser_context,
+                        context_page=self.context_page,
+                        cookie_str=config.COOKIES,
+                    )
+                    await login_obj.begin()
+                    await self.zhihu_client.update_cookies(
+                        browser_context=self.browser_context
+                    )
+
+                # 知乎的搜索接口需要打开搜索页面之后cookies才能访问API，单独的首页不行
+                utils.logger.info(
+                    "[ZhihuCrawler.start] Zhihu跳转到搜索页面获取搜索页面的Cookies，该过程需要5秒左右"
+                )
+                await self.context_page.goto(
+                    f"{self.index_url}/search?q=python&search_source=Guess&utm_content=search_hot&type=content"
                 )
-                await login_obj.begin()
+                await asyncio.sleep(5)
                 await self.zhihu_client.update_cookies(
                     browser_context=self.browser_context
                 )
+                if config.SAVE_LOGIN_STATE:
+                    # 导出打开搜索页之后的登录态，之后的免浏览器模式任务直接使用
+                    await save_session_state(self.browser_context, config.PLATFORM)
+
+                await self.crawl()
+        finally:
+            # 免浏览器模式和浏览器模式都会创建 zhihu_client
+            zhihu_client = getattr(self, "zhihu_client", None)
+            if zhihu_client is not None:
+                await zhihu_client.close()
+
+    async def crawl(self) -> None:
+        """
+        按爬取类型开始爬取，zhihu_client 需要已经完成登录
+        Returns:
+
+        """
+        crawler_type_var.set(config.CRAWLER_TYPE)
+        if config.CRAWLER_TYPE == "search":
+            # Search for notes and retrieve their comment information.
+            await self.search()
+        elif config.CRAWLER_TYPE == "detail":
+            # Get the information and comments of the specified post
+            await self.get_specified_notes()
+        elif config.CRAWLER_TYPE == "creator":
+            # Get creator's information and their notes and comments
+            await self.get_creators_and_notes()
+        elif config.CRAWLER_TYPE == "question":
+            await self.get_question_and_notes()
+        else:
+            pass
+
+        utils.logger.info("[ZhihuCrawler.start] Zhihu Crawler finished ...")
+
+    async def open_browser_free_session(
+        self, httpx_proxy: Optional[str], ip_pool: Optional[ProxyIpPool] = None
+    ) -> bool:
+        """
+        免浏览器模式：使用保存的登录态创建 zhihu_client，请求头在进程内用 zhihu.js 签名，不启动浏览器
+        Args:
+            httpx_proxy: httpx 代理
+            ip_pool: 代理池，开启后每次请求从代理池租用代理
 
-            # 知乎的搜索接口需要打开搜索页面之后cookies才能访问API，单独的首页不行
+        Returns:
+            没有保存的登录态或者登录态已经失效时返回 False，需要启动浏览器重新登录
+        """
+        session_state = load_session_state(config.PLATFORM)
+        if session_state is None:
             utils.logger.info(
-                "[ZhihuCrawler.start] Zhihu跳转到搜索页面获取搜索页面的Cookies，该过程需要5秒左右"
+                "[ZhihuCrawler.open_browser_free_session] no saved session state, fallback to browser"
             )
-            await self.context_page.goto(
-                f"{self.index_url}/search?q=python&search_source=Guess&utm_content=search_hot&type=content"
+            return False
+        self.zhihu_client = await self.create_zhihu_client(
+            httpx_proxy, ip_pool, session_state=session_state
+        )
+        if not await self.zhihu_client.pong():
+            utils.logger.info(
+                "[ZhihuCrawler.open_browser_free_session] saved session expired, fallback to browser"
             )
-            await asyncio.sleep(5)
-            await self.zhihu_client.update_cookies(browser_context=self.browser_context)
-
-            crawler_type_var.set(config.CRAWLER_TYPE)
-            if config.CRAWLER_TYPE == "search":
-                # Search for notes and retrieve their comment information.
-                await self.search()
-            elif config.CRAWLER_TYPE == "detail":
-                # Get the information and comments of the specified post
-                await self.get_specified_notes()
-            elif config.CRAWLER_TYPE == "creator":
-                # Get creator's information and their notes and comments
-                await self.get_creators_and_notes()
-            elif config.CRAWLER_TYPE == "question":
-                await self.get_question_and_notes()
-            else:
-                pass
-
-            utils.logger.info("[ZhihuCrawler.start] Zhihu Crawler finished ...")
+            return False
+        utils.logger.info(
+            "[ZhihuCrawler.open_browser_free_session] use saved session without browser"
+        )
+        return True
 
     async def search(self) -> None:
         """Search for notes and retrieve their comment information."""
         utils.logger.info("[ZhihuCrawler.search] Begin search zhihu keywords")
         zhihu_limit_count = 20  # zhihu limit page fixed value
         # 如果配置的最大笔记数量小于知乎分页限制值，则调整为分页限制值
-        if config.CRAWLER_MAX_NOTES_COUNT < zhihu_limit_count:
-            config.CRAWLER_MAX_NOTES_COUNT = zhihu_limit_count
+        # 不修改全局配置，避免影响同一进程内的其他任务
+        max_notes_count = max(config.CRAWLER_MAX_NOTES_COUNT, zhihu_limit_count)
         # 获取起始页码
         start_page = config.START_PAGE
         for keyword in config.KEYWORDS.split(","):
@@ -136,9 +194,7 @@ class ZhihuCrawler(AbstractCrawler):
                 f"[ZhihuCrawler.search] Current search keyword: {keyword}"
             )
             page = 1
-            while (
-                page - start_page + 1
-            ) * zhihu_limit_count <= config.CRAWLER_MAX_NOTES_COUNT:
+            while (page - start_page + 1) * zhihu_limit_count <= max_notes_count:
                 # 跳过小于起始页码的页面
                 if page < start_page:
                     utils.logger.info(f"[ZhihuCrawler.search] Skip page {page}")
@@ -362,16 +418,30 @@ class ZhihuCrawler(AbstractCrawler):
         }
         return playwright_proxy, httpx_proxy
 
-    async def create_zhihu_client(self, httpx_proxy: Optional[str]) -> ZhiHuClient:
-        """Create zhihu client"""
+    async def create_zhihu_client(
+        self,
+        httpx_proxy: Optional[str],
+        ip_pool: Optional[ProxyIpPool] = None,
+        session_state: Optional[SessionState] = None,
+    ) -> ZhiHuClient:
+        """Create zhihu client, session_state 不为空时使用保存的登录态，不依赖浏览器"""
         utils.logger.info(
             "[ZhihuCrawler.create_zhihu_client] Begin create zhihu API client ..."
         )
-        cookie_str, cookie_dict = utils.convert_cookies(
-            await self.browser_context.cookies()
-        )
+        if session_state is not None:
+            cookie_str, cookie_dict = (
+                session_state.cookie_str,
+                session_state.cookie_dict,
+            )
+            playwright_page = None
+        else:
+            cookie_str, cookie_dict = utils.convert_cookies(
+                await self.browser_context.cookies()
+            )
+            playwright_page = self.context_page
         zhihu_client_obj = ZhiHuClient(
             proxies=httpx_proxy,
+            ip_pool=ip_pool,
             headers={
                 "accept": "*/*",
                 "accept-language": "zh-CN,zh;q=0.9",
@@ -384,11 +454,30 @@ class ZhihuCrawler(AbstractCrawler):
                 "x-requested-with": "fetch",
                 "x-zse-93": "101_3_3.0",
             },
-            playwright_page=self.context_page,
+            playwright_page=playwright_page,
             cookie_dict=cookie_dict,
         )
         return zhihu_client_obj
 
+    async def create_browser_context(self, chromium: BrowserType) -> BrowserContext:
+        """
+        启动浏览器并注入反检测脚本，浏览器上下文池中没有可复用的上下文时调用
+        Args:
+            chromium:
+
+        Returns:
+
+        """
+        current_file = os.path.abspath(__file__)
+        crawler_dir = os.path.dirname(os.path.dirname(os.path.dirname(current_file)))
+        stealth_path = os.path.join(crawler_dir, "libs", "stealth.min.js")
+        browser_context = await self.launch_browser(
+            chromium, None, self.user_agent, headless=config.HEADLESS
+        )
+        # stealth.min.js is a js script to prevent the website from detecting the crawler.添加stealth.min.js脚本防止网站检测爬虫。
+        await browser_context.add_init_script(path=stealth_path)
+        return browser_context
+
     async def launch_browser(
         self,
         chromium: BrowserType,
@@ -451,44 +540,73 @@ class ZhihuCrawler(AbstractCrawler):
             )
             return
 
-        # Get all answers for the question
-        answers = await self.zhihu_client.get_question_answers(question_id)
-        if not answers:
-            utils.logger.info(
-                f"[ZhihuCrawler.get_question_and_notes] No answers found for question ID: {question_id}"
-            )
-            return
-
-        # Extract answers and convert to JSON
-        question_answers = []
-        for answer in answers.get("data", []):
-            answer_id = answer.get("id")
-            if not answer_id:
-                continue
-
-            # Get answer details
-            answer_info = await self.zhihu_client.get_answer_info(
-                question_id, answer_id
-            )
-            print("answer_info:", answer_info)
-            if not answer_info:
-                continue
+        # 列表接口已经带回答正文的直接入库，缺少正文的回答在后台并发请求详情，
+        # 回答列表继续翻页，每一页的回答到达后立即入库
+        detail_group = BoundedTaskGroup(
+            config.MAX_CONCURRENCY_NUM, name=f"zhihu_question_answers_{question_id}"
+        )
+        stored_answer_ids = set()
 
+        async def save_answer(answer_info: ZhihuContent):
             # 将 answer_info 转换为 ZhihuQuestionAnswer 对象
             answer_dict = answer_info.model_dump()
             # 确保时间字段有默认值
-            if "created_time" not in answer_dict or answer_dict["created_time"] is None:
+            if answer_dict.get("created_time") is None:
                 answer_dict["created_time"] = 0
-            if "updated_time" not in answer_dict or answer_dict["updated_time"] is None:
+            if answer_dict.get("updated_time") is None:
                 answer_dict["updated_time"] = 0
+            await zhihu_store.update_zhihu_question_answer(
+                ZhihuQuestionAnswer(**answer_dict)
+            )
+            stored_answer_ids.add(answer_info.content_id)
 
-            question_answer = ZhihuQuestionAnswer(**answer_dict)
-            question_answer.source_keyword = source_keyword_var.get()
+        async def fetch_and_save_answer(answer_id: str):
+            answer_info = await self.zhihu_client.get_answer_info(
+                question_id, answer_id
+            )
+            if not answer_info:
+                utils.logger.info(
+                    f"[ZhihuCrawler.get_question_and_notes] Get answer info failed, answer_id: {answer_id}"
+                )
+                return
+            await save_answer(answer_info)
 
-            question_answers.append(question_answer)
+        async def on_answers(answers: List[Dict]):
+            for answer in answers:
+                answer_id = answer.get("id")
+                if not answer_id:
+                    continue
+                answer_info = self._extractor.extract_answer_content_from_api(answer)
+                if answer_info:
+                    await save_answer(answer_info)
+                else:
+                    detail_group.spawn(fetch_and_save_answer(str(answer_id)))
+
+        if config.ZHIHU_QUESTION_ALL_ANSWERS:
+            answers = await self.zhihu_client.get_all_question_answers(
+                question_id,
+                crawl_interval=random.random(),
+                callback=on_answers,
+                max_count=config.ZHIHU_QUESTION_MAX_ANSWERS_COUNT,
+                page_size=config.ZHIHU_QUESTION_ANSWERS_PAGE_SIZE,
+            )
+        else:
+            answers_res = await self.zhihu_client.get_question_answers(
+                question_id, limit=config.ZHIHU_QUESTION_ANSWERS_PAGE_SIZE
+            )
+            answers = (answers_res or {}).get("data", [])
+            await on_answers(answers)
+        await detail_group.wait()
 
-        # 存储 question_answers 到 JSON 文件
-        await zhihu_store.batch_update_zhihu_question_answers(question_answers)
+        if not answers:
+            utils.logger.info(
+                f"[ZhihuCrawler.get_question_and_notes] No answers found for question ID: {question_id}"
+            )
+            return
+        utils.logger.info(
+            f"[ZhihuCrawler.get_question_and_notes] question {question_id} answers listed: {len(answers)}, "
+            f"stored: {len(stored_answer_ids)}"
+        )
 
 
 # ... existing code ...
@@ -134,6 +134,38 @@ class ZhihuExtractor:
         res.user_url_token = author_info.url_token
         return res
 
+    def extract_answer_content_from_api(self, answer: Dict) -> Optional[ZhihuContent]:
+        """
+        extract zhihu answer content from question answers api
+        Args:
+            answer: 问题回答列表接口中的单个回答
+
+        Returns: 接口没有返回回答正文时返回 None，需要再请求回答详情
+        """
+        if not answer.get("content"):
+            return None
+        question: Dict = answer.get("question") or {}
+        res = ZhihuContent()
+        res.content_id = str(answer.get("id", ""))
+        res.content_type = answer.get("type") or zhihu_constant.ANSWER_NAME
+        res.content_text = extract_text_from_html(answer.get("content", ""))
+        res.question_id = str(question.get("id", ""))
+        res.content_url = f"{zhihu_constant.ZHIHU_URL}/question/{res.question_id}/answer/{res.content_id}"
+        res.title = extract_text_from_html(question.get("title", ""))
+        res.desc = extract_text_from_html(answer.get("excerpt", ""))
+        res.created_time = answer.get("created_time", 0)
+        res.updated_time = answer.get("updated_time", 0)
+        res.voteup_count = answer.get("voteup_count", 0)
+        res.comment_count = answer.get("comment_count", 0)
+
+        author_info = self._extract_content_or_comment_author(answer.get("author"))
+        res.user_id = author_info.user_id
+        res.user_link = author_info.user_link
+        res.user_nickname = author_info.user_nickname
+        res.user_avatar = author_info.user_avatar
+        res.user_url_token = author_info.url_token
+        return res
+
     def _extract_article_content(self, article: Dict) -> ZhihuContent:
         """
         extract zhihu article content
@@ -0,0 +1,219 @@
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import config
+import db
+from store.store_events import add_store_listener, remove_store_listener
+from tools import utils
+from tools.circuit_breaker import get_circuit_breaker_stats
+from tools.rate_limiter import get_rate_limiter_stats
+from tools.retry_policy import get_retry_stats
+
+
+@dataclass
+class CrawlTarget:
+    """一次爬取任务：平台 + 爬取类型 + 只对该任务生效的配置"""
+
+    platform: str
+    crawler_type: str
+    login_type: str = "cookie"
+    overrides: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def name(self) -> str:
+        return f"{self.platform}-{self.crawler_type}"
+
+
+@dataclass
+class CrawlProgress:
+    """单个爬取任务的进度"""
+
+    status: str = "pending"  # pending | running | completed | error
+    start_ts: float = 0.0
+    end_ts: float = 0.0
+    error: str = ""
+    item_counts: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    @property
+    def elapsed(self) -> float:
+        if not self.start_ts:
+            return 0.0
+        return (self.end_ts or time.monotonic()) - self.start_ts
+
+    def to_dict(self) -> Dict:
+        return {
+            "status": self.status,
+            "elapsed": round(self.elapsed, 1),
+            "error": self.error,
+            "item_counts": dict(self.item_counts),
+        }
+
+
+class CrawlOrchestrator:
+    """
+    多平台并发爬取：
+    - 不同平台的爬虫在同一个事件循环中并发运行，各自使用独立的浏览器上下文和任务配置，
+      总耗时接近最慢的平台而不是所有平台之和
+    - 同一个平台的多个爬取类型共用同一个浏览器用户数据目录（登录态），按顺序执行
+    - 通过存储事件统计各任务已保存的数据量，定期输出汇总进度
+    """
+
+    def __init__(
+        self,
+        targets: List[CrawlTarget],
+        max_concurrent_platforms: int = 0,
+        concurrency_per_crawler: int = 0,
+        progress_interval_sec: float = 30,
+    ):
+        """
+        :param targets: 爬取任务列表
+        :param max_concurrent_platforms: 同时运行的平台数量，0 表示不限制
+        :param concurrency_per_crawler: 每个爬虫的 MAX_CONCURRENCY_NUM，0 表示使用默认配置，
+            任务自己的 overrides 中指定时以任务为准
+        :param progress_interval_sec: 汇总进度日志的输出间隔
+        """
+        self.targets = targets
+        self.concurrency_per_crawler = concurrency_per_crawler
+        self.progress_interval_sec = progress_interval_sec
+        platform_count = len({target.platform for target in targets})
+        self._platform_semaphore = asyncio.Semaphore(
+            max_concurrent_platforms or max(1, platform_count)
+        )
+        self.progress: Dict[str, CrawlProgress] = {
+            target.name: CrawlProgress() for target in targets
+        }
+        # 平台 -> 当前正在运行的任务名，用于把存储事件归到对应的任务上
+        self._running_target: Dict[str, str] = {}
+
+    def get_progress(self) -> Dict[str, Dict]:
+        return {name: progress.to_dict() for name, progress in self.progress.items()}
+
+    async def _on_store_event(self, platform: str, item_type: str, item: Dict):
+        target_name = self._running_target.get(platform)
+        if target_name:
+            self.progress[target_name].item_counts[item_type] += 1
+
+    def _build_job_config(self, target: CrawlTarget) -> config.CrawlerJobConfig:
+        base_overrides = {
+            "PLATFORM": target.platform,
+            "LOGIN_TYPE": target.login_type,
+            "CRAWLER_TYPE": target.crawler_type,
+        }
+        if self.concurrency_per_crawler:
+            base_overrides["MAX_CONCURRENCY_NUM"] = self.concurrency_per_crawler
+        return config.build_job_config(base_overrides, target.overrides)
+
+    async def _run_target(self, target: CrawlTarget):
+        from crawler_main import CrawlerFactory
+
+        progress = self.progress[target.name]
+        progress.status = "running"
+        progress.start_ts = time.monotonic()
+        self._running_target[target.platform] = target.name
+        utils.logger.info(f"[CrawlOrchestrator._run_target] start {target.name}")
+        try:
+            crawler = CrawlerFactory.create_crawler(
+                target.platform, self._build_job_config(target)
+            )
+            await crawler.start()
+            progress.status = "completed"
+        except Exception as e:
+            progress.status = "error"
+            progress.error = str(e)
+            utils.logger.error(
+                f"[CrawlOrchestrator._run_target] {target.name} failed: {e}"
+            )
+        finally:
+            progress.end_ts = time.monotonic()
+            self._running_target.pop(target.platform, None)
+            utils.logger.info(
+                f"[CrawlOrchestrator._run_target] {target.name} {progress.status}, "
+                f"elapsed: {progress.elapsed:.1f}s"
+            )
+
+    async def _run_platform(self, targets: List[CrawlTarget]):
+        async with self._platform_semaphore:
+            for target in targets:
+                await self._run_target(target)
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(self.progress_interval_sec)
+            utils.logger.info(
+                f"[CrawlOrchestrator._report_progress] {self.get_progress()}, "
+                f"rate limiters: {get_rate_limiter_stats()}, "
+                f"circuit breakers: {get_circuit_breaker_stats()}, "
+                f"retries: {get_retry_stats()}"
+            )
+
+    async def run(self) -> Dict[str, Dict]:
+        """
+        运行所有爬取任务，返回各任务的最终进度
+        :return:
+        """
+        platform_targets: Dict[str, List[CrawlTarget]] = defaultdict(list)
+        for target in self.targets:
+            platform_targets[target.platform].append(target)
+
+        save_to_db = config.SAVE_DATA_OPTION == "db" or any(
+            target.overrides.get("SAVE_DATA_OPTION") == "db" for target in self.targets
+        )
+        if save_to_db:
+            await db.init_db()
+
+        add_store_listener(self._on_store_event)
+        reporter = asyncio.create_task(self._report_progress())
+        start_ts = time.monotonic()
+        try:
+            # 每个平台一个 task，task 之间的任务配置互不影响
+            await asyncio.gather(
+                *[
+                    asyncio.create_task(self._run_platform(targets))
+                    for targets in platform_targets.values()
+                ]
+            )
+        finally:
+            reporter.cancel()
+            remove_store_listener(self._on_store_event)
+            if save_to_db:
+                await db.close()
+
+        utils.logger.info(
+            f"[CrawlOrchestrator.run] all targets finished in {time.monotonic() - start_ts:.1f}s, "
+            f"progress: {self.get_progress()}"
+        )
+        return self.get_progress()
+
+
+async def run_multi_platform(
+    platforms: List[str],
+    crawler_type: str,
+    login_type: str = "cookie",
+    overrides: Optional[Dict[str, Any]] = None,
+    concurrency_per_crawler: int = 0,
+) -> Dict[str, Dict]:
+    """
+    使用相同的配置（例如同一组关键词）同时爬取多个平台
+    :param platforms: 平台列表，例如 ["bili", "zhihu", "xhs"]
+    :param crawler_type: 爬取类型
+    :param login_type: 登录方式
+    :param overrides: 所有平台共用的覆盖配置
+    :param concurrency_per_crawler: 每个爬虫的并发数量
+    :return:
+    """
+    targets = [
+        CrawlTarget(
+            platform=platform,
+            crawler_type=crawler_type,
+            login_type=login_type,
+            overrides=dict(overrides or {}),
+        )
+        for platform in platforms
+    ]
+    orchestrator = CrawlOrchestrator(
+        targets, concurrency_per_crawler=concurrency_per_crawler
+    )
+    return await orchestrator.run()
@@ -0,0 +1,157 @@
+"""
+代理池选取策略压测，使用本地模拟代理（localmock）和本地目标地址，不需要网络和代理商账号
+
+在 crawler 目录下运行：python -m proxy.benchmark --requests 500 --concurrency 20
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional, Type
+
+import config
+from proxy.providers import LocalMockProxy
+from proxy.proxy_ip_pool import ProxyIpPool
+from proxy.proxy_transport import ProxyTransport
+from proxy.types import IpInfoModel
+from tools import utils
+
+
+class RandomProxyIpPool(ProxyIpPool):
+    """对照组：均匀随机选择代理，不看健康度，也不剔除失败的代理"""
+
+    async def get_proxy(self, exclude: Optional[IpInfoModel] = None) -> IpInfoModel:
+        if not self.proxy_list:
+            await self.load_proxies()
+        return random.choice(self.proxy_list)
+
+    def report_failure(self, proxy: IpInfoModel, reason: str = ""):
+        return
+
+
+POOL_STRATEGIES: Dict[str, Type[ProxyIpPool]] = {
+    "random": RandomProxyIpPool,
+    "health": ProxyIpPool,
+}
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+async def run_strategy(
+    strategy: str,
+    total_requests: int,
+    concurrency: int,
+    pool_count: int,
+    seed: int,
+) -> Dict:
+    """
+    用一种代理池策略发出 total_requests 个请求，统计成功率、吞吐量和延迟
+    :param strategy: POOL_STRATEGIES 中的名称
+    :param total_requests: 请求总数
+    :param concurrency: 并发请求数
+    :param pool_count: 代理池数量
+    :param seed: 随机种子，相同的种子下每种策略拿到的模拟代理完全一样
+    :return:
+    """
+    random.seed(seed)
+    provider = LocalMockProxy(
+        latency_range=tuple(config.MOCK_PROXY_LATENCY_RANGE),
+        max_failure_rate=config.MOCK_PROXY_MAX_FAILURE_RATE,
+        expire_sec=config.MOCK_PROXY_EXPIRE_SEC,
+    )
+    target_url = await provider.start_validation_server()
+    pool = POOL_STRATEGIES[strategy](
+        ip_pool_count=pool_count,
+        enable_validate_ip=False,
+        ip_provider=provider,
+        valid_ip_url=target_url,
+    )
+    await pool.load_proxies()
+    transport = ProxyTransport("benchmark", ip_pool=pool)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failure_count = 0
+
+    async def send_one():
+        nonlocal failure_count
+        async with semaphore:
+            start_ts = time.monotonic()
+            try:
+                lease = await transport.lease(target_url)
+                response = await lease.request("GET", target_url, timeout=10)
+            except Exception:
+                failure_count += 1
+                return
+            if response.status_code == 200:
+                lease.report_success()
+                latencies.append(time.monotonic() - start_ts)
+            else:
+                lease.report_throttled(f"status {response.status_code}")
+                failure_count += 1
+
+    start_ts = time.monotonic()
+    await asyncio.gather(*[send_one() for _ in range(total_requests)])
+    elapsed = time.monotonic() - start_ts
+    proxies_used = len(provider.proxies)
+    await provider.close()
+    return {
+        "strategy": strategy,
+        "success_rate": round(len(latencies) / total_requests, 3),
+        "failures": failure_count,
+        "throughput": round(len(latencies) / elapsed, 1),
+        "p50_latency": round(percentile(latencies, 0.5), 3),
+        "p95_latency": round(percentile(latencies, 0.95), 3),
+        "proxies_used": proxies_used,
+    }
+
+
+async def run_benchmark(
+    strategies: List[str],
+    total_requests: int,
+    concurrency: int,
+    pool_count: int,
+    seed: int,
+) -> List[Dict]:
+    # 压测只看代理池本身，关闭限速和平台熔断
+    config.job_config_var.set(
+        config.build_job_config(
+            {
+                "ENABLE_RATE_LIMITER": False,
+                "CIRCUIT_BREAKER_FAILURE_THRESHOLD": total_requests + 1,
+            }
+        )
+    )
+    results = []
+    for strategy in strategies:
+        result = await run_strategy(
+            strategy, total_requests, concurrency, pool_count, seed
+        )
+        utils.logger.info(f"[benchmark.run_benchmark] {result}")
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Proxy pool strategy benchmark.")
+    parser.add_argument(
+        "--strategies", type=str, default=",".join(POOL_STRATEGIES.keys())
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--pool-count", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(
+        run_benchmark(
+            strategies=args.strategies.split(","),
+            total_requests=args.requests,
+            concurrency=args.concurrency,
+            pool_count=args.pool_count,
+            seed=args.seed,
+        )
+    )
@@ -1,2 +1,3 @@
 from .jishu_http_proxy import new_jisu_http_proxy
 from .kuaidl_proxy import new_kuai_daili_proxy
+from .local_mock_proxy import LocalMockProxy, new_local_mock_proxy
@@ -112,6 +112,7 @@ class KuaiDaiLiProxy(ProxyProvider):
                 raise Exception("get ip error from proxy provider and  code not 0 ...")
 
             proxy_list: List[str] = ip_response.get("data", {}).get("proxy_list")
+            current_ts = utils.get_unix_timestamp()
             for proxy in proxy_list:
                 proxy_model = parse_kuaidaili_proxy(proxy)
                 ip_info_model = IpInfoModel(
@@ -119,7 +120,8 @@ class KuaiDaiLiProxy(ProxyProvider):
                     port=proxy_model.port,
                     user=self.kdl_user_name,
                     password=self.kdl_user_pwd,
-                    expired_time_ts=proxy_model.expire_ts,
+                    # 快代理返回的是剩余有效秒数，统一换算成过期时间戳
+                    expired_time_ts=current_ts + proxy_model.expire_ts,
                 )
                 ip_key = (
                     f"{self.proxy_brand_name}_{ip_info_model.ip}_{ip_info_model.port}"
@@ -127,7 +129,7 @@ class KuaiDaiLiProxy(ProxyProvider):
                 self.ip_cache.set_ip(
                     ip_key,
                     ip_info_model.model_dump_json(),
-                    ex=ip_info_model.expired_time_ts,
+                    ex=proxy_model.expire_ts,
                 )
                 ip_infos.append(ip_info_model)
 
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import random
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import config
+from proxy import ProxyProvider
+from proxy.types import IpInfoModel
+from tools import utils
+
+# 一次读取 / 转发的字节数
+PIPE_CHUNK_SIZE = 64 * 1024
+
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            data = await reader.read(PIPE_CHUNK_SIZE)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _read_request_head(
+    reader: asyncio.StreamReader,
+) -> Tuple[str, str, str, List[Tuple[str, str]]]:
+    request_line = (await reader.readline()).decode("latin-1").strip()
+    method, target, version = request_line.split(" ", 2)
+    headers = []
+    while True:
+        line = (await reader.readline()).decode("latin-1")
+        if line in ("\r\n", "\n", ""):
+            break
+        name, _, value = line.partition(":")
+        headers.append((name.strip(), value.strip()))
+    return method, target, version, headers
+
+
+class LocalForwardProxy:
+    """
+    本地 HTTP 正向代理，用来模拟一个代理 IP：
+    - 支持普通 HTTP 请求转发和 HTTPS 的 CONNECT 隧道
+    - 每个请求先等待 latency 上下浮动 50% 的随机延迟，再按 failure_rate 的概率返回 502
+    """
+
+    def __init__(self, latency: float, failure_rate: float):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.port = 0
+        self.request_count = 0
+        self.failure_count = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> int:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            method, target, version, headers = await _read_request_head(reader)
+        except (ValueError, ConnectionError):
+            writer.close()
+            return
+        self.request_count += 1
+        await asyncio.sleep(self.latency * random.uniform(0.5, 1.5))
+        if random.random() < self.failure_rate:
+            self.failure_count += 1
+            writer.write(
+                b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+            )
+            await writer.drain()
+            writer.close()
+            return
+
+        try:
+            if method == "CONNECT":
+                host, _, port = target.rpartition(":")
+                upstream_reader, upstream_writer = await asyncio.open_connection(
+                    host, int(port)
+                )
+                writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+                await writer.drain()
+            else:
+                url = urlsplit(target)
+                upstream_reader, upstream_writer = await asyncio.open_connection(
+                    url.hostname, url.port or 80
+                )
+                path = url.path or "/"
+                if url.query:
+                    path = f"{path}?{url.query}"
+                head = [f"{method} {path} {version}"]
+                for name, value in headers:
+                    if (
+                        name.lower().startswith("proxy-")
+                        or name.lower() == "connection"
+                    ):
+                        continue
+                    head.append(f"{name}: {value}")
+                head.append("Connection: close")
+                upstream_writer.write(
+                    ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+                )
+        except OSError:
+            writer.write(
+                b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+            )
+            await writer.drain()
+            writer.close()
+            return
+
+        await asyncio.gather(
+            _pipe(reader, upstream_writer), _pipe(upstream_reader, writer)
+        )
+
+
+class LocalValidationServer:
+    """本地的 IP 验证地址，作用和 httpbin.org/ip 一样，任意请求都返回 200 和请求方的地址"""
+
+    def __init__(self):
+        self.port = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/ip"
+
+    async def start(self) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            self.port = 0
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await _read_request_head(reader)
+            peer = writer.get_extra_info("peername") or ("", 0)
+            body = json.dumps({"origin": peer[0]}).encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (ValueError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class LocalMockProxy(ProxyProvider):
+    def __init__(
+        self,
+        latency_range: Tuple[float, float],
+        max_failure_rate: float,
+        expire_sec: int,
+    ):
+        """
+        本地模拟代理商，不需要网络和代理商账号，用于离线调试代理池和压测
+        每次提取 IP 时在本机启动新的正向代理，每个代理的平均延迟在 latency_range 之间随机，
+        失败率在 [0, max_failure_rate] 之间随机，模拟代理商给的 IP 有快有慢、有好有坏
+        :param latency_range: 单个代理平均延迟的范围（秒）
+        :param max_failure_rate: 单个代理的最大失败率
+        :param expire_sec: 代理的有效时长（秒）
+        """
+        self.latency_range = latency_range
+        self.max_failure_rate = max_failure_rate
+        self.expire_sec = expire_sec
+        self.proxies: List[LocalForwardProxy] = []
+        self.validation_server = LocalValidationServer()
+
+    async def start_validation_server(self) -> str:
+        """
+        启动本地验证地址，返回可以配置到 IP_PROXY_VALIDATE_URL 的地址
+        :return:
+        """
+        if not self.validation_server.port:
+            await self.validation_server.start()
+        return self.validation_server.url
+
+    async def get_proxies(self, num: int) -> List[IpInfoModel]:
+        """
+        :param num:
+        :return:
+        """
+        ip_infos = []
+        current_ts = utils.get_unix_timestamp()
+        for _ in range(num):
+            forward_proxy = LocalForwardProxy(
+                latency=random.uniform(*self.latency_range),
+                failure_rate=random.uniform(0, self.max_failure_rate),
+            )
+            port = await forward_proxy.start()
+            self.proxies.append(forward_proxy)
+            ip_infos.append(
+                IpInfoModel(
+                    ip="127.0.0.1",
+                    port=port,
+                    user="mock",
+                    password="mock",
+                    protocol="http://",
+                    expired_time_ts=current_ts + self.expire_sec,
+                )
+            )
+        utils.logger.info(
+            f"[LocalMockProxy.get_proxies] started {num} local proxies, total: {len(self.proxies)}"
+        )
+        return ip_infos
+
+    async def close(self):
+        for forward_proxy in self.proxies:
+            await forward_proxy.close()
+        self.proxies = []
+        await self.validation_server.close()
+
+
+def new_local_mock_proxy() -> LocalMockProxy:
+    """
+    构造本地模拟代理商实例
+    Returns:
+
+    """
+    return LocalMockProxy(
+        latency_range=tuple(config.MOCK_PROXY_LATENCY_RANGE),
+        max_failure_rate=config.MOCK_PROXY_MAX_FAILURE_RATE,
+        expire_sec=config.MOCK_PROXY_EXPIRE_SEC,
+    )
@@ -1,9 +1,16 @@
+import asyncio
 import random
-from typing import Dict, List
+import time
+from typing import Dict, List, Optional
 
 import config
 import httpx
-from proxy.providers import new_jisu_http_proxy, new_kuai_daili_proxy
+from proxy.providers import (
+    LocalMockProxy,
+    new_jisu_http_proxy,
+    new_kuai_daili_proxy,
+    new_local_mock_proxy,
+)
 from tenacity import retry, stop_after_attempt, wait_fixed
 from tools import utils
 
@@ -11,9 +18,83 @@ from .base_proxy import ProxyProvider
 from .types import IpInfoModel, ProviderNameEnum
 
 
+class ProxyHealth:
+    """单个代理 IP 的健康状况：成功率、延迟（指数移动平均）、过期时间"""
+
+    # 延迟的指数移动平均系数，越大越看重最近的请求
+    LATENCY_EWMA_ALPHA = 0.3
+
+    def __init__(self, proxy: IpInfoModel):
+        self.proxy = proxy
+        self.success_count = 0
+        self.failure_count = 0
+        self.consecutive_failures = 0
+        self.avg_latency = 0.0
+
+    @staticmethod
+    def key_of(proxy: IpInfoModel) -> str:
+        return f"{proxy.ip}:{proxy.port}:{proxy.user}"
+
+    @property
+    def key(self) -> str:
+        return self.key_of(self.proxy)
+
+    def expires_within(self, seconds: float) -> bool:
+        """
+        是否会在 seconds 秒内过期，没有过期时间的代理永不过期
+        :param seconds:
+        :return:
+        """
+        if not self.proxy.expired_time_ts:
+            return False
+        return self.proxy.expired_time_ts - time.time() <= seconds
+
+    @property
+    def score(self) -> float:
+        """
+        健康分：平滑后的成功率 / (1 + 平均延迟)，分数越高被选中的概率越大
+        :return:
+        """
+        success_rate = (self.success_count + 1) / (
+            self.success_count + self.failure_count + 2
+        )
+        return success_rate / (1 + self.avg_latency)
+
+    def record_success(self, latency: float):
+        self.success_count += 1
+        self.consecutive_failures = 0
+        if self.avg_latency:
+            self.avg_latency += self.LATENCY_EWMA_ALPHA * (latency - self.avg_latency)
+        else:
+            self.avg_latency = latency
+
+    def record_failure(self):
+        self.failure_count += 1
+        self.consecutive_failures += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            "success": self.success_count,
+            "failure": self.failure_count,
+            "avg_latency": round(self.avg_latency, 3),
+            "expired_time_ts": self.proxy.expired_time_ts,
+        }
+
+
 class ProxyIpPool:
+    """
+    带健康度的代理池：
+    - 按健康分加权随机选择代理，健康的代理被选中的概率更大，同时把请求分散到多个 IP 上
+    - 使用方通过 report_success / report_failure 上报结果，连续失败的代理会被剔除，下次自动换 IP
+    - 即将过期的代理提前剔除；可用代理低于水位线时在后台补充并发验证新 IP，爬取不用等待新一批 IP
+    """
+
     def __init__(
-        self, ip_pool_count: int, enable_validate_ip: bool, ip_provider: ProxyProvider
+        self,
+        ip_pool_count: int,
+        enable_validate_ip: bool,
+        ip_provider: ProxyProvider,
+        valid_ip_url: Optional[str] = None,
     ) -> None:
         """
 
@@ -21,20 +102,60 @@ class ProxyIpPool:
             ip_pool_count:
             enable_validate_ip:
             ip_provider:
+            valid_ip_url: 验证 IP 是否有效的地址，默认使用 IP_PROXY_VALIDATE_URL
         """
-        self.valid_ip_url = "https://httpbin.org/ip"  # 验证 IP 是否有效的地址
+        self.valid_ip_url = valid_ip_url or config.IP_PROXY_VALIDATE_URL
         self.ip_pool_count = ip_pool_count
         self.enable_validate_ip = enable_validate_ip
-        self.proxy_list: List[IpInfoModel] = []
         self.ip_provider: ProxyProvider = ip_provider
+        self._proxies: Dict[str, ProxyHealth] = {}
+        self._refill_task: Optional[asyncio.Task] = None
+        self._validate_semaphore = asyncio.Semaphore(
+            max(1, config.IP_PROXY_VALIDATE_CONCURRENCY)
+        )
+
+    @property
+    def proxy_list(self) -> List[IpInfoModel]:
+        return [health.proxy for health in self._proxies.values()]
 
     async def load_proxies(self) -> None:
         """
-        加载IP代理
+        从代理商提取 IP 补足代理池，开启验证时并发验证，只保留有效的 IP
         Returns:
 
         """
-        self.proxy_list = await self.ip_provider.get_proxies(self.ip_pool_count)
+        need_count = max(1, self.ip_pool_count - len(self._proxies))
+        proxies = await self.ip_provider.get_proxies(need_count)
+        new_proxies = [
+            ProxyHealth(proxy)
+            for proxy in proxies
+            if ProxyHealth.key_of(proxy) not in self._proxies
+        ]
+        new_proxies = [
+            health
+            for health in new_proxies
+            if not health.expires_within(config.IP_PROXY_EXPIRE_MARGIN_SEC)
+        ]
+        if self.enable_validate_ip:
+            results = await asyncio.gather(
+                *[self._validate(health) for health in new_proxies]
+            )
+            new_proxies = [
+                health for health, is_valid in zip(new_proxies, results) if is_valid
+            ]
+        for health in new_proxies:
+            self._proxies[health.key] = health
+        utils.logger.info(
+            f"[ProxyIpPool.load_proxies] loaded {len(new_proxies)} proxies, pool size: {len(self._proxies)}"
+        )
+
+    async def _validate(self, health: ProxyHealth) -> bool:
+        async with self._validate_semaphore:
+            start_ts = time.monotonic()
+            is_valid = await self._is_valid_proxy(health.proxy)
+            if is_valid:
+                health.record_success(time.monotonic() - start_ts)
+            return is_valid
 
     async def _is_valid_proxy(self, proxy: IpInfoModel) -> bool:
         """
@@ -49,48 +170,114 @@ class ProxyIpPool:
             httpx_proxy = {
                 f"{proxy.protocol}": f"http://{proxy.user}:{proxy.password}@{proxy.ip}:{proxy.port}"
             }
-            async with httpx.AsyncClient(proxies=httpx_proxy) as client:
+            async with httpx.AsyncClient(
+                proxies=httpx_proxy, timeout=config.IP_PROXY_VALIDATE_TIMEOUT_SEC
+            ) as client:
                 response = await client.get(self.valid_ip_url)
-            if response.status_code == 200:
-                return True
-            else:
-                return False
+            return response.status_code == 200
         except Exception as e:
             utils.logger.info(
                 f"[ProxyIpPool._is_valid_proxy] testing {proxy.ip} err: {e}"
             )
-            raise e
+            return False
+
+    def _evict(self, health: ProxyHealth, reason: str):
+        if self._proxies.pop(health.key, None) is not None:
+            utils.logger.info(
+                f"[ProxyIpPool._evict] remove proxy {health.proxy.ip}:{health.proxy.port}, reason: {reason}"
+            )
+
+    def _evict_expiring(self):
+        for health in list(self._proxies.values()):
+            if health.expires_within(config.IP_PROXY_EXPIRE_MARGIN_SEC):
+                self._evict(health, "expiring")
+
+    def _trigger_refill(self) -> asyncio.Task:
+        """
+        在后台补充代理池，同一时间只有一个补充任务
+        :return:
+        """
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.create_task(self._refill())
+        return self._refill_task
+
+    async def _refill(self):
+        try:
+            await self.load_proxies()
+        except Exception as e:
+            utils.logger.error(f"[ProxyIpPool._refill] load proxies error: {e}")
 
     @retry(stop=stop_after_attempt(3), wait=wait_fixed(1))
-    async def get_proxy(self) -> IpInfoModel:
+    async def get_proxy(self, exclude: Optional[IpInfoModel] = None) -> IpInfoModel:
         """
-        从代理池中随机提取一个代理IP
+        按健康分加权随机选择一个代理IP，代理池低于水位线时在后台补充
+        :param exclude: 需要避开的代理（例如刚刚失败的那个），池中只剩它时仍然会返回它
         :return:
         """
-        if len(self.proxy_list) == 0:
-            await self._reload_proxies()
+        self._evict_expiring()
+        if len(self._proxies) <= self.ip_pool_count * config.IP_PROXY_REFILL_RATIO:
+            refill_task = self._trigger_refill()
+            if not self._proxies:
+                # 代理池已经空了，只能等待这一批补充完成
+                await refill_task
 
-        proxy = random.choice(self.proxy_list)
-        self.proxy_list.remove(proxy)  # 取出来一个IP就应该移出掉
-        if self.enable_validate_ip:
-            if not await self._is_valid_proxy(proxy):
-                raise Exception(
-                    "[ProxyIpPool.get_proxy] current ip invalid and again get it"
-                )
-        return proxy
+        candidates = list(self._proxies.values())
+        if not candidates:
+            raise Exception(
+                "[ProxyIpPool.get_proxy] no available proxy and again get it"
+            )
+        if exclude is not None and len(candidates) > 1:
+            exclude_key = ProxyHealth.key_of(exclude)
+            candidates = [health for health in candidates if health.key != exclude_key]
+        health = random.choices(
+            candidates, weights=[health.score for health in candidates]
+        )[0]
+        return health.proxy
 
-    async def _reload_proxies(self):
+    def is_available(self, proxy: IpInfoModel) -> bool:
         """
-        # 重新加载代理池
+        代理是否还在代理池中（没有因为失败或者过期被剔除）
+        :param proxy:
         :return:
         """
-        self.proxy_list = []
-        await self.load_proxies()
+        return ProxyHealth.key_of(proxy) in self._proxies
+
+    def report_success(self, proxy: IpInfoModel, latency: float):
+        """
+        上报一次通过该代理成功的请求
+        :param proxy:
+        :param latency: 请求耗时（秒）
+        :return:
+        """
+        health = self._proxies.get(ProxyHealth.key_of(proxy))
+        if health:
+            health.record_success(latency)
+
+    def report_failure(self, proxy: IpInfoModel, reason: str = ""):
+        """
+        上报一次通过该代理失败的请求，连续失败达到阈值后剔除并在后台补充
+        :param proxy:
+        :param reason:
+        :return:
+        """
+        health = self._proxies.get(ProxyHealth.key_of(proxy))
+        if not health:
+            return
+        health.record_failure()
+        if health.consecutive_failures >= config.IP_PROXY_MAX_CONSECUTIVE_FAILURES:
+            self._evict(
+                health, f"{health.consecutive_failures} consecutive failures, {reason}"
+            )
+            self._trigger_refill()
+
+    def get_stats(self) -> Dict[str, Dict]:
+        return {key: health.to_dict() for key, health in self._proxies.items()}
 
 
 IpProxyProvider: Dict[str, ProxyProvider] = {
     ProviderNameEnum.JISHU_HTTP_PROVIDER.value: new_jisu_http_proxy(),
     ProviderNameEnum.KUAI_DAILI_PROVIDER.value: new_kuai_daili_proxy(),
+    ProviderNameEnum.LOCAL_MOCK_PROVIDER.value: new_local_mock_proxy(),
 }
 
 
@@ -101,10 +288,16 @@ async def create_ip_pool(ip_pool_count: int, enable_validate_ip: bool) -> ProxyI
     :param enable_validate_ip: 是否开启验证IP代理
     :return:
     """
+    ip_provider = IpProxyProvider.get(config.IP_PROXY_PROVIDER_NAME)
+    valid_ip_url = None
+    if isinstance(ip_provider, LocalMockProxy):
+        # 本地模拟代理使用本机的验证地址，不需要访问外网
+        valid_ip_url = await ip_provider.start_validation_server()
     pool = ProxyIpPool(
         ip_pool_count=ip_pool_count,
         enable_validate_ip=enable_validate_ip,
-        ip_provider=IpProxyProvider.get(config.IP_PROXY_PROVIDER_NAME),
+        ip_provider=ip_provider,
+        valid_ip_url=valid_ip_url,
     )
     await pool.load_proxies()
     return pool
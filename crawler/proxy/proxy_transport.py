@@ -0,0 +1,255 @@
+import time
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import config
+import httpx
+from tools import utils
+from tools.account_pool import AccountPool, AccountSession, current_account
+from tools.rate_limiter import get_rate_limiter, mark_transient_failure
+
+from .proxy_ip_pool import ProxyHealth, ProxyIpPool
+from .types import IpInfoModel
+
+ProxiesType = Union[None, str, Dict[str, str]]
+
+
+def build_proxy_mounts(proxies: ProxiesType) -> Dict[str, httpx.AsyncHTTPTransport]:
+    """
+    把 {"https://": "http://user:pwd@ip:port"} 或者代理地址字符串转换成 httpx 的 mounts，
+    新旧版本的 httpx 都支持这种写法
+    :param proxies:
+    :return:
+    """
+    if not proxies:
+        return {}
+    if isinstance(proxies, str):
+        proxies = {"all://": proxies}
+    return {
+        pattern: httpx.AsyncHTTPTransport(proxy=httpx.Proxy(proxy_url))
+        for pattern, proxy_url in proxies.items()
+    }
+
+
+def proxy_host_of(proxies: ProxiesType) -> str:
+    """
+    取出固定代理的 host:port，去掉代理地址里的账号密码，用作限速器名称（会出现在日志和统计接口里），
+    {"http://": url, "https://": url} 这种写法各协议通常使用同一个代理，不同协议使用不同代理时返回以英文逗号连接的地址
+    :param proxies:
+    :return: 没有代理时返回空字符串
+    """
+    if not proxies:
+        return ""
+    proxy_urls = [proxies] if isinstance(proxies, str) else proxies.values()
+    hosts = set()
+    for proxy_url in proxy_urls:
+        if "://" not in proxy_url:
+            proxy_url = "//" + proxy_url
+        parts = urlsplit(proxy_url)
+        hosts.add(f"{parts.hostname}:{parts.port}" if parts.port else parts.hostname)
+    return ",".join(sorted(hosts))
+
+
+def with_cookie(headers: Optional[Dict[str, str]], cookie_str: str) -> Dict[str, str]:
+    """
+    复制请求头并替换其中的 cookie（各平台客户端 cookie 请求头的大小写不一样）
+    :param headers:
+    :param cookie_str:
+    :return:
+    """
+    headers = {
+        name: value
+        for name, value in (headers or {}).items()
+        if name.lower() != "cookie"
+    }
+    headers["Cookie"] = cookie_str
+    return headers
+
+
+class ProxyLease:
+    """一次请求租用的代理：请求通过该代理的长连接 client 发出，结果同时回报给限速器、代理池和账号池"""
+
+    def __init__(
+        self,
+        transport: "ProxyTransport",
+        proxy: Optional[IpInfoModel],
+        client: httpx.AsyncClient,
+        rate_limiter,
+        account: Optional[AccountSession] = None,
+    ):
+        self.proxy = proxy
+        self.rate_limiter = rate_limiter
+        self.account = account
+        self.latency = 0.0
+        self._transport = transport
+        self._client = client
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """
+        发出请求，连接失败、超时等网络错误直接记为该代理失败
+        :param method:
+        :param url:
+        :param kwargs: 透传给 httpx.AsyncClient.request
+        :return:
+        """
+        account_pool = self._transport.account_pool
+        if self.account is not None and self.account is not account_pool.primary:
+            # 客户端的请求头里是 primary 账号的 cookie，换成本次租用的账号
+            kwargs["headers"] = with_cookie(
+                kwargs.get("headers"), self.account.cookie_str
+            )
+        self._transport.client_acquired(self.proxy)
+        start_ts = time.monotonic()
+        try:
+            response = await self._client.request(method, url, **kwargs)
+            if response.status_code >= 500:
+                # 服务端暂时不可用，客户端随后抛出的异常可以重试
+                mark_transient_failure(f"status {response.status_code}")
+            return response
+        except httpx.TransportError as e:
+            self._transport.report_proxy_failure(self.proxy, type(e).__name__)
+            raise
+        finally:
+            self.latency = time.monotonic() - start_ts
+            await self._transport.client_released(self.proxy)
+
+    def report_success(self):
+        self.rate_limiter.report_success()
+        self._transport.report_proxy_success(self.proxy, self.latency)
+        if self.account is not None:
+            self._transport.account_pool.report_success(self.account)
+
+    def report_throttled(self, reason: str = ""):
+        self.rate_limiter.report_throttled(reason)
+        self._transport.report_proxy_failure(self.proxy, reason)
+        if self.account is not None:
+            self._transport.account_pool.report_failure(self.account, reason)
+
+
+class ProxyTransport:
+    """
+    平台客户端共用的代理感知传输层：
+    - 每次请求从代理池租用一个代理（IP_PROXY_ROTATION_MODE = "request"），或者固定使用一个代理直到它失败
+      （"session"，适合对登录态和 IP 绑定敏感的平台）
+    - 每个代理一个长期复用的 httpx.AsyncClient，连接池保持温热，不再每次请求都重新建立连接
+    - 限速器按实际使用的代理划分，请求结果回报给代理池，失败多的代理被剔除，请求自动换到其他 IP
+    - 没有代理池时使用固定代理（或直连）
+    - 有账号池时请求使用客户端通过 account_pool.lease 租用的账号，限速器按 (账号, 代理) 划分
+    """
+
+    def __init__(
+        self,
+        platform: str,
+        ip_pool: Optional[ProxyIpPool] = None,
+        default_proxies: ProxiesType = None,
+        sticky: Optional[bool] = None,
+        account_pool: Optional[AccountPool] = None,
+    ):
+        """
+        :param platform: 平台名称，与 config.PLATFORM 一致，用于划分限速器
+        :param ip_pool: 代理池，为空时使用 default_proxies
+        :param default_proxies: 固定代理，httpx 的 proxies 格式
+        :param sticky: 是否固定使用一个代理，默认按 IP_PROXY_ROTATION_MODE
+        :param account_pool: 账号池，请求结果回报给当前租用的账号
+        """
+        self.platform = platform
+        self.ip_pool = ip_pool
+        self.account_pool = account_pool
+        self.default_proxies = default_proxies
+        self.sticky = (
+            config.IP_PROXY_ROTATION_MODE == "session" if sticky is None else sticky
+        )
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._inflight: Dict[str, int] = {}
+        self._sticky_proxy: Optional[IpInfoModel] = None
+        self._failed_proxy: Optional[IpInfoModel] = None
+
+    async def _pick_proxy(self) -> Optional[IpInfoModel]:
+        if self.ip_pool is None:
+            return None
+        if self.sticky and self._sticky_proxy is not None:
+            if self.ip_pool.is_available(self._sticky_proxy):
+                return self._sticky_proxy
+        proxy = await self.ip_pool.get_proxy(exclude=self._failed_proxy)
+        if self.sticky:
+            self._sticky_proxy = proxy
+        return proxy
+
+    def _get_client(
+        self, proxy: Optional[IpInfoModel]
+    ) -> Tuple[str, httpx.AsyncClient]:
+        client_key = ProxyHealth.key_of(proxy) if proxy else ""
+        client = self._clients.get(client_key)
+        if client is None:
+            if proxy is not None:
+                _, proxies = utils.format_proxy_info(proxy)
+            else:
+                proxies = self.default_proxies
+            client = httpx.AsyncClient(mounts=build_proxy_mounts(proxies))
+            self._clients[client_key] = client
+        return client_key, client
+
+    async def lease(self, url: str) -> ProxyLease:
+        """
+        为一次请求租用代理，并在该代理对应的限速器上拿到令牌
+        :param url: 请求地址，用于划分接口类型
+        :return:
+        """
+        proxy = await self._pick_proxy()
+        _, client = self._get_client(proxy)
+        # 按出口代理的 host:port 限速，不能带上代理的账号密码
+        identity = (
+            f"{proxy.ip}:{proxy.port}" if proxy else proxy_host_of(self.default_proxies)
+        )
+        account = current_account() if self.account_pool is not None else None
+        if account is not None and len(self.account_pool.accounts) > 1:
+            identity = f"{account.name}|{identity or ''}"
+        rate_limiter = get_rate_limiter(self.platform, url, identity)
+        await rate_limiter.acquire()
+        return ProxyLease(self, proxy, client, rate_limiter, account)
+
+    def client_acquired(self, proxy: Optional[IpInfoModel]):
+        client_key = ProxyHealth.key_of(proxy) if proxy else ""
+        self._inflight[client_key] = self._inflight.get(client_key, 0) + 1
+
+    async def client_released(self, proxy: Optional[IpInfoModel]):
+        """
+        请求结束，代理已经被代理池剔除并且没有进行中的请求时关闭它的连接池
+        :param proxy:
+        :return:
+        """
+        client_key = ProxyHealth.key_of(proxy) if proxy else ""
+        self._inflight[client_key] -= 1
+        if self._inflight[client_key] > 0 or proxy is None:
+            return
+        if self.ip_pool is None or self.ip_pool.is_available(proxy):
+            return
+        self._inflight.pop(client_key, None)
+        client = self._clients.pop(client_key, None)
+        if client is not None:
+            await client.aclose()
+
+    async def aclose(self):
+        """
+        关闭所有代理的连接池，客户端不再使用时（爬虫结束）调用
+        :return:
+        """
+        clients = list(self._clients.values())
+        self._clients.clear()
+        self._inflight.clear()
+        for client in clients:
+            await client.aclose()
+
+    def report_proxy_success(self, proxy: Optional[IpInfoModel], latency: float):
+        if proxy is not None and self.ip_pool is not None:
+            self.ip_pool.report_success(proxy, latency)
+
+    def report_proxy_failure(self, proxy: Optional[IpInfoModel], reason: str = ""):
+        if proxy is None or self.ip_pool is None:
+            return
+        self.ip_pool.report_failure(proxy, reason)
+        # 下一次换代理时尽量避开刚刚失败的代理，固定代理模式下代理被剔除后才换
+        self._failed_proxy = proxy
+        if not self.ip_pool.is_available(proxy) and self._sticky_proxy is not None:
+            if ProxyHealth.key_of(self._sticky_proxy) == ProxyHealth.key_of(proxy):
+                self._sticky_proxy = None
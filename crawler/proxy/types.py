@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field
 class ProviderNameEnum(Enum):
     JISHU_HTTP_PROVIDER: str = "jishuhttp"
     KUAI_DAILI_PROVIDER: str = "kuaidaili"
+    LOCAL_MOCK_PROVIDER: str = "localmock"
 
 
 class IpInfoModel(BaseModel):
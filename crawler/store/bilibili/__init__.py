@@ -1,6 +1,7 @@
 from typing import List
 
 import config
+from store.store_events import emit_store_event
 from var import source_keyword_var
 
 from .bilibili_store_impl import *
@@ -180,6 +181,25 @@ async def store_video(aid, video_content, extension_file_name):
     )
 
 
+async def store_video_stream(aid, video_url, download_func, extension_file_name):
+    """
+    video streaming storage implementation
+    Args:
+        aid:
+        video_url:
+        download_func: async function that streams the video into the given file path
+        extension_file_name:
+    """
+    result = await BilibiliVideo().save_video_stream(
+        aid, video_url, download_func, extension_file_name
+    )
+    if result:
+        await emit_store_event(
+            "bili", "video", {"aid": str(aid), "video_path": result.save_file_name}
+        )
+    return result
+
+
 async def store_audio(aid: str, audio_content: bytes, filename: str):
     """存储音频文件"""
     audio_dir = os.path.join(config.STORE_DIR, "bilibili", "audios")
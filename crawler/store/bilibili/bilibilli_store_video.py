@@ -1,9 +1,11 @@
 import pathlib
-from typing import Dict
+from typing import Awaitable, Callable, Dict, Optional
 
 import aiofiles
 from base.base_crawler import AbstractStoreImage
+from store.media_blob_store import save_media
 from tools import utils
+from tools.media_download import MediaDownloadResult
 
 
 class BilibiliVideo(AbstractStoreImage):
@@ -53,3 +55,32 @@ class BilibiliVideo(AbstractStoreImage):
             utils.logger.info(
                 f"[BilibiliVideoImplement.save_video] save save_video {save_file_name} success ..."
             )
+
+    async def save_video_stream(
+        self,
+        aid: int,
+        url: str,
+        download_func: Callable[[str], Awaitable[Optional[MediaDownloadResult]]],
+        extension_file_name="video.mp4",
+    ) -> Optional[MediaDownloadResult]:
+        """
+        stream video to local file, the whole video is never held in memory
+        Args:
+            aid: aid
+            url: media url, used as the key of the media dedup index
+            download_func: async function that downloads the media into the given file path
+            extension_file_name: file name
+
+        Returns:
+
+        """
+        pathlib.Path(self.video_store_path + "/" + str(aid)).mkdir(
+            parents=True, exist_ok=True
+        )
+        save_file_name = self.make_save_file_name(str(aid), extension_file_name)
+        result = await save_media(url, save_file_name, download_func)
+        if result:
+            utils.logger.info(
+                f"[BilibiliVideoImplement.save_video_stream] save video {save_file_name} success, size: {result.size}, sha256: {result.sha256}"
+            )
+        return result
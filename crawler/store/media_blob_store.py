@@ -0,0 +1,175 @@
+import asyncio
+import hashlib
+import os
+import pathlib
+import shutil
+import sqlite3
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import config
+from tools import utils
+from tools.media_download import MediaDownloadResult
+
+
+class MediaBlobStore:
+    """
+    内容寻址的媒体文件存储：
+    - 文件按 sha256 保存到 objects/ab/cd/<sha256>，相同内容只保存一份
+    - url -> sha256 的索引保存在 sqlite 中，下载前先查索引，已经下载过的直接复用
+    - 各平台原来的保存路径（data/<platform>/images/<id>/<n>.jpg）通过硬链接指向 blob，
+      硬链接不可用时（例如跨盘）退化为复制
+    """
+
+    def __init__(self, root_dir: str = ""):
+        self.root_dir = root_dir or config.MEDIA_BLOB_STORE_DIR
+        self.objects_dir = os.path.join(self.root_dir, "objects")
+        self.tmp_dir = os.path.join(self.root_dir, "tmp")
+        pathlib.Path(self.objects_dir).mkdir(parents=True, exist_ok=True)
+        pathlib.Path(self.tmp_dir).mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(self.root_dir, "index.db"))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS url_index ("
+            "url TEXT PRIMARY KEY, sha256 TEXT NOT NULL, size INTEGER NOT NULL, "
+            "add_ts INTEGER NOT NULL)"
+        )
+        self._conn.commit()
+        # 同一个 url 同时只允许一个下载，避免重复下载和临时文件互相覆盖；
+        # 锁在没有任务等待时删除，不会随下载过的 url 数量一直增长
+        self._url_locks: Dict[str, asyncio.Lock] = {}
+        self._url_lock_users: Dict[str, int] = {}
+
+    def blob_path(self, sha256: str) -> str:
+        """
+        按 sha256 前两级目录分片，避免单个目录下文件过多
+        :param sha256:
+        :return:
+        """
+        return os.path.join(self.objects_dir, sha256[:2], sha256[2:4], sha256)
+
+    def lookup_url(self, url: str) -> Optional[Tuple[str, int]]:
+        """
+        查询 url 对应的 blob，blob 文件已经丢失时视为不存在
+        :param url:
+        :return: (sha256, size)
+        """
+        row = self._conn.execute(
+            "SELECT sha256, size FROM url_index WHERE url = ?", (url,)
+        ).fetchone()
+        if not row or not os.path.exists(self.blob_path(row[0])):
+            return None
+        return row[0], row[1]
+
+    def _record_url(self, url: str, sha256: str, size: int):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO url_index (url, sha256, size, add_ts) VALUES (?, ?, ?, ?)",
+            (url, sha256, size, utils.get_current_timestamp()),
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _link(src: str, dst: str):
+        """
+        把 blob 硬链接到目标路径，失败时复制
+        :param src:
+        :param dst:
+        :return:
+        """
+        pathlib.Path(dst).parent.mkdir(parents=True, exist_ok=True)
+        if os.path.exists(dst):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+
+    def _tmp_file_name(self, url: str) -> str:
+        # 同一个 url 的临时文件路径固定，下载中断后可以断点续传
+        return os.path.join(self.tmp_dir, hashlib.sha1(url.encode()).hexdigest())
+
+    async def save(
+        self,
+        url: str,
+        save_file_name: str,
+        download_func: Callable[[str], Awaitable[Optional[MediaDownloadResult]]],
+    ) -> Optional[MediaDownloadResult]:
+        """
+        保存媒体文件到 save_file_name，url 已经下载过时不再发起请求
+        :param url: 媒体地址
+        :param save_file_name: 平台原来的保存路径
+        :param download_func: 将媒体流式下载到指定文件路径的异步函数
+        :return:
+        """
+        url_lock = self._url_locks.setdefault(url, asyncio.Lock())
+        self._url_lock_users[url] = self._url_lock_users.get(url, 0) + 1
+        try:
+            async with url_lock:
+                return await self._save(url, save_file_name, download_func)
+        finally:
+            self._url_lock_users[url] -= 1
+            if self._url_lock_users[url] == 0:
+                del self._url_lock_users[url]
+                del self._url_locks[url]
+
+    async def _save(
+        self,
+        url: str,
+        save_file_name: str,
+        download_func: Callable[[str], Awaitable[Optional[MediaDownloadResult]]],
+    ) -> Optional[MediaDownloadResult]:
+        hit = self.lookup_url(url)
+        if hit:
+            sha256, size = hit
+            self._link(self.blob_path(sha256), save_file_name)
+            utils.logger.info(
+                f"[MediaBlobStore.save] url already stored, skip download: {url}"
+            )
+            return MediaDownloadResult(
+                save_file_name=save_file_name, size=size, sha256=sha256
+            )
+
+        result = await download_func(self._tmp_file_name(url))
+        if result is None:
+            return None
+
+        blob_file_name = self.blob_path(result.sha256)
+        if os.path.exists(blob_file_name):
+            # 不同 url 但内容相同（转发、共享的图片），只保留一份
+            os.remove(result.save_file_name)
+        else:
+            pathlib.Path(blob_file_name).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(result.save_file_name, blob_file_name)
+        self._record_url(url, result.sha256, result.size)
+        self._link(blob_file_name, save_file_name)
+        result.save_file_name = save_file_name
+        return result
+
+
+_media_blob_store: Optional[MediaBlobStore] = None
+
+
+def get_media_blob_store() -> MediaBlobStore:
+    """
+    获取进程内共享的 MediaBlobStore
+    :return:
+    """
+    global _media_blob_store
+    if _media_blob_store is None:
+        _media_blob_store = MediaBlobStore()
+    return _media_blob_store
+
+
+async def save_media(
+    url: str,
+    save_file_name: str,
+    download_func: Callable[[str], Awaitable[Optional[MediaDownloadResult]]],
+) -> Optional[MediaDownloadResult]:
+    """
+    根据 ENABLE_MEDIA_DEDUP 配置决定是否经过内容寻址存储
+    :param url: 媒体地址
+    :param save_file_name: 保存路径
+    :param download_func: 将媒体流式下载到指定文件路径的异步函数
+    :return:
+    """
+    if not config.ENABLE_MEDIA_DEDUP:
+        return await download_func(save_file_name)
+    return await get_media_blob_store().save(url, save_file_name, download_func)
@@ -0,0 +1,50 @@
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from tools import utils
+
+StoreListener = Callable[[str, str, Dict], Awaitable[Any]]
+
+# 当前任务注册的存储事件监听器，使用 ContextVar 保证同一进程内的多个任务互不干扰
+store_listeners_var: ContextVar[Optional[List[StoreListener]]] = ContextVar(
+    "store_listeners", default=None
+)
+
+
+def add_store_listener(listener: StoreListener):
+    """
+    注册存储事件监听器，之后在当前上下文中存储的数据都会推送给监听器
+    :param listener: async def listener(platform, item_type, item)
+    :return:
+    """
+    listeners = store_listeners_var.get()
+    if listeners is None:
+        listeners = []
+        store_listeners_var.set(listeners)
+    listeners.append(listener)
+
+
+def remove_store_listener(listener: StoreListener):
+    listeners = store_listeners_var.get()
+    if listeners and listener in listeners:
+        listeners.remove(listener)
+
+
+async def emit_store_event(platform: str, item_type: str, item: Dict):
+    """
+    存储层在数据落盘后调用，把数据推送给下游（转写、切分、向量化等）
+    :param platform: 平台名称
+    :param item_type: 数据类型，content | comment | video
+    :param item: 数据
+    :return:
+    """
+    listeners = store_listeners_var.get()
+    if not listeners:
+        return
+    for listener in list(listeners):
+        try:
+            await listener(platform, item_type, item)
+        except Exception as e:
+            utils.logger.error(
+                f"[store_events.emit_store_event] listener handle {platform} {item_type} error: {e}"
+            )
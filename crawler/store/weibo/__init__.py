@@ -162,6 +162,25 @@ async def update_weibo_note_image(picid: str, pic_content, extension_file_name):
     )
 
 
+async def update_weibo_note_image_stream(
+    picid: str, image_url: str, download_func, extension_file_name
+):
+    """
+    Stream weibo note image to local
+    Args:
+        picid:
+        image_url:
+        download_func: async function that streams the image into the given file path
+        extension_file_name:
+
+    Returns:
+
+    """
+    return await WeiboStoreImage().save_image_stream(
+        picid, image_url, download_func, extension_file_name
+    )
+
+
 async def save_creator(user_id: str, user_info: Dict):
     """
     Save creator information to local
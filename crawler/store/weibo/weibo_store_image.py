@@ -1,9 +1,11 @@
 import pathlib
-from typing import Dict
+from typing import Awaitable, Callable, Dict, Optional
 
 import aiofiles
 from base.base_crawler import AbstractStoreImage
+from store.media_blob_store import save_media
 from tools import utils
+from tools.media_download import MediaDownloadResult
 
 
 class WeiboStoreImage(AbstractStoreImage):
@@ -52,3 +54,30 @@ class WeiboStoreImage(AbstractStoreImage):
             utils.logger.info(
                 f"[WeiboImageStoreImplement.save_image] save image {save_file_name} success ..."
             )
+
+    async def save_image_stream(
+        self,
+        picid: str,
+        url: str,
+        download_func: Callable[[str], Awaitable[Optional[MediaDownloadResult]]],
+        extension_file_name="jpg",
+    ) -> Optional[MediaDownloadResult]:
+        """
+        stream image to local file
+        Args:
+            picid: image id
+            url: media url, used as the key of the media dedup index
+            download_func: async function that downloads the media into the given file path
+            extension_file_name: file extension
+
+        Returns:
+
+        """
+        pathlib.Path(self.image_store_path).mkdir(parents=True, exist_ok=True)
+        save_file_name = self.make_save_file_name(picid, extension_file_name)
+        result = await save_media(url, save_file_name, download_func)
+        if result:
+            utils.logger.info(
+                f"[WeiboImageStoreImplement.save_image_stream] save image {save_file_name} success ..."
+            )
+        return result
@@ -1,6 +1,7 @@
 from typing import List
 
 import config
+from store.store_events import emit_store_event
 from var import source_keyword_var
 
 from . import xhs_store_impl
@@ -100,6 +101,7 @@ async def update_xhs_note(note_item: Dict):
     }
     utils.logger.info(f"[store.xhs.update_xhs_note] xhs note: {local_db_item}")
     await XhsStoreFactory.create_store().store_content(local_db_item)
+    await emit_store_event("xhs", "content", local_db_item)
 
 
 async def batch_update_xhs_note_comments(note_id: str, comments: List[Dict]):
@@ -153,6 +155,7 @@ async def update_xhs_note_comment(note_id: str, comment_item: Dict):
         f"[store.xhs.update_xhs_note_comment] xhs note comment:{local_db_item}"
     )
     await XhsStoreFactory.create_store().store_comment(local_db_item)
+    await emit_store_event("xhs", "comment", local_db_item)
 
 
 async def save_creator(user_id: str, creator: Dict):
@@ -225,3 +228,22 @@ async def update_xhs_note_image(note_id, pic_content, extension_file_name):
             "extension_file_name": extension_file_name,
         }
     )
+
+
+async def update_xhs_note_media_stream(
+    note_id, media_url, download_func, extension_file_name
+):
+    """
+    流式保存小红书笔记图片/视频
+    Args:
+        note_id:
+        media_url:
+        download_func: 将媒体流式下载到指定文件路径的异步函数
+        extension_file_name:
+
+    Returns:
+
+    """
+    return await XiaoHongShuImage().save_image_stream(
+        note_id, media_url, download_func, extension_file_name
+    )
@@ -1,9 +1,11 @@
 import pathlib
-from typing import Dict
+from typing import Awaitable, Callable, Dict, Optional
 
 import aiofiles
 from base.base_crawler import AbstractStoreImage
+from store.media_blob_store import save_media
 from tools import utils
+from tools.media_download import MediaDownloadResult
 
 
 class XiaoHongShuImage(AbstractStoreImage):
@@ -57,3 +59,32 @@ class XiaoHongShuImage(AbstractStoreImage):
             utils.logger.info(
                 f"[XiaoHongShuImageStoreImplement.save_image] save image {save_file_name} success ..."
             )
+
+    async def save_image_stream(
+        self,
+        notice_id: str,
+        url: str,
+        download_func: Callable[[str], Awaitable[Optional[MediaDownloadResult]]],
+        extension_file_name="jpg",
+    ) -> Optional[MediaDownloadResult]:
+        """
+        stream image or video to local file, the whole file is never held in memory
+        Args:
+            notice_id: notice id
+            url: media url, used as the key of the media dedup index
+            download_func: async function that downloads the media into the given file path
+            extension_file_name: file name
+
+        Returns:
+
+        """
+        pathlib.Path(self.image_store_path + "/" + notice_id).mkdir(
+            parents=True, exist_ok=True
+        )
+        save_file_name = self.make_save_file_name(notice_id, extension_file_name)
+        result = await save_media(url, save_file_name, download_func)
+        if result:
+            utils.logger.info(
+                f"[XiaoHongShuImageStoreImplement.save_image_stream] save media {save_file_name} success, size: {result.size}, sha256: {result.sha256}"
+            )
+        return result
@@ -3,6 +3,7 @@ from typing import List
 import config
 from base.base_crawler import AbstractStore
 from model.m_zhihu import ZhihuComment, ZhihuContent, ZhihuCreator, ZhihuQuestionAnswer
+from store.store_events import emit_store_event
 from store.zhihu.zhihu_store_impl import (
     ZhihuCsvStoreImplement,
     ZhihuDbStoreImplement,
@@ -64,6 +65,7 @@ async def update_zhihu_content(content_item: ZhihuContent):
         f"[store.zhihu.update_zhihu_content] zhihu content: {local_db_item}"
     )
     await ZhihuStoreFactory.create_store().store_content(local_db_item)
+    await emit_store_event("zhihu", "content", local_db_item)
 
 
 async def batch_update_zhihu_note_comments(comments: List[ZhihuComment]):
@@ -149,3 +151,4 @@ async def update_zhihu_question_answer(question_answer: ZhihuQuestionAnswer):
         f"[store.zhihu.update_zhihu_question_answer] zhihu question answer: {local_db_item}"
     )
     await ZhihuStoreFactory.create_store().store_content(local_db_item)
+    await emit_store_event("zhihu", "content", local_db_item)
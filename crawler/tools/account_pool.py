@@ -0,0 +1,205 @@
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import config
+from tools import utils
+
+PongCallback = Callable[[], Awaitable[bool]]
+
+# 当前请求使用的账号，由 AccountPool.lease 设置，签名和 ProxyTransport 从这里读取
+account_var: ContextVar[Optional["AccountSession"]] = ContextVar(
+    "account_var", default=None
+)
+
+
+def current_account() -> Optional["AccountSession"]:
+    return account_var.get()
+
+
+class AccountSession:
+    """一个账号的登录态（cookie）和它的使用情况、健康状况"""
+
+    def __init__(self, name: str, cookie_str: str, cookie_dict: Dict[str, str]):
+        self.name = name
+        self.cookie_str = cookie_str
+        self.cookie_dict = cookie_dict
+        self.inflight = 0
+        self.use_count = 0
+        self.success_count = 0
+        self.failure_count = 0
+        self.consecutive_failures = 0
+        # 暂停到什么时候（time.monotonic），暂停期间不再租出，到期后用 pong 验证登录态
+        self.suspended_until = 0.0
+        self.retired = False
+
+    @property
+    def is_suspended(self) -> bool:
+        return time.monotonic() < self.suspended_until
+
+    def update_cookies(self, cookie_str: str, cookie_dict: Dict[str, str]):
+        self.cookie_str = cookie_str
+        self.cookie_dict = cookie_dict
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "inflight": self.inflight,
+            "use": self.use_count,
+            "success": self.success_count,
+            "failure": self.failure_count,
+            "suspended": self.is_suspended,
+            "retired": self.retired,
+        }
+
+
+class AccountPool:
+    """
+    同一平台的多账号池：
+    - 浏览器登录的账号作为 primary，PLATFORM_ACCOUNT_COOKIES 中配置的账号一起轮流使用，
+      每个请求（包括签名）租用一个账号，限速器按账号划分，吞吐量随账号数量增加
+    - 按 ACCOUNT_LEASE_STRATEGY 选择账号：least_loaded 选进行中请求最少的账号，round_robin 依次轮流
+    - 账号连续被限流达到阈值后暂停，暂停结束后调用 pong 验证登录态，验证失败的账号退役不再使用，
+      primary 账号不会退役，由平台登录和熔断刷新流程处理
+    """
+
+    PRIMARY = "primary"
+
+    def __init__(self, platform: str, cookie_str: str, cookie_dict: Dict[str, str]):
+        """
+        :param platform: 平台名称，与 config.PLATFORM 一致
+        :param cookie_str: primary 账号的 cookie
+        :param cookie_dict:
+        """
+        self.platform = platform
+        self.strategy = config.ACCOUNT_LEASE_STRATEGY
+        self.accounts: List[AccountSession] = [
+            AccountSession(self.PRIMARY, cookie_str, cookie_dict)
+        ]
+        for index, extra_cookie_str in enumerate(
+            config.PLATFORM_ACCOUNT_COOKIES.get(platform, []), start=1
+        ):
+            self.accounts.append(
+                AccountSession(
+                    f"account_{index}",
+                    extra_cookie_str,
+                    utils.convert_str_cookie_to_dict(extra_cookie_str),
+                )
+            )
+        self._round_robin = itertools.count()
+        self._pong_callback: Optional[PongCallback] = None
+        self._verify_tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def primary(self) -> AccountSession:
+        return self.accounts[0]
+
+    def set_pong_callback(self, callback: PongCallback):
+        """
+        注册验证登录态的回调，验证时 current_account() 为被验证的账号
+        :param callback: 通常是客户端的 pong 方法
+        :return:
+        """
+        self._pong_callback = callback
+
+    def update_primary(self, cookie_str: str, cookie_dict: Dict[str, str]):
+        self.primary.update_cookies(cookie_str, cookie_dict)
+
+    def _pick(self) -> AccountSession:
+        candidates = [
+            account
+            for account in self.accounts
+            if not account.retired and not account.is_suspended
+        ]
+        if not candidates:
+            # 所有账号都在暂停中，继续使用最快恢复的账号，不阻塞爬取
+            candidates = [
+                min(
+                    (account for account in self.accounts if not account.retired),
+                    key=lambda account: account.suspended_until,
+                )
+            ]
+        if self.strategy == "round_robin":
+            return candidates[next(self._round_robin) % len(candidates)]
+        return min(
+            candidates, key=lambda account: (account.inflight, account.use_count)
+        )
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[AccountSession]:
+        """
+        为一次请求（签名 + 发送）租用账号，已经在租用中时（例如 get 里调用 request）直接复用
+        :return:
+        """
+        account = account_var.get()
+        if account is not None:
+            yield account
+            return
+        account = self._pick()
+        account.inflight += 1
+        account.use_count += 1
+        token = account_var.set(account)
+        try:
+            yield account
+        finally:
+            account_var.reset(token)
+            account.inflight -= 1
+
+    def report_success(self, account: AccountSession):
+        account.success_count += 1
+        account.consecutive_failures = 0
+
+    def report_failure(self, account: AccountSession, reason: str = ""):
+        """
+        记录账号被限流 / 风控，连续达到阈值后暂停，暂停结束后验证登录态
+        :param account:
+        :param reason:
+        :return:
+        """
+        account.failure_count += 1
+        account.consecutive_failures += 1
+        if len(self.accounts) == 1 or account.is_suspended:
+            return
+        if account.consecutive_failures < config.ACCOUNT_MAX_CONSECUTIVE_FAILURES:
+            return
+        account.suspended_until = time.monotonic() + config.ACCOUNT_SUSPEND_SEC
+        utils.logger.warning(
+            f"[AccountPool.report_failure] {self.platform} {account.name} suspended for "
+            f"{config.ACCOUNT_SUSPEND_SEC}s, {account.consecutive_failures} consecutive failures, last: {reason}"
+        )
+        task = self._verify_tasks.get(account.name)
+        if task is None or task.done():
+            self._verify_tasks[account.name] = asyncio.create_task(
+                self._verify_after_suspend(account)
+            )
+
+    async def _verify_after_suspend(self, account: AccountSession):
+        await asyncio.sleep(max(0.0, account.suspended_until - time.monotonic()))
+        if self._pong_callback is None:
+            account.consecutive_failures = 0
+            return
+        token = account_var.set(account)
+        try:
+            is_valid = await self._pong_callback()
+        except Exception as e:
+            utils.logger.error(
+                f"[AccountPool._verify_after_suspend] {self.platform} {account.name} pong error: {e}"
+            )
+            is_valid = False
+        finally:
+            account_var.reset(token)
+        account.consecutive_failures = 0
+        if is_valid or account is self.primary:
+            utils.logger.info(
+                f"[AccountPool._verify_after_suspend] {self.platform} {account.name} back to pool"
+            )
+            return
+        account.retired = True
+        utils.logger.warning(
+            f"[AccountPool._verify_after_suspend] {self.platform} {account.name} login expired, retired"
+        )
+
+    def get_stats(self) -> Dict[str, Dict]:
+        return {account.name: account.to_dict() for account in self.accounts}
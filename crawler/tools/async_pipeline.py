@@ -0,0 +1,166 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from tools import utils
+
+StageHandler = Callable[[Any], Awaitable[Any]]
+
+
+class PipelineStage:
+    """流水线中的一个阶段：一个有界队列 + 若干并发 worker"""
+
+    def __init__(
+        self, name: str, handler: StageHandler, concurrency: int, queue_size: int
+    ):
+        self.name = name
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.next_stage: Optional["PipelineStage"] = None
+        self.workers: List[asyncio.Task] = []
+        self.processed_count = 0
+        self.failed_count = 0
+
+    def start(self):
+        self.workers = [
+            asyncio.create_task(self._worker(), name=f"{self.name}_{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def stop(self):
+        """
+        等待队列清空后停止 worker
+        :return:
+        """
+        await self.queue.join()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def _forward(self, result: Any):
+        if result is None or self.next_stage is None:
+            return
+        if isinstance(result, list):
+            for item in result:
+                await self.next_stage.queue.put(item)
+        else:
+            await self.next_stage.queue.put(result)
+
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                result = await self.handler(item)
+                self.processed_count += 1
+                await self._forward(result)
+            except Exception as e:
+                self.failed_count += 1
+                utils.logger.error(
+                    f"[PipelineStage._worker] stage {self.name} handle item error: {e}"
+                )
+            finally:
+                self.queue.task_done()
+
+
+class BoundedTaskGroup:
+    """
+    有并发上限的一组后台任务：spawn 立即返回，调用方可以继续做别的事情（例如继续翻页），
+    最后调用 wait 等待所有任务结束，单个任务失败不影响其他任务
+    """
+
+    def __init__(self, concurrency: int, name: str = "task_group"):
+        self.name = name
+        self._semaphore = asyncio.Semaphore(max(1, concurrency))
+        self._tasks: List[asyncio.Task] = []
+
+    async def _run(self, coro: Awaitable[Any]) -> Any:
+        async with self._semaphore:
+            return await coro
+
+    def spawn(self, coro: Awaitable[Any]) -> asyncio.Task:
+        task = asyncio.create_task(self._run(coro))
+        self._tasks.append(task)
+        return task
+
+    async def wait(self) -> List[Any]:
+        """
+        等待所有任务结束，返回成功任务的结果，失败的任务只记录日志
+        :return:
+        """
+        tasks, self._tasks = self._tasks, []
+        results = []
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                utils.logger.error(
+                    f"[BoundedTaskGroup.wait] group {self.name} task error: {result}"
+                )
+                continue
+            results.append(result)
+        return results
+
+
+class AsyncPipeline:
+    """
+    多阶段异步流水线，阶段之间用有界队列连接，每个阶段有独立的并发度
+    handler 的返回值会传递给下一个阶段：返回 None 表示不往下传递，返回 list 表示逐个往下传递
+    下游处理变慢时队列会被填满，上游 put 会等待，形成反压
+    """
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self.stages: List[PipelineStage] = []
+        self._started = False
+
+    def add_stage(
+        self,
+        name: str,
+        handler: StageHandler,
+        concurrency: int = 1,
+        queue_size: int = 100,
+    ) -> "AsyncPipeline":
+        stage = PipelineStage(name, handler, concurrency, queue_size)
+        if self.stages:
+            self.stages[-1].next_stage = stage
+        self.stages.append(stage)
+        return self
+
+    def start(self):
+        if self._started:
+            return
+        for stage in self.stages:
+            stage.start()
+        self._started = True
+
+    async def put(self, item: Any):
+        """
+        往第一个阶段投递数据
+        :param item:
+        :return:
+        """
+        self.start()
+        await self.stages[0].queue.put(item)
+
+    async def close(self):
+        """
+        按阶段顺序排空队列并停止，保证上游的产出都被下游处理完
+        :return:
+        """
+        if not self._started:
+            return
+        for stage in self.stages:
+            await stage.stop()
+        self._started = False
+        utils.logger.info(
+            f"[AsyncPipeline.close] pipeline {self.name} finished, stats: {self.get_stats()}"
+        )
+
+    def get_stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            stage.name: {
+                "queue_depth": stage.queue.qsize(),
+                "processed": stage.processed_count,
+                "failed": stage.failed_count,
+            }
+            for stage in self.stages
+        }
@@ -0,0 +1,356 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import config
+from playwright.async_api import (
+    BrowserContext,
+    BrowserType,
+    Page,
+    Playwright,
+    async_playwright,
+)
+from tools import utils
+from tools.browser_resource import (
+    ResourceBlocker,
+    install_resource_blocking,
+    open_signer_page,
+)
+
+LaunchCallback = Callable[[BrowserType], Awaitable[BrowserContext]]
+
+# 读取页面 JS 堆内存占用（仅 Chromium 支持 performance.memory），单位字节
+JS_HEAP_SIZE_SCRIPT = "() => performance.memory ? performance.memory.usedJSHeapSize : 0"
+
+
+async def close_browser_context(browser_context: BrowserContext):
+    """
+    关闭浏览器上下文，非持久化的上下文由单独启动的浏览器创建，需要一起关闭
+    :param browser_context:
+    :return:
+    """
+    browser = browser_context.browser
+    try:
+        await browser_context.close()
+        if browser is not None:
+            await browser.close()
+    except Exception as e:
+        utils.logger.warning(f"[close_browser_context] close error: {e}")
+
+
+class PooledBrowser:
+    """池中的一个浏览器上下文和它已经打开首页的页面"""
+
+    def __init__(
+        self,
+        key: str,
+        browser_context: BrowserContext,
+        page: Page,
+        blocker: Optional[ResourceBlocker] = None,
+    ):
+        self.key = key
+        self.browser_context = browser_context
+        self.page = page
+        self.blocker = blocker
+        self.use_count = 0
+        self.created_ts = time.monotonic()
+        self.last_used_ts = self.created_ts
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_ts
+
+    @property
+    def idle_time(self) -> float:
+        return time.monotonic() - self.last_used_ts
+
+    async def heap_size_mb(self) -> float:
+        try:
+            heap_size = await self.page.evaluate(JS_HEAP_SIZE_SCRIPT)
+        except Exception:
+            return 0.0
+        return (heap_size or 0) / 1024 / 1024
+
+    async def close(self):
+        await close_browser_context(self.browser_context)
+
+
+class _PoolSlot:
+    """同一个 key 的上下文：空闲列表 + 限制同时租出数量的信号量"""
+
+    def __init__(self, capacity: int):
+        self.semaphore = asyncio.Semaphore(capacity)
+        self.idle: List[PooledBrowser] = []
+        self.open_count = 0
+
+
+class BrowserContextPool:
+    """
+    跨任务共享的浏览器上下文池：
+    - 同一个 key（平台 + 用户数据目录 + 无头模式）的上下文在任务结束后归还到池中，不再关闭浏览器，
+      下一个任务直接拿到已经打开首页、保留登录态的页面，省去启动浏览器和登录的时间
+    - 持久化的用户数据目录同一时间只能被一个浏览器打开，同一个 key 的任务会排队依次租用
+    - 租用前做健康检查（页面没有关闭、能执行脚本），不健康的上下文直接关闭重建
+    - 使用次数、存活时间、JS 堆内存超过上限，或者空闲太久的上下文会被回收
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.hit_count = 0
+        self.miss_count = 0
+        self._playwright: Optional[Playwright] = None
+        self._playwright_lock = asyncio.Lock()
+        self._slots: Dict[str, _PoolSlot] = {}
+
+    async def _get_playwright(self) -> Playwright:
+        async with self._playwright_lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            return self._playwright
+
+    async def _stop_playwright_if_unused(self):
+        async with self._playwright_lock:
+            if self._playwright is None:
+                return
+            if any(slot.open_count for slot in self._slots.values()):
+                return
+            await self._playwright.stop()
+            self._playwright = None
+
+    def _get_slot(self, key: str, exclusive: bool) -> _PoolSlot:
+        slot = self._slots.get(key)
+        if slot is None:
+            capacity = (
+                1 if exclusive else max(1, config.BROWSER_POOL_MAX_CONTEXTS_PER_KEY)
+            )
+            slot = _PoolSlot(capacity)
+            self._slots[key] = slot
+        return slot
+
+    async def _is_healthy(
+        self, pooled: PooledBrowser, index_url: str, wait_until: str
+    ) -> bool:
+        """
+        健康检查：页面没有关闭并且能执行脚本，页面已经离开首页所在的站点时重新打开首页
+        :param pooled:
+        :param index_url:
+        :param wait_until:
+        :return:
+        """
+        if pooled.page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(
+                pooled.page.evaluate("1"),
+                timeout=config.BROWSER_POOL_HEALTH_CHECK_TIMEOUT_SEC,
+            )
+            if urlsplit(pooled.page.url).netloc != urlsplit(index_url).netloc:
+                await open_signer_page(
+                    pooled.page, index_url, config.PLATFORM, wait_until
+                )
+            return True
+        except Exception as e:
+            utils.logger.warning(
+                f"[BrowserContextPool._is_healthy] {pooled.key} health check failed: {e}"
+            )
+            return False
+
+    async def _should_recycle(self, pooled: PooledBrowser) -> str:
+        """
+        :param pooled:
+        :return: 需要回收的原因，不需要回收时返回空字符串
+        """
+        if not config.ENABLE_BROWSER_POOL:
+            return "browser pool disabled"
+        if pooled.use_count >= config.BROWSER_POOL_MAX_USES:
+            return f"used {pooled.use_count} times"
+        if pooled.age >= config.BROWSER_POOL_MAX_AGE_SEC:
+            return f"alive {int(pooled.age)}s"
+        heap_size_mb = await pooled.heap_size_mb()
+        if heap_size_mb >= config.BROWSER_POOL_MAX_HEAP_MB:
+            return f"js heap {heap_size_mb:.0f}MB"
+        return ""
+
+    async def _close(self, slot: _PoolSlot, pooled: PooledBrowser, reason: str):
+        utils.logger.info(
+            f"[BrowserContextPool._close] close browser context {pooled.key}, reason: {reason}"
+        )
+        slot.open_count -= 1
+        await pooled.close()
+
+    async def _reap_idle(self):
+        for slot in self._slots.values():
+            for pooled in list(slot.idle):
+                if pooled.idle_time >= config.BROWSER_POOL_IDLE_TIMEOUT_SEC:
+                    slot.idle.remove(pooled)
+                    await self._close(slot, pooled, f"idle {int(pooled.idle_time)}s")
+
+    async def _open(
+        self, key: str, launch: LaunchCallback, index_url: str, wait_until: str
+    ) -> PooledBrowser:
+        playwright = await self._get_playwright()
+        browser_context = await launch(playwright.chromium)
+        try:
+            blocker = await install_resource_blocking(browser_context)
+            page = await browser_context.new_page()
+            await open_signer_page(page, index_url, config.PLATFORM, wait_until)
+        except Exception:
+            await close_browser_context(browser_context)
+            raise
+        return PooledBrowser(key, browser_context, page, blocker)
+
+    async def acquire(
+        self,
+        key: str,
+        launch: LaunchCallback,
+        index_url: str,
+        exclusive: bool = True,
+        wait_until: str = "load",
+    ) -> PooledBrowser:
+        """
+        租用一个浏览器上下文，池中没有可用的上下文时调用 launch 新建并打开 index_url，
+        用完后必须调用 release 归还
+        :param key: 可以互相复用的上下文使用相同的 key，参考 browser_pool_key
+        :param launch: async def launch(chromium) -> BrowserContext，启动浏览器并注入脚本、cookie
+        :param index_url: 首页地址，复用的页面不在该站点时重新打开首页
+        :param exclusive: 同一个 key 同一时间只能租出一个上下文（持久化的用户数据目录）
+        :param wait_until: 打开首页时 page.goto 的 wait_until
+        :return:
+        """
+        await self._reap_idle()
+        slot = self._get_slot(key, exclusive)
+        await slot.semaphore.acquire()
+        try:
+            pooled = None
+            while slot.idle and pooled is None:
+                pooled = slot.idle.pop()
+                if not await self._is_healthy(pooled, index_url, wait_until):
+                    await self._close(slot, pooled, "unhealthy")
+                    pooled = None
+            if pooled is not None:
+                self.hit_count += 1
+                utils.logger.info(
+                    f"[BrowserContextPool.acquire] reuse browser context {key}, uses: {pooled.use_count}"
+                )
+            else:
+                self.miss_count += 1
+                pooled = await self._open(key, launch, index_url, wait_until)
+                slot.open_count += 1
+        except BaseException:
+            slot.semaphore.release()
+            raise
+        pooled.use_count += 1
+        return pooled
+
+    async def release(self, pooled: PooledBrowser):
+        """
+        归还浏览器上下文，需要回收的上下文直接关闭
+        :param pooled:
+        :return:
+        """
+        slot = self._slots[pooled.key]
+        try:
+            pooled.last_used_ts = time.monotonic()
+            reason = await self._should_recycle(pooled)
+            if reason or pooled.page.is_closed():
+                await self._close(slot, pooled, reason or "page closed")
+            else:
+                slot.idle.append(pooled)
+        finally:
+            slot.semaphore.release()
+        if not config.ENABLE_BROWSER_POOL:
+            await self._stop_playwright_if_unused()
+
+    @asynccontextmanager
+    async def lease(
+        self,
+        key: str,
+        launch: LaunchCallback,
+        index_url: str,
+        exclusive: bool = True,
+        wait_until: str = "load",
+    ) -> AsyncIterator[PooledBrowser]:
+        """
+        acquire / release 的 async with 写法，参数同 acquire
+        """
+        pooled = await self.acquire(key, launch, index_url, exclusive, wait_until)
+        try:
+            yield pooled
+        finally:
+            await self.release(pooled)
+
+    async def close_all(self):
+        """
+        关闭所有空闲的上下文和 playwright，进程退出前调用
+        :return:
+        """
+        for slot in self._slots.values():
+            while slot.idle:
+                await self._close(slot, slot.idle.pop(), "pool closed")
+        await self._stop_playwright_if_unused()
+
+    def get_stats(self) -> Dict:
+        blocked_count: Dict[str, int] = {}
+        for slot in self._slots.values():
+            for pooled in slot.idle:
+                if pooled.blocker is None:
+                    continue
+                for reason, count in pooled.blocker.blocked_count.items():
+                    blocked_count[reason] = blocked_count.get(reason, 0) + count
+        return {
+            "hit": self.hit_count,
+            "miss": self.miss_count,
+            "contexts": {
+                key: {"open": slot.open_count, "idle": len(slot.idle)}
+                for key, slot in self._slots.items()
+            },
+            "blocked_requests": blocked_count,
+        }
+
+
+_browser_pool: Optional[BrowserContextPool] = None
+
+
+def get_browser_pool() -> BrowserContextPool:
+    """
+    获取当前事件循环的浏览器上下文池，playwright 对象不能跨事件循环使用，
+    事件循环变化时（例如命令行多次 asyncio.run）重新创建
+    :return:
+    """
+    global _browser_pool
+    if _browser_pool is None or _browser_pool.loop is not asyncio.get_running_loop():
+        _browser_pool = BrowserContextPool()
+    return _browser_pool
+
+
+async def close_browser_pool():
+    """
+    关闭浏览器上下文池
+    :return:
+    """
+    global _browser_pool
+    if _browser_pool is not None and _browser_pool.loop is asyncio.get_running_loop():
+        await _browser_pool.close_all()
+    _browser_pool = None
+
+
+def browser_pool_key(platform: str) -> str:
+    """
+    按当前任务配置生成上下文池的 key，用户数据目录和无头模式相同的任务可以复用同一个浏览器
+    :param platform:
+    :return:
+    """
+    if config.SAVE_LOGIN_STATE:
+        user_data_dir = os.path.join(
+            os.getcwd(), "browser_data", config.USER_DATA_DIR % platform
+        )
+    else:
+        user_data_dir = ""
+    mode = "headless" if config.HEADLESS else "headed"
+    if config.ENABLE_BROWSER_RESOURCE_BLOCKING:
+        # 拦截了资源的上下文不能给需要完整页面的任务使用
+        mode = f"{mode}-blocking"
+    return f"{platform}:{user_data_dir}:{mode}"
@@ -0,0 +1,87 @@
+from typing import Dict, Optional, Set
+
+import config
+from playwright.async_api import BrowserContext, Page, Route
+from tools import utils
+
+
+class ResourceBlocker:
+    """
+    拦截浏览器上下文中与签名无关的请求：图片、视频、字体等资源和统计/埋点脚本
+    爬虫的页面只用来执行签名 JS、读取 localStorage 和 cookie，这些请求只会占用 CPU、内存和带宽
+    """
+
+    def __init__(self, resource_types: Set[str], url_keywords: Set[str]):
+        self.resource_types = resource_types
+        self.url_keywords = url_keywords
+        self.blocked_count: Dict[str, int] = {}
+
+    def should_block(self, resource_type: str, url: str) -> str:
+        """
+        :param resource_type: playwright 的 request.resource_type
+        :param url:
+        :return: 拦截的原因（资源类型或命中的关键字），不拦截时返回空字符串
+        """
+        if resource_type in self.resource_types:
+            return resource_type
+        for keyword in self.url_keywords:
+            if keyword in url:
+                return keyword
+        return ""
+
+    async def handle(self, route: Route):
+        request = route.request
+        reason = self.should_block(request.resource_type, request.url)
+        if not reason:
+            await route.continue_()
+            return
+        self.blocked_count[reason] = self.blocked_count.get(reason, 0) + 1
+        await route.abort()
+
+
+async def install_resource_blocking(
+    browser_context: BrowserContext,
+) -> Optional[ResourceBlocker]:
+    """
+    按 ENABLE_BROWSER_RESOURCE_BLOCKING 给浏览器上下文安装请求拦截，需要在打开页面之前调用
+    扫码登录时二维码是图片，不拦截图片
+    :param browser_context:
+    :return: 没有开启时返回 None
+    """
+    if not config.ENABLE_BROWSER_RESOURCE_BLOCKING:
+        return None
+    resource_types = set(config.BROWSER_BLOCK_RESOURCE_TYPES)
+    if config.LOGIN_TYPE == "qrcode":
+        resource_types.discard("image")
+    blocker = ResourceBlocker(resource_types, set(config.BROWSER_BLOCK_URL_KEYWORDS))
+    await browser_context.route("**/*", blocker.handle)
+    return blocker
+
+
+async def open_signer_page(page: Page, url: str, platform: str, wait_until: str):
+    """
+    打开用来签名的页面。开启 ENABLE_BROWSER_MINIMAL_PAGE 时只等到 DOMContentLoaded，
+    再等待 BROWSER_SIGNER_READY_SCRIPTS 中平台的签名函数就绪，不等待整个页面加载完成；
+    等待超时只记录日志，签名时如果还没有就绪由客户端报错重试
+    :param page:
+    :param url:
+    :param platform: 平台名称，与 config.PLATFORM 一致
+    :param wait_until: 不开启精简加载时 page.goto 的 wait_until
+    :return:
+    """
+    if not config.ENABLE_BROWSER_MINIMAL_PAGE:
+        await page.goto(url, wait_until=wait_until)
+        return
+    await page.goto(url, wait_until="domcontentloaded")
+    ready_script = config.BROWSER_SIGNER_READY_SCRIPTS.get(platform)
+    if not ready_script:
+        return
+    try:
+        await page.wait_for_function(
+            ready_script, timeout=config.BROWSER_SIGNER_READY_TIMEOUT_SEC * 1000
+        )
+    except Exception as e:
+        utils.logger.warning(
+            f"[open_signer_page] {platform} signer not ready after "
+            f"{config.BROWSER_SIGNER_READY_TIMEOUT_SEC}s: {e}"
+        )
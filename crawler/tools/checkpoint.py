@@ -0,0 +1,269 @@
+import json
+import os
+import pathlib
+import sqlite3
+from typing import Any, Dict, Optional, Set
+
+import config
+from tools import utils
+
+
+class CrawlCheckpoint:
+    """
+    爬取断点记录，保存在 sqlite 中：
+    - cursors: 各个分页位置，例如 关键词/日期 -> 页码、创作者 -> pn、视频评论 -> next 游标
+    - completed: 已经完成的内容ID（视频、关键词、日期等），重新运行时直接跳过
+    所有记录按 job_key（平台:爬取类型:运行ID）隔离，不同任务之间互不影响，
+    不是断点续爬时清空 job_key 之前的记录，已完成标记只在续爬时生效
+    """
+
+    def __init__(
+        self,
+        job_key: str,
+        db_path: str = "",
+        enabled: Optional[bool] = None,
+        resume: Optional[bool] = None,
+    ):
+        self.job_key = job_key
+        self.enabled = config.ENABLE_CHECKPOINT if enabled is None else enabled
+        self.resume = config.CHECKPOINT_RESUME if resume is None else resume
+        self._conn: Optional[sqlite3.Connection] = None
+        if not self.enabled:
+            return
+        db_path = db_path or config.CHECKPOINT_DB_PATH
+        pathlib.Path(os.path.dirname(db_path) or ".").mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cursors ("
+            "job_key TEXT NOT NULL, scope TEXT NOT NULL, value TEXT NOT NULL, "
+            "update_ts INTEGER NOT NULL, PRIMARY KEY (job_key, scope))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS completed ("
+            "job_key TEXT NOT NULL, item_id TEXT NOT NULL, extra TEXT NOT NULL, "
+            "add_ts INTEGER NOT NULL, PRIMARY KEY (job_key, item_id))"
+        )
+        if not self.resume:
+            self.reset()
+        self._conn.commit()
+
+    def reset(self):
+        """
+        清空当前任务的分页位置和已完成标记，重新开始爬取
+        :return:
+        """
+        if not self.enabled:
+            return
+        self._conn.execute("DELETE FROM cursors WHERE job_key = ?", (self.job_key,))
+        self._conn.execute("DELETE FROM completed WHERE job_key = ?", (self.job_key,))
+        self._conn.commit()
+        utils.logger.info(f"[CrawlCheckpoint.reset] start a new run for {self.job_key}")
+
+    def get_cursor(self, scope: str, default: Any = None) -> Any:
+        """
+        获取分页位置
+        :param scope: 分页范围，例如 search:关键词:日期
+        :param default: 没有记录时返回的值
+        :return:
+        """
+        if not self.enabled:
+            return default
+        row = self._conn.execute(
+            "SELECT value FROM cursors WHERE job_key = ? AND scope = ?",
+            (self.job_key, scope),
+        ).fetchone()
+        if not row:
+            return default
+        utils.logger.info(
+            f"[CrawlCheckpoint.get_cursor] resume {self.job_key} {scope} from {row[0]}"
+        )
+        return json.loads(row[0])
+
+    def set_cursor(self, scope: str, value: Any):
+        """
+        保存分页位置，value 需要能被 json 序列化
+        :param scope:
+        :param value:
+        :return:
+        """
+        if not self.enabled:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO cursors (job_key, scope, value, update_ts) VALUES (?, ?, ?, ?)",
+            (
+                self.job_key,
+                scope,
+                json.dumps(value, ensure_ascii=False),
+                utils.get_current_timestamp(),
+            ),
+        )
+        self._conn.commit()
+
+    def clear_cursor(self, scope: str):
+        if not self.enabled:
+            return
+        self._conn.execute(
+            "DELETE FROM cursors WHERE job_key = ? AND scope = ?", (self.job_key, scope)
+        )
+        self._conn.commit()
+
+    def is_completed(self, item_id: str) -> bool:
+        return self.get_completed(item_id) is not None
+
+    def get_completed(self, item_id: str) -> Optional[str]:
+        """
+        查询已完成的内容，返回完成时记录的附加信息，未完成返回 None
+        :param item_id:
+        :return:
+        """
+        if not self.enabled:
+            return None
+        row = self._conn.execute(
+            "SELECT extra FROM completed WHERE job_key = ? AND item_id = ?",
+            (self.job_key, item_id),
+        ).fetchone()
+        return row[0] if row else None
+
+    def mark_completed(self, item_id: str, extra: str = ""):
+        """
+        标记内容已经完成，同时清除该内容的分页位置
+        :param item_id: 内容ID，例如 aid:123、day:关键词:2024-01-01
+        :param extra: 附加信息，例如 bvid 对应的 aid
+        :return:
+        """
+        if not self.enabled:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO completed (job_key, item_id, extra, add_ts) VALUES (?, ?, ?, ?)",
+            (self.job_key, item_id, str(extra), utils.get_current_timestamp()),
+        )
+        self._conn.execute(
+            "DELETE FROM cursors WHERE job_key = ? AND scope = ?",
+            (self.job_key, item_id),
+        )
+        self._conn.commit()
+
+    def reopen(self, item_id: str):
+        """
+        清除内容的完成标记和分页位置，之后重新爬取
+        :param item_id: 内容ID，例如 aid:123、comments:123
+        :return:
+        """
+        if not self.enabled:
+            return
+        self._conn.execute(
+            "DELETE FROM completed WHERE job_key = ? AND item_id = ?",
+            (self.job_key, item_id),
+        )
+        self._conn.execute(
+            "DELETE FROM cursors WHERE job_key = ? AND scope = ?",
+            (self.job_key, item_id),
+        )
+        self._conn.commit()
+
+
+class PageCheckpointTracker:
+    """
+    流水线爬取时，搜索页的内容会在后续阶段异步处理完，不能在翻页时直接保存页码
+    这里记录每个分页范围（关键词、日期）内各页还没处理完的内容数量，
+    只有某一页之前的所有页都处理完后才把断点推进到该页，
+    分页范围翻页结束且所有内容处理完后标记该范围完成
+    """
+
+    def __init__(self, checkpoint: CrawlCheckpoint):
+        self.checkpoint = checkpoint
+        # 分页范围 -> {页码: 未处理完的内容数量}
+        self._pending: Dict[str, Dict[int, int]] = {}
+        # 分页范围 -> 第一个还没处理完（或者还没有放入流水线）的页码
+        self._low_page: Dict[str, int] = {}
+        self._closed_scopes: Set[str] = set()
+        # 分页范围 -> 有内容处理失败的页码，这些页一直保持未处理完
+        self.failed_pages: Dict[str, Set[int]] = {}
+
+    def open_scope(self, scope: str, start_page: int):
+        """
+        声明分页范围的起始页码，多页并发请求、乱序放入流水线时需要先调用，
+        还没有放入流水线的页视为未处理完，断点不会越过它
+        :param scope: 分页范围
+        :param start_page: 起始页码
+        :return:
+        """
+        self._low_page[scope] = start_page
+
+    def add_page(self, scope: str, page: int, item_count: int):
+        """
+        一页搜索结果已经放入流水线
+        :param scope: 分页范围
+        :param page: 页码
+        :param item_count: 该页放入流水线的内容数量
+        :return:
+        """
+        self._pending.setdefault(scope, {})[page] = item_count
+        self._low_page.setdefault(scope, page)
+        self._advance(scope)
+
+    def item_done(self, scope: str, page: int):
+        """
+        该页的一个内容已经处理完
+        :param scope:
+        :param page:
+        :return:
+        """
+        pages = self._pending.get(scope, {})
+        if page in pages:
+            pages[page] -= 1
+            self._advance(scope)
+
+    def item_failed(self, scope: str, page: int):
+        """
+        该页的一个内容处理失败：该页保持未处理完，断点停在第一个失败的页，
+        分页范围也不会被标记完成，续爬时从该页重新处理
+        :param scope:
+        :param page:
+        :return:
+        """
+        self.failed_pages.setdefault(scope, set()).add(page)
+        utils.logger.warning(
+            f"[PageCheckpointTracker.item_failed] {scope} page {page} has a failed item, "
+            f"checkpoint stays at page {self._low_page.get(scope)}"
+        )
+
+    def close_scope(self, scope: str):
+        """
+        该分页范围已经翻页结束，内容全部处理完后会标记完成
+        :param scope:
+        :return:
+        """
+        self._closed_scopes.add(scope)
+        self._advance(scope)
+
+    def _advance(self, scope: str):
+        pages = self._pending.get(scope, {})
+        low_page = self._low_page.get(scope)
+        while low_page in pages and pages[low_page] <= 0:
+            del pages[low_page]
+            low_page += 1
+        if low_page is not None:
+            self._low_page[scope] = low_page
+        if pages:
+            # low_page 还没处理完，或者还没有放入流水线
+            self.checkpoint.set_cursor(scope, low_page)
+            return
+        if scope in self._closed_scopes:
+            self.checkpoint.mark_completed(scope)
+            self._closed_scopes.discard(scope)
+            self._pending.pop(scope, None)
+            self._low_page.pop(scope, None)
+        elif low_page is not None:
+            self.checkpoint.set_cursor(scope, low_page)
+
+
+def create_crawl_checkpoint() -> CrawlCheckpoint:
+    """
+    按当前任务的平台、爬取类型和运行ID创建断点记录
+    :return:
+    """
+    job_key = f"{config.PLATFORM}:{config.CRAWLER_TYPE}"
+    if config.CHECKPOINT_RUN_ID:
+        job_key = f"{job_key}:{config.CHECKPOINT_RUN_ID}"
+    return CrawlCheckpoint(job_key=job_key)
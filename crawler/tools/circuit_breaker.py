@@ -0,0 +1,220 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import config
+from tools import utils
+
+RefreshCallback = Callable[[], Awaitable[Any]]
+
+
+class CircuitOpenError(Exception):
+    """平台熔断处于快速失败状态，请求没有发出"""
+
+
+class PlatformCircuitBreaker:
+    """
+    平台级熔断：连续被限流 / 风控达到阈值，或者调用方主动 trip 时打开
+    - 打开期间该平台的请求在发出前协作式等待（asyncio.sleep），不阻塞事件循环，
+      其他平台的爬取、媒体下载、存储照常进行
+    - 冷却结束后先执行一次刷新回调（例如重新打开首页、刷新 cookie），再放行请求
+    - 滑动窗口内请求失败的比例突增（平台故障）时进入快速失败：冷却期间的请求直接抛出
+      CircuitOpenError，不再发出和重试，任务很快结束而不是排队等待
+    """
+
+    def __init__(
+        self,
+        platform: str,
+        failure_threshold: int,
+        cooldown_sec: float,
+        error_rate_threshold: float = 1.0,
+        min_requests: int = 0,
+        window_sec: float = 60,
+    ):
+        self.platform = platform
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown_sec = cooldown_sec
+        self.error_rate_threshold = error_rate_threshold
+        self.min_requests = max(1, min_requests)
+        self.window_sec = window_sec
+        self.trip_count = 0
+        self.error_trip_count = 0
+        self.fast_fail_count = 0
+        self._open_until = 0.0
+        self._fast_fail_until = 0.0
+        # 滑动窗口内的请求结果 (时间, 是否成功)
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._error_count = 0
+        self._consecutive_failures = 0
+        self._need_refresh = False
+        self._refresh_callback: Optional[RefreshCallback] = None
+        self._refresh_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return time.monotonic() < self._open_until
+
+    @property
+    def is_fast_failing(self) -> bool:
+        return time.monotonic() < self._fast_fail_until
+
+    @property
+    def error_rate(self) -> float:
+        self._trim_outcomes(time.monotonic())
+        if not self._outcomes:
+            return 0.0
+        return self._error_count / len(self._outcomes)
+
+    def set_refresh_callback(self, callback: Optional[RefreshCallback]):
+        """
+        注册冷却结束后的刷新回调，同一个平台只保留最后注册的回调
+        :param callback: async def callback()
+        :return:
+        """
+        self._refresh_callback = callback
+
+    def trip(self, reason: str = "", cooldown_sec: Optional[float] = None):
+        """
+        打开熔断，暂停该平台的请求
+        :param reason: 原因，仅用于日志
+        :param cooldown_sec: 冷却时间，默认使用 CIRCUIT_BREAKER_COOLDOWN_SEC
+        :return:
+        """
+        cooldown_sec = self.cooldown_sec if cooldown_sec is None else cooldown_sec
+        self._open_until = max(self._open_until, time.monotonic() + cooldown_sec)
+        self._consecutive_failures = 0
+        self._need_refresh = True
+        self.trip_count += 1
+        utils.logger.warning(
+            f"[PlatformCircuitBreaker.trip] {self.platform} paused for {cooldown_sec}s: {reason}"
+        )
+
+    def record_failure(self, reason: str = ""):
+        """
+        记录一次被限流 / 风控，连续达到阈值后打开熔断
+        :param reason:
+        :return:
+        """
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= self.failure_threshold:
+            self.trip(
+                f"{self._consecutive_failures} consecutive failures, last: {reason}"
+            )
+
+    def record_success(self):
+        self._consecutive_failures = 0
+
+    def _trim_outcomes(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.window_sec:
+            _, success = self._outcomes.popleft()
+            if not success:
+                self._error_count -= 1
+
+    def record_outcome(self, success: bool, reason: str = ""):
+        """
+        记录一次请求的最终结果（包括网络错误、接口报错），窗口内失败比例达到阈值时进入快速失败
+        :param success:
+        :param reason: 失败原因，仅用于日志
+        :return:
+        """
+        now = time.monotonic()
+        self._outcomes.append((now, success))
+        if not success:
+            self._error_count += 1
+        self._trim_outcomes(now)
+        if success or self.is_fast_failing or len(self._outcomes) < self.min_requests:
+            return
+        error_rate = self._error_count / len(self._outcomes)
+        if error_rate < self.error_rate_threshold:
+            return
+        self._fast_fail_until = now + self.cooldown_sec
+        self._need_refresh = True
+        self.error_trip_count += 1
+        # 冷却结束后重新统计，重新积累 min_requests 个请求后才会再次判断
+        self._outcomes.clear()
+        self._error_count = 0
+        utils.logger.warning(
+            f"[PlatformCircuitBreaker.record_outcome] {self.platform} error rate {error_rate:.0%}, "
+            f"fast fail for {self.cooldown_sec}s, last error: {reason}"
+        )
+
+    def check(self):
+        """
+        请求发出前调用，快速失败期间直接抛出 CircuitOpenError
+        :return:
+        """
+        remaining = self._fast_fail_until - time.monotonic()
+        if remaining <= 0:
+            return
+        self.fast_fail_count += 1
+        raise CircuitOpenError(
+            f"{self.platform} circuit open, fast fail for another {remaining:.1f}s"
+        )
+
+    async def wait_until_closed(self):
+        """
+        请求发出前调用：熔断打开时等待冷却结束，冷却结束后的第一个请求负责执行刷新回调
+        :return:
+        """
+        while True:
+            delay = self._open_until - time.monotonic()
+            if delay <= 0:
+                break
+            await asyncio.sleep(delay)
+        if not self._need_refresh:
+            return
+        async with self._refresh_lock:
+            if not self._need_refresh:
+                return
+            self._need_refresh = False
+            if self._refresh_callback is None:
+                return
+            try:
+                await self._refresh_callback()
+                utils.logger.info(
+                    f"[PlatformCircuitBreaker.wait_until_closed] {self.platform} session refreshed"
+                )
+            except Exception as e:
+                utils.logger.error(
+                    f"[PlatformCircuitBreaker.wait_until_closed] {self.platform} refresh error: {e}"
+                )
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "open": self.is_open,
+            "fast_failing": self.is_fast_failing,
+            "error_rate": round(self.error_rate, 3),
+            "trips": self.trip_count,
+            "error_trips": self.error_trip_count,
+            "fast_failed": self.fast_fail_count,
+        }
+
+
+_circuit_breakers: Dict[str, PlatformCircuitBreaker] = {}
+
+
+def get_circuit_breaker(platform: str) -> PlatformCircuitBreaker:
+    """
+    获取平台的熔断器，进程内共享
+    :param platform: 平台名称，与 config.PLATFORM 一致
+    :return:
+    """
+    breaker = _circuit_breakers.get(platform)
+    if breaker is None:
+        breaker = PlatformCircuitBreaker(
+            platform,
+            failure_threshold=config.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+            cooldown_sec=config.CIRCUIT_BREAKER_COOLDOWN_SEC,
+            error_rate_threshold=config.CIRCUIT_BREAKER_ERROR_RATE,
+            min_requests=config.CIRCUIT_BREAKER_MIN_REQUESTS,
+            window_sec=config.CIRCUIT_BREAKER_WINDOW_SEC,
+        )
+        _circuit_breakers[platform] = breaker
+    return breaker
+
+
+def get_circuit_breaker_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        platform: breaker.get_stats() for platform, breaker in _circuit_breakers.items()
+    }
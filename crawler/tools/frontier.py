@@ -0,0 +1,143 @@
+import hashlib
+import math
+import os
+import pathlib
+import sqlite3
+from typing import Iterable, Optional
+
+import config
+from tools import utils
+
+# 大于该值的爬取时间是毫秒时间戳（秒级时间戳要到 5138 年才会超过）
+MILLISECOND_TS_THRESHOLD = 10**11
+
+
+class BloomFilter:
+    """
+    布隆过滤器：判断为不存在时一定不存在，判断为存在时有很小的概率误判
+    使用 double hashing 从一次 sha256 中派生出 k 个哈希位置
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(1, capacity)
+        self.bit_count = max(
+            8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+        )
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self._bits = bytearray((self.bit_count + 7) // 8)
+
+    def _positions(self, key: str) -> Iterable[int]:
+        digest = hashlib.sha256(key.encode()).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return ((h1 + i * h2) % self.bit_count for i in range(self.hash_count))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class CrawlFrontier:
+    """
+    跨任务的爬取记录：
+    - sqlite 中保存 (平台, 内容ID) -> (指纹, 最后爬取时间)
+    - 启动时把已爬取的内容ID加载到布隆过滤器，新内容不需要查询 sqlite
+    - 内容超过 FRONTIER_REFRESH_INTERVAL_SEC 未爬取，或者指纹（例如评论数）发生变化时重新爬取
+    """
+
+    def __init__(
+        self,
+        platform: str,
+        db_path: str = "",
+        refresh_interval_sec: int = 0,
+        enabled: Optional[bool] = None,
+    ):
+        self.platform = platform
+        self.enabled = config.ENABLE_CRAWL_FRONTIER if enabled is None else enabled
+        self.refresh_interval_sec = (
+            refresh_interval_sec or config.FRONTIER_REFRESH_INTERVAL_SEC
+        )
+        self.skipped_count = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._bloom: Optional[BloomFilter] = None
+        if not self.enabled:
+            return
+        db_path = db_path or config.FRONTIER_DB_PATH
+        pathlib.Path(os.path.dirname(db_path) or ".").mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS frontier ("
+            "platform TEXT NOT NULL, item_id TEXT NOT NULL, fingerprint TEXT NOT NULL, "
+            "last_crawl_ts INTEGER NOT NULL, PRIMARY KEY (platform, item_id))"
+        )
+        self._conn.commit()
+        self._bloom = BloomFilter(
+            config.FRONTIER_BLOOM_CAPACITY, config.FRONTIER_BLOOM_ERROR_RATE
+        )
+        loaded_count = 0
+        for (item_id,) in self._conn.execute(
+            "SELECT item_id FROM frontier WHERE platform = ?", (platform,)
+        ):
+            self._bloom.add(item_id)
+            loaded_count += 1
+        utils.logger.info(
+            f"[CrawlFrontier.__init__] {platform} frontier loaded {loaded_count} items"
+        )
+
+    def should_crawl(self, item_id: str, fingerprint: Optional[str] = None) -> bool:
+        """
+        判断内容是否需要爬取
+        :param item_id: 内容ID
+        :param fingerprint: 内容指纹，例如列表页返回的评论数，为 None 时只按时间判断是否过期
+        :return:
+        """
+        if not self.enabled:
+            return True
+        item_id = str(item_id)
+        if item_id not in self._bloom:
+            return True
+        row = self._conn.execute(
+            "SELECT fingerprint, last_crawl_ts FROM frontier WHERE platform = ? AND item_id = ?",
+            (self.platform, item_id),
+        ).fetchone()
+        if not row:
+            return True
+        stored_fingerprint, last_crawl_ts = row
+        if last_crawl_ts > MILLISECOND_TS_THRESHOLD:
+            # 早期版本按毫秒记录爬取时间
+            last_crawl_ts //= 1000
+        if utils.get_unix_timestamp() - last_crawl_ts > self.refresh_interval_sec:
+            return True
+        if fingerprint is not None and str(fingerprint) != stored_fingerprint:
+            return True
+        self.skipped_count += 1
+        return False
+
+    def record(self, item_id: str, fingerprint: Optional[str] = None):
+        """
+        记录内容已经爬取
+        :param item_id: 内容ID
+        :param fingerprint: 内容指纹
+        :return:
+        """
+        if not self.enabled:
+            return
+        item_id = str(item_id)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO frontier (platform, item_id, fingerprint, last_crawl_ts) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                self.platform,
+                item_id,
+                "" if fingerprint is None else str(fingerprint),
+                utils.get_unix_timestamp(),
+            ),
+        )
+        self._conn.commit()
+        self._bloom.add(item_id)
@@ -0,0 +1,117 @@
+"""
+检查 async 函数中的阻塞调用（time.sleep、requests.* 等），这些调用会卡住整个事件循环，
+所有平台的爬取、下载、存储都会一起停下来。
+
+用法（在 crawler 目录下执行，发现阻塞调用时退出码为 1）：
+    python tools/lint_async.py [文件或目录 ...]
+"""
+import ast
+import os
+import sys
+from typing import Iterator, List, Set, Tuple
+
+# 模块 -> 该模块中会阻塞事件循环的函数
+BLOCKING_CALLS = {
+    "time": {"sleep"},
+    "requests": {"get", "post", "put", "patch", "delete", "head", "options", "request"},
+    "httpx": {"get", "post", "put", "patch", "delete", "head", "options", "request"},
+}
+
+SKIP_DIRS = {"__pycache__", ".git", "venv", ".venv", "node_modules"}
+
+
+class BlockingCallVisitor(ast.NodeVisitor):
+    """遍历一个模块，记录 async 函数体内（不含嵌套的同步函数）的阻塞调用"""
+
+    def __init__(self):
+        # 本模块中 import 的别名：别名 -> 模块名，例如 import time as t
+        self.module_aliases = {}
+        # from time import sleep 这种直接导入的函数：别名 -> 模块名.函数名
+        self.function_aliases = {}
+        self.in_async = False
+        self.errors: List[Tuple[int, str]] = []
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            if alias.name in BLOCKING_CALLS:
+                self.module_aliases[alias.asname or alias.name] = alias.name
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        if node.module not in BLOCKING_CALLS:
+            return
+        for alias in node.names:
+            if alias.name in BLOCKING_CALLS[node.module]:
+                self.function_aliases[
+                    alias.asname or alias.name
+                ] = f"{node.module}.{alias.name}"
+
+    def _visit_scope(self, node: ast.AST, in_async: bool):
+        previous, self.in_async = self.in_async, in_async
+        self.generic_visit(node)
+        self.in_async = previous
+
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
+        self._visit_scope(node, True)
+
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self._visit_scope(node, False)
+
+    def visit_Lambda(self, node: ast.Lambda):
+        self._visit_scope(node, False)
+
+    def _blocking_name(self, func: ast.AST) -> str:
+        if isinstance(func, ast.Name):
+            return self.function_aliases.get(func.id, "")
+        if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name):
+            module = self.module_aliases.get(func.value.id)
+            if module and func.attr in BLOCKING_CALLS[module]:
+                return f"{module}.{func.attr}"
+        return ""
+
+    def visit_Call(self, node: ast.Call):
+        if self.in_async:
+            name = self._blocking_name(node.func)
+            if name:
+                self.errors.append((node.lineno, name))
+        self.generic_visit(node)
+
+
+def iter_python_files(paths: List[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isfile(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+            for file_name in sorted(files):
+                if file_name.endswith(".py"):
+                    yield os.path.join(root, file_name)
+
+
+def check_file(file_path: str) -> List[Tuple[int, str]]:
+    with open(file_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=file_path)
+    visitor = BlockingCallVisitor()
+    visitor.visit(tree)
+    return visitor.errors
+
+
+def main(paths: List[str]) -> int:
+    paths = paths or [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+    checked: Set[str] = set()
+    error_count = 0
+    for file_path in iter_python_files(paths):
+        if file_path in checked:
+            continue
+        checked.add(file_path)
+        for lineno, name in check_file(file_path):
+            error_count += 1
+            print(f"{file_path}:{lineno}: blocking call {name}() in async function")
+    if error_count:
+        print(f"found {error_count} blocking call(s) in async code")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,186 @@
+import hashlib
+import os
+import pathlib
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import aiofiles
+import config
+import httpx
+from tools import utils
+
+# 未完成下载的临时文件后缀，下载完成后原子重命名为最终文件名
+PART_FILE_SUFFIX = ".part"
+
+
+@dataclass
+class MediaDownloadResult:
+    """流式下载结果"""
+
+    save_file_name: str
+    size: int
+    sha256: str
+    resumed: bool = False
+
+
+def build_httpx_client_kwargs(proxies) -> Dict:
+    """
+    处理 httpx 版本兼容性问题，新版本 httpx 使用不同的代理参数格式
+    Args:
+        proxies: dict 或 str 格式的代理
+
+    Returns:
+
+    """
+    httpx_kwargs = {}
+    if proxies:
+        if isinstance(proxies, str):
+            httpx_kwargs["proxy"] = proxies
+        else:
+            httpx_kwargs["proxies"] = proxies
+    return httpx_kwargs
+
+
+async def _hash_existing_file(file_name: str, chunk_size: int):
+    """
+    断点续传时，先对已下载的部分计算摘要，保证最终校验值覆盖整个文件
+    Args:
+        file_name: 临时文件路径
+        chunk_size: 每次读取的字节数
+
+    Returns:
+
+    """
+    hasher = hashlib.sha256()
+    async with aiofiles.open(file_name, "rb") as f:
+        while True:
+            chunk = await f.read(chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher
+
+
+def _parse_content_range_start(content_range: Optional[str]) -> Optional[int]:
+    """
+    解析 206 响应的 Content-Range 起始位置，例如 "bytes 100-199/200" 返回 100
+    Args:
+        content_range: Content-Range 响应头
+
+    Returns:
+        响应头缺失或者格式不对时返回 None
+    """
+    if not content_range:
+        return None
+    unit, _, byte_range = content_range.strip().partition(" ")
+    start, sep, _ = byte_range.partition("-")
+    if unit.lower() != "bytes" or not sep or not start.strip().isdigit():
+        return None
+    return int(start)
+
+
+async def download_media_to_file(
+    url: str,
+    save_file_name: str,
+    headers: Optional[Dict[str, str]] = None,
+    proxies=None,
+    timeout: float = 60,
+    chunk_size: int = 0,
+    resume: bool = True,
+    expected_sha256: Optional[str] = None,
+) -> Optional[MediaDownloadResult]:
+    """
+    流式下载媒体文件，分块写入临时文件，下载完成后原子重命名，内存占用与文件大小无关
+    如果存在上一次未完成的临时文件，会通过 Range 请求从断点继续下载
+    Args:
+        url: 媒体文件地址
+        save_file_name: 最终保存的文件路径
+        headers: 请求头
+        proxies: httpx 代理
+        timeout: 超时时间（秒）
+        chunk_size: 每次读取写入的字节数，默认取 config.MEDIA_DOWNLOAD_CHUNK_SIZE
+        resume: 是否开启断点续传
+        expected_sha256: 期望的 sha256 值，不一致时丢弃下载结果
+
+    Returns:
+        下载结果，失败返回 None
+    """
+    chunk_size = chunk_size or config.MEDIA_DOWNLOAD_CHUNK_SIZE
+    part_file_name = save_file_name + PART_FILE_SUFFIX
+    pathlib.Path(save_file_name).parent.mkdir(parents=True, exist_ok=True)
+
+    request_headers = dict(headers or {})
+    offset = 0
+    if resume and os.path.exists(part_file_name):
+        offset = os.path.getsize(part_file_name)
+    if offset > 0:
+        request_headers["Range"] = f"bytes={offset}-"
+
+    try:
+        async with httpx.AsyncClient(**build_httpx_client_kwargs(proxies)) as client:
+            while True:
+                async with client.stream(
+                    "GET", url, headers=request_headers, timeout=timeout
+                ) as response:
+                    if response.status_code == 416:
+                        # 临时文件已经不对应服务端的内容了，删除后下次重新下载
+                        utils.logger.error(
+                            f"[media_download.download_media_to_file] range not satisfiable, drop part file: {part_file_name}"
+                        )
+                        os.remove(part_file_name)
+                        return None
+                    if response.status_code not in (200, 206):
+                        utils.logger.error(
+                            f"[media_download.download_media_to_file] request {url} err, status: {response.status_code}"
+                        )
+                        return None
+
+                    resumed = offset > 0 and response.status_code == 206
+                    if resumed:
+                        range_start = _parse_content_range_start(
+                            response.headers.get("Content-Range")
+                        )
+                        if range_start != offset:
+                            # 返回的内容不是从断点开始的，不能直接追加，清空临时文件后从头下载
+                            utils.logger.warning(
+                                f"[media_download.download_media_to_file] unexpected Content-Range: "
+                                f"{response.headers.get('Content-Range')}, offset: {offset}, restart download: {url}"
+                            )
+                            os.truncate(part_file_name, 0)
+                            offset = 0
+                            request_headers.pop("Range", None)
+                            continue
+                        hasher = await _hash_existing_file(part_file_name, chunk_size)
+                        mode = "ab"
+                    else:
+                        # 服务端不支持 Range 时会返回 200 和完整内容，需要从头写
+                        hasher = hashlib.sha256()
+                        mode = "wb"
+                        offset = 0
+
+                    size = offset
+                    async with aiofiles.open(part_file_name, mode) as f:
+                        async for chunk in response.aiter_bytes(chunk_size):
+                            hasher.update(chunk)
+                            size += len(chunk)
+                            await f.write(chunk)
+                break
+    except httpx.HTTPError as e:
+        # 保留临时文件，下次调用时可以断点续传
+        utils.logger.error(
+            f"[media_download.download_media_to_file] download {url} interrupted at {part_file_name}, err: {e}"
+        )
+        return None
+
+    sha256 = hasher.hexdigest()
+    if expected_sha256 and expected_sha256 != sha256:
+        utils.logger.error(
+            f"[media_download.download_media_to_file] checksum mismatch for {url}, expected: {expected_sha256}, got: {sha256}"
+        )
+        os.remove(part_file_name)
+        return None
+
+    os.replace(part_file_name, save_file_name)
+    return MediaDownloadResult(
+        save_file_name=save_file_name, size=size, sha256=sha256, resumed=resumed
+    )
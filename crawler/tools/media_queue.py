@@ -0,0 +1,150 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import config
+from tools import utils
+from tools.media_download import MediaDownloadResult
+
+MediaJob = Callable[[], Awaitable[Optional[MediaDownloadResult]]]
+
+
+@dataclass
+class MediaDownloadTask:
+    url: str
+    job: MediaJob
+
+
+class HostRateLimiter:
+    """按域名限制请求速率，同一个域名两次请求之间至少间隔 1/qps 秒"""
+
+    def __init__(self, host_qps: float):
+        self.min_interval = 1.0 / host_qps if host_qps > 0 else 0.0
+        self._next_allowed_ts: Dict[str, float] = {}
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, host: str):
+        """
+        预约该域名下一个可用的时间片，并等待到该时间片
+        :param host: 域名
+        :return:
+        """
+        if self.min_interval <= 0:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            allowed_ts = max(now, self._next_allowed_ts.get(host, now))
+            self._next_allowed_ts[host] = allowed_ts + self.min_interval
+        delay = allowed_ts - now
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class MediaDownloadStage:
+    """
+    独立的媒体下载阶段：元数据爬取只负责把下载任务放入队列，
+    由固定数量的 worker 按各自的并发和域名限速下载，互不阻塞
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 0,
+        host_qps: float = 0,
+        queue_size: int = 0,
+        name: str = "media",
+    ):
+        self.name = name
+        self.concurrency = concurrency or config.MEDIA_DOWNLOAD_CONCURRENCY
+        self.queue: asyncio.Queue = asyncio.Queue(
+            maxsize=queue_size or config.MEDIA_DOWNLOAD_QUEUE_SIZE
+        )
+        self.rate_limiter = HostRateLimiter(host_qps or config.MEDIA_DOWNLOAD_HOST_QPS)
+        self._workers: List[asyncio.Task] = []
+        self._start_ts: float = 0.0
+        self.completed_count = 0
+        self.failed_count = 0
+        self.total_bytes = 0
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    @property
+    def bytes_per_sec(self) -> float:
+        if not self._start_ts:
+            return 0.0
+        elapsed = time.monotonic() - self._start_ts
+        return self.total_bytes / elapsed if elapsed > 0 else 0.0
+
+    def get_stats(self) -> Dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "completed": self.completed_count,
+            "failed": self.failed_count,
+            "total_bytes": self.total_bytes,
+            "bytes_per_sec": round(self.bytes_per_sec, 2),
+        }
+
+    def start(self):
+        """
+        启动下载 worker
+        :return:
+        """
+        if self.started:
+            return
+        self._start_ts = time.monotonic()
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"{self.name}_download_{i}")
+            for i in range(self.concurrency)
+        ]
+
+    async def submit(self, url: str, job: MediaJob):
+        """
+        提交下载任务，队列满时等待，形成对上游的反压
+        :param url: 媒体地址，用于按域名限速
+        :param job: 执行下载并落盘的异步函数
+        :return:
+        """
+        self.start()
+        await self.queue.put(MediaDownloadTask(url=url, job=job))
+
+    async def close(self):
+        """
+        等待队列中的任务全部下载完成，然后停止 worker
+        :return:
+        """
+        if not self.started:
+            return
+        await self.queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        utils.logger.info(
+            f"[MediaDownloadStage.close] {self.name} media download finished, stats: {self.get_stats()}"
+        )
+
+    async def _worker(self):
+        while True:
+            task: MediaDownloadTask = await self.queue.get()
+            try:
+                await self.rate_limiter.acquire(urlparse(task.url).netloc)
+                result = await task.job()
+                if result is None:
+                    self.failed_count += 1
+                else:
+                    self.completed_count += 1
+                    self.total_bytes += result.size
+            except Exception as e:
+                self.failed_count += 1
+                utils.logger.error(
+                    f"[MediaDownloadStage._worker] download {task.url} error: {e}"
+                )
+            finally:
+                self.queue.task_done()
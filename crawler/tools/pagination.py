@@ -0,0 +1,41 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from tools.rate_limiter import crawl_sleep
+
+FetchPage = Callable[[Any], Awaitable[Any]]
+
+
+async def iter_cursor_pages(
+    fetch_page: FetchPage,
+    next_cursor: Callable[[Any], Optional[Any]],
+    start_cursor: Any = "",
+    crawl_interval: float = 0,
+) -> AsyncIterator[Any]:
+    """
+    按游标翻页，并预取下一页：拿到当前页的游标后立即在后台请求下一页，
+    调用方处理当前页（例如把内容交给详情 worker）的同时下一页已经在路上
+    :param fetch_page: async def fetch_page(cursor) -> 一页的响应
+    :param next_cursor: def next_cursor(page) -> 下一页的游标，没有下一页时返回 None
+    :param start_cursor: 第一页的游标
+    :param crawl_interval: 两次翻页请求之间的间隔（秒）
+    :return: 逐页返回响应
+    """
+
+    async def fetch_after_interval(cursor: Any) -> Any:
+        await crawl_sleep(crawl_interval)
+        return await fetch_page(cursor)
+
+    pending: Optional[asyncio.Task] = asyncio.create_task(fetch_page(start_cursor))
+    try:
+        while pending is not None:
+            page = await pending
+            pending = None
+            cursor = next_cursor(page) if page else None
+            if cursor is not None:
+                pending = asyncio.create_task(fetch_after_interval(cursor))
+            yield page
+    finally:
+        # 调用方提前结束翻页时取消已经预取的请求
+        if pending is not None:
+            pending.cancel()
@@ -0,0 +1,229 @@
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import config
+from tools import utils
+from tools.circuit_breaker import PlatformCircuitBreaker, get_circuit_breaker
+
+# 各平台表示“请求过快 / 被风控”的 HTTP 状态码：403 禁止访问、418 微博限流、
+# 429 请求过多、461 / 471 小红书验证码
+THROTTLE_STATUS_CODES = frozenset({403, 418, 429, 461, 471})
+
+# 当前请求遇到的暂时性失败（被限流 / 风控、服务端 5xx），retry_request 据此判断请求失败后是否重试
+transient_failure_var: ContextVar[str] = ContextVar("transient_failure", default="")
+
+
+def mark_transient_failure(reason: str):
+    """
+    标记当前请求遇到了暂时性的失败，请求随后抛出的异常可以重试并计入平台熔断
+    :param reason: 原因，例如 status 503、code -412
+    :return:
+    """
+    transient_failure_var.set(reason or "transient failure")
+
+
+# 按 url 路径中的关键字划分接口类型，不同类型的接口通常有各自独立的限流阈值
+ENDPOINT_CLASS_KEYWORDS = (
+    ("search", "search"),
+    ("comment", "comment"),
+    ("reply", "comment"),
+    ("creator", "creator"),
+    ("user", "creator"),
+    ("space", "creator"),
+    ("people", "creator"),
+)
+
+
+def classify_endpoint(url: str) -> str:
+    """
+    根据请求地址划分接口类型
+    :param url: 请求地址
+    :return: search | comment | creator | default
+    """
+    path = urlparse(url).path.lower()
+    for keyword, endpoint_class in ENDPOINT_CLASS_KEYWORDS:
+        if keyword in path:
+            return endpoint_class
+    return "default"
+
+
+class AdaptiveRateLimiter:
+    """
+    令牌桶限速，速率按 AIMD 自适应：
+    - 每次请求前预约一个令牌，令牌不足时等待到令牌补足
+    - 连续成功 RATE_LIMIT_SUCCESS_THRESHOLD 次后速率加上 RATE_LIMIT_INCREASE_STEP（加性增）
+    - 被限流 / 风控时速率乘以 RATE_LIMIT_DECREASE_FACTOR（乘性减），并暂停 RATE_LIMIT_COOLDOWN_SEC 秒
+    - 同时把结果上报给平台熔断器，熔断打开时该平台的所有限速器都暂停发放令牌
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        min_rate: float,
+        max_rate: float,
+        burst: float,
+        increase_step: float,
+        decrease_factor: float,
+        success_threshold: int,
+        cooldown_sec: float,
+        breaker: Optional[PlatformCircuitBreaker] = None,
+    ):
+        self.name = name
+        self.breaker = breaker
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, min_rate)
+        self.rate = min(max(rate, self.min_rate), self.max_rate)
+        self.burst = max(1.0, burst)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.success_threshold = max(1, success_threshold)
+        self.cooldown_sec = cooldown_sec
+        self.success_count = 0
+        self.throttled_count = 0
+        self._tokens = self.burst
+        self._last_refill_ts = time.monotonic()
+        self._blocked_until = 0.0
+        self._success_streak = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill_ts
+        self._tokens = min(self.burst, self._tokens + elapsed * self.rate)
+        self._last_refill_ts = now
+
+    async def acquire(self):
+        """
+        预约一个令牌，并等待到令牌可用
+        :return:
+        """
+        if self.breaker is not None:
+            await self.breaker.wait_until_closed()
+        async with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            delay = max(-self._tokens / self.rate, self._blocked_until - now, 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def report_success(self):
+        """
+        请求成功，持续成功时逐步提速
+        :return:
+        """
+        self.success_count += 1
+        self._success_streak += 1
+        if self.breaker is not None:
+            self.breaker.record_success()
+        if self._success_streak < self.success_threshold:
+            return
+        self._success_streak = 0
+        if self.rate < self.max_rate:
+            self._refill(time.monotonic())
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def report_throttled(self, reason: str = ""):
+        """
+        请求被限流或风控，立即降速并暂停一段时间
+        :param reason: 原因，仅用于日志
+        :return:
+        """
+        now = time.monotonic()
+        self._refill(now)
+        self.throttled_count += 1
+        self._success_streak = 0
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self._tokens = min(self._tokens, 0.0)
+        self._blocked_until = max(self._blocked_until, now + self.cooldown_sec)
+        mark_transient_failure(reason)
+        utils.logger.warning(
+            f"[AdaptiveRateLimiter.report_throttled] {self.name} throttled ({reason}), "
+            f"rate down to {self.rate:.2f} req/s, cooldown {self.cooldown_sec}s"
+        )
+        if self.breaker is not None:
+            self.breaker.record_failure(reason)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "rate": round(self.rate, 3),
+            "success": self.success_count,
+            "throttled": self.throttled_count,
+        }
+
+
+class NoopRateLimiter:
+    """关闭自适应限速时使用，不限速，只在平台熔断打开时等待"""
+
+    def __init__(self, breaker: PlatformCircuitBreaker):
+        self.breaker = breaker
+
+    async def acquire(self):
+        await self.breaker.wait_until_closed()
+
+    def report_success(self):
+        self.breaker.record_success()
+
+    def report_throttled(self, reason: str = ""):
+        mark_transient_failure(reason)
+        self.breaker.record_failure(reason)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {}
+
+
+_rate_limiters: Dict[Tuple[str, str, str], AdaptiveRateLimiter] = {}
+_noop_rate_limiters: Dict[str, NoopRateLimiter] = {}
+
+
+def get_rate_limiter(platform: str, url: str = "", identity: Any = None):
+    """
+    获取 (平台, 接口类型, 账号/代理) 对应的限速器，进程内共享，同一个出口对同一类接口只有一个令牌桶
+    :param platform: 平台名称，与 config.PLATFORM 一致
+    :param url: 请求地址，用于划分接口类型
+    :param identity: 账号或者代理，不同出口 IP / 账号分别限速
+    :return:
+    """
+    if not config.ENABLE_RATE_LIMITER:
+        if platform not in _noop_rate_limiters:
+            _noop_rate_limiters[platform] = NoopRateLimiter(
+                get_circuit_breaker(platform)
+            )
+        return _noop_rate_limiters[platform]
+    key = (platform, classify_endpoint(url), str(identity or ""))
+    limiter = _rate_limiters.get(key)
+    if limiter is None:
+        limiter = AdaptiveRateLimiter(
+            name=":".join(part for part in key if part),
+            rate=config.RATE_LIMIT_PLATFORM_RPS.get(
+                platform, config.RATE_LIMIT_INITIAL_RPS
+            ),
+            min_rate=config.RATE_LIMIT_MIN_RPS,
+            max_rate=config.RATE_LIMIT_MAX_RPS,
+            burst=config.RATE_LIMIT_BURST,
+            increase_step=config.RATE_LIMIT_INCREASE_STEP,
+            decrease_factor=config.RATE_LIMIT_DECREASE_FACTOR,
+            success_threshold=config.RATE_LIMIT_SUCCESS_THRESHOLD,
+            cooldown_sec=config.RATE_LIMIT_COOLDOWN_SEC,
+            breaker=get_circuit_breaker(platform),
+        )
+        _rate_limiters[key] = limiter
+    return limiter
+
+
+def get_rate_limiter_stats() -> Dict[str, Dict[str, Any]]:
+    return {limiter.name: limiter.get_stats() for limiter in _rate_limiters.values()}
+
+
+async def crawl_sleep(seconds: Optional[float]):
+    """
+    翻页之间的固定等待：开启自适应限速后请求节奏由令牌桶控制，不再额外等待
+    :param seconds: 关闭自适应限速时等待的秒数
+    :return:
+    """
+    if config.ENABLE_RATE_LIMITER or not seconds:
+        return
+    await asyncio.sleep(seconds)
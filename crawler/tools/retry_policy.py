@@ -0,0 +1,228 @@
+import asyncio
+import functools
+import random
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import config
+import httpx
+from tools import utils
+from tools.circuit_breaker import CircuitOpenError, get_circuit_breaker
+from tools.rate_limiter import THROTTLE_STATUS_CODES, transient_failure_var
+
+T = TypeVar("T")
+
+
+class RetryPolicy:
+    """单个平台的重试策略：最多尝试次数，失败后按指数退避加随机抖动（full jitter）等待"""
+
+    def __init__(self, max_attempts: int, base_delay_sec: float, max_delay_sec: float):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay_sec = base_delay_sec
+        self.max_delay_sec = max_delay_sec
+
+    def backoff(self, attempt: int) -> float:
+        """
+        第 attempt 次尝试失败后的等待时间，在 [0, min(max_delay, base_delay * 2^(attempt-1))] 之间随机，
+        同时失败的请求不会在同一时刻一起重试
+        :param attempt: 从 1 开始
+        :return:
+        """
+        ceiling = min(self.max_delay_sec, self.base_delay_sec * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)
+
+
+def get_retry_policy(platform: str) -> RetryPolicy:
+    """
+    按当前任务配置生成平台的重试策略，RETRY_PLATFORM_POLICIES 中没有配置的字段使用默认值
+    :param platform: 平台名称，与 config.PLATFORM 一致
+    :return:
+    """
+    platform_policy = config.RETRY_PLATFORM_POLICIES.get(platform, {})
+    return RetryPolicy(
+        max_attempts=platform_policy.get("max_attempts", config.RETRY_MAX_ATTEMPTS),
+        base_delay_sec=platform_policy.get(
+            "base_delay_sec", config.RETRY_BASE_DELAY_SEC
+        ),
+        max_delay_sec=platform_policy.get("max_delay_sec", config.RETRY_MAX_DELAY_SEC),
+    )
+
+
+class RetryBudget:
+    """
+    全局重试预算：滑动窗口内重试请求最多占全部请求的 ratio，另外每个窗口至少允许 min_retries 次重试，
+    平台大面积出错时重试不会把请求量放大成几倍
+    """
+
+    def __init__(self, ratio: float, min_retries: int, window_sec: float):
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_sec = window_sec
+        self.exhausted_count = 0
+        self._requests: Deque[float] = deque()
+        self._retries: Deque[float] = deque()
+
+    def _trim(self, now: float):
+        for timestamps in (self._requests, self._retries):
+            while timestamps and now - timestamps[0] > self.window_sec:
+                timestamps.popleft()
+
+    def record_request(self, is_retry: bool):
+        now = time.monotonic()
+        self._requests.append(now)
+        if is_retry:
+            self._retries.append(now)
+
+    def can_retry(self) -> bool:
+        """
+        :return: 预算内还可以重试时返回 True
+        """
+        self._trim(time.monotonic())
+        allowed = max(self.min_retries, self.ratio * len(self._requests))
+        if len(self._retries) < allowed:
+            return True
+        self.exhausted_count += 1
+        return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        return {
+            "requests": len(self._requests),
+            "retries": len(self._retries),
+            "exhausted": self.exhausted_count,
+        }
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    判断请求失败是否是暂时性的，只有暂时性的失败才重试并计入平台熔断：
+    - 网络错误：httpx.TransportError，以及 requests 等同步库的连接、超时错误（OSError 的子类）
+    - HTTP 5xx、429 以及各平台表示限流 / 风控的状态码
+    - 请求过程中上报过限流 / 风控或者服务端 5xx（客户端会把它们包装成 DataFetchError 等异常）
+    其他错误（参数错误、内容不存在、解析失败等）重试也不会成功
+    :param error: 请求抛出的异常
+    :return:
+    """
+    if transient_failure_var.get():
+        return True
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (httpx.TransportError, OSError)):
+            return True
+        if isinstance(error, httpx.HTTPStatusError):
+            status_code = error.response.status_code
+            return status_code >= 500 or status_code in THROTTLE_STATUS_CODES
+        # 客户端在 except 中重新抛出的异常，检查原始异常
+        error = error.__cause__ or error.__context__
+    return False
+
+
+@dataclass
+class RetryStats:
+    requests: int = 0
+    retries: int = 0
+    recovered: int = 0
+    gave_up: int = 0
+    budget_exhausted: int = 0
+    fast_failed: int = 0
+    not_retryable: int = 0
+
+
+_retry_budget: Optional[RetryBudget] = None
+_retry_stats: Dict[str, RetryStats] = {}
+
+
+def get_retry_budget() -> RetryBudget:
+    """
+    获取全局重试预算，进程内所有平台共享
+    :return:
+    """
+    global _retry_budget
+    if _retry_budget is None:
+        _retry_budget = RetryBudget(
+            ratio=config.RETRY_BUDGET_RATIO,
+            min_retries=config.RETRY_BUDGET_MIN_RETRIES,
+            window_sec=config.RETRY_BUDGET_WINDOW_SEC,
+        )
+    return _retry_budget
+
+
+def retry_request(platform: str):
+    """
+    平台客户端 request 方法的重试装饰器：
+    - 暂时性的失败（见 is_transient_error）按平台的重试策略指数退避重试，最后一次仍然失败时抛出原始异常，
+      其他异常直接抛出，不重试也不计入熔断
+    - 重试前检查全局重试预算，预算用完时不再重试
+    - 每次请求的结果上报给平台熔断器，熔断快速失败期间直接抛出 CircuitOpenError，不发出请求也不重试
+    :param platform: 平台名称，与 config.PLATFORM 一致
+    :return:
+    """
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs) -> T:
+            policy = get_retry_policy(platform)
+            budget = get_retry_budget()
+            breaker = get_circuit_breaker(platform)
+            stats = _retry_stats.setdefault(platform, RetryStats())
+            attempt = 1
+            while True:
+                try:
+                    breaker.check()
+                except CircuitOpenError:
+                    stats.fast_failed += 1
+                    raise
+                stats.requests += 1
+                if attempt > 1:
+                    stats.retries += 1
+                budget.record_request(is_retry=attempt > 1)
+                transient_failure_var.set("")
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    if not is_transient_error(e):
+                        stats.not_retryable += 1
+                        raise
+                    breaker.record_outcome(False, f"{type(e).__name__}: {e}")
+                    if attempt >= policy.max_attempts:
+                        stats.gave_up += 1
+                        utils.logger.error(
+                            f"[retry_request] {platform} {func.__name__} failed after {attempt} attempts: {e}"
+                        )
+                        raise
+                    if breaker.is_fast_failing:
+                        raise
+                    if not budget.can_retry():
+                        stats.budget_exhausted += 1
+                        utils.logger.warning(
+                            f"[retry_request] {platform} retry budget exhausted, give up: {e}"
+                        )
+                        raise
+                    delay = policy.backoff(attempt)
+                    utils.logger.warning(
+                        f"[retry_request] {platform} {func.__name__} attempt {attempt} failed: {e}, "
+                        f"retry in {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                breaker.record_outcome(True)
+                if attempt > 1:
+                    stats.recovered += 1
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def get_retry_stats() -> Dict[str, Any]:
+    return {
+        "budget": get_retry_budget().get_stats(),
+        "platforms": {
+            platform: asdict(stats) for platform, stats in _retry_stats.items()
+        },
+    }
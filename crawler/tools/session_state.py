@@ -0,0 +1,85 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+import config
+from playwright.async_api import BrowserContext
+from tools import utils
+
+
+class SessionState:
+    """
+    登录态快照：cookie 和各站点的 localStorage，文件格式与 playwright 的 storage_state 一致，
+    也可以用 BrowserContext.storage_state(path=...) 或者浏览器插件导出后直接使用
+    """
+
+    def __init__(self, cookies: List[Dict], local_storage: Dict[str, str]):
+        self.cookies = cookies
+        self.local_storage = local_storage
+        self.cookie_str, self.cookie_dict = utils.convert_cookies(cookies)
+
+    @classmethod
+    def from_storage_state(cls, storage_state: Dict) -> "SessionState":
+        local_storage = {}
+        for origin in storage_state.get("origins", []):
+            for item in origin.get("localStorage", []):
+                local_storage[item["name"]] = item["value"]
+        return cls(storage_state.get("cookies", []), local_storage)
+
+    @classmethod
+    def from_cookie_str(cls, cookie_str: str) -> "SessionState":
+        cookie_dict = utils.convert_str_cookie_to_dict(cookie_str)
+        cookies = [
+            {"name": name, "value": value} for name, value in cookie_dict.items()
+        ]
+        return cls(cookies, {})
+
+
+def session_state_path(platform: str) -> str:
+    """
+    登录态文件路径：browser_data/SESSION_STATE_FILE，同一平台的所有 worker 共用
+    :param platform:
+    :return:
+    """
+    return os.path.join(
+        os.getcwd(), "browser_data", config.SESSION_STATE_FILE % platform
+    )
+
+
+def load_session_state(platform: str) -> Optional[SessionState]:
+    """
+    读取保存的登录态，没有登录态文件时使用 cookie 登录方式配置的 COOKIES
+    :param platform:
+    :return: 都没有时返回 None
+    """
+    file_path = session_state_path(platform)
+    if os.path.exists(file_path):
+        try:
+            with open(file_path, encoding="utf-8") as f:
+                return SessionState.from_storage_state(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            utils.logger.error(
+                f"[load_session_state] read session state {file_path} error: {e}"
+            )
+    if config.LOGIN_TYPE == "cookie" and config.COOKIES:
+        return SessionState.from_cookie_str(config.COOKIES)
+    return None
+
+
+async def save_session_state(browser_context: BrowserContext, platform: str):
+    """
+    导出浏览器的登录态，先写临时文件再替换，其他进程读取时不会读到写了一半的文件
+    :param browser_context:
+    :param platform:
+    :return:
+    """
+    file_path = session_state_path(platform)
+    storage_state = await browser_context.storage_state()
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    tmp_path = f"{file_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(storage_state, f, ensure_ascii=False)
+    os.replace(tmp_path, file_path)
+    utils.logger.info(
+        f"[save_session_state] {platform} session state saved to {file_path}"
+    )
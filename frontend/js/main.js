@@ -182,8 +182,9 @@ async function pollTaskStatus(taskId) {
         try {
             const status = await ApiClient.getTaskStatus(taskId);
 
-            if (status.status === 'running') {
-                // 任务仍在运行，继续轮询
+            if (status.status === 'queued' || status.status === 'running') {
+                // 任务排队中或仍在运行，继续轮询
+                runStatus.innerHTML = '<span class="loading"></span>' + status.message;
                 setTimeout(poll, pollInterval);
             } else if (status.status === 'completed') {
                 // 任务完成
@@ -192,7 +193,7 @@ async function pollTaskStatus(taskId) {
                 // 重新启用按钮
                 runBtn.disabled = false;
                 runBtn.textContent = '运行爬虫和生成模型';
-            } else if (status.status === 'error') {
+            } else if (status.status === 'error' || status.status === 'cancelled') {
                 // 任务出错
                 runStatus.classList.remove('status-info');
                 runStatus.classList.add('status-error');
@@ -0,0 +1,229 @@
+# job_runner.py
+import asyncio
+import itertools
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_COMPLETED = "completed"
+JOB_STATUS_ERROR = "error"
+JOB_STATUS_CANCELLED = "cancelled"
+
+JobFunc = Callable[..., Awaitable[Any]]
+
+
+class JobStore:
+    """任务状态持久化到 SQLite，服务重启后可以查询历史任务并恢复未完成的任务"""
+
+    def __init__(self, db_path: str):
+        self._lock = Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, status TEXT NOT NULL, message TEXT NOT NULL, "
+            "priority INTEGER NOT NULL, params TEXT NOT NULL, "
+            "create_ts REAL NOT NULL, update_ts REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def insert(self, job_id: str, priority: int, params: Dict, message: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs "
+                "(job_id, status, message, priority, params, create_ts, update_ts) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    JOB_STATUS_QUEUED,
+                    message,
+                    priority,
+                    json.dumps(params, ensure_ascii=False),
+                    now,
+                    now,
+                ),
+            )
+            self._conn.commit()
+
+    def update(self, job_id: str, status: str, message: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, update_ts = ? WHERE job_id = ?",
+                (status, message, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, status, message, priority, params FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if not row:
+            return None
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "message": row[2],
+            "priority": row[3],
+            "params": json.loads(row[4]),
+        }
+
+    def list_unfinished(self):
+        """
+        查询上次服务退出时还没有完成的任务，按优先级和提交时间排序
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, priority, params FROM jobs WHERE status IN (?, ?) "
+                "ORDER BY priority, create_ts",
+                (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING),
+            ).fetchall()
+        return [(row[0], row[1], json.loads(row[2])) for row in rows]
+
+
+class JobRunner:
+    """
+    爬虫任务执行器：
+    - 所有任务运行在同一个后台事件循环线程中，不再每个任务新建线程和事件循环
+    - 固定数量的 worker 从优先级队列中取任务，数字越小优先级越高，同优先级按提交顺序
+    - 支持取消排队中或运行中的任务
+    - 任务状态保存在 SQLite 中，服务重启后未完成的任务会重新排队
+    """
+
+    def __init__(
+        self, job_func: JobFunc, max_workers: int = 1, db_path: str = "jobs.db"
+    ):
+        self.job_func = job_func
+        self.max_workers = max(1, max_workers)
+        self.store = JobStore(db_path)
+        self._loop = asyncio.new_event_loop()
+        self._thread: Optional[Thread] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._running_tasks: Dict[str, asyncio.Task] = {}
+        # 任务最近一次入队的序号，队列中序号对不上的条目（已取消或者被重新提交）直接跳过
+        self._job_tokens: Dict[str, int] = {}
+        self._start_lock = Lock()
+        # Flask 多线程处理请求，检查任务状态和入队 / 取消需要在同一把锁里完成
+        self._submit_lock = Lock()
+
+    def start(self):
+        """
+        启动后台事件循环线程和 worker，并恢复上次未完成的任务
+        """
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = Thread(
+                target=self._loop.run_forever, name="job_runner", daemon=True
+            )
+            self._thread.start()
+            self._call(self._start_workers()).result()
+
+        with self._submit_lock:
+            for job_id, priority, params in self.store.list_unfinished():
+                logger.info(f"恢复未完成的任务: {job_id}")
+                self._enqueue(job_id, priority, params, "服务重启，任务重新排队")
+
+    def _call(self, coro) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _start_workers(self):
+        self._queue = asyncio.PriorityQueue()
+        for i in range(self.max_workers):
+            self._loop.create_task(self._worker(), name=f"job_worker_{i}")
+
+    def _enqueue(self, job_id: str, priority: int, params: Dict, message: str):
+        self.store.insert(job_id, priority, params, message)
+        token = next(self._seq)
+        self._job_tokens[job_id] = token
+        item = (priority, token, job_id, params)
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+
+    def submit(self, job_id: str, params: Dict, priority: int = 10) -> bool:
+        """
+        提交任务
+        :param job_id: 任务ID
+        :param params: 传给 job_func 的关键字参数，需要能被 json 序列化
+        :param priority: 优先级，数字越小越先执行
+        :return: 任务已经在排队或运行时返回 False
+        """
+        self.start()
+        with self._submit_lock:
+            job = self.store.get(job_id)
+            if job and job["status"] in (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING):
+                return False
+            self._enqueue(job_id, priority, params, "任务排队中...")
+            return True
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        取消任务，排队中的任务不会再执行，运行中的任务会收到 CancelledError
+        :param job_id: 任务ID
+        :return: 任务不存在或已经结束时返回 False
+        """
+        with self._submit_lock:
+            job = self.store.get(job_id)
+            if not job or job["status"] not in (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING):
+                return False
+            self._job_tokens.pop(job_id, None)
+            task = self._running_tasks.get(job_id)
+            if task is not None:
+                self._loop.call_soon_threadsafe(task.cancel)
+            self.store.update(job_id, JOB_STATUS_CANCELLED, "任务已取消")
+            return True
+
+    def get_status(self, job_id: str) -> Optional[Dict]:
+        job = self.store.get(job_id)
+        if not job:
+            return None
+        return {"status": job["status"], "message": job["message"]}
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "max_workers": self.max_workers,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "running": len(self._running_tasks),
+        }
+
+    async def _worker(self):
+        while True:
+            _, token, job_id, params = await self._queue.get()
+            try:
+                if self._job_tokens.get(job_id) != token:
+                    continue
+                await self._run_job(job_id, token, params)
+            finally:
+                self._queue.task_done()
+
+    async def _run_job(self, job_id: str, token: int, params: Dict):
+        self.store.update(job_id, JOB_STATUS_RUNNING, "正在运行爬虫和生成模型...")
+        task = asyncio.create_task(self.job_func(**params), name=f"job_{job_id}")
+        self._running_tasks[job_id] = task
+        try:
+            message = await task
+            self.store.update(job_id, JOB_STATUS_COMPLETED, message or "任务完成")
+            logger.info(f"任务 {job_id} 完成")
+        except asyncio.CancelledError:
+            # 取消后重新提交的任务已经在排队，不覆盖它的状态
+            if self._job_tokens.get(job_id) in (token, None):
+                self.store.update(job_id, JOB_STATUS_CANCELLED, "任务已取消")
+            logger.info(f"任务 {job_id} 已取消")
+        except Exception as e:
+            self.store.update(job_id, JOB_STATUS_ERROR, str(e))
+            logger.error(f"任务 {job_id} 出错: {str(e)}")
+        finally:
+            if self._running_tasks.get(job_id) is task:
+                self._running_tasks.pop(job_id)
+            if self._job_tokens.get(job_id) == token:
+                self._job_tokens.pop(job_id)
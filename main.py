@@ -3,10 +3,10 @@ import glob
 import os
 import shutil
 import sys
-from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
 
-from AI.AI_rag.build_model import build_and_save_model
+from AI.AI_rag.build_model import IncrementalModelBuilder, build_and_save_model
 from AI.audio_video.video_to_txt import extract_txt_from_mp4
 
 project_root = os.path.dirname(os.path.abspath(__file__))
@@ -27,6 +27,22 @@ class CrawlerConfig:
     logintype: str
     platform: str
     crawlertype: str
+    # 是否使用流式流水线：爬取、转写/提取、切分向量化同时进行
+    streaming: bool = True
+    # 只对本次任务生效的爬虫配置项，例如 {"ZHIHU_QUESTION_URL": "..."}
+    overrides: Dict[str, Any] = field(default_factory=dict)
+    # 是否从上次中断的位置继续爬取：保留 data 目录和断点记录，跳过已经保存的内容
+    resume: bool = False
+    # 断点记录所属的运行ID，例如 API 请求中的 task_id，续爬时只复用同一个运行ID的断点
+    run_id: str = ""
+
+
+# 流式流水线各阶段之间的队列长度
+STREAM_QUEUE_SIZE = 1000
+# 转写/提取阶段的并发数量（音频转写比较耗CPU，不宜过大）
+STREAM_EXTRACT_CONCURRENCY = 2
+# 向量化阶段累计多少字符后批量写入一次向量数据库
+STREAM_INDEX_BATCH_CHARS = 4000
 
 
 def clean_crawler_data() -> None:
@@ -123,7 +139,16 @@ async def run_crawler_internal(Cconfig: CrawlerConfig) -> None:
     spec.loader.exec_module(crawler_main)
 
     # 运行爬虫
-    await crawler_main.main(Cconfig.logintype, Cconfig.platform, Cconfig.crawlertype)
+    await crawler_main.main(
+        Cconfig.logintype,
+        Cconfig.platform,
+        Cconfig.crawlertype,
+        overrides={
+            **Cconfig.overrides,
+            "CHECKPOINT_RESUME": Cconfig.resume,
+            "CHECKPOINT_RUN_ID": Cconfig.run_id,
+        },
+    )
     print("Crawler program execution completed")
 
 
@@ -191,6 +216,34 @@ def process_zhihu_data(file_groups: List[Tuple[str, str, str]]) -> str:
     return processed_content
 
 
+def format_xhs_post(post: dict) -> List[str]:
+    """把小红书帖子转换为文本行"""
+    return [
+        "帖子标题: " + str(post.get("title", "")),
+        "帖子描述: " + str(post.get("desc", "")),
+        "最后更新时间: " + str(post.get("last_update_time", "")),
+        "用户ID: " + str(post.get("user_id", "")),
+        "用户名: " + str(post.get("nickname", "")),
+        "用户地区: " + str(post.get("ip_location", "")),
+        "点赞数: " + str(post.get("liked_count", "")),
+        "收藏数: " + str(post.get("collected_count", "")),
+        "评论数: " + str(post.get("comment_count", "")),
+        "标签: " + str(post.get("tag_list", "")),
+        "",  # 空行分隔
+    ]
+
+
+def format_xhs_comment(comment: dict) -> List[str]:
+    """把小红书评论转换为文本行"""
+    return [
+        "评论地区: " + str(comment.get("ip_location", "")),
+        "评论内容: " + str(comment.get("content", "")),
+        "回复数: " + str(comment.get("sub_comment_count", "")),
+        "点赞数: " + str(comment.get("like_count", "")),
+        "",  # 空行分隔
+    ]
+
+
 def process_xhs_data(config: CrawlerConfig) -> str:
     """处理小红书数据"""
     processed_content = ""
@@ -213,19 +266,7 @@ def process_xhs_data(config: CrawlerConfig) -> str:
                     post = data[0] if isinstance(data, list) else data
 
                     # 提取帖子主要内容
-                    xhs_content.append("帖子标题: " + post.get("title", ""))
-                    xhs_content.append("帖子描述: " + post.get("desc", ""))
-                    xhs_content.append(
-                        "最后更新时间: " + str(post.get("last_update_time", ""))
-                    )
-                    xhs_content.append("用户ID: " + post.get("user_id", ""))
-                    xhs_content.append("用户名: " + post.get("nickname", ""))
-                    xhs_content.append("用户地区: " + post.get("ip_location", ""))
-                    xhs_content.append("点赞数: " + post.get("liked_count", ""))
-                    xhs_content.append("收藏数: " + post.get("collected_count", ""))
-                    xhs_content.append("评论数: " + post.get("comment_count", ""))
-                    xhs_content.append("标签: " + post.get("tag_list", ""))
-                    xhs_content.append("")  # 空行分隔
+                    xhs_content.extend(format_xhs_post(post))
 
             except Exception as e:
                 print(f"  Error: Failed to process XHS content data: {e}")
@@ -242,13 +283,7 @@ def process_xhs_data(config: CrawlerConfig) -> str:
 
                     # 提取每条评论的关键信息
                     for comment in comments_data:
-                        xhs_content.append("评论地区: " + comment.get("ip_location", ""))
-                        xhs_content.append("评论内容: " + comment.get("content", ""))
-                        xhs_content.append(
-                            "回复数: " + comment.get("sub_comment_count", "")
-                        )
-                        xhs_content.append("点赞数: " + comment.get("like_count", ""))
-                        xhs_content.append("")  # 空行分隔
+                        xhs_content.extend(format_xhs_comment(comment))
 
             except Exception as e:
                 print(f"  Error: Failed to process XHS comments data: {e}")
@@ -281,12 +316,115 @@ def process_crawler_data(Cconfig: CrawlerConfig) -> str:
     return processed_content.strip()
 
 
+def extract_text_from_store_item(platform: str, item_type: str, item: dict) -> str:
+    """
+    把存储层推送过来的单条数据转换为构建模型用的文本
+    B站视频需要先转写音频，其余平台直接提取文本字段
+    """
+    if platform == "bili" and item_type == "video":
+        video_path = item.get("video_path", "")
+        if not os.path.exists(video_path):
+            print(f"  Warning: Video file does not exist: {video_path}")
+            return ""
+        return extract_txt_from_mp4(video_path) or ""
+    if platform == "zhihu" and item_type == "content":
+        return item.get("content_text") or item.get("content") or item.get("text") or ""
+    if platform == "xhs" and item_type == "content":
+        return "\n".join(format_xhs_post(item))
+    if platform == "xhs" and item_type == "comment":
+        return "\n".join(format_xhs_comment(item))
+    return ""
+
+
+async def run_streaming_pipeline(Cconfig: CrawlerConfig) -> bool:
+    """
+    爬取 -> 转写/提取 -> 切分向量化 流水线：
+    存储层每落盘一条数据就推送到转写阶段，转写结果再推送到向量化阶段，
+    阶段之间使用有界队列，总耗时接近最慢的阶段而不是各阶段之和
+    返回是否成功构建了模型
+    """
+    from store.store_events import add_store_listener, remove_store_listener
+    from tools.async_pipeline import AsyncPipeline
+
+    model_name = Cconfig.platform + "_model"
+    model_type = Cconfig.platform + "_model"
+    builder: Optional[IncrementalModelBuilder] = None
+    pending_texts: List[str] = []
+    pending_chars = 0
+
+    async def flush_pending_texts():
+        nonlocal builder, pending_texts, pending_chars
+        if not pending_texts:
+            return
+        if builder is None:
+            builder = await asyncio.to_thread(
+                IncrementalModelBuilder, model_name, model_type
+            )
+        texts, pending_texts, pending_chars = pending_texts, [], 0
+        chunk_count = await asyncio.to_thread(builder.add_texts, ["\n\n".join(texts)])
+        print(f"  Indexed {chunk_count} chunks into {model_name}")
+
+    async def extract_stage(event: Tuple[str, str, dict]) -> Optional[str]:
+        platform, item_type, item = event
+        text = await asyncio.to_thread(
+            extract_text_from_store_item, platform, item_type, item
+        )
+        return text.strip() or None
+
+    async def index_stage(text: str):
+        nonlocal pending_chars
+        pending_texts.append(text)
+        pending_chars += len(text)
+        if pending_chars >= STREAM_INDEX_BATCH_CHARS:
+            await flush_pending_texts()
+
+    pipeline = (
+        AsyncPipeline(name=f"{Cconfig.platform}_crawl_index")
+        .add_stage(
+            "extract",
+            extract_stage,
+            concurrency=STREAM_EXTRACT_CONCURRENCY,
+            queue_size=STREAM_QUEUE_SIZE,
+        )
+        .add_stage("index", index_stage, concurrency=1, queue_size=STREAM_QUEUE_SIZE)
+    )
+
+    async def on_store_event(platform: str, item_type: str, item: dict):
+        if platform == Cconfig.platform:
+            await pipeline.put((platform, item_type, item))
+
+    add_store_listener(on_store_event)
+    try:
+        await run_crawler_internal(Cconfig)
+    finally:
+        remove_store_listener(on_store_event)
+        # 爬虫结束后排空转写和向量化阶段中剩余的数据
+        await pipeline.close()
+    await flush_pending_texts()
+
+    if builder is None:
+        return False
+    return await asyncio.to_thread(builder.finalize)
+
+
 async def main(Cconfig: CrawlerConfig) -> None:
-    # 0. 清空之前的数据文件（在爬虫运行前）
+    # 0. 清空之前的数据文件（在爬虫运行前），断点续爬时保留已经爬取的数据和断点记录
     print("\n" + "=" * 50)
-    print("Step 0: Clean historical crawler data")
-    print("=" * 50)
-    clean_crawler_data()
+    if Cconfig.resume:
+        print("Step 0: Resume from checkpoint, keep historical crawler data")
+        print("=" * 50)
+    else:
+        print("Step 0: Clean historical crawler data")
+        print("=" * 50)
+        clean_crawler_data()
+
+    if Cconfig.streaming:
+        # 1-3. 爬取、转写和模型构建同时进行
+        print("\n" + "=" * 50)
+        print("Step 1-3: Execute streaming crawl -> transcribe -> index pipeline")
+        if not await run_streaming_pipeline(Cconfig):
+            print("  Error: No valid data content found for model building")
+        return
 
     # 1. 执行爬虫
     print("\n" + "=" * 50)
@@ -329,6 +467,16 @@ async def main(Cconfig: CrawlerConfig) -> None:
     # clean_crawler_data()  # 如果需要在最后也清空数据，取消注释这行
 
 
+async def run_cli(Cconfig: CrawlerConfig) -> None:
+    """命令行入口：进程只运行一个任务，结束后关闭爬虫的浏览器上下文池"""
+    from tools.browser_pool import close_browser_pool
+
+    try:
+        await main(Cconfig)
+    finally:
+        await close_browser_pool()
+
+
 if __name__ == "__main__":
     # Cconfig = CrawlerConfig(
     #     logintype="cookie",
@@ -346,6 +494,6 @@ if __name__ == "__main__":
     Cconfig = CrawlerConfig(logintype="qrcode ", platform="xhs", crawlertype="detail")
 
     try:
-        asyncio.run(main(Cconfig))
+        asyncio.run(run_cli(Cconfig))
     except KeyboardInterrupt:
         sys.exit()
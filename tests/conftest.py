@@ -0,0 +1,9 @@
+import os
+import sys
+
+# 爬虫模块按 crawler 目录为根导入（import config、from tools import utils）
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+crawler_root = os.path.join(project_root, "crawler")
+for path in (project_root, crawler_root):
+    if path not in sys.path:
+        sys.path.insert(0, path)
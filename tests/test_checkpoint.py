@@ -0,0 +1,98 @@
+from tools.checkpoint import CrawlCheckpoint, PageCheckpointTracker
+
+
+def open_checkpoint(tmp_path, job_key: str = "bili:search:task", resume: bool = True):
+    return CrawlCheckpoint(
+        job_key, db_path=str(tmp_path / "checkpoint.db"), enabled=True, resume=resume
+    )
+
+
+def test_resume_keeps_cursors_and_completed(tmp_path):
+    checkpoint = open_checkpoint(tmp_path, resume=False)
+    checkpoint.set_cursor("search:keyword", 3)
+    checkpoint.mark_completed("aid:1")
+
+    resumed = open_checkpoint(tmp_path, resume=True)
+    assert resumed.get_cursor("search:keyword") == 3
+    assert resumed.is_completed("aid:1")
+
+
+def test_new_run_clears_previous_records(tmp_path):
+    checkpoint = open_checkpoint(tmp_path, resume=False)
+    checkpoint.set_cursor("search:keyword", 3)
+    checkpoint.mark_completed("aid:1")
+
+    fresh = open_checkpoint(tmp_path, resume=False)
+    assert fresh.get_cursor("search:keyword", 1) == 1
+    assert not fresh.is_completed("aid:1")
+
+
+def test_records_are_isolated_by_job_key(tmp_path):
+    open_checkpoint(tmp_path, job_key="bili:search:a").mark_completed("aid:1")
+
+    other = open_checkpoint(tmp_path, job_key="bili:search:b", resume=False)
+    assert not other.is_completed("aid:1")
+    assert open_checkpoint(tmp_path, job_key="bili:search:a").is_completed("aid:1")
+
+
+def test_mark_completed_clears_cursor(tmp_path):
+    checkpoint = open_checkpoint(tmp_path)
+    checkpoint.set_cursor("comments:1", "next-cursor")
+    checkpoint.mark_completed("comments:1", extra="done")
+
+    assert checkpoint.get_cursor("comments:1") is None
+    assert checkpoint.get_completed("comments:1") == "done"
+
+
+def test_disabled_checkpoint_records_nothing(tmp_path):
+    checkpoint = CrawlCheckpoint("bili:search", enabled=False)
+    checkpoint.set_cursor("search:keyword", 3)
+    checkpoint.mark_completed("aid:1")
+
+    assert checkpoint.get_cursor("search:keyword", 1) == 1
+    assert not checkpoint.is_completed("aid:1")
+
+
+def test_tracker_cursor_waits_for_earlier_pages(tmp_path):
+    checkpoint = open_checkpoint(tmp_path)
+    tracker = PageCheckpointTracker(checkpoint)
+    tracker.open_scope("search:keyword", 1)
+    tracker.add_page("search:keyword", 2, 1)
+    tracker.add_page("search:keyword", 1, 2)
+    assert checkpoint.get_cursor("search:keyword") == 1
+
+    # 第 2 页先处理完，第 1 页还有内容没处理完，断点停在第 1 页
+    tracker.item_done("search:keyword", 2)
+    tracker.item_done("search:keyword", 1)
+    assert checkpoint.get_cursor("search:keyword") == 1
+
+    tracker.item_done("search:keyword", 1)
+    assert checkpoint.get_cursor("search:keyword") == 3
+
+
+def test_tracker_marks_closed_scope_completed(tmp_path):
+    checkpoint = open_checkpoint(tmp_path)
+    tracker = PageCheckpointTracker(checkpoint)
+    tracker.add_page("search:keyword", 1, 1)
+    tracker.close_scope("search:keyword")
+    assert not checkpoint.is_completed("search:keyword")
+
+    tracker.item_done("search:keyword", 1)
+    assert checkpoint.is_completed("search:keyword")
+    assert checkpoint.get_cursor("search:keyword") is None
+
+
+def test_tracker_cursor_stops_at_first_failed_page(tmp_path):
+    checkpoint = open_checkpoint(tmp_path)
+    tracker = PageCheckpointTracker(checkpoint)
+    for page in (1, 2, 3):
+        tracker.add_page("search:keyword", page, 1)
+    tracker.close_scope("search:keyword")
+
+    tracker.item_done("search:keyword", 1)
+    tracker.item_failed("search:keyword", 2)
+    tracker.item_done("search:keyword", 3)
+
+    assert checkpoint.get_cursor("search:keyword") == 2
+    assert not checkpoint.is_completed("search:keyword")
+    assert tracker.failed_pages == {"search:keyword": {2}}
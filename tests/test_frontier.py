@@ -0,0 +1,93 @@
+import sqlite3
+
+from tools import utils
+from tools.checkpoint import CrawlCheckpoint
+from tools.frontier import BloomFilter, CrawlFrontier
+
+
+def open_frontier(tmp_path, refresh_interval_sec: int = 3600):
+    return CrawlFrontier(
+        "bili",
+        db_path=str(tmp_path / "frontier.db"),
+        refresh_interval_sec=refresh_interval_sec,
+        enabled=True,
+    )
+
+
+def set_last_crawl_ts(tmp_path, item_id: str, last_crawl_ts: int):
+    conn = sqlite3.connect(str(tmp_path / "frontier.db"))
+    conn.execute(
+        "UPDATE frontier SET last_crawl_ts = ? WHERE item_id = ?",
+        (last_crawl_ts, item_id),
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    keys = [f"aid:{i}" for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+
+
+def test_new_item_should_be_crawled(tmp_path):
+    assert open_frontier(tmp_path).should_crawl("aid:1", 10)
+
+
+def test_recent_unchanged_item_is_skipped(tmp_path):
+    frontier = open_frontier(tmp_path)
+    frontier.record("aid:1", 10)
+
+    reloaded = open_frontier(tmp_path)
+    assert not reloaded.should_crawl("aid:1", 10)
+    assert reloaded.skipped_count == 1
+
+
+def test_changed_fingerprint_is_crawled(tmp_path):
+    frontier = open_frontier(tmp_path)
+    frontier.record("aid:1", 10)
+    assert frontier.should_crawl("aid:1", 11)
+
+
+def test_refresh_interval_is_in_seconds(tmp_path):
+    frontier = open_frontier(tmp_path, refresh_interval_sec=3600)
+    frontier.record("aid:1", 10)
+
+    # 11 分钟前爬取过，还没有超过 1 小时的刷新间隔
+    set_last_crawl_ts(tmp_path, "aid:1", utils.get_unix_timestamp() - 11 * 60)
+    assert not frontier.should_crawl("aid:1", 10)
+
+    set_last_crawl_ts(tmp_path, "aid:1", utils.get_unix_timestamp() - 2 * 3600)
+    assert frontier.should_crawl("aid:1", 10)
+
+
+def test_millisecond_records_are_still_understood(tmp_path):
+    frontier = open_frontier(tmp_path, refresh_interval_sec=3600)
+    frontier.record("aid:1", 10)
+
+    set_last_crawl_ts(tmp_path, "aid:1", (utils.get_unix_timestamp() - 60) * 1000)
+    assert not frontier.should_crawl("aid:1", 10)
+
+    set_last_crawl_ts(tmp_path, "aid:1", (utils.get_unix_timestamp() - 7200) * 1000)
+    assert frontier.should_crawl("aid:1", 10)
+
+
+def test_disabled_frontier_crawls_everything(tmp_path):
+    frontier = CrawlFrontier("bili", enabled=False)
+    frontier.record("aid:1", 10)
+    assert frontier.should_crawl("aid:1", 10)
+
+
+def test_checkpoint_reopen_clears_completed_and_cursor(tmp_path):
+    checkpoint = CrawlCheckpoint(
+        "bili:search", db_path=str(tmp_path / "checkpoint.db"), enabled=True
+    )
+    checkpoint.mark_completed("aid:1")
+    checkpoint.set_cursor("comments:1", "next-cursor")
+
+    checkpoint.reopen("aid:1")
+    checkpoint.reopen("comments:1")
+    assert not checkpoint.is_completed("aid:1")
+    assert checkpoint.get_cursor("comments:1") is None
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from threading import Event, Thread
+
+from job_runner import JOB_STATUS_COMPLETED, JobRunner
+
+
+def wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_cancel_then_resubmit_runs_job_once(tmp_path):
+    release_blocker = Event()
+    runs = []
+
+    async def job_func(name: str):
+        runs.append(name)
+        if name == "blocker":
+            await asyncio.to_thread(release_blocker.wait)
+        return f"{name} done"
+
+    runner = JobRunner(job_func, max_workers=1, db_path=str(tmp_path / "jobs.db"))
+    assert runner.submit("blocker", {"name": "blocker"})
+    assert wait_for(lambda: runs == ["blocker"])
+
+    # 排队中取消，在 worker 取到旧条目之前重新提交
+    assert runner.submit("job", {"name": "job"})
+    assert runner.cancel("job")
+    assert runner.submit("job", {"name": "job"})
+
+    release_blocker.set()
+    assert wait_for(lambda: runner.get_status("job")["status"] == JOB_STATUS_COMPLETED)
+    assert wait_for(lambda: runner.get_stats()["queued"] == 0)
+    time.sleep(0.1)
+    assert runs == ["blocker", "job"]
+
+
+def test_cancelled_queued_job_is_skipped(tmp_path):
+    release_blocker = Event()
+    runs = []
+
+    async def job_func(name: str):
+        runs.append(name)
+        if name == "blocker":
+            await asyncio.to_thread(release_blocker.wait)
+
+    runner = JobRunner(job_func, max_workers=1, db_path=str(tmp_path / "jobs.db"))
+    runner.submit("blocker", {"name": "blocker"})
+    assert wait_for(lambda: runs == ["blocker"])
+    runner.submit("job", {"name": "job"})
+    assert runner.cancel("job")
+
+    release_blocker.set()
+    assert wait_for(lambda: runner.get_stats()["queued"] == 0)
+    time.sleep(0.1)
+    assert runs == ["blocker"]
+    assert runner.get_status("job")["status"] == "cancelled"
+
+
+def test_concurrent_submit_enqueues_job_once(tmp_path):
+    release_job = Event()
+    runs = []
+
+    async def job_func(name: str):
+        runs.append(name)
+        await asyncio.to_thread(release_job.wait)
+        return f"{name} done"
+
+    runner = JobRunner(job_func, max_workers=2, db_path=str(tmp_path / "jobs.db"))
+    runner.start()
+    results = []
+    threads = [
+        Thread(target=lambda: results.append(runner.submit("job", {"name": "job"})))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 1
+    assert wait_for(lambda: runs == ["job"])
+    release_job.set()
+    assert wait_for(lambda: runner.get_status("job")["status"] == JOB_STATUS_COMPLETED)
+    assert runs == ["job"]
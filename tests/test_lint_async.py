@@ -0,0 +1,27 @@
+import os
+
+from tools import lint_async
+
+CRAWLER_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "crawler"
+)
+
+
+def test_crawler_has_no_blocking_calls_in_async_code():
+    assert lint_async.main([CRAWLER_DIR]) == 0
+
+
+def test_blocking_sleep_in_async_function_is_reported(tmp_path):
+    source = tmp_path / "blocking.py"
+    source.write_text(
+        "import time\n\n\nasync def fetch():\n    time.sleep(1)\n", encoding="utf-8"
+    )
+    assert lint_async.main([str(tmp_path)]) == 1
+
+
+def test_sleep_in_sync_function_is_allowed(tmp_path):
+    source = tmp_path / "sync_sleep.py"
+    source.write_text(
+        "import time\n\n\ndef wait():\n    time.sleep(1)\n", encoding="utf-8"
+    )
+    assert lint_async.main([str(tmp_path)]) == 0
@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+
+import httpx
+import pytest
+from tools import media_download
+from tools.media_download import PART_FILE_SUFFIX, download_media_to_file
+
+CONTENT = b"0123456789abcdefghij"
+
+
+@pytest.fixture
+def mock_server(monkeypatch):
+    # 用 MockTransport 代替真实请求，按 Range 请求头返回内容，并记录每次请求的 Range
+    ranges = []
+    state = {"content_range": None}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        range_header = request.headers.get("Range")
+        ranges.append(range_header)
+        if not range_header:
+            return httpx.Response(200, content=CONTENT)
+        start = int(range_header[len("bytes=") : -1])
+        content_range = state["content_range"]
+        if content_range is None:
+            content_range = f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}"
+        headers = {"Content-Range": content_range} if content_range else {}
+        return httpx.Response(206, content=CONTENT[start:], headers=headers)
+
+    async_client = httpx.AsyncClient
+
+    def create_client(**kwargs):
+        return async_client(transport=httpx.MockTransport(handler), **kwargs)
+
+    monkeypatch.setattr(media_download.httpx, "AsyncClient", create_client)
+    return ranges, state
+
+
+def write_part_file(tmp_path, content: bytes) -> str:
+    save_file_name = str(tmp_path / "video.mp4")
+    with open(save_file_name + PART_FILE_SUFFIX, "wb") as f:
+        f.write(content)
+    return save_file_name
+
+
+def download(save_file_name: str):
+    return asyncio.run(
+        download_media_to_file("https://example.com/video.mp4", save_file_name)
+    )
+
+
+def test_resume_appends_matching_content_range(tmp_path, mock_server):
+    ranges, _ = mock_server
+    save_file_name = write_part_file(tmp_path, CONTENT[:8])
+
+    result = download(save_file_name)
+    assert result.resumed
+    assert ranges == ["bytes=8-"]
+    with open(save_file_name, "rb") as f:
+        assert f.read() == CONTENT
+    assert result.sha256 == hashlib.sha256(CONTENT).hexdigest()
+
+
+@pytest.mark.parametrize("content_range", ["", "bytes 0-19/20"])
+def test_resume_restarts_on_missing_or_mismatched_content_range(
+    tmp_path, mock_server, content_range
+):
+    ranges, state = mock_server
+    state["content_range"] = content_range
+    save_file_name = write_part_file(tmp_path, CONTENT[:8])
+
+    result = download(save_file_name)
+    assert not result.resumed
+    assert ranges == ["bytes=8-", None]
+    with open(save_file_name, "rb") as f:
+        assert f.read() == CONTENT
+    assert result.size == len(CONTENT)
@@ -0,0 +1,133 @@
+import asyncio
+
+import config
+import httpx
+import pytest
+from tools.circuit_breaker import (
+    CircuitOpenError,
+    PlatformCircuitBreaker,
+    get_circuit_breaker,
+)
+from tools.rate_limiter import mark_transient_failure
+from tools.retry_policy import RetryBudget, is_transient_error, retry_request
+
+
+@pytest.fixture
+def no_retry_delay():
+    token = config.job_config_var.set(
+        config.build_job_config(
+            {
+                "RETRY_MAX_ATTEMPTS": 3,
+                "RETRY_BASE_DELAY_SEC": 0,
+                "CIRCUIT_BREAKER_MIN_REQUESTS": 1000,
+            }
+        )
+    )
+    yield
+    config.job_config_var.reset(token)
+
+
+def http_status_error(status_code: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://example.com")
+    response = httpx.Response(status_code, request=request)
+    return httpx.HTTPStatusError("error", request=request, response=response)
+
+
+def test_retry_budget_allows_min_retries_then_ratio():
+    budget = RetryBudget(ratio=0.1, min_retries=2, window_sec=60)
+    for _ in range(10):
+        budget.record_request(is_retry=False)
+    assert budget.can_retry()
+    budget.record_request(is_retry=True)
+    assert budget.can_retry()
+    budget.record_request(is_retry=True)
+    assert not budget.can_retry()
+    assert budget.get_stats() == {"requests": 12, "retries": 2, "exhausted": 1}
+
+
+def test_circuit_breaker_fast_fails_on_error_rate():
+    breaker = PlatformCircuitBreaker(
+        "test",
+        failure_threshold=3,
+        cooldown_sec=60,
+        error_rate_threshold=0.5,
+        min_requests=4,
+    )
+    breaker.record_outcome(True)
+    breaker.record_outcome(True)
+    breaker.record_outcome(False)
+    breaker.check()
+    breaker.record_outcome(False)
+    assert breaker.is_fast_failing
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+
+
+def test_circuit_breaker_trips_on_consecutive_failures():
+    breaker = PlatformCircuitBreaker("test", failure_threshold=2, cooldown_sec=60)
+    breaker.record_failure("429")
+    breaker.record_success()
+    breaker.record_failure("429")
+    assert not breaker.is_open
+    breaker.record_failure("429")
+    assert breaker.is_open
+
+
+def test_transient_error_classification():
+    assert is_transient_error(httpx.ConnectTimeout("timeout"))
+    assert is_transient_error(http_status_error(503))
+    assert is_transient_error(http_status_error(429))
+    assert not is_transient_error(http_status_error(404))
+    assert not is_transient_error(ValueError("bad response"))
+
+    # 客户端把 HTTP 错误包装成业务异常时检查原始异常
+    try:
+        try:
+            raise http_status_error(502)
+        except httpx.HTTPStatusError as e:
+            raise RuntimeError("HTTP error: 502") from e
+    except RuntimeError as wrapped:
+        assert is_transient_error(wrapped)
+
+
+def test_retry_request_retries_transient_errors(no_retry_delay):
+    calls = []
+
+    @retry_request("test_transient")
+    async def request():
+        calls.append(1)
+        if len(calls) < 3:
+            raise httpx.ConnectError("connect error")
+        return "ok"
+
+    assert asyncio.run(request()) == "ok"
+    assert len(calls) == 3
+
+
+def test_retry_request_retries_throttled_requests(no_retry_delay):
+    calls = []
+
+    @retry_request("test_throttled")
+    async def request():
+        calls.append(1)
+        if len(calls) == 1:
+            mark_transient_failure("code -412")
+            raise RuntimeError("request was throttled")
+        return "ok"
+
+    assert asyncio.run(request()) == "ok"
+    assert len(calls) == 2
+
+
+def test_retry_request_raises_other_errors_immediately(no_retry_delay):
+    calls = []
+
+    @retry_request("test_not_retryable")
+    async def request():
+        calls.append(1)
+        raise KeyError("data")
+
+    with pytest.raises(KeyError):
+        asyncio.run(request())
+    assert len(calls) == 1
+    assert get_circuit_breaker("test_not_retryable").error_rate == 0
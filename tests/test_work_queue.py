@@ -0,0 +1,96 @@
+import time
+
+from distributed.fake_redis import FakeRedis
+from distributed.work_queue import UNIT_KIND_DETAIL, RedisWorkQueue, WorkUnit
+
+
+def create_queue(visibility_timeout_sec: int = 60, max_attempts: int = 3):
+    return RedisWorkQueue(
+        FakeRedis(),
+        name="test_queue",
+        visibility_timeout_sec=visibility_timeout_sec,
+        max_attempts=max_attempts,
+    )
+
+
+def detail_unit(aid: int) -> WorkUnit:
+    return WorkUnit(platform="bili", kind=UNIT_KIND_DETAIL, payload={"aid": aid})
+
+
+def expire_inflight(queue: RedisWorkQueue):
+    for unit_id in queue.redis.zrangebyscore(queue._inflight_key, 0, float("inf")):
+        queue.redis.zadd(queue._inflight_key, {unit_id: time.time() - 1})
+
+
+def test_enqueue_deduplicates_units():
+    queue = create_queue()
+    assert queue.enqueue(detail_unit(1))
+    assert not queue.enqueue(detail_unit(1))
+    assert queue.enqueue_many([detail_unit(1), detail_unit(2)]) == 1
+    assert queue.get_stats()["pending"] == 2
+
+
+def test_claim_and_ack():
+    queue = create_queue()
+    queue.enqueue(detail_unit(1))
+
+    unit = queue.claim()
+    assert unit.payload == {"aid": 1}
+    assert queue.get_stats()["inflight"] == 1
+    assert queue.claim() is None
+
+    queue.ack(unit)
+    assert queue.get_stats() == {"pending": 0, "inflight": 0, "done": 1, "dead": 0}
+    assert queue.is_drained()
+
+
+def test_nack_requeues_until_max_attempts():
+    queue = create_queue(max_attempts=2)
+    queue.enqueue(detail_unit(1))
+
+    queue.nack(queue.claim(), "error")
+    unit = queue.claim()
+    assert unit.attempts == 1
+
+    queue.nack(unit, "error")
+    assert queue.claim() is None
+    assert queue.get_stats()["dead"] == 1
+
+
+def test_expired_unit_is_requeued_and_counted_as_attempt():
+    queue = create_queue(max_attempts=3)
+    queue.enqueue(detail_unit(1))
+    queue.claim()
+
+    expire_inflight(queue)
+    assert queue.requeue_expired() == 1
+    unit = queue.claim()
+    assert unit.attempts == 1
+
+
+def test_expired_unit_moves_to_dead_queue_after_max_attempts():
+    queue = create_queue(max_attempts=2)
+    queue.enqueue(detail_unit(1))
+    for _ in range(2):
+        assert queue.claim() is not None
+        expire_inflight(queue)
+        queue.requeue_expired()
+
+    assert queue.claim() is None
+    assert queue.get_stats()["dead"] == 1
+    assert queue.is_drained()
+
+
+def test_nack_after_requeue_does_not_push_twice():
+    queue = create_queue()
+    queue.enqueue(detail_unit(1))
+    stale_unit = queue.claim()
+
+    # 原 worker 超时后任务已经重新入队，之后原 worker 才 nack
+    expire_inflight(queue)
+    queue.requeue_expired()
+    queue.nack(stale_unit, "error")
+
+    assert queue.get_stats()["pending"] == 1
+    assert queue.claim() is not None
+    assert queue.claim() is None